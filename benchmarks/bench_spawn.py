@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Compare dialog spawn latency of the 'popen' and 'posix_spawn' methods of
+crossfiledialog.process as the host process grows.
+
+Each step grows the resident set and the number of open descriptors, then
+times how long the caller is blocked starting /bin/true and how long a full
+spawn-and-collect round trip takes. The 'subprocess' rows are a plain
+subprocess.Popen with pipes and nothing else, the baseline both methods are
+compared against. Results are printed as JSON lines.
+
+Usage: python benchmarks/bench_spawn.py [--steps 4] [--mb 512] [--fds 8192] [--runs 20]
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from crossfiledialog import process  # noqa: E402
+
+
+def _plain_popen(cmdlist):
+    return subprocess.Popen(cmdlist, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+
+def measure(method, runs):
+    if method == 'subprocess':
+        spawn = _plain_popen
+    else:
+        process.spawn_method = method
+        spawn = process.spawn
+    spawn_times, total_times = [], []
+    for _ in range(runs):
+        start = time.perf_counter()
+        child = spawn(['/bin/true'])
+        spawned = time.perf_counter()
+        child.communicate()
+        done = time.perf_counter()
+        spawn_times.append(spawned - start)
+        total_times.append(done - start)
+    return dict(
+        spawn_ms=round(statistics.median(spawn_times) * 1000, 3),
+        total_ms=round(statistics.median(total_times) * 1000, 3),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--steps', type=int, default=4)
+    parser.add_argument('--mb', type=int, default=512, help="memory added per step")
+    parser.add_argument('--fds', type=int, default=8192, help="descriptors added per step")
+    parser.add_argument('--runs', type=int, default=20)
+    options = parser.parse_args()
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = options.fds * options.steps + 256
+    if soft < wanted:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(wanted, hard), hard))
+
+    ballast, fds = [], []
+    for step in range(options.steps + 1):
+        rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024
+        for method in ('subprocess', 'popen', 'posix_spawn'):
+            row = dict(step=step, method=method, rss_mb=rss_mb, open_fds=len(os.listdir('/proc/self/fd')))
+            row.update(measure(method, options.runs))
+            print(json.dumps(row), flush=True)
+
+        # Touch every page so the memory is really resident.
+        ballast.append(bytearray(b'\1') * (options.mb * 1024 * 1024))
+        try:
+            for _ in range(options.fds):
+                fds.append(os.open(os.devnull, os.O_RDONLY))
+        except OSError:
+            pass
+
+
+if __name__ == '__main__':
+    main()
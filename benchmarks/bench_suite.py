@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Benchmark crossfiledialog against stand-in dialog executables.
+
+Fake zenity, kdialog and osascript binaries (see fakes.py) are put in front
+of PATH and answer every dialog from a prepared file, so the suite runs
+headless and measures only crossfiledialog's own costs:
+
+  import      time to `import crossfiledialog` in a fresh interpreter, as
+              reported by -X importtime
+  resolve     backend detection on first use
+  argv        command line construction for every filter shape
+  spawn       a full single-file dialog round trip through the fake
+  parse       decoding and splitting a 100k-path answer, in memory
+  multiple    open_multiple() and iter_multiple() end to end with that answer
+  adversarial awkward file names survive every backend unchanged
+  osascript   scripts are compiled once (with the fake osacompile), and a
+              dialog round trip through the stay-open runner
+  portal      a dialog round trip through a mock xdg-desktop-portal on a
+              private dbus-daemon (skipped without dbus-daemon)
+
+Results are written as one JSON document. With --check, each metric is
+compared against benchmarks/thresholds.json and the exit status is 1 if any
+exceeds its limit, so the suite can gate a release.
+
+Usage: python benchmarks/bench_suite.py [--runs 20] [--paths 100000] [--output results.json] [--check]
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+sys.path.insert(0, HERE)
+
+# Keep the suite from touching the user's directory history and probe cache.
+os.environ['FILEDIALOG_HISTORY'] = '0'
+os.environ['FILEDIALOG_PROBE_CACHE'] = '0'
+os.environ.pop('FILEDIALOG_CWD', None)
+os.environ.pop('FILEDIALOG_BACKEND', None)
+# Nor reach the desktop's portal; bench_portal() starts its own.
+os.environ['DBUS_SESSION_BUS_ADDRESS'] = 'disabled:'
+
+import fakes  # noqa: E402
+
+from crossfiledialog import filters, kdialog, osascript, portal, streaming, wrapper, zenity  # noqa: E402
+
+BACKENDS = dict(zenity=zenity, kdialog=kdialog, osascript=osascript)
+
+FILTER_SHAPES = dict(
+    none=None,
+    single='*.py',
+    flat=['*.py', '*.md', '*.txt'],
+    nested=[['*.py', '*.md'], ['*.png', '*.jpg', '*.gif'], ['*.txt']],
+    named={'Python': ['*.py', '*.pyi'], 'Images': ['*.png', '*.jpg'], 'PDF': '*.pdf'},
+)
+
+
+def median_seconds(function, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def per_call(function, loops, runs=5):
+    # For sub-microsecond operations: time `loops` calls, keep the best run.
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        for _ in range(loops):
+            function()
+        elapsed = (time.perf_counter() - start) / loops
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def import_time(code):
+    # The cumulative time -X importtime reports for crossfiledialog itself,
+    # so interpreter start-up is not part of the measurement.
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code], check=True, stderr=subprocess.PIPE, text=True,
+    )
+    for line in completed.stderr.splitlines():
+        fields = [field.strip() for field in line.split('|')]
+        if len(fields) == 3 and fields[2] == 'crossfiledialog':
+            return int(fields[1]) / 1e6
+    raise RuntimeError("crossfiledialog missing from -X importtime output")
+
+
+def bench_import(runs):
+    code = 'import sys; sys.path.insert(0, {0!r}); import crossfiledialog'.format(os.path.join(HERE, '..'))
+    return {'import.ms': statistics.median(import_time(code) for _ in range(runs)) * 1000}
+
+
+def bench_resolve(runs):
+    results = {}
+    for desktop in ('gnome', 'kde'):
+        os.environ['XDG_CURRENT_DESKTOP'] = desktop
+
+        def resolve():
+            wrapper.backend = None
+            wrapper.load_backend()
+
+        results['resolve.{0}.us'.format(desktop)] = median_seconds(resolve, runs) * 1e6
+        results['resolve.{0}.backend'.format(desktop)] = wrapper.backend.__name__.rsplit('.', 1)[-1]
+    os.environ.pop('XDG_CURRENT_DESKTOP')
+    wrapper.backend = None
+    return results
+
+
+def bench_argv():
+    results = {}
+    for name, backend in BACKENDS.items():
+        for shape, filter in FILTER_SHAPES.items():
+            def build():
+                backend.open_file_command('Pick', '/tmp', filter)
+
+            def build_cold():
+                filters._compile.cache_clear()
+                backend.open_file_command('Pick', '/tmp', filter)
+
+            results['argv.{0}.{1}.us'.format(name, shape)] = per_call(build, 2000) * 1e6
+            results['argv.{0}.{1}.cold.us'.format(name, shape)] = per_call(build_cold, 2000) * 1e6
+    return results
+
+
+def bench_spawn(directory, runs):
+    results = {}
+    os.environ['FAKE_DIALOG_ANSWER'] = fakes.write_answer(directory, [b'/tmp/chosen.txt'], 'single')
+    for name, backend in BACKENDS.items():
+        def show():
+            assert backend.open_file('Pick', '/tmp') == '/tmp/chosen.txt'
+        results['spawn.{0}.ms'.format(name)] = median_seconds(show, runs) * 1000
+    return results
+
+
+def bench_parse(paths, runs):
+    results = {}
+    data = b''.join(p + b'\n' for p in paths)
+    for name, backend in BACKENDS.items():
+        for mode in ('str', 'bytes'):
+            def parse():
+                result = backend.parse_multiple(backend.process_output(0, data, b'', mode))
+                assert len(result) == len(paths)
+            seconds = median_seconds(parse, max(3, runs // 4))
+            results['parse.{0}.{1}.paths_per_s'.format(name, mode)] = len(paths) / seconds
+    return results
+
+
+def bench_multiple(directory, paths, runs):
+    results = {}
+    os.environ['FAKE_DIALOG_ANSWER'] = fakes.write_answer(directory, paths, 'many')
+    wrapper.backend = zenity
+    try:
+        def blocking():
+            assert len(zenity.open_multiple('Pick', '/tmp')) == len(paths)
+
+        def streamed():
+            assert sum(1 for _ in streaming.iter_multiple('Pick', '/tmp')) == len(paths)
+
+        def first_path():
+            iterator = streaming.iter_multiple('Pick', '/tmp')
+            next(iterator)
+            iterator.close()
+
+        count = max(3, runs // 4)
+        results['multiple.open_multiple.ms'] = median_seconds(blocking, count) * 1000
+        results['multiple.iter_multiple.ms'] = median_seconds(streamed, count) * 1000
+        results['multiple.iter_multiple.first_path.ms'] = median_seconds(first_path, count) * 1000
+    finally:
+        wrapper.backend = None
+    return results
+
+
+def bench_adversarial(directory):
+    results = {}
+    paths = fakes.adversarial_paths()
+    os.environ['FAKE_DIALOG_ANSWER'] = fakes.write_answer(directory, paths, 'adversarial')
+    for name, backend in BACKENDS.items():
+        got = backend.open_multiple('Pick', '/tmp', paths='bytes')
+        results['adversarial.{0}.mismatches'.format(name)] = sum(a != b for a, b in zip(got, paths)) + \
+            abs(len(got) - len(paths))
+
+    # Single selections: the name is then the whole output, ends included.
+    for path in paths:
+        os.environ['FAKE_DIALOG_ANSWER'] = fakes.write_answer(directory, [path], 'adversarial-single')
+        for name, backend in BACKENDS.items():
+            key = 'adversarial.{0}.single_mismatches'.format(name)
+            results[key] = results.get(key, 0) + (backend.open_file('Pick', '/tmp', paths='bytes') != path)
+    return results
+
+
+def bench_osascript(directory, runs):
+    results = {}
+    log = os.path.join(directory, 'osacompile.log')
+    os.environ['FAKE_OSACOMPILE_LOG'] = log
+    os.environ['FAKE_DIALOG_ANSWER'] = fakes.write_answer(directory, [b'/tmp/chosen.txt'], 'single')
+    osascript.forget()
+    try:
+        for _ in range(3):
+            # As in a new process: only the cache directory is left.
+            osascript._commands.clear()
+            assert osascript.open_file('Pick', '/tmp') == '/tmp/chosen.txt'
+        with open(log) as fp:
+            results['osascript.compiles'] = len(fp.read().splitlines())
+
+        osascript.use_runner = True
+
+        def show():
+            assert osascript.open_file('Pick', '/tmp') == '/tmp/chosen.txt'
+        show()  # start the runner outside the measurement
+        results['osascript.runner.ms'] = median_seconds(show, runs) * 1000
+    finally:
+        osascript.use_runner = False
+        osascript.stop_runner()
+        os.environ.pop('FAKE_OSACOMPILE_LOG')
+    return results
+
+
+def bench_portal(runs):
+    if shutil.which('dbus-daemon') is None:
+        return {}
+    results = {}
+    with fakes.MockPortal(['file:///tmp/chosen.txt']) as mock:
+        os.environ['DBUS_SESSION_BUS_ADDRESS'] = mock.address
+        try:
+            def show():
+                assert portal.open_file('Pick', '/tmp') == '/tmp/chosen.txt'
+            show()  # connect and check the version outside the measurement
+            results['portal.round_trip.ms'] = median_seconds(show, runs) * 1000
+        finally:
+            os.environ['DBUS_SESSION_BUS_ADDRESS'] = 'disabled:'
+            portal.connection.close()
+    return results
+
+
+def check(results, thresholds):
+    failures = []
+    for metric, limit in thresholds.items():
+        if metric not in results:
+            failures.append('{0}: missing'.format(metric))
+            continue
+        value = results[metric]
+        if 'min' in limit and value < limit['min']:
+            failures.append('{0}: {1:.6g} < {2:.6g}'.format(metric, value, limit['min']))
+        if 'max' in limit and value > limit['max']:
+            failures.append('{0}: {1:.6g} > {2:.6g}'.format(metric, value, limit['max']))
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--paths', type=int, default=100000, help="size of the large multi-selection")
+    parser.add_argument('--output', help="write the results here instead of stdout")
+    parser.add_argument('--check', action='store_true', help="compare against thresholds.json")
+    parser.add_argument('--thresholds', default=os.path.join(HERE, 'thresholds.json'))
+    options = parser.parse_args()
+
+    directory = fakes.create()
+    os.environ['PATH'] = directory + os.pathsep + os.environ.get('PATH', '')
+    # Compiled osascript scripts go here rather than to the user's cache.
+    os.environ['XDG_CACHE_HOME'] = os.path.join(directory, 'cache')
+    zenity.zenity_binary = os.path.join(directory, 'zenity')
+    kdialog.kdialog_binary = os.path.join(directory, 'kdialog')
+
+    paths = fakes.many_paths(options.paths)
+    results = {}
+    try:
+        results.update(bench_import(options.runs))
+        results.update(bench_resolve(options.runs))
+        results.update(bench_argv())
+        results.update(bench_spawn(directory, options.runs))
+        results.update(bench_parse(paths, options.runs))
+        results.update(bench_multiple(directory, paths, options.runs))
+        results.update(bench_adversarial(directory))
+        results.update(bench_osascript(directory, options.runs))
+        results.update(bench_portal(options.runs))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    document = dict(
+        python=platform.python_version(),
+        platform=sys.platform,
+        paths=options.paths,
+        runs=options.runs,
+        results={k: round(v, 3) if isinstance(v, float) else v for k, v in sorted(results.items())},
+    )
+
+    status = 0
+    if options.check:
+        with open(options.thresholds) as fp:
+            document['failures'] = check(results, json.load(fp))
+        status = 1 if document['failures'] else 0
+
+    text = json.dumps(document, indent=2)
+    if options.output:
+        with open(options.output, 'w') as fp:
+            fp.write(text + '\n')
+    else:
+        print(text)
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,239 @@
+"""
+Stand-in zenity, kdialog and osascript executables for the benchmarks.
+
+The fakes are tiny shell scripts that print a prepared answer file and exit
+with a prepared status, so measurements include a real fork/exec and pipe
+transfer but no toolkit. Point FAKE_DIALOG_ANSWER at the answer file and
+optionally set FAKE_DIALOG_STATUS. The fake osacompile copies the script
+source to its output file, and logs that file to FAKE_OSACOMPILE_LOG if set;
+the fake osascript plays the runner when asked to run its script.
+fake_gtkhelper.py stands in for crossfiledialog.gtkhelper: it answers
+requests from the answer file, logs them to FAKE_HELPER_LOG if set, and
+fails to start with FAKE_HELPER_ERROR. MockPortal plays
+xdg-desktop-portal on a private dbus-daemon.
+"""
+import os
+import stat
+import sys
+import tempfile
+
+
+FAKE_SCRIPT = """#!/bin/sh
+[ -n "$FAKE_DIALOG_ANSWER" ] && cat "$FAKE_DIALOG_ANSWER"
+exit "${FAKE_DIALOG_STATUS:-0}"
+"""
+
+FAKE_OSASCRIPT = """#!/bin/sh
+case "$1" in
+*/runner-*.scpt) exec "$(dirname "$0")/osascript-runner" ;;
+-l) [ "$2" = JavaScript ] && exec "$(dirname "$0")/osascript-runner" ;;
+esac
+[ -n "$FAKE_DIALOG_ANSWER" ] && cat "$FAKE_DIALOG_ANSWER"
+exit "${FAKE_DIALOG_STATUS:-0}"
+"""
+
+FAKE_OSACOMPILE = """#!/bin/sh
+while [ $# -gt 0 ]; do
+    case "$1" in
+    -o) output="$2"; shift 2 ;;
+    -e) source="$2"; shift 2 ;;
+    *) shift ;;
+    esac
+done
+[ -n "$FAKE_OSACOMPILE_LOG" ] && echo "$output" >> "$FAKE_OSACOMPILE_LOG"
+printf '%s\\n' "$source" > "$output"
+"""
+
+# Speaks crossfiledialog.osascript's runner protocol, answering every
+# request with the answer file.
+FAKE_RUNNER = """#!{python}
+import json, os, sys
+
+def answer():
+    path = os.environ.get('FAKE_DIALOG_ANSWER')
+    if not path:
+        return ''
+    with open(path, encoding='utf-8') as fp:
+        return fp.read()
+
+sys.stdout.write(json.dumps(dict(ready=True)) + '\\n')
+sys.stdout.flush()
+for line in sys.stdin:
+    json.loads(line)
+    sys.stdout.write(json.dumps(dict(result=answer())) + '\\n')
+    sys.stdout.flush()
+"""
+
+# Serves crossfiledialog.resident's requests with gtkhelper's own loop, so
+# only the dialog is fake. Run with python -m fake_gtkhelper, with the fakes
+# directory on PYTHONPATH.
+FAKE_HELPER = """import json, os, sys
+
+from crossfiledialog import gtkhelper
+from crossfiledialog.framing import write_frame
+
+
+def show(request):
+    log = os.environ.get('FAKE_HELPER_LOG')
+    if log:
+        with open(log, 'a', encoding='utf-8') as fp:
+            fp.write(json.dumps(dict(request, pid=os.getpid())) + '\\n')
+    paths = []
+    if os.environ.get('FAKE_DIALOG_ANSWER'):
+        with open(os.environ['FAKE_DIALOG_ANSWER'], 'rb') as fp:
+            paths = [os.fsdecode(line) for line in fp.read().splitlines()]
+    return dict(paths=paths, timeout=False)
+
+
+stdin, out = gtkhelper.channels()
+sys.stderr.write('fake helper {0} started\\n'.format(os.getpid()))
+sys.stderr.flush()
+if os.environ.get('FAKE_HELPER_ERROR'):
+    write_frame(out, dict(error=os.environ['FAKE_HELPER_ERROR']))
+    sys.exit(1)
+write_frame(out, dict(ready=True))
+sys.exit(gtkhelper.serve(stdin, out, show, float(sys.argv[1])))
+"""
+
+BINARIES = ('zenity', 'kdialog', 'osascript')
+
+# File names that have broken naive parsers: separators used by the old
+# multi-select formats, quoting characters, option-like names, non-ASCII and
+# non-UTF-8 bytes, and a name close to NAME_MAX. Newlines are left out: no
+# backend can report them unambiguously.
+ADVERSARIAL_NAMES = (
+    b'with space.txt',
+    b'  leading and trailing spaces  ',
+    b'comma, separated.txt',
+    b'pipe|separated.txt',
+    b'quote"double.txt',
+    b"quote'single.txt",
+    b'back\\slash.txt',
+    b'--title=not-an-option',
+    b'-',
+    b'tab\tinside.txt',
+    b'$(echo injected).txt',
+    b'*.py',
+    'café 日本語 \U0001f4c4.txt'.encode('utf-8'),
+    b'latin1-caf\xe9.txt',
+    b'x' * 250,
+)
+
+
+def create(directory=None):
+    """
+    Write the fake executables into `directory` (a new temporary one by default).
+
+    Returns:
+        str: The directory, to be put in front of PATH.
+    """
+    directory = directory or tempfile.mkdtemp(prefix='crossfiledialog-fakes-')
+    scripts = {name: FAKE_SCRIPT for name in BINARIES}
+    scripts.update({
+        'osascript': FAKE_OSASCRIPT,
+        'osacompile': FAKE_OSACOMPILE,
+        'osascript-runner': FAKE_RUNNER.format(python=sys.executable),
+        'fake_gtkhelper.py': FAKE_HELPER,
+    })
+    for name, script in scripts.items():
+        path = os.path.join(directory, name)
+        with open(path, 'w') as fp:
+            fp.write(script)
+        os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return directory
+
+
+def many_paths(count, root=b'/srv/scans/2024/batch-0042'):
+    """`count` distinct absolute paths, as bytes."""
+    return [b'%s/scan-%07d.tif' % (root, i) for i in range(count)]
+
+
+def adversarial_paths(root=b'/tmp/adversarial'):
+    return [root + b'/' + name for name in ADVERSARIAL_NAMES]
+
+
+def write_answer(directory, paths, name='answer'):
+    """
+    Write paths one per line, the way every backend now reports a multi-selection.
+
+    Returns:
+        str: The answer file, for FAKE_DIALOG_ANSWER.
+    """
+    path = os.path.join(directory, name)
+    with open(path, 'wb') as fp:
+        fp.write(b''.join(p + b'\n' for p in paths))
+    return path
+
+
+class MockPortal:
+    """
+    A stand-in xdg-desktop-portal on a private dbus-daemon.
+
+    It owns org.freedesktop.portal.Desktop and answers every FileChooser
+    request at once with `uris`, or cancels it when `uris` is None; a
+    `response` code other than 0 and 1 ends requests with that code. The
+    options of every request are kept in `requests`.
+
+    Example:
+        with MockPortal(['file:///tmp/a.txt']) as portal:
+            os.environ['DBUS_SESSION_BUS_ADDRESS'] = portal.address
+            ...
+    """
+
+    def __init__(self, uris=(), version=4, response=None):
+        self.uris = uris
+        self.version = version
+        self.response = response
+        self.requests = []
+        self.daemon = None
+        self.address = None
+        self.connection = None
+
+    def __enter__(self):
+        import subprocess
+        from crossfiledialog.bus import Connection
+
+        self.daemon = subprocess.Popen(
+            ['dbus-daemon', '--session', '--nofork', '--print-address=1'],
+            stdout=subprocess.PIPE, stdin=subprocess.DEVNULL,
+        )
+        self.address = self.daemon.stdout.readline().decode().strip()
+        self.connection = Connection(self.address)
+        self.connection.method_handler = self._handle
+        self.connection.call(
+            'org.freedesktop.DBus', '/org/freedesktop/DBus', 'org.freedesktop.DBus', 'RequestName', 'su',
+            ['org.freedesktop.portal.Desktop', 4], timeout=10,
+        )
+        return self
+
+    def __exit__(self, *exc_info):
+        self.connection.close()
+        self.daemon.terminate()
+        self.daemon.wait()
+
+    def _handle(self, call):
+        from crossfiledialog.bus import Variant
+
+        if call.member == 'Get' and call.body == ['org.freedesktop.portal.FileChooser', 'version']:
+            self.connection.reply(call, 'v', [Variant('u', self.version)])
+        elif call.interface == 'org.freedesktop.portal.FileChooser':
+            _, title, options = call.body
+            self.requests.append(dict(options, method=call.member, title=title))
+            handle = '/org/freedesktop/portal/desktop/request/{0}/{1}'.format(
+                call.sender[1:].replace('.', '_'), options['handle_token'],
+            )
+            self.connection.reply(call, 'o', [handle])
+            if self.response is not None:
+                response, results = self.response, {}
+            elif self.uris is None:
+                response, results = 1, {}
+            else:
+                response, results = 0, dict(uris=Variant('as', list(self.uris)))
+            self.connection.emit(
+                handle, 'org.freedesktop.portal.Request', 'Response', 'ua{sv}', [response, results],
+                destination=call.sender,
+            )
+        elif call.interface == 'org.freedesktop.portal.Request' and call.member == 'Close':
+            self.connection.reply(call)
+        else:
+            self.connection.reply_error(call, 'org.freedesktop.DBus.Error.UnknownMethod', call.member)
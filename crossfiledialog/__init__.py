@@ -1 +1,21 @@
-from crossfiledialog.wrapper import *
+import os
+
+from crossfiledialog import wrapper
+from crossfiledialog.wrapper import __all__
+
+
+if os.environ.get('FILEDIALOG_SPAWN') == 'launcher':
+    # Fork the launcher now, while the host process is still small.
+    from crossfiledialog import launcher
+    launcher.start()
+
+
+def __getattr__(name):
+    # Backend functions are resolved on first use, see wrapper.load_backend().
+    if name in __all__:
+        return getattr(wrapper, name)
+    raise AttributeError("module {0!r} has no attribute {1!r}".format(__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,152 @@
+"""
+Native file dialogs from the command line, with JSON output.
+
+  python -m crossfiledialog open_file --title "Pick a file" --filter '*.py'
+  python -m crossfiledialog choose_folder --start-dir ~/Documents
+
+prints {"result": "/home/user/a.py"} and exits with status 0, or 1 if the
+dialog was cancelled (the result is then "" or []). Errors are printed as
+{"error": {"type": ..., "message": ...}} with status 2.
+
+With --batch, one process answers many dialogs: every line read from stdin
+is a JSON request such as
+
+  {"id": 1, "function": "open_multiple", "title": "Scans", "filter": ["*.tif"]}
+
+and one JSON line is written (and flushed) per request, in order:
+{"id": 1, "result": [...]} or {"id": 1, "error": {...}}. Besides "function"
+and "id", a request may contain title, start_dir, filter, timeout, paths
+and stderr. The backend is picked once and filters are compiled once, so
+later requests cost only the dialog itself.
+"""
+import argparse
+import json
+import sys
+
+from crossfiledialog.exceptions import FileDialogException
+
+
+FUNCTIONS = ('open_file', 'open_multiple', 'save_file', 'choose_folder')
+
+# Request keys passed on to the dialog functions; choose_folder() and
+# save_file() take no filter.
+OPTIONS = ('title', 'start_dir', 'filter', 'timeout', 'paths', 'stderr')
+
+
+class RequestError(ValueError):
+    pass
+
+
+def _error(exception):
+    return dict(type=type(exception).__name__, message=str(exception))
+
+
+def show(session, request):
+    """
+    Show the dialog `request` asks for.
+
+    Args:
+        session (DialogSession): Shows the dialog.
+        request (dict): "function" and the dialog's arguments.
+
+    Returns:
+        The dialog's result.
+
+    Raises:
+        RequestError: If the request is malformed.
+    """
+    if not isinstance(request, dict):
+        raise RequestError("A request must be a JSON object")
+    function = request.get('function')
+    if function not in FUNCTIONS:
+        raise RequestError("function must be one of {0}, not {1!r}".format(', '.join(FUNCTIONS), function))
+    unknown = set(request) - set(OPTIONS) - {'function', 'id'}
+    if function in ('save_file', 'choose_folder') and 'filter' in request:
+        unknown.add('filter')
+    if unknown:
+        raise RequestError("Unknown arguments for {0}: {1}".format(function, ', '.join(sorted(unknown))))
+    if request.get('paths') == 'bytes':
+        raise RequestError("paths='bytes' cannot be represented in JSON")
+    kwargs = {key: request[key] for key in OPTIONS if key in request}
+    return getattr(session, function)(**kwargs)
+
+
+def batch(session, input, output):
+    """
+    Answer newline-delimited JSON requests from `input` on `output`.
+
+    Returns:
+        int: 0, once `input` is exhausted.
+    """
+    for line in input:
+        if not line.strip():
+            continue
+        request_id = None
+        try:
+            request = json.loads(line)
+            if isinstance(request, dict):
+                request_id = request.get('id')
+            response = dict(result=show(session, request))
+        except (ValueError, TypeError, OSError, FileDialogException) as e:
+            # json.JSONDecodeError and RequestError are ValueErrors.
+            response = dict(error=_error(e))
+        response = dict(id=request_id, **response)
+        output.write(json.dumps(response) + '\n')
+        output.flush()
+    return 0
+
+
+def _parse_filter(values):
+    # Each --filter is a wildcard, or a filter of any shape as JSON.
+    if not values:
+        return None
+    if len(values) == 1 and values[0][:1] in ('[', '{'):
+        return json.loads(values[0])
+    return values if len(values) > 1 else values[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m crossfiledialog', description=__doc__.strip().splitlines()[0],
+    )
+    parser.add_argument('function', nargs='?', choices=FUNCTIONS)
+    parser.add_argument('--batch', action='store_true', help="answer JSON requests read from stdin, one per line")
+    parser.add_argument('--backend', help="use this backend instead of detecting one")
+    parser.add_argument('--title')
+    parser.add_argument('--start-dir')
+    parser.add_argument('--filter', action='append', help="a wildcard (repeatable), or a filter as JSON")
+    parser.add_argument('--timeout', type=float)
+    parser.add_argument('--paths', choices=('str', 'surrogateescape'), default='str')
+    parser.add_argument('--stderr', choices=('forward', 'devnull', 'ring', 'log'))
+    options = parser.parse_args(argv)
+    if options.batch == (options.function is not None):
+        parser.error("give either a function or --batch")
+
+    from crossfiledialog.session import DialogSession
+
+    try:
+        session = DialogSession(backend=options.backend, shared_history=True, stderr=options.stderr)
+    except FileDialogException as e:
+        print(json.dumps(dict(error=_error(e))))
+        return 2
+
+    if options.batch:
+        return batch(session, sys.stdin, sys.stdout)
+
+    request = dict(function=options.function, paths=options.paths)
+    for key in ('title', 'start_dir', 'timeout'):
+        if getattr(options, key) is not None:
+            request[key] = getattr(options, key)
+    try:
+        if options.filter:
+            request['filter'] = _parse_filter(options.filter)
+        result = show(session, request)
+    except (ValueError, TypeError, OSError, FileDialogException) as e:
+        print(json.dumps(dict(error=_error(e))))
+        return 2
+    print(json.dumps(dict(result=result)))
+    return 0 if result else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,207 @@
+import asyncio
+import functools
+
+from subprocess import PIPE
+
+from crossfiledialog import strings
+from crossfiledialog.exceptions import DialogTimeout
+from crossfiledialog.process import kill, kill_grace, spawn_kwargs, terminate, with_death_signal
+from crossfiledialog.stderr import Capture, join_timeout
+from crossfiledialog.wrapper import load_backend
+
+
+async def _read_stderr(reader, capture):
+    while True:
+        data = await reader.read(65536)
+        capture.feed(data)
+        if not data:
+            return
+
+
+async def _finish_reading(reader, timeout=join_timeout):
+    # A child the dialog left running may hold the pipe open.
+    if reader is not None:
+        try:
+            await asyncio.wait_for(reader, timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def _close(process):
+    terminate(process)
+    try:
+        await asyncio.wait_for(process.wait(), kill_grace)
+    except asyncio.TimeoutError:
+        kill(process)
+        await process.wait()
+
+
+async def run_command(backend, cmdlist, timeout=None, kind='open', stderr=None):
+    """
+    Run a backend command without blocking the event loop.
+
+    If the awaiting task is cancelled or the timeout expires, the dialog's
+    process group is terminated before the exception propagates. The
+    program's stderr is handled by the `stderr` policy, or the current one
+    (see crossfiledialog.stderr).
+    """
+    capture = Capture(backend.__name__.rsplit('.', 1)[-1], stderr)
+    process = await asyncio.create_subprocess_exec(
+        *with_death_signal(cmdlist), stdout=PIPE, stderr=capture.target, **spawn_kwargs(),
+        **backend.popen_kwargs(kind)
+    )
+    reader = None
+    if not capture.forward and process.stderr is not None:
+        # communicate() then reads stdout only.
+        reader = asyncio.ensure_future(_read_stderr(process.stderr, capture))
+        process.stderr = None
+    with capture:
+        try:
+            stdout, captured = await asyncio.wait_for(process.communicate(), timeout)
+        except asyncio.TimeoutError:
+            await _close(process)
+            await _finish_reading(reader)
+            raise DialogTimeout("No answer from the dialog within {0} seconds".format(timeout))
+        except asyncio.CancelledError:
+            await _close(process)
+            if reader is not None:
+                reader.cancel()
+            raise
+        await _finish_reading(reader)
+        return backend.process_output(
+            process.returncode, stdout, capture.collect(captured), forward=capture.forward,
+        )
+
+
+async def _run_in_executor(function, *args, **kwargs):
+    # Backends without a command line (win32) block inside the calling
+    # thread, so run them on the default executor instead.
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(function, *args, **kwargs))
+
+
+async def open_file(title=strings.open_file, start_dir=None, filter=None, timeout=None, stderr=None):
+    """
+    Open a file selection dialog for selecting a file, without blocking the event loop.
+
+    Args:
+        title (str, optional): The title of the file selection dialog.
+            Default is 'Choose a file'
+        start_dir (str, optional): The starting directory for the dialog.
+        filter (str, list, dict, optional): The filter for file types to display.
+        timeout (float, optional): Seconds after which the dialog is closed and
+            DialogTimeout is raised. Default is to wait indefinitely.
+        stderr (str, optional): What happens to the dialog program's stderr:
+            'forward' (default), 'devnull', 'ring', 'log' or a logger. See
+            crossfiledialog.stderr.
+
+    Returns:
+        str: The selected file's path.
+
+    Example:
+        result = await open_file(title="Select a file", filter="*.txt")
+    """
+    backend = load_backend()
+    if not hasattr(backend, 'open_file_command'):
+        return await _run_in_executor(backend.open_file, title, start_dir, filter, timeout=timeout)
+
+    result = await run_command(backend, backend.open_file_command(title, start_dir, filter), timeout, stderr=stderr)
+    if result:
+        backend.set_last_cwd(result)
+    return result
+
+
+async def open_multiple(title=strings.open_multiple, start_dir=None, filter=None, timeout=None, stderr=None):
+    """
+    Open a file selection dialog for selecting multiple files, without blocking the event loop.
+
+    Args:
+        title (str, optional): The title of the file selection dialog.
+            Default is 'Choose one or more files'
+        start_dir (str, optional): The starting directory for the dialog.
+        filter (str, list, dict, optional): The filter for file types to display.
+        timeout (float, optional): Seconds after which the dialog is closed and
+            DialogTimeout is raised. Default is to wait indefinitely.
+        stderr (str, optional): What happens to the dialog program's stderr:
+            'forward' (default), 'devnull', 'ring', 'log' or a logger. See
+            crossfiledialog.stderr.
+
+    Returns:
+        list[str]: A list of selected file paths.
+
+    Example:
+        result = await open_multiple(title="Select multiple files", filter="*.txt")
+    """
+    backend = load_backend()
+    if not hasattr(backend, 'open_multiple_command'):
+        return await _run_in_executor(backend.open_multiple, title, start_dir, filter, timeout=timeout)
+
+    result = await run_command(backend, backend.open_multiple_command(title, start_dir, filter), timeout, stderr=stderr)
+    result_list = backend.parse_multiple(result)
+    if result_list:
+        backend.set_last_cwd(result_list[0])
+        return result_list
+    return []
+
+
+async def save_file(title=strings.save_file, start_dir=None, timeout=None, stderr=None):
+    """
+    Open a save file dialog, without blocking the event loop.
+
+    Args:
+        title (str, optional): The title of the save file dialog.
+            Default is 'Enter the name of the file to save to'
+        start_dir (str, optional): The starting directory for the dialog.
+        timeout (float, optional): Seconds after which the dialog is closed and
+            DialogTimeout is raised. Default is to wait indefinitely.
+        stderr (str, optional): What happens to the dialog program's stderr:
+            'forward' (default), 'devnull', 'ring', 'log' or a logger. See
+            crossfiledialog.stderr.
+
+    Returns:
+        str: The selected file's path for saving.
+
+    Example:
+        result = await save_file(title="Save file")
+    """
+    backend = load_backend()
+    if not hasattr(backend, 'save_file_command'):
+        return await _run_in_executor(backend.save_file, title, start_dir, timeout=timeout)
+
+    result = await run_command(backend, backend.save_file_command(title, start_dir), timeout, 'save', stderr)
+    if result:
+        backend.set_last_cwd(result, 'save')
+    return result
+
+
+async def choose_folder(title=strings.choose_folder, start_dir=None, timeout=None, stderr=None):
+    """
+    Open a folder selection dialog, without blocking the event loop.
+
+    Args:
+        title (str, optional): The title of the folder selection dialog.
+            Default is 'Choose a folder'
+        start_dir (str, optional): The starting directory for the dialog.
+        timeout (float, optional): Seconds after which the dialog is closed and
+            DialogTimeout is raised. Default is to wait indefinitely.
+        stderr (str, optional): What happens to the dialog program's stderr:
+            'forward' (default), 'devnull', 'ring', 'log' or a logger. See
+            crossfiledialog.stderr.
+
+    Returns:
+        str: The selected folder's path.
+
+    Example:
+        result = await choose_folder(title="Select folder")
+    """
+    backend = load_backend()
+    if not hasattr(backend, 'choose_folder_command'):
+        return await _run_in_executor(backend.choose_folder, title, start_dir, timeout=timeout)
+
+    result = await run_command(backend, backend.choose_folder_command(title, start_dir), timeout, 'folder', stderr)
+    if result:
+        backend.set_last_cwd(result, 'folder')
+    return result
+
+
+__all__ = ['open_file', 'open_multiple', 'save_file', 'choose_folder']
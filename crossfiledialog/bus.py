@@ -0,0 +1,496 @@
+"""
+A minimal D-Bus client, enough to talk to xdg-desktop-portal.
+
+It speaks the D-Bus wire protocol directly over the bus's Unix socket, so
+crossfiledialog.portal needs neither dbus-python, jeepney nor PyGObject.
+Supported: EXTERNAL authentication, method calls and replies, signals and
+every type except Unix file descriptors. One Connection is meant to be kept
+open and shared between threads: a daemon thread reads all incoming
+messages and hands replies to the callers waiting for them.
+"""
+import itertools
+import os
+import socket
+import struct
+import threading
+
+from concurrent.futures import Future, TimeoutError
+from urllib.parse import unquote
+
+from crossfiledialog.exceptions import DialogTimeout, FileDialogException
+
+
+class DBusError(FileDialogException):
+    """
+    An error reply, or a failure of the connection.
+
+    Attributes:
+        name (str): The D-Bus error name, e.g.
+            'org.freedesktop.DBus.Error.ServiceUnknown'.
+    """
+
+    def __init__(self, name, message=''):
+        super().__init__('{0}: {1}'.format(name, message) if message else name)
+        self.name = name
+
+
+class Variant:
+    """
+    A value with an explicit D-Bus signature, for marshalling `v` values.
+
+    Unmarshalled variants are returned as their plain value.
+    """
+
+    __slots__ = ('signature', 'value')
+
+    def __init__(self, signature, value):
+        self.signature = signature
+        self.value = value
+
+    def __repr__(self):
+        return 'Variant({0!r}, {1!r})'.format(self.signature, self.value)
+
+
+METHOD_CALL, METHOD_RETURN, ERROR, SIGNAL = 1, 2, 3, 4
+NO_REPLY_EXPECTED = 0x1
+
+BUS_NAME = 'org.freedesktop.DBus'
+BUS_PATH = '/org/freedesktop/DBus'
+
+_FIELDS = ('path', 'interface', 'member', 'error_name', 'reply_serial', 'destination', 'sender', 'signature')
+_FIELD_TYPES = 'osssusgg'
+
+_FIXED = {
+    'y': struct.Struct('B'), 'b': struct.Struct('I'), 'n': struct.Struct('h'), 'q': struct.Struct('H'),
+    'i': struct.Struct('i'), 'u': struct.Struct('I'), 'x': struct.Struct('q'), 't': struct.Struct('Q'),
+    'd': struct.Struct('d'), 'h': struct.Struct('I'),
+}
+_ALIGN = dict(y=1, b=4, n=2, q=2, i=4, u=4, x=8, t=8, d=8, h=4, s=4, o=4, g=1, a=4, v=1)
+_ALIGN['('] = _ALIGN['{'] = 8
+
+
+def split_signature(signature):
+    """
+    Split a signature into its complete types, e.g. 'sa{sv}(ii)' into
+    ['s', 'a{sv}', '(ii)'].
+    """
+    types = []
+    index = 0
+    while index < len(signature):
+        end = _type_end(signature, index)
+        types.append(signature[index:end])
+        index = end
+    return types
+
+
+def _type_end(signature, index):
+    code = signature[index]
+    if code == 'a':
+        return _type_end(signature, index + 1)
+    if code in '({':
+        close = ')' if code == '(' else '}'
+        index += 1
+        while signature[index] != close:
+            index = _type_end(signature, index)
+        return index + 1
+    if code not in _ALIGN:
+        raise ValueError("Invalid D-Bus signature {0!r}".format(signature))
+    return index + 1
+
+
+def _pad(buffer, alignment):
+    buffer.extend(b'\0' * (-len(buffer) % alignment))
+
+
+def _marshal(buffer, type, value, endian):
+    code = type[0]
+    _pad(buffer, _ALIGN[code])
+    if code in _FIXED:
+        if code == 'b':
+            value = 1 if value else 0
+        buffer.extend(struct.pack(endian + _FIXED[code].format, value))
+    elif code in 'so':
+        data = value.encode('utf-8')
+        buffer.extend(struct.pack(endian + 'I', len(data)) + data + b'\0')
+    elif code == 'g':
+        data = value.encode('ascii')
+        buffer.extend(struct.pack('B', len(data)) + data + b'\0')
+    elif code == 'v':
+        _marshal(buffer, 'g', value.signature, endian)
+        _marshal(buffer, value.signature, value.value, endian)
+    elif code == 'a':
+        element = type[1:]
+        length_at = len(buffer)
+        buffer.extend(b'\0\0\0\0')
+        _pad(buffer, _ALIGN[element[0]])
+        start = len(buffer)
+        if element == 'y':
+            buffer.extend(value)
+        elif element[0] == '{':
+            for item in value.items():
+                _marshal(buffer, element, item, endian)
+        else:
+            for item in value:
+                _marshal(buffer, element, item, endian)
+        struct.pack_into(endian + 'I', buffer, length_at, len(buffer) - start)
+    elif code in '({':
+        for field_type, field in zip(split_signature(type[1:-1]), value):
+            _marshal(buffer, field_type, field, endian)
+    else:
+        raise ValueError("Cannot marshal D-Bus type {0!r}".format(type))
+
+
+def marshal(signature, values, endian='<'):
+    """
+    Serialise `values` according to `signature`, aligned as a message body.
+
+    Returns:
+        bytearray: The marshalled data.
+    """
+    buffer = bytearray()
+    types = split_signature(signature)
+    if len(types) != len(values):
+        raise ValueError("Signature {0!r} needs {1} values, got {2}".format(signature, len(types), len(values)))
+    for type, value in zip(types, values):
+        _marshal(buffer, type, value, endian)
+    return buffer
+
+
+def _unmarshal(data, offset, type, endian):
+    code = type[0]
+    offset += -offset % _ALIGN[code]
+    if code in _FIXED:
+        fixed = _FIXED[code]
+        value, = struct.unpack_from(endian + fixed.format, data, offset)
+        return (bool(value) if code == 'b' else value), offset + fixed.size
+    if code in 'so':
+        length, = struct.unpack_from(endian + 'I', data, offset)
+        offset += 4
+        return data[offset:offset + length].decode('utf-8'), offset + length + 1
+    if code == 'g':
+        length = data[offset]
+        offset += 1
+        return data[offset:offset + length].decode('ascii'), offset + length + 1
+    if code == 'v':
+        signature, offset = _unmarshal(data, offset, 'g', endian)
+        return _unmarshal(data, offset, signature, endian)
+    if code == 'a':
+        length, = struct.unpack_from(endian + 'I', data, offset)
+        element = type[1:]
+        offset += 4
+        offset += -offset % _ALIGN[element[0]]
+        end = offset + length
+        if element == 'y':
+            return bytes(data[offset:end]), end
+        items = []
+        while offset < end:
+            item, offset = _unmarshal(data, offset, element, endian)
+            items.append(item)
+        return (dict(items) if element[0] == '{' else items), end
+    if code in '({':
+        fields = []
+        for field_type in split_signature(type[1:-1]):
+            field, offset = _unmarshal(data, offset, field_type, endian)
+            fields.append(field)
+        return tuple(fields), offset
+    raise ValueError("Cannot unmarshal D-Bus type {0!r}".format(type))
+
+
+def unmarshal(signature, data, endian='<'):
+    """
+    Deserialise a message body.
+
+    Returns:
+        list: One value per complete type in `signature`.
+    """
+    values = []
+    offset = 0
+    for type in split_signature(signature):
+        value, offset = _unmarshal(data, offset, type, endian)
+        values.append(value)
+    return values
+
+
+class Message:
+    """
+    A D-Bus message. `body` is a list of values matching `signature`.
+    """
+
+    __slots__ = ('type', 'flags', 'serial') + _FIELDS + ('body',)
+
+    def __init__(self, type, flags=0, serial=0, body=(), **fields):
+        self.type = type
+        self.flags = flags
+        self.serial = serial
+        for name in _FIELDS:
+            setattr(self, name, fields.get(name))
+        if self.signature is None:
+            self.signature = ''
+        self.body = list(body)
+
+    def __repr__(self):
+        return 'Message({0})'.format(', '.join(
+            '{0}={1!r}'.format(name, getattr(self, name)) for name in self.__slots__
+            if getattr(self, name) not in (None, '')
+        ))
+
+    def encode(self):
+        body = marshal(self.signature, self.body)
+        fields = [
+            (code, Variant(_FIELD_TYPES[code - 1], getattr(self, name)))
+            for code, name in enumerate(_FIELDS, 1)
+            if getattr(self, name) not in (None, '')
+        ]
+        header = marshal('yyyyuua(yv)', [ord('l'), self.type, self.flags, 1, len(body), self.serial, fields])
+        _pad(header, 8)
+        return bytes(header + body)
+
+
+def _decode(header, rest):
+    endian = '<' if header[0:1] == b'l' else '>'
+    _, type, flags, _, _, serial, raw_fields = unmarshal('yyyyuua(yv)', header + rest, endian)
+    fields = {_FIELDS[code - 1]: value for code, value in raw_fields if 0 < code <= len(_FIELDS)}
+    message = Message(type, flags, serial, **fields)
+    return message, endian
+
+
+def session_bus_address():
+    """
+    The session bus address from DBUS_SESSION_BUS_ADDRESS, or the
+    conventional $XDG_RUNTIME_DIR/bus socket.
+
+    Returns:
+        str: The address, or None if there is no session bus.
+    """
+    address = os.environ.get('DBUS_SESSION_BUS_ADDRESS')
+    if address:
+        return address
+    runtime = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime and os.path.exists(os.path.join(runtime, 'bus')):
+        return 'unix:path=' + os.path.join(runtime, 'bus')
+    return None
+
+
+def _connect_socket(address):
+    error = None
+    for entry in address.split(';'):
+        transport, _, params = entry.partition(':')
+        if transport != 'unix':
+            continue
+        options = dict(param.split('=', 1) for param in params.split(',') if '=' in param)
+        if 'path' in options:
+            target = unquote(options['path'])
+        elif 'abstract' in options:
+            target = '\0' + unquote(options['abstract'])
+        else:
+            continue
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(target)
+        except OSError as e:
+            sock.close()
+            error = e
+            continue
+        return sock
+    if error is not None:
+        raise error
+    raise DBusError('org.freedesktop.DBus.Error.BadAddress', "No usable address in {0!r}".format(address))
+
+
+class Connection:
+    """
+    A connection to a message bus.
+
+    Args:
+        address (str, optional): The bus address. Default is the session bus.
+
+    Raises:
+        OSError: If the bus cannot be reached.
+        DBusError: If it does not accept the connection.
+    """
+
+    def __init__(self, address=None):
+        address = address or session_bus_address()
+        if address is None:
+            raise DBusError('org.freedesktop.DBus.Error.NotSupported', "No session bus")
+        self._socket = _connect_socket(address)
+        self._send_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._serials = itertools.count(1)
+        # reply serial -> Future
+        self._pending = dict()
+        # (path, interface, member) -> [callback]
+        self._signal_handlers = dict()
+        self.method_handler = None
+        self.closed = False
+        try:
+            self._authenticate()
+        except BaseException:
+            self._socket.close()
+            raise
+        self._reader = threading.Thread(target=self._read_loop, name='crossfiledialog-dbus', daemon=True)
+        self._reader.start()
+        self.unique_name = self.call(BUS_NAME, BUS_PATH, BUS_NAME, 'Hello', timeout=10)[0]
+
+    def _authenticate(self):
+        uid = str(os.getuid()).encode('ascii').hex()
+        self._socket.sendall(b'\0AUTH EXTERNAL ' + uid.encode('ascii') + b'\r\n')
+        reply = b''
+        while not reply.endswith(b'\r\n'):
+            chunk = self._socket.recv(256)
+            if not chunk:
+                raise DBusError('org.freedesktop.DBus.Error.AuthFailed', "Bus closed during authentication")
+            reply += chunk
+        if not reply.startswith(b'OK '):
+            raise DBusError('org.freedesktop.DBus.Error.AuthFailed', reply.decode(errors='replace').strip())
+        self._socket.sendall(b'BEGIN\r\n')
+
+    def _read_exact(self, size):
+        data = bytearray()
+        while len(data) < size:
+            chunk = self._socket.recv(size - len(data))
+            if not chunk:
+                raise EOFError()
+            data.extend(chunk)
+        return bytes(data)
+
+    def _read_message(self):
+        header = self._read_exact(16)
+        endian = '<' if header[0:1] == b'l' else '>'
+        body_length, _, fields_length = struct.unpack_from(endian + 'III', header, 4)
+        rest = self._read_exact(fields_length + (-(16 + fields_length) % 8) + body_length)
+        message, endian = _decode(header, rest[:fields_length])
+        body = rest[len(rest) - body_length:]
+        message.body = unmarshal(message.signature, body, endian) if message.signature else []
+        return message
+
+    def _read_loop(self):
+        try:
+            while True:
+                self._dispatch(self._read_message())
+        except (OSError, EOFError, ValueError, struct.error):
+            pass
+        finally:
+            self.closed = True
+            with self._lock:
+                pending, self._pending = self._pending, dict()
+            for future in pending.values():
+                future.set_exception(DBusError('org.freedesktop.DBus.Error.Disconnected', "Connection closed"))
+
+    def _dispatch(self, message):
+        if message.type in (METHOD_RETURN, ERROR):
+            with self._lock:
+                future = self._pending.pop(message.reply_serial, None)
+            if future is None:
+                return
+            if message.type == ERROR:
+                text = message.body[0] if message.body and isinstance(message.body[0], str) else ''
+                future.set_exception(DBusError(message.error_name, text))
+            else:
+                future.set_result(message.body)
+        elif message.type == SIGNAL:
+            with self._lock:
+                callbacks = list(self._signal_handlers.get((message.path, message.interface, message.member), ()))
+            for callback in callbacks:
+                callback(message)
+        elif message.type == METHOD_CALL and self.method_handler is not None:
+            self.method_handler(message)
+
+    def send(self, message):
+        """
+        Send `message`, giving it the next serial.
+
+        Returns:
+            int: The serial.
+        """
+        with self._send_lock:
+            message.serial = next(self._serials)
+            self._socket.sendall(message.encode())
+        return message.serial
+
+    def call_async(self, destination, path, interface, member, signature='', body=()):
+        """
+        Call a method without waiting for the reply.
+
+        Returns:
+            Future: Resolves to the reply's body, or raises DBusError.
+        """
+        if self.closed:
+            raise DBusError('org.freedesktop.DBus.Error.Disconnected', "Connection closed")
+        message = Message(METHOD_CALL, path=path, interface=interface, member=member, destination=destination,
+                          signature=signature, body=body)
+        future = Future()
+        with self._send_lock:
+            message.serial = next(self._serials)
+            with self._lock:
+                self._pending[message.serial] = future
+            self._socket.sendall(message.encode())
+        return future
+
+    def call(self, destination, path, interface, member, signature='', body=(), timeout=None):
+        """
+        Call a method and wait for its reply.
+
+        Returns:
+            list: The reply's body.
+
+        Raises:
+            DBusError: If the method returned an error.
+            DialogTimeout: If there is no reply within `timeout` seconds.
+        """
+        try:
+            return self.call_async(destination, path, interface, member, signature, body).result(timeout)
+        except TimeoutError:
+            raise DialogTimeout("No reply to {0}.{1} within {2} seconds".format(interface, member, timeout)) \
+                from None
+
+    def reply(self, call, signature='', body=()):
+        self.send(Message(METHOD_RETURN, NO_REPLY_EXPECTED, reply_serial=call.serial, destination=call.sender,
+                          signature=signature, body=body))
+
+    def reply_error(self, call, name, text=''):
+        self.send(Message(ERROR, NO_REPLY_EXPECTED, reply_serial=call.serial, destination=call.sender,
+                          error_name=name, signature='s', body=[text]))
+
+    def emit(self, path, interface, member, signature='', body=(), destination=None):
+        self.send(Message(SIGNAL, NO_REPLY_EXPECTED, path=path, interface=interface, member=member,
+                          destination=destination, signature=signature, body=body))
+
+    def subscribe(self, path, interface, member, callback):
+        """
+        Call `callback` with every `member` signal emitted on `path`.
+
+        The match rule is registered with the bus before this returns, so
+        no signal sent afterwards is missed.
+
+        Returns:
+            An opaque token for unsubscribe().
+        """
+        key = (path, interface, member)
+        with self._lock:
+            self._signal_handlers.setdefault(key, []).append(callback)
+        rule = "type='signal',path='{0}',interface='{1}',member='{2}'".format(path, interface, member)
+        self.call(BUS_NAME, BUS_PATH, BUS_NAME, 'AddMatch', 's', [rule], timeout=10)
+        return key, callback, rule
+
+    def unsubscribe(self, token):
+        key, callback, rule = token
+        with self._lock:
+            callbacks = self._signal_handlers.get(key, [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+            if not callbacks:
+                self._signal_handlers.pop(key, None)
+        if not self.closed:
+            self.call_async(BUS_NAME, BUS_PATH, BUS_NAME, 'RemoveMatch', 's', [rule])
+
+    def close(self):
+        self.closed = True
+        try:
+            self._socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._socket.close()
+
+
+__all__ = ['Connection', 'DBusError', 'Message', 'Variant', 'marshal', 'unmarshal', 'session_bus_address']
@@ -0,0 +1,203 @@
+"""
+Coordination of dialogs requested from several threads at once.
+
+A Coordinator sits between a DialogSession and its backend. Identical
+requests that arrive while the first one is still open (same dialog kind,
+title, start_dir, filter and paths mode) share that dialog instead of
+opening another: every caller receives its result, or its exception. The
+number of dialogs open at the same time can be capped as well; callers over
+the limit wait in a first-come, first-served queue.
+
+Enable it for the module-level functions with install(), or pass a
+Coordinator to DialogSession(coordinator=...).
+"""
+import bisect
+import threading
+import time
+
+from collections import deque
+from concurrent.futures import Future, TimeoutError
+
+from crossfiledialog import metrics
+from crossfiledialog.exceptions import DialogTimeout
+from crossfiledialog.filters import compile_filter
+
+
+class Coordinator:
+    """
+    Coalesces identical in-flight dialogs and limits how many are open.
+
+    Args:
+        max_concurrent (int, optional): Dialogs that may be open at the same
+            time. Default is 1; None removes the limit.
+        coalesce (bool, optional): Share one dialog between identical
+            requests. Default is True.
+
+    Example:
+        coordinator.install(max_concurrent=1)
+        # Ten threads calling choose_folder("Export to") now share one dialog.
+    """
+
+    def __init__(self, max_concurrent=1, coalesce=True):
+        self.max_concurrent = max_concurrent
+        self.coalesce = coalesce
+        self._lock = threading.Lock()
+        # key -> Future of the dialog currently answering that request
+        self._flights = dict()
+        self._running = 0
+        # One Event per queued caller, set when it is handed a slot.
+        self._waiters = deque()
+        self._stats = dict(dialogs=0, coalesced=0, timeouts=0, queued=0, max_queue_depth=0, wait_time=0.0,
+                           max_wait_time=0.0)
+        self._wait_counts = [0] * (len(metrics.buckets) + 1)
+
+    def __repr__(self):
+        return 'Coordinator(max_concurrent={0!r}, coalesce={1!r})'.format(self.max_concurrent, self.coalesce)
+
+    @staticmethod
+    def request_key(function, title, start_dir, filter=None, paths='str'):
+        """
+        The key under which identical requests are coalesced.
+        """
+        spec = compile_filter(filter)
+        return function, title, start_dir, spec and (spec.shape, spec.groups), paths
+
+    def call(self, key, function, timeout=None):
+        """
+        Run `function(timeout)`, the dialog for request `key`, or wait for
+        the identical request that is already running.
+
+        Args:
+            key (hashable): The request, see request_key().
+            function (callable): Shows the dialog; called with the time left
+                of `timeout` after waiting for a slot.
+            timeout (float, optional): Seconds to wait for a slot and the
+                dialog together.
+
+        Returns:
+            The dialog's result.
+
+        Raises:
+            DialogTimeout: If `timeout` passed first.
+        """
+        start = time.monotonic()
+        with self._lock:
+            future = self._flights.get(key) if self.coalesce else None
+            if future is not None:
+                self._stats['coalesced'] += 1
+            else:
+                leader = Future()
+                if self.coalesce:
+                    self._flights[key] = leader
+
+        if future is not None:
+            try:
+                result = future.result(timeout)
+            except TimeoutError:
+                raise DialogTimeout("No answer from the dialog within {0} seconds".format(timeout)) from None
+            # Each caller gets its own list to modify.
+            return list(result) if isinstance(result, list) else result
+
+        try:
+            result = self._run(function, timeout, start)
+        except BaseException as e:
+            self._land(key, leader)
+            leader.set_exception(e)
+            raise
+        self._land(key, leader)
+        leader.set_result(result)
+        return result
+
+    def _land(self, key, future):
+        # Take the flight off the board before publishing its result, so a
+        # request arriving afterwards opens a new dialog.
+        with self._lock:
+            if self._flights.get(key) is future:
+                del self._flights[key]
+
+    def _run(self, function, timeout, start):
+        if not self._acquire(timeout):
+            with self._lock:
+                self._stats['timeouts'] += 1
+            raise DialogTimeout("No dialog slot became free within {0} seconds".format(timeout))
+        with self._lock:
+            self._stats['dialogs'] += 1
+        try:
+            if timeout is not None:
+                timeout = max(0.0, timeout - (time.monotonic() - start))
+            return function(timeout)
+        finally:
+            self._release()
+
+    def _acquire(self, timeout):
+        start = time.monotonic()
+        with self._lock:
+            if self.max_concurrent is None or (self._running < self.max_concurrent and not self._waiters):
+                self._running += 1
+                return True
+            event = threading.Event()
+            self._waiters.append(event)
+            self._stats['queued'] += 1
+            self._stats['max_queue_depth'] = max(self._stats['max_queue_depth'], len(self._waiters))
+
+        granted = event.wait(timeout)
+        with self._lock:
+            if not granted:
+                # _release() may have picked this caller just after the wait ran out.
+                granted = event.is_set()
+                if not granted:
+                    self._waiters.remove(event)
+            waited = time.monotonic() - start
+            self._stats['wait_time'] += waited
+            self._stats['max_wait_time'] = max(self._stats['max_wait_time'], waited)
+            self._wait_counts[bisect.bisect_left(metrics.buckets, waited)] += 1
+        return granted
+
+    def _release(self):
+        with self._lock:
+            if self._waiters:
+                # Hand the slot straight to the longest waiting caller.
+                self._waiters.popleft().set()
+            else:
+                self._running -= 1
+
+    def stats(self):
+        """
+        What the coordinator has done so far.
+
+        Returns:
+            dict: 'running' and 'queue_depth' now; totals of 'dialogs' shown,
+                requests 'coalesced' into another one, requests 'queued' and
+                'timeouts' while queued; 'max_queue_depth'; 'wait_time' and
+                'max_wait_time' in seconds and 'wait_histogram' (buckets as in
+                crossfiledialog.metrics) of the time queued callers waited.
+        """
+        with self._lock:
+            stats = dict(self._stats, running=self._running, queue_depth=len(self._waiters))
+            stats['wait_histogram'] = dict(buckets=list(metrics.buckets), counts=list(self._wait_counts))
+        return stats
+
+
+def install(max_concurrent=1, coalesce=True):
+    """
+    Put a Coordinator in front of the module-level dialog functions.
+
+    Args:
+        max_concurrent (int, optional): See Coordinator.
+        coalesce (bool, optional): See Coordinator.
+
+    Returns:
+        Coordinator: The coordinator, e.g. to read its stats().
+    """
+    from crossfiledialog.wrapper import get_default_session
+    session = get_default_session()
+    session.coordinator = Coordinator(max_concurrent, coalesce)
+    return session.coordinator
+
+
+def uninstall():
+    from crossfiledialog.wrapper import get_default_session
+    get_default_session().coordinator = None
+
+
+__all__ = ['Coordinator', 'install', 'uninstall']
@@ -1,6 +1,19 @@
 class FileDialogException(Exception):
-    pass
+    # The end of the dialog program's stderr, if it was kept (see crossfiledialog.stderr).
+    stderr = None
+    # The dialog program's exit status, if it ran and failed.
+    returncode = None
 
 
 class NoImplementationFoundException(FileDialogException):
     pass
+
+
+class DialogTimeout(FileDialogException):
+    pass
+
+
+class BackendUnavailable(FileDialogException):
+    # The backend cannot show dialogs in this process or session (toolkit
+    # missing, no display, no bus); the next backend is tried instead.
+    pass
@@ -0,0 +1,173 @@
+import functools
+
+
+class FilterSpec:
+    """
+    A compiled, immutable file filter.
+
+    Every accepted filter shape is reduced to a tuple of (label, patterns)
+    groups, from which each backend's representation is rendered once and
+    then reused. Instances come from compile_filter() and are shared between
+    calls, so they must never be modified.
+
+    Shapes:
+        'single': a single wildcard, e.g. "*.py"
+        'flat':   a list of wildcards, e.g. ["*.py", "*.md"]
+        'nested': a list of lists of wildcards, e.g. [["*.py", "*.md"], ["*.txt"]]
+        'named':  a dict mapping descriptions to wildcards, e.g. {"Python": ["*.py"]}
+    """
+
+    __slots__ = ('shape', 'groups', '_rendered')
+
+    def __init__(self, shape, groups):
+        object.__setattr__(self, 'shape', shape)
+        object.__setattr__(self, 'groups', groups)
+        object.__setattr__(self, '_rendered', dict())
+
+    def __setattr__(self, name, value):
+        raise AttributeError("FilterSpec is immutable")
+
+    def __repr__(self):
+        return 'FilterSpec({0!r}, {1!r})'.format(self.shape, self.groups)
+
+    def _render(self, name, function):
+        try:
+            return self._rendered[name]
+        except KeyError:
+            return self._rendered.setdefault(name, function())
+
+    def zenity_args(self):
+        """--file-filter arguments for zenity."""
+        def render():
+            if self.shape == 'named':
+                return tuple(
+                    "--file-filter={0} | {1}".format(label, ' | '.join(patterns))
+                    for label, patterns in self.groups
+                )
+            return tuple("--file-filter={0}".format(' '.join(patterns)) for _, patterns in self.groups)
+        return self._render('zenity', render)
+
+    def kdialog_filter(self):
+        """The filter argument for kdialog."""
+        def render():
+            if self.shape == 'named':
+                return " | ".join(
+                    "{0} ({1})".format(label, ' '.join(patterns)) for label, patterns in self.groups
+                )
+            return " | ".join(' '.join(patterns) for _, patterns in self.groups)
+        return self._render('kdialog', render)
+
+    def applescript_types(self):
+        """
+        File extensions for AppleScript's `of type` clause.
+
+        AppleScript filters by type/extension rather than wildcard, so only
+        patterns of the form '*.ext' are kept.
+        """
+        def render():
+            return tuple(
+                pattern[2:]
+                for _, patterns in self.groups for pattern in patterns
+                if pattern.startswith('*.')
+            )
+        return self._render('applescript', render)
+
+    def comdlg_specs(self):
+        """(name, spec) pairs for COMDLG_FILTERSPEC on Windows."""
+        def render():
+            return tuple(
+                (label if label is not None else ';'.join(patterns), ';'.join(patterns))
+                for label, patterns in self.groups
+            )
+        return self._render('comdlg', render)
+
+    def qt_name_filters(self):
+        """Name filters for QFileDialog.setNameFilters(), e.g. 'Images (*.png *.jpg)'."""
+        def render():
+            return tuple(
+                ' '.join(patterns) if label is None else "{0} ({1})".format(label, ' '.join(patterns))
+                for label, patterns in self.groups
+            )
+        return self._render('qt', render)
+
+    def portal_filters(self):
+        """
+        The `filters` option of the xdg-desktop-portal FileChooser, a(sa(us)):
+        (label, [(0, glob), ...]) per group.
+        """
+        def render():
+            return tuple(
+                (label, [(0, pattern) for pattern in patterns]) for label, patterns in self.labelled_groups()
+            )
+        return self._render('portal', render)
+
+    def labelled_groups(self):
+        """(label, patterns) pairs, with a label derived from the patterns where none was given."""
+        def render():
+            return tuple(
+                (label if label is not None else ' '.join(patterns), patterns)
+                for label, patterns in self.groups
+            )
+        return self._render('labelled', render)
+
+
+def _patterns(value):
+    if isinstance(value, str):
+        return (value,)
+    if isinstance(value, (list, tuple)) and all(isinstance(v, str) for v in value):
+        return tuple(value)
+    raise ValueError("Invalid filter")
+
+
+def _freeze(filter):
+    # Reduce the filter to a hashable key that still tells the shapes apart.
+    if isinstance(filter, str):
+        return 'single', filter
+    if isinstance(filter, list):
+        if isinstance(filter[0], str):
+            return 'flat', _patterns(filter)
+        if isinstance(filter[0], list):
+            return 'nested', tuple(_patterns(f) for f in filter)
+        raise ValueError("Invalid filter")
+    if isinstance(filter, dict):
+        return 'named', tuple((key, _patterns(value)) for key, value in filter.items())
+    raise ValueError("Invalid filter")
+
+
+@functools.lru_cache(maxsize=256)
+def _compile(shape, value):
+    if shape == 'single':
+        groups = ((None, (value,)),)
+    elif shape == 'flat':
+        groups = ((None, value),)
+    elif shape == 'nested':
+        groups = tuple((None, patterns) for patterns in value)
+    else:
+        groups = value
+    return FilterSpec(shape, groups)
+
+
+def compile_filter(filter):
+    """
+    Compile a filter in any of the accepted shapes into a FilterSpec.
+
+    Compiled filters are cached, so showing the same filter again costs a
+    dictionary lookup.
+
+    Args:
+        filter (str, list, dict, FilterSpec, optional): The filter for file types to display.
+
+    Returns:
+        FilterSpec: The compiled filter, or None if `filter` is empty.
+
+    Raises:
+        ValueError: If the filter has none of the accepted shapes.
+    """
+    if not filter:
+        return None
+    if isinstance(filter, FilterSpec):
+        return filter
+    return _compile(*_freeze(filter))
+
+
+__all__ = ['FilterSpec', 'compile_filter']
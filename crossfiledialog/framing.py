@@ -0,0 +1,43 @@
+import json
+import struct
+
+
+# Every frame is a 4-byte big-endian payload length followed by a UTF-8
+# JSON document. Paths that are not valid UTF-8 travel as surrogate-escaped
+# strings, which json escapes and restores losslessly.
+_header = struct.Struct('>I')
+
+
+def write_frame(fp, obj):
+    payload = json.dumps(obj, separators=(',', ':')).encode('utf-8')
+    fp.write(_header.pack(len(payload)) + payload)
+    fp.flush()
+
+
+def _read_exact(fp, size):
+    data = b''
+    while len(data) < size:
+        chunk = fp.read(size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+
+def read_frame(fp):
+    """
+    Read one frame from a binary file object.
+
+    Returns:
+        The decoded object, or None if the stream ended.
+    """
+    header = _read_exact(fp, _header.size)
+    if header is None:
+        return None
+    payload = _read_exact(fp, _header.unpack(header)[0])
+    if payload is None:
+        return None
+    return json.loads(payload.decode('utf-8'))
+
+
+__all__ = ['write_frame', 'read_frame']
@@ -0,0 +1,276 @@
+"""
+In-process GTK dialogs through PyGObject.
+
+GTK is initialised once, on first use, on a daemon thread that then keeps
+running the GTK main loop. Each dialog is created on that thread and its
+result handed back to the calling thread, so no process is started and GTK
+connects to the display only once. Gtk.FileChooserNative is used where
+available, which also picks up the desktop portal inside sandboxes.
+
+GTK may only be used from one thread, so this backend declines to run in
+a process that already imported GTK itself; such applications should
+show their own Gtk.FileChooserNative.
+"""
+import importlib.util
+import os
+import sys
+import threading
+
+from concurrent.futures import Future, TimeoutError
+
+from crossfiledialog import history, metrics, strings
+from crossfiledialog.exceptions import BackendUnavailable, DialogTimeout, FileDialogException
+from crossfiledialog.filters import compile_filter
+from crossfiledialog.gtkhelper import chooser_action, configure
+from crossfiledialog.paths import check_mode, from_str
+
+
+class GtkException(FileDialogException):
+    pass
+
+
+class GtkUnavailable(GtkException, BackendUnavailable):
+    pass
+
+
+Gtk = GLib = None
+
+_thread = None
+_ready = threading.Event()
+_error = None
+_lock = threading.Lock()
+# Dialogs currently shown; FileChooserNative must be kept referenced.
+_shown = set()
+
+
+def get_preferred_cwd(kind='open'):
+    possible_cwd = os.environ.get('FILEDIALOG_CWD', '')
+    if possible_cwd:
+        return possible_cwd
+
+    return history.recent(kind)
+
+
+def set_last_cwd(cwd, kind='open'):
+    history.remember(kind, os.path.dirname(os.fsdecode(cwd)))
+
+
+def _main():
+    global Gtk, GLib, _error
+    try:
+        import gi
+        gi.require_version('Gtk', '3.0')
+        from gi.repository import GLib as glib, Gtk as gtk
+        if not gtk.init_check(None)[0]:
+            raise RuntimeError("Cannot open display")
+    except Exception as e:
+        _error = e
+        _ready.set()
+        return
+    Gtk, GLib = gtk, glib
+    _ready.set()
+    Gtk.main()
+
+
+def start():
+    """
+    Start the GTK thread, if it is not running yet, and wait until GTK is ready.
+
+    Raises:
+        GtkUnavailable: If PyGObject is missing or GTK cannot open the display.
+    """
+    global _thread
+    with _lock:
+        if _thread is None:
+            _thread = threading.Thread(target=_main, name='crossfiledialog-gtk', daemon=True)
+            _thread.start()
+    _ready.wait()
+    if _error is not None:
+        raise GtkUnavailable("GTK is not available: {0}".format(_error))
+
+
+def available():
+    """
+    Whether PyGObject is installed, there is a display to connect to and
+    the host process does not use GTK itself.
+
+    GTK is not initialised here, so picking a backend costs no thread and no
+    display connection; if GTK then fails to start, the first dialog raises
+    GtkUnavailable and the next backend is used.
+    """
+    if _thread is not None:
+        return _error is None
+    if not (os.environ.get('DISPLAY') or os.environ.get('WAYLAND_DISPLAY')):
+        return False
+    return 'gi.repository.Gtk' not in sys.modules and importlib.util.find_spec('gi') is not None
+
+
+def _filter_groups(filter):
+    spec = compile_filter(filter)
+    if spec is None:
+        return []
+    return spec.labelled_groups()
+
+
+def _open(request, future):
+    # Runs on the GTK thread.
+    action, accept = chooser_action(Gtk, request['kind'])
+    if hasattr(Gtk, 'FileChooserNative'):
+        dialog = Gtk.FileChooserNative.new(request['title'], None, action, accept, '_Cancel')
+    else:
+        dialog = Gtk.FileChooserDialog(title=request['title'], action=action)
+        dialog.add_buttons('_Cancel', Gtk.ResponseType.CANCEL, accept, Gtk.ResponseType.ACCEPT)
+        dialog.set_default_response(Gtk.ResponseType.ACCEPT)
+    configure(Gtk, dialog, request)
+
+    def on_response(dialog, response):
+        selected = dialog.get_filenames() if response == Gtk.ResponseType.ACCEPT else []
+        _close(dialog)
+        if not future.done():
+            future.set_result(selected)
+
+    dialog.connect('response', on_response)
+    _shown.add(dialog)
+    dialog.show()
+    return dialog
+
+
+def _close(dialog):
+    # Runs on the GTK thread.
+    if dialog in _shown:
+        _shown.discard(dialog)
+        dialog.destroy()
+
+
+def _show(kind, title, start_dir, filter, timeout, paths):
+    check_mode(paths)
+    start()
+    request = dict(
+        kind=kind, title=title, start_dir=start_dir or get_preferred_cwd(history.kinds[kind]),
+        filters=_filter_groups(filter),
+    )
+    future = Future()
+    opened = []
+
+    def open_dialog():
+        try:
+            opened.append(_open(request, future))
+        except Exception as e:
+            future.set_exception(e)
+        return GLib.SOURCE_REMOVE
+
+    def close_dialog():
+        for dialog in opened:
+            _close(dialog)
+        return GLib.SOURCE_REMOVE
+
+    metrics.mark('command')
+    GLib.idle_add(open_dialog)
+    try:
+        selected = future.result(timeout)
+    except TimeoutError:
+        GLib.idle_add(close_dialog)
+        raise DialogTimeout("No answer from the dialog within {0} seconds".format(timeout)) from None
+    metrics.mark('exited')
+    return [from_str(path, paths) for path in selected]
+
+
+@metrics.instrument('gtk')
+def open_file(title=strings.open_file, start_dir=None, filter=None, timeout=None, on_spawn=None, paths='str'):
+    """
+    Open a file selection dialog for selecting a file using GTK in this process.
+
+    Args:
+        title (str, optional): The title of the file selection dialog.
+            Default is 'Choose a file'
+        start_dir (str, optional): The starting directory for the dialog.
+        filter (str, list, dict, optional): The filter for file types to display.
+        timeout (float, optional): Seconds after which the dialog is closed and
+            DialogTimeout is raised. Default is to wait indefinitely.
+        on_spawn (callable, optional): Never called; no process is started.
+        paths (str, optional): 'str' (default), 'surrogateescape' or 'bytes'.
+
+    Returns:
+        str: The selected file's path.
+    """
+    selected = _show('open_file', title, start_dir, filter, timeout, paths)
+    result = selected[0] if selected else ''
+    if result:
+        set_last_cwd(result)
+    return result
+
+
+@metrics.instrument('gtk')
+def open_multiple(title=strings.open_multiple, start_dir=None, filter=None, timeout=None, on_spawn=None, paths='str'):
+    """
+    Open a file selection dialog for selecting multiple files using GTK in this process.
+
+    Args:
+        title (str, optional): The title of the file selection dialog.
+            Default is 'Choose one or more files'
+        start_dir (str, optional): The starting directory for the dialog.
+        filter (str, list, dict, optional): The filter for file types to display.
+        timeout (float, optional): Seconds after which the dialog is closed and
+            DialogTimeout is raised. Default is to wait indefinitely.
+        on_spawn (callable, optional): Never called; no process is started.
+        paths (str, optional): 'str' (default), 'surrogateescape' or 'bytes'.
+
+    Returns:
+        list[str]: A list of selected file paths.
+    """
+    result_list = _show('open_multiple', title, start_dir, filter, timeout, paths)
+    if result_list:
+        set_last_cwd(result_list[0])
+        return result_list
+    return []
+
+
+@metrics.instrument('gtk')
+def save_file(title=strings.save_file, start_dir=None, timeout=None, on_spawn=None, paths='str'):
+    """
+    Open a save file dialog using GTK in this process.
+
+    Args:
+        title (str, optional): The title of the save file dialog.
+            Default is 'Enter the name of the file to save to'
+        start_dir (str, optional): The starting directory for the dialog.
+        timeout (float, optional): Seconds after which the dialog is closed and
+            DialogTimeout is raised. Default is to wait indefinitely.
+        on_spawn (callable, optional): Never called; no process is started.
+        paths (str, optional): 'str' (default), 'surrogateescape' or 'bytes'.
+
+    Returns:
+        str: The selected file's path for saving.
+    """
+    selected = _show('save_file', title, start_dir, None, timeout, paths)
+    result = selected[0] if selected else ''
+    if result:
+        set_last_cwd(result, 'save')
+    return result
+
+
+@metrics.instrument('gtk')
+def choose_folder(title=strings.choose_folder, start_dir=None, timeout=None, on_spawn=None, paths='str'):
+    """
+    Open a folder selection dialog using GTK in this process.
+
+    Args:
+        title (str, optional): The title of the folder selection dialog.
+            Default is 'Choose a folder'
+        start_dir (str, optional): The starting directory for the dialog.
+        timeout (float, optional): Seconds after which the dialog is closed and
+            DialogTimeout is raised. Default is to wait indefinitely.
+        on_spawn (callable, optional): Never called; no process is started.
+        paths (str, optional): 'str' (default), 'surrogateescape' or 'bytes'.
+
+    Returns:
+        str: The selected folder's path.
+    """
+    selected = _show('choose_folder', title, start_dir, None, timeout, paths)
+    result = selected[0] if selected else ''
+    if result:
+        set_last_cwd(result, 'folder')
+    return result
+
+
+__all__ = ['open_file', 'open_multiple', 'save_file', 'choose_folder', 'available', 'start']
@@ -0,0 +1,130 @@
+"""
+Long-lived GTK dialog helper used by crossfiledialog.resident.
+
+Run as `python -m crossfiledialog.gtkhelper IDLE_TIMEOUT`. GTK is initialised
+once; after that every request frame read from stdin shows one dialog and
+produces one response frame on stdout. The helper exits when stdin closes
+or when no request arrives for IDLE_TIMEOUT seconds.
+"""
+import os
+import select
+import sys
+
+from crossfiledialog.framing import read_frame, write_frame
+
+
+RESPONSE_TIMEOUT = 1
+
+
+def chooser_action(Gtk, kind):
+    """The Gtk.FileChooserAction and accept button label for a dialog kind."""
+    if kind == 'save_file':
+        return Gtk.FileChooserAction.SAVE, '_Save'
+    if kind == 'choose_folder':
+        return Gtk.FileChooserAction.SELECT_FOLDER, '_Select'
+    return Gtk.FileChooserAction.OPEN, '_Open'
+
+
+def configure(Gtk, chooser, request):
+    """
+    Apply a request's options to anything implementing Gtk.FileChooser:
+    a FileChooserDialog here, a FileChooserNative in crossfiledialog.gtk.
+    """
+    kind = request['kind']
+    chooser.set_select_multiple(kind == 'open_multiple')
+    chooser.set_do_overwrite_confirmation(kind == 'save_file')
+
+    if request.get('start_dir'):
+        chooser.set_current_folder(request['start_dir'])
+
+    for name, patterns in request.get('filters') or ():
+        file_filter = Gtk.FileFilter()
+        file_filter.set_name(name)
+        for pattern in patterns:
+            file_filter.add_pattern(pattern)
+        chooser.add_filter(file_filter)
+
+
+def run_dialog(Gtk, GLib, request):
+    action, accept = chooser_action(Gtk, request['kind'])
+    dialog = Gtk.FileChooserDialog(title=request['title'], action=action)
+    dialog.add_buttons('_Cancel', Gtk.ResponseType.CANCEL, accept, Gtk.ResponseType.ACCEPT)
+    dialog.set_default_response(Gtk.ResponseType.ACCEPT)
+    configure(Gtk, dialog, request)
+
+    if request.get('timeout') is not None:
+        def expire():
+            dialog.response(RESPONSE_TIMEOUT)
+            return GLib.SOURCE_REMOVE
+        GLib.timeout_add(max(1, int(request['timeout'] * 1000)), expire)
+
+    response = dialog.run()
+    paths = dialog.get_filenames() if response == Gtk.ResponseType.ACCEPT else []
+    dialog.destroy()
+
+    # Let GTK unmap the window before blocking on the next request.
+    while Gtk.events_pending():
+        Gtk.main_iteration()
+
+    return dict(paths=paths, timeout=response == RESPONSE_TIMEOUT)
+
+
+def channels():
+    """
+    The request and response streams: the original stdin and stdout.
+
+    Keeps the protocol channel private; anything the toolkit prints to
+    stdout goes to stderr instead.
+    """
+    out = os.fdopen(os.dup(1), 'wb')
+    os.dup2(2, 1)
+    # Unbuffered, so select() never misses bytes held in a read-ahead buffer.
+    stdin = os.fdopen(os.dup(0), 'rb', buffering=0)
+    return stdin, out
+
+
+def serve(stdin, out, show, idle_timeout=None):
+    """
+    Answer every request frame from `stdin` with a frame holding
+    `show(request)`, until stdin closes or no request arrives for
+    `idle_timeout` seconds.
+
+    Returns:
+        int: The exit status.
+    """
+    while True:
+        readable, _, _ = select.select([stdin], [], [], idle_timeout)
+        if not readable:
+            return 0
+
+        request = read_frame(stdin)
+        if request is None:
+            return 0
+
+        try:
+            response = show(request)
+        except Exception as e:
+            response = dict(error=str(e))
+        write_frame(out, response)
+
+
+def main(argv):
+    idle_timeout = float(argv[1]) if len(argv) > 1 else None
+    stdin, out = channels()
+
+    try:
+        import gi
+        gi.require_version('Gtk', '3.0')
+        from gi.repository import GLib, Gtk
+        if not Gtk.init_check(None)[0]:
+            raise RuntimeError("Cannot open display")
+    except Exception as e:
+        write_frame(out, dict(error=str(e)))
+        return 1
+
+    write_frame(out, dict(ready=True))
+    return serve(stdin, out, lambda request: run_dialog(Gtk, GLib, request), idle_timeout)
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
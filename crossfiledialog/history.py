@@ -0,0 +1,257 @@
+"""
+Recently used directories, shared between processes and kept across runs.
+
+Each application and dialog kind ('open', 'save', 'folder') has a small
+append-only file under $XDG_STATE_HOME/crossfiledialog/<application>/,
+holding one directory per line, most recent last. Remembering a directory
+appends a single line with one write(), which is atomic for lines this
+short, so concurrent processes cannot interleave within a line. Once the
+file has grown to several times the size of its distinct entries, it is
+rewritten to the `max_entries` most recent ones and swapped in with
+os.replace(). Appending and rewriting hold an flock() on the file, so no
+process appends to a file that is being replaced.
+
+Lookups are served from memory; the file is only read again when its size
+or modification time shows that another process appended to it.
+
+While a DialogSession that keeps its own directories shows a dialog,
+remember() and recent() on that thread are answered by the session instead.
+"""
+import os
+import re
+import sys
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: appends are still atomic, but a compaction can lose a line
+    # another process appends during the swap.
+    fcntl = None
+
+
+# Name of the directory that keeps this application's history apart from
+# others'. Defaults to FILEDIALOG_APP, or the name of the running script.
+application = os.environ.get('FILEDIALOG_APP') or \
+        os.path.splitext(os.path.basename(sys.argv[0] if sys.argv and sys.argv[0] else ''))[0] or 'python'
+
+# Distinct directories kept per kind; older ones are evicted first.
+max_entries = 32
+
+# FILEDIALOG_HISTORY=0 keeps the history in memory only.
+persistent = os.environ.get('FILEDIALOG_HISTORY', '1') != '0'
+
+kinds = {
+    'open_file': 'open',
+    'open_multiple': 'open',
+    'save_file': 'save',
+    'choose_folder': 'folder',
+}
+
+_lock = threading.Lock()
+# kind -> (file signature, directories with the most recent first)
+_cache = dict()
+# `owner`: the object with remember() and recent() that stands in for this
+# module on the current thread, if any.
+_local = threading.local()
+
+
+def set_owner(owner):
+    """
+    Send remember() and recent() calls made on this thread to `owner`
+    (None to restore the shared history).
+
+    Returns:
+        The previous owner, to be restored afterwards.
+    """
+    previous = getattr(_local, 'owner', None)
+    _local.owner = owner
+    return previous
+
+
+def state_directory():
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~\\AppData\\Local')
+    else:
+        base = os.environ.get('XDG_STATE_HOME') or os.path.expanduser('~/.local/state')
+    return os.path.join(base, 'crossfiledialog', re.sub(r'[\\/:]', '_', application))
+
+
+def _history_file(kind):
+    return os.path.join(state_directory(), kind)
+
+
+def _signature(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def _fd_signature(fd):
+    st = os.fstat(fd)
+    return st.st_size, st.st_mtime_ns
+
+
+def _parse(data):
+    entries = []
+    seen = set()
+    for line in reversed(data.split(b'\n')):
+        if line and line not in seen:
+            seen.add(line)
+            entries.append(os.fsdecode(line))
+            if len(entries) == max_entries:
+                break
+    return entries
+
+
+def _load(kind):
+    # Called with _lock held.
+    signature, entries = _cache.get(kind, (None, []))
+    if not persistent:
+        return entries
+
+    path = _history_file(kind)
+    current = _signature(path)
+    if current is None or current == signature:
+        return entries
+    try:
+        with open(path, 'rb') as fp:
+            data = fp.read()
+    except OSError:
+        return entries
+    entries = _parse(data)
+    _cache[kind] = (current, entries)
+    return entries
+
+
+def _compact(path, entries):
+    temporary = '{0}.{1}.tmp'.format(path, os.getpid())
+    with open(temporary, 'wb') as fp:
+        fp.write(b''.join(os.fsencode(entry) + b'\n' for entry in reversed(entries)))
+    os.replace(temporary, path)
+
+
+def _open_locked(path):
+    # The file to append to, locked. A process that compacted it while we
+    # waited for the lock replaced it; the lock is then on the old file.
+    while True:
+        fd = os.open(path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o600)
+        if fcntl is None:
+            return fd
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            if os.path.samestat(os.fstat(fd), os.stat(path)):
+                return fd
+        except FileNotFoundError:
+            pass
+        except BaseException:
+            os.close(fd)
+            raise
+        os.close(fd)
+
+
+def _read_fd(fd):
+    os.lseek(fd, 0, os.SEEK_SET)
+    chunks = []
+    while True:
+        chunk = os.read(fd, 65536)
+        if not chunk:
+            return b''.join(chunks)
+        chunks.append(chunk)
+
+
+def _store(kind, loaded, entries, directory):
+    # Called with _lock held. `loaded` is the signature of the file
+    # `entries` came from. Returns the signature and entries to cache.
+    path = _history_file(kind)
+    line = os.fsencode(directory) + b'\n'
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd = _open_locked(path)
+        try:
+            unseen = _fd_signature(fd) != loaded
+            os.write(fd, line)
+            if unseen:
+                # Another process appended since we read the file: read it
+                # again, rather than miss its lines from now on.
+                entries = _parse(_read_fd(fd))
+            size = os.fstat(fd).st_size
+            # Rewrite once the file is several times larger than its
+            # distinct entries; the lock keeps others from appending.
+            if size > 4 * sum(len(os.fsencode(entry)) + 1 for entry in entries):
+                _compact(path, entries)
+            signature = _signature(path)
+        finally:
+            # Also releases the lock.
+            os.close(fd)
+    except OSError:
+        # The history is a convenience; a read-only home must not break dialogs.
+        return None, entries
+    return signature, entries
+
+
+def remember(kind, directory):
+    """
+    Record `directory` as the most recently used one for dialogs of `kind`.
+
+    Args:
+        kind (str): 'open', 'save' or 'folder'.
+        directory (str): The directory to remember.
+    """
+    if not directory or '\n' in directory:
+        return
+    owner = getattr(_local, 'owner', None)
+    if owner is not None:
+        owner.remember(kind, directory)
+        return
+    with _lock:
+        entries = [directory] + [e for e in _load(kind) if e != directory][:max_entries - 1]
+        signature = None
+        if persistent:
+            signature, entries = _store(kind, _cache.get(kind, (None,))[0], entries, directory)
+        _cache[kind] = (signature, entries)
+
+
+def entries(kind):
+    """
+    The remembered directories for dialogs of `kind`, most recent first.
+    """
+    with _lock:
+        return list(_load(kind))
+
+
+def recent(kind):
+    """
+    The most recently used directory for dialogs of `kind` that still exists.
+
+    Returns:
+        str: The directory, or None if there is none.
+    """
+    owner = getattr(_local, 'owner', None)
+    if owner is not None:
+        return owner.recent(kind)
+    with _lock:
+        candidates = _load(kind)
+    for directory in candidates:
+        if os.path.isdir(directory):
+            return directory
+    return None
+
+
+def clear(kind=None):
+    """
+    Forget the remembered directories of one kind, or of all kinds.
+    """
+    with _lock:
+        for k in [kind] if kind else set(kinds.values()):
+            _cache.pop(k, None)
+            if persistent:
+                try:
+                    os.unlink(_history_file(k))
+                except OSError:
+                    pass
+
+
+__all__ = ['remember', 'entries', 'recent', 'clear', 'state_directory']
@@ -1,36 +1,45 @@
 import os
 import sys
 
-from subprocess import PIPE, Popen
-
-from crossfiledialog import strings
+from crossfiledialog import history, metrics, strings
 from crossfiledialog.exceptions import FileDialogException
+from crossfiledialog.filters import compile_filter
+from crossfiledialog.paths import check_mode, decode_output, split_lines, strip_newline
+from crossfiledialog.process import communicate, failed, spawn
+from crossfiledialog.resolver import which
+from crossfiledialog.stderr import Capture
 
 
 class KDialogException(FileDialogException):
     pass
 
 
-last_cwd = None
+kdialog_binary = None
 
 
-def get_preferred_cwd():
+def get_preferred_cwd(kind='open'):
     possible_cwd = os.environ.get('FILEDIALOG_CWD', '')
     if possible_cwd:
         return possible_cwd
 
-    global last_cwd
-    if last_cwd:
-        return last_cwd
+    return history.recent(kind)
 
 
-def set_last_cwd(cwd):
-    global last_cwd
-    last_cwd = os.path.dirname(cwd)
+def set_last_cwd(cwd, kind='open'):
+    history.remember(kind, os.path.dirname(os.fsdecode(cwd)))
 
 
-def run_kdialog(*args, **kwargs):
-    cmdlist = ['kdialog']
+def get_binary():
+    # Resolve the absolute path once; every later call reuses it instead of
+    # letting Popen search PATH again.
+    global kdialog_binary
+    if not kdialog_binary:
+        kdialog_binary = which('kdialog') or 'kdialog'
+    return kdialog_binary
+
+
+def kdialog_command(*args, **kwargs):
+    cmdlist = [get_binary()]
     cmdlist.extend('--{0}'.format(arg) for arg in args)
 
     if "start_dir" in kwargs:
@@ -43,25 +52,93 @@ def run_kdialog(*args, **kwargs):
         cmdlist.append('--{0}'.format(k))
         cmdlist.append(v)
 
+    return cmdlist
+
+
+def process_output(returncode, stdout, stderr, paths='str', forward=True):
+    if failed(returncode):
+        error = KDialogException("kdialog failed with exit status {0}: {1}".format(
+            returncode, stderr.decode(errors='replace').strip() or 'no error message'
+        ))
+        error.returncode = returncode
+        raise error
+
+    stdout = decode_output(stdout, paths)
+    if forward and stderr.strip():
+        sys.stderr.write(stderr.decode())
+
+    return strip_newline(stdout)
+
+
+def popen_kwargs(kind='open'):
     extra_kwargs = dict()
-    preferred_cwd = get_preferred_cwd()
+    preferred_cwd = get_preferred_cwd(kind)
     if preferred_cwd:
         extra_kwargs['cwd'] = preferred_cwd
+    return extra_kwargs
+
+
+def run_command(cmdlist, timeout=None, on_spawn=None, paths='str', kind='open'):
+    check_mode(paths)
+    capture = Capture('kdialog')
+    metrics.mark('command')
+    process = spawn(cmdlist, stderr=capture.target, **popen_kwargs(kind))
+    metrics.mark('spawned')
+    capture.start(process)
+    if on_spawn:
+        on_spawn(process)
+    with capture:
+        stdout, stderr = communicate(process, timeout)
+        metrics.process_exited(process)
+        stderr = capture.collect(stderr)
+        # parse_time starts here, so it covers decoding and splitting.
+        metrics.mark('output')
+        return process_output(process.returncode, stdout, stderr, paths, capture.forward)
+
+
+@metrics.instrument('kdialog')
+def run_kdialog(*args, **kwargs):
+    return run_command(kdialog_command(*args, **kwargs))
+
+
+def _kdialog_kwargs(title, start_dir, filter=None):
+    kdialog_kwargs = dict(title=title)
+
+    if start_dir:
+        kdialog_kwargs["start_dir"] = start_dir
+
+    if filter:
+        kdialog_kwargs["filter"] = compile_filter(filter).kdialog_filter()
+
+    return kdialog_kwargs
+
+
+def open_file_command(title=strings.open_file, start_dir=None, filter=None):
+    return kdialog_command('getopenfilename', **_kdialog_kwargs(title, start_dir, filter))
+
+
+def open_multiple_command(title=strings.open_multiple, start_dir=None, filter=None):
+    # --separate-output prints one path per line instead of joining them
+    # with spaces, which breaks paths that contain a space.
+    return kdialog_command(
+        'getopenfilename', 'multiple', 'separate-output', **_kdialog_kwargs(title, start_dir, filter)
+    )
+
 
-    process = Popen(cmdlist, stdout=PIPE, stderr=PIPE, **extra_kwargs)
-    stdout, stderr = process.communicate()
+def save_file_command(title=strings.save_file, start_dir=None):
+    return kdialog_command('getsavefilename', **_kdialog_kwargs(title, start_dir))
 
-    if process.returncode == -1:
-        raise KDialogException("Unexpected error during kdialog call")
 
-    stdout, stderr = stdout.decode(), stderr.decode()
-    if stderr.strip():
-        sys.stderr.write(stderr)
+def choose_folder_command(title=strings.choose_folder, start_dir=None):
+    return kdialog_command('getexistingdirectory', **_kdialog_kwargs(title, start_dir))
 
-    return stdout.strip()
 
+def parse_multiple(result):
+    return split_lines(result)
 
-def open_file(title=strings.open_file, start_dir=None, filter=None):
+
+@metrics.instrument('kdialog')
+def open_file(title=strings.open_file, start_dir=None, filter=None, timeout=None, on_spawn=None, paths='str'):
     """
     Open a file selection dialog for selecting a file using KDialog.
 
@@ -70,6 +147,14 @@ def open_file(title=strings.open_file, start_dir=None, filter=None):
             Default is 'Choose a file'
         start_dir (str, optional): The starting directory for the dialog.
         filter (str, list, dict, optional): The filter for file types to display.
+        timeout (float, optional): Seconds after which the dialog is closed and
+            DialogTimeout is raised. Default is to wait indefinitely.
+        on_spawn (callable, optional): Called with the dialog process as soon as
+            it starts, so another thread can close it with
+            crossfiledialog.process.terminate().
+        paths (str, optional): 'str' (default) decodes the dialog's output as
+            UTF-8, 'surrogateescape' decodes it like os.fsdecode() and 'bytes'
+            returns the raw bytes, for file names that are not valid UTF-8.
 
     Returns:
         str: The selected file's path.
@@ -77,50 +162,14 @@ def open_file(title=strings.open_file, start_dir=None, filter=None):
     Example:
         result = open_file(title="Select a file", start_dir="/path/to/starting/directory", filter="*.txt")
     """
-    kdialog_kwargs = dict(title=title)
-
-    if start_dir:
-        kdialog_kwargs["start_dir"] = start_dir
-
-    if filter:
-        if isinstance(filter, str):
-            # Filter is a single wildcard.
-            kdialog_kwargs["filter"] = filter
-        elif isinstance(filter, list):
-            if isinstance(filter[0], str):
-                # Filter is a list of wildcards.
-                kdialog_kwargs["filter"] = " ".join(filter)
-            elif isinstance(filter[0], list):
-                # Filter is a list of lists with wildcards.
-                kdialog_kwargs["filter"] = " | ".join(
-                    " ".join(f) for f in filter
-                )
-            else:
-                raise ValueError("Invalid filter")
-        elif isinstance(filter, dict):
-            # Filter is a dictionary mapping descriptions to wildcards or lists of wildcards.
-            filters = []
-            for key, value in filter.items():
-                if isinstance(value, str):
-                    filters.append("{0} ({1})".format(key, value))
-                elif isinstance(value, list):
-                    filters.append("{0} ({1})".format(key, ' '.join(value)))
-                else:
-                    raise ValueError("Invalid filter")
-
-            kdialog_kwargs["filter"] = " | ".join(
-                filters
-            )
-        else:
-            raise ValueError("Invalid filter")
-
-    result = run_kdialog('getopenfilename', **kdialog_kwargs)
+    result = run_command(open_file_command(title, start_dir, filter), timeout, on_spawn, paths)
     if result:
         set_last_cwd(result)
     return result
 
 
-def open_multiple(title=strings.open_multiple, start_dir=None, filter=None):
+@metrics.instrument('kdialog')
+def open_multiple(title=strings.open_multiple, start_dir=None, filter=None, timeout=None, on_spawn=None, paths='str'):
     """
     Open a file selection dialog for selecting multiple files using KDialog.
 
@@ -129,6 +178,14 @@ def open_multiple(title=strings.open_multiple, start_dir=None, filter=None):
             Default is 'Choose one or more files'
         start_dir (str, optional): The starting directory for the dialog.
         filter (optional): The filter for file types to display.
+        timeout (float, optional): Seconds after which the dialog is closed and
+            DialogTimeout is raised. Default is to wait indefinitely.
+        on_spawn (callable, optional): Called with the dialog process as soon as
+            it starts, so another thread can close it with
+            crossfiledialog.process.terminate().
+        paths (str, optional): 'str' (default) decodes the dialog's output as
+            UTF-8, 'surrogateescape' decodes it like os.fsdecode() and 'bytes'
+            returns the raw bytes, for file names that are not valid UTF-8.
 
     Returns:
         list[str]: A list of selected file paths.
@@ -137,52 +194,16 @@ def open_multiple(title=strings.open_multiple, start_dir=None, filter=None):
         result = open_multiple(title="Select multiple files",
         start_dir="/path/to/starting/directory", filter="*.txt")
     """
-    kdialog_kwargs = dict(title=title)
-
-    if start_dir:
-        kdialog_kwargs["start_dir"] = start_dir
-
-    if filter:
-        if isinstance(filter, str):
-            # Filter is a single wildcard.
-            kdialog_kwargs["filter"] = filter
-        elif isinstance(filter, list):
-            if isinstance(filter[0], str):
-                # Filter is a list of wildcards.
-                kdialog_kwargs["filter"] = " ".join(filter)
-            elif isinstance(filter[0], list):
-                # Filter is a list of lists with wildcards.
-                kdialog_kwargs["filter"] = " | ".join(
-                    " ".join(f) for f in filter
-                )
-            else:
-                raise ValueError("Invalid filter")
-        elif isinstance(filter, dict):
-            # Filter is a dictionary mapping descriptions to wildcards or lists of wildcards.
-            filters = []
-            for key, value in filter.items():
-                if isinstance(value, str):
-                    filters.append("{0} ({1})".format(key, value))
-                elif isinstance(value, list):
-                    filters.append("{0} ({1})".format(key, ' '.join(value)))
-                else:
-                    raise ValueError("Invalid filter")
-
-            kdialog_kwargs["filter"] = " | ".join(
-                filters
-            )
-        else:
-            raise ValueError("Invalid filter")
-
-    result = run_kdialog('getopenfilename', 'multiple', **kdialog_kwargs)
-    result_list = list(map(str.strip, result.split(' ')))
+    result = run_command(open_multiple_command(title, start_dir, filter), timeout, on_spawn, paths)
+    result_list = parse_multiple(result)
     if result_list:
         set_last_cwd(result_list[0])
         return result_list
     return []
 
 
-def save_file(title=strings.save_file, start_dir=None):
+@metrics.instrument('kdialog')
+def save_file(title=strings.save_file, start_dir=None, timeout=None, on_spawn=None, paths='str'):
     """
     Open a save file dialog using KDialog.
 
@@ -190,6 +211,14 @@ def save_file(title=strings.save_file, start_dir=None):
         title (str, optional): The title of the save file dialog.
             Default is 'Enter the name of the file to save to'
         start_dir (str, optional): The starting directory for the dialog.
+        timeout (float, optional): Seconds after which the dialog is closed and
+            DialogTimeout is raised. Default is to wait indefinitely.
+        on_spawn (callable, optional): Called with the dialog process as soon as
+            it starts, so another thread can close it with
+            crossfiledialog.process.terminate().
+        paths (str, optional): 'str' (default) decodes the dialog's output as
+            UTF-8, 'surrogateescape' decodes it like os.fsdecode() and 'bytes'
+            returns the raw bytes, for file names that are not valid UTF-8.
 
     Returns:
         str: The selected file's path for saving.
@@ -197,19 +226,14 @@ def save_file(title=strings.save_file, start_dir=None):
     Example:
         result = save_file(title="Save file", start_dir="/path/to/starting/directory")
     """
-    kdialog_args = ['getsavefilename']
-    kdialog_kwargs = dict(title=title)
-
-    if start_dir:
-        kdialog_kwargs["start_dir"] = start_dir
-
-    result = run_kdialog(*kdialog_args, **kdialog_kwargs)
+    result = run_command(save_file_command(title, start_dir), timeout, on_spawn, paths, 'save')
     if result:
-        set_last_cwd(result)
+        set_last_cwd(result, 'save')
     return result
 
 
-def choose_folder(title=strings.choose_folder, start_dir=None):
+@metrics.instrument('kdialog')
+def choose_folder(title=strings.choose_folder, start_dir=None, timeout=None, on_spawn=None, paths='str'):
     """
     Open a folder selection dialog using KDialog.
 
@@ -217,6 +241,14 @@ def choose_folder(title=strings.choose_folder, start_dir=None):
         title (str, optional): The title of the folder selection dialog.
             Default is 'Choose a folder'
         start_dir (str, optional): The starting directory for the dialog.
+        timeout (float, optional): Seconds after which the dialog is closed and
+            DialogTimeout is raised. Default is to wait indefinitely.
+        on_spawn (callable, optional): Called with the dialog process as soon as
+            it starts, so another thread can close it with
+            crossfiledialog.process.terminate().
+        paths (str, optional): 'str' (default) decodes the dialog's output as
+            UTF-8, 'surrogateescape' decodes it like os.fsdecode() and 'bytes'
+            returns the raw bytes, for file names that are not valid UTF-8.
 
     Returns:
         str: The selected folder's path.
@@ -224,14 +256,9 @@ def choose_folder(title=strings.choose_folder, start_dir=None):
     Example:
         result = choose_folder(title="Select folder", start_dir="/path/to/starting/directory")
     """
-    kdialog_kwargs = dict(title=title)
-
-    if start_dir:
-        kdialog_kwargs["start_dir"] = start_dir
-
-    result = run_kdialog('getexistingdirectory', **kdialog_kwargs)
+    result = run_command(choose_folder_command(title, start_dir), timeout, on_spawn, paths, 'folder')
     if result:
-        set_last_cwd(result)
+        set_last_cwd(result, 'folder')
     return result
 
 
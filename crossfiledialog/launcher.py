@@ -0,0 +1,322 @@
+"""
+Forkserver-style launcher for dialog processes.
+
+start() forks a small launcher process while the host is still small,
+ideally during `import crossfiledialog` (set FILEDIALOG_SPAWN=launcher).
+Later dialogs send their argv, working directory and the changes the host
+made to its environment since the fork, and the write ends of their output
+pipes, over a SOCK_SEQPACKET socketpair. The launcher starts the dialog and reports
+its pid and exit status, while the caller reads the output pipes directly.
+The cost of starting a dialog therefore no longer depends on how large the
+host process has grown.
+
+The launcher exits when the host closes its end of the socket or dies,
+and closes the dialogs it started.
+"""
+import errno
+import json
+import os
+import signal
+import socket
+import sys
+import threading
+import types
+
+from subprocess import DEVNULL, PIPE, TimeoutExpired
+
+from crossfiledialog.process import PR_SET_PDEATHSIG, DialogPopen, PipeProcess, _load_prctl, signal_group, spawn_kwargs
+
+
+_MESSAGE_SIZE = 65536
+
+_client = None
+
+
+def _environment(request):
+    # The host's environment as it is now: the launcher's copy is the one
+    # the host had when it forked.
+    if not request.get('env') and not request.get('unset'):
+        return None
+    env = dict(os.environ)
+    env.update(request.get('env', {}))
+    for key in request.get('unset', ()):
+        env.pop(key, None)
+    return env
+
+
+def _serve(sock):
+    # Runs in the forked launcher; never returns into the host's code.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    lock = threading.Lock()
+    running = set()
+
+    def close_dialogs(*args):
+        with lock:
+            pids = list(running)
+        for pid in pids:
+            signal_group(pid, signal.SIGTERM)
+        if args:
+            # SIGTERM, sent when the host died.
+            os._exit(0)
+
+    signal.signal(signal.SIGTERM, close_dialogs)
+
+    def reply(request_id, **message):
+        message['id'] = request_id
+        with lock:
+            sock.send(json.dumps(message).encode('utf-8'))
+
+    def run(request, fds):
+        try:
+            try:
+                process = DialogPopen(
+                    request['argv'], stdin=DEVNULL, stdout=fds[0], stderr=fds[1],
+                    cwd=request.get('cwd'), env=_environment(request), **spawn_kwargs()
+                )
+            finally:
+                for fd in fds:
+                    os.close(fd)
+        except OSError as e:
+            reply(request['id'], errno=e.errno, error=e.strerror or str(e))
+            return
+
+        with lock:
+            running.add(process.pid)
+        reply(request['id'], pid=process.pid)
+        returncode = process.wait()
+        with lock:
+            running.discard(process.pid)
+        rusage = process.rusage
+        reply(
+            request['id'], returncode=returncode,
+            rusage=[rusage.ru_maxrss, rusage.ru_utime, rusage.ru_stime] if rusage else None,
+        )
+
+    while True:
+        try:
+            data, fds, _, _ = socket.recv_fds(sock, _MESSAGE_SIZE, 2)
+        except OSError:
+            break
+        if not data:
+            break
+        threading.Thread(target=run, args=(json.loads(data.decode('utf-8')), fds), daemon=True).start()
+    close_dialogs()
+
+
+def _environment_changes(base):
+    # What to send instead of the whole environment: usually nothing.
+    current = os.environ
+    changed = {key: value for key, value in current.items() if base.get(key) != value}
+    removed = [key for key in base if key not in current]
+    return changed, removed
+
+
+class _Client:
+    """
+    Host side of the launcher connection.
+
+    A reader thread, started with the first request, routes replies to the
+    waiting LauncherProcess objects.
+    """
+
+    def __init__(self, sock, pid, environ):
+        self.sock = sock
+        self.pid = pid
+        # The environment the launcher inherited.
+        self.environ = environ
+        self.alive = True
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._waiting = dict()
+        self._reader = None
+
+    def submit(self, process, request, fds):
+        changed, removed = _environment_changes(self.environ)
+        if changed:
+            request['env'] = changed
+        if removed:
+            request['unset'] = removed
+        with self._lock:
+            if not self.alive:
+                raise OSError("Dialog launcher has exited")
+            self._next_id += 1
+            request['id'] = self._next_id
+            payload = json.dumps(request).encode('utf-8')
+            if len(payload) > _MESSAGE_SIZE:
+                raise OSError(errno.E2BIG, "Dialog request too large for the launcher")
+            self._waiting[self._next_id] = process
+            if self._reader is None:
+                self._reader = threading.Thread(target=self._read, name='crossfiledialog-launcher', daemon=True)
+                self._reader.start()
+            try:
+                socket.send_fds(self.sock, [payload], fds)
+            except BaseException:
+                del self._waiting[self._next_id]
+                raise
+
+    def _read(self):
+        while True:
+            try:
+                data = self.sock.recv(_MESSAGE_SIZE)
+            except OSError:
+                data = b''
+            if not data:
+                break
+
+            message = json.loads(data.decode('utf-8'))
+            with self._lock:
+                process = self._waiting.get(message['id'])
+                if 'returncode' in message or 'error' in message:
+                    self._waiting.pop(message['id'], None)
+            if process is not None:
+                process._update(message)
+
+        with self._lock:
+            self.alive = False
+            waiting, self._waiting = self._waiting, dict()
+        for process in waiting.values():
+            process._update(dict(errno=None, error="Dialog launcher has exited"))
+        self._reap()
+
+    def _reap(self):
+        try:
+            os.waitpid(self.pid, 0)
+        except ChildProcessError:
+            pass
+
+    def close(self):
+        with self._lock:
+            self.alive = False
+            reader = self._reader
+        # The launcher sees EOF and exits; whoever reads the socket reaps it.
+        self.sock.shutdown(socket.SHUT_RDWR)
+        if reader is None:
+            self._reap()
+        elif reader is not threading.current_thread():
+            reader.join()
+        self.sock.close()
+
+
+class LauncherProcess(PipeProcess):
+    """
+    A dialog process started by the launcher.
+
+    The output pipes belong to the caller; only the pid and the exit status
+    come from the launcher. Signals are sent to the dialog directly.
+    """
+
+    def __init__(self, args, cwd=None, stderr=PIPE):
+        self.args = args
+        self.pid = None
+        self._chunks = ([], [])
+        self._error = None
+        self._spawned = threading.Event()
+        self._exited = threading.Event()
+
+        stdout_r, stdout_w = os.pipe()
+        if stderr == DEVNULL:
+            stderr_r, stderr_w = None, os.open(os.devnull, os.O_WRONLY)
+        else:
+            stderr_r, stderr_w = os.pipe()
+        try:
+            _client.submit(self, dict(argv=list(args), cwd=cwd), [stdout_w, stderr_w])
+        except BaseException:
+            os.close(stdout_r)
+            if stderr_r is not None:
+                os.close(stderr_r)
+            raise
+        finally:
+            os.close(stdout_w)
+            os.close(stderr_w)
+
+        self.stdout = os.fdopen(stdout_r, 'rb', 0)
+        self.stderr = os.fdopen(stderr_r, 'rb', 0) if stderr_r is not None else None
+
+        self._spawned.wait()
+        if self._error is not None:
+            self.stdout.close()
+            if self.stderr is not None:
+                self.stderr.close()
+            code, message = self._error
+            if code is None:
+                raise OSError(message)
+            raise OSError(code, message, args[0])
+
+    def _update(self, message):
+        if 'pid' in message:
+            self.pid = message['pid']
+            self._spawned.set()
+        elif 'returncode' in message:
+            if message.get('rusage'):
+                maxrss, utime, stime = message['rusage']
+                self.rusage = types.SimpleNamespace(ru_maxrss=maxrss, ru_utime=utime, ru_stime=stime)
+            self.returncode = message['returncode']
+            self._exited.set()
+        else:
+            self._error = (message['errno'], message['error'])
+            if self.pid is not None:
+                # The launcher died while the dialog was open.
+                self.returncode = -1
+                self._exited.set()
+            self._spawned.set()
+
+    def poll(self):
+        return self.returncode
+
+    def wait(self, timeout=None):
+        if not self._exited.wait(timeout):
+            raise TimeoutExpired(self.args, timeout)
+        return self.returncode
+
+
+def start():
+    """
+    Fork the launcher, unless it is already running.
+
+    Call this as early as possible, before the process grows and before it
+    starts threads; FILEDIALOG_SPAWN=launcher does so while crossfiledialog
+    is imported.
+    """
+    global _client
+    if _client is not None and _client.alive:
+        return
+
+    # Resolved before forking: the child must not run the import machinery
+    # or ctypes' library lookup.
+    prctl = _load_prctl() if sys.platform == 'linux' else None
+    parent_sock, child_sock = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+    parent_pid = os.getpid()
+    environ = dict(os.environ)
+    pid = os.fork()
+    if pid == 0:
+        status = 0
+        try:
+            parent_sock.close()
+            if prctl is not None:
+                prctl(PR_SET_PDEATHSIG, signal.SIGTERM)
+            if os.getppid() == parent_pid:
+                _serve(child_sock)
+        except BaseException:
+            status = 1
+        finally:
+            os._exit(status)
+
+    child_sock.close()
+    _client = _Client(parent_sock, pid, environ)
+
+
+def running():
+    return _client is not None and _client.alive
+
+
+def stop():
+    """
+    Shut the launcher down and reap it. Dialogs it started are closed.
+    """
+    global _client
+    client, _client = _client, None
+    if client is not None:
+        client.close()
+
+
+__all__ = ['LauncherProcess', 'start', 'stop', 'running']
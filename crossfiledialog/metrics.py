@@ -0,0 +1,266 @@
+"""
+Per-call instrumentation for dialogs.
+
+Every instrumented call produces a DialogEvent with its phase timings, the
+dialog process's resource usage and the outcome. Events are passed to the
+callables registered with add_hook() and, after enable(), accumulated into
+counters and histograms that snapshot() exports as plain data.
+
+Nothing is measured while no hook is registered and collection is off;
+instrumented functions then cost a single check of `active`. Setting
+FILEDIALOG_METRICS=1 enables collection at import time.
+"""
+import bisect
+import functools
+import os
+import threading
+import time
+import traceback
+
+from crossfiledialog.exceptions import DialogTimeout
+
+
+# True while there is anyone to report to; checked before any measurement.
+active = False
+
+hooks = []
+collecting = False
+
+# Upper bounds, in seconds, of the histogram buckets; the last bucket is unbounded.
+buckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+_lock = threading.Lock()
+_local = threading.local()
+_counters = dict()
+_histograms = dict()
+
+
+class DialogEvent:
+    """
+    What happened during one dialog call.
+
+    Times are in seconds and None where a phase does not apply, e.g.
+    spawn_time for the in-process win32 backend.
+
+    Attributes:
+        backend (str): The backend's name, e.g. 'zenity'.
+        function (str): The function that was called, e.g. 'open_multiple'.
+        argv_time (float): Building the command line or configuring the dialog.
+        spawn_time (float): Starting the dialog process.
+        wall_time (float): From the start of the dialog until it closed.
+        parse_time (float): Turning the dialog's output into the result.
+        total_time (float): The whole call.
+        max_rss (int): Peak resident set size of the dialog process, as
+            reported by wait4() (KiB on Linux, bytes on macOS).
+        cpu_time (float): User plus system CPU time of the dialog process.
+        result_count (int): Number of paths returned.
+        outcome (str): 'selected', 'cancelled', 'error' or 'timeout'.
+        error (Exception): The exception raised, if any.
+    """
+
+    __slots__ = (
+        'backend', 'function', 'argv_time', 'spawn_time', 'wall_time', 'parse_time', 'total_time',
+        'max_rss', 'cpu_time', 'result_count', 'outcome', 'error', '_marks',
+    )
+
+    def __init__(self, backend, function):
+        self.backend = backend
+        self.function = function
+        self.argv_time = self.spawn_time = self.wall_time = self.parse_time = self.total_time = None
+        self.max_rss = self.cpu_time = None
+        self.result_count = 0
+        self.outcome = None
+        self.error = None
+        self._marks = dict()
+
+    def __repr__(self):
+        return 'DialogEvent({0})'.format(', '.join(
+            '{0}={1!r}'.format(name, getattr(self, name)) for name in self.__slots__[:-1]
+        ))
+
+    def as_dict(self):
+        event = {name: getattr(self, name) for name in self.__slots__[:-2]}
+        event['error'] = repr(self.error) if self.error is not None else None
+        return event
+
+
+def _update_active():
+    global active
+    active = collecting or bool(hooks)
+
+
+def add_hook(hook):
+    """
+    Call `hook` with a DialogEvent after every dialog.
+
+    Hooks run on the thread that showed the dialog. Exceptions they raise
+    are printed and otherwise ignored.
+    """
+    with _lock:
+        hooks.append(hook)
+        _update_active()
+
+
+def remove_hook(hook):
+    with _lock:
+        hooks.remove(hook)
+        _update_active()
+
+
+def enable():
+    """Start accumulating counters and histograms."""
+    global collecting
+    with _lock:
+        collecting = True
+        _update_active()
+
+
+def disable():
+    global collecting
+    with _lock:
+        collecting = False
+        _update_active()
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+def mark(phase):
+    """
+    Record that the current call reached `phase`.
+
+    Phases, in order: 'command' (the command line is built), 'spawned'
+    (the dialog process is running), 'exited' (it closed and its output
+    was read) and 'output' (the raw output is complete; decoding and
+    splitting it count towards parse_time).
+    """
+    event = getattr(_local, 'event', None)
+    if event is not None:
+        event._marks[phase] = time.perf_counter()
+
+
+def process_exited(process):
+    """
+    Record the 'exited' phase and the resource usage of `process`.
+    """
+    event = getattr(_local, 'event', None)
+    if event is None:
+        return
+    event._marks['exited'] = time.perf_counter()
+    rusage = getattr(process, 'rusage', None)
+    if rusage is not None:
+        event.max_rss = rusage.ru_maxrss
+        event.cpu_time = rusage.ru_utime + rusage.ru_stime
+
+
+def _finish(event, start, end):
+    marks = event._marks
+    event.total_time = end - start
+    command = marks.get('command')
+    spawned = marks.get('spawned')
+    exited = marks.get('exited')
+    output = marks.get('output', exited)
+    if command is not None:
+        event.argv_time = command - start
+        if spawned is not None:
+            event.spawn_time = spawned - command
+    # In-process dialogs (win32) have no spawn; they open at 'command'.
+    opened = spawned if spawned is not None else command
+    if opened is not None and exited is not None:
+        event.wall_time = exited - opened
+    if output is not None:
+        event.parse_time = end - output
+
+
+def _record(event):
+    with _lock:
+        key = '{0}.{1}'.format(event.backend, event.outcome)
+        _counters[key] = _counters.get(key, 0) + 1
+        for phase in ('argv_time', 'spawn_time', 'wall_time', 'parse_time', 'total_time'):
+            value = getattr(event, phase)
+            if value is None:
+                continue
+            histogram = _histograms.setdefault(
+                '{0}.{1}'.format(event.backend, phase), dict(counts=[0] * (len(buckets) + 1), sum=0.0)
+            )
+            histogram['counts'][bisect.bisect_left(buckets, value)] += 1
+            histogram['sum'] += value
+
+
+def emit(event):
+    if collecting:
+        _record(event)
+    for hook in list(hooks):
+        try:
+            hook(event)
+        except Exception:
+            traceback.print_exc()
+
+
+def instrument(backend):
+    """
+    Decorate a backend's dialog function so each call emits a DialogEvent.
+
+    Calls made while another instrumented call is running on the same
+    thread are counted as part of it.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not active or getattr(_local, 'event', None) is not None:
+                return function(*args, **kwargs)
+
+            event = _local.event = DialogEvent(backend, function.__name__)
+            start = time.perf_counter()
+            try:
+                result = function(*args, **kwargs)
+            except DialogTimeout as e:
+                event.outcome, event.error = 'timeout', e
+                raise
+            except BaseException as e:
+                event.outcome, event.error = 'error', e
+                raise
+            else:
+                if isinstance(result, list):
+                    event.result_count = len(result)
+                else:
+                    event.result_count = 1 if result else 0
+                event.outcome = 'selected' if event.result_count else 'cancelled'
+                return result
+            finally:
+                _local.event = None
+                _finish(event, start, time.perf_counter())
+                emit(event)
+        return wrapper
+    return decorator
+
+
+def snapshot():
+    """
+    The accumulated counters and histograms, as JSON-serialisable data.
+
+    Returns:
+        dict: {'counters': {'<backend>.<outcome>': count},
+               'histograms': {'<backend>.<phase>': {'buckets', 'counts', 'sum'}}}
+    """
+    with _lock:
+        return dict(
+            counters=dict(_counters),
+            histograms={
+                name: dict(buckets=list(buckets), counts=list(h['counts']), sum=h['sum'])
+                for name, h in _histograms.items()
+            },
+        )
+
+
+if os.environ.get('FILEDIALOG_METRICS') == '1':
+    enable()
+
+
+__all__ = [
+    'DialogEvent', 'add_hook', 'remove_hook', 'enable', 'disable', 'reset', 'snapshot',
+    'instrument', 'mark', 'process_exited',
+]
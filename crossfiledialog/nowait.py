@@ -0,0 +1,373 @@
+import functools
+import os
+import selectors
+import threading
+import time
+
+from concurrent.futures import Future, InvalidStateError
+from crossfiledialog import history, strings
+from crossfiledialog.exceptions import DialogTimeout
+from crossfiledialog.process import kill, kill_grace, spawn, terminate
+from crossfiledialog.stderr import Capture
+from crossfiledialog.wrapper import load_backend
+
+
+class DialogHandle(Future):
+    """
+    A Future for a dialog that is still open.
+
+    Besides the regular Future interface (done(), result(timeout), ...),
+    cancel() closes the dialog by terminating its process, and
+    add_done_callback() accepts an adapter that delivers the callback on the
+    host application's event loop instead of the watcher thread.
+    """
+
+    def __init__(self, process=None):
+        super().__init__()
+        self.process = process
+
+    def cancel(self):
+        if self.process is None:
+            # Thread-backed dialogs (win32) cannot be closed from outside.
+            return False
+        terminate(self.process)
+        return super().cancel()
+
+    def add_done_callback(self, fn, adapter=None):
+        """
+        Attach a callable that is called with this handle once it completes.
+
+        Args:
+            fn (callable): The callback, called with the handle as its only argument.
+            adapter (callable, optional): Schedules a zero-argument callable on the
+                host event loop, see tk_adapter(), qt_adapter() and glib_adapter().
+                Without it, fn runs on the watcher thread.
+        """
+        if adapter is None:
+            return super().add_done_callback(fn)
+        return super().add_done_callback(lambda handle: adapter(functools.partial(fn, handle)))
+
+
+class _Watch:
+    __slots__ = ('process', 'callback', 'capture', 'chunks', 'open_pipes', 'deadline', 'timed_out')
+
+    def __init__(self, process, callback, capture, deadline):
+        self.process = process
+        self.callback = callback
+        self.capture = capture
+        self.chunks = ([], [])
+        self.open_pipes = 0
+        self.deadline = deadline
+        self.timed_out = False
+
+
+class _Watcher:
+    """
+    One daemon thread that drains the pipes of every open dialog.
+
+    The thread is started on demand and exits again once no dialog is left,
+    so idle processes do not keep it around.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = []
+        self._thread = None
+        self._selector = None
+        self._wakeup_r = self._wakeup_w = None
+
+    def watch(self, process, callback, capture, timeout=None):
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._lock:
+            if self._thread is None:
+                self._selector = selectors.DefaultSelector()
+                self._wakeup_r, self._wakeup_w = os.pipe()
+                os.set_blocking(self._wakeup_r, False)
+                self._selector.register(self._wakeup_r, selectors.EVENT_READ)
+                self._thread = threading.Thread(target=self._run, name='crossfiledialog-watcher', daemon=True)
+                self._thread.start()
+            self._pending.append(_Watch(process, callback, capture, deadline))
+            os.write(self._wakeup_w, b'\0')
+
+    def _run(self):
+        watched = dict()
+        timed = set()
+        while True:
+            wait = None
+            if timed:
+                wait = max(0, min(w.deadline for w in timed) - time.monotonic())
+
+            for key, _ in self._selector.select(wait):
+                if key.fileobj == self._wakeup_r:
+                    try:
+                        os.read(self._wakeup_r, 4096)
+                    except BlockingIOError:
+                        pass
+                    continue
+
+                watch, index, pipe = watched[key.fileobj]
+                data = os.read(key.fileobj, 65536)
+                if index == 1 and not watch.capture.forward:
+                    # Logged or kept as it arrives, not collected.
+                    watch.capture.feed(data)
+                elif data:
+                    watch.chunks[index].append(data)
+                if data:
+                    continue
+
+                self._selector.unregister(key.fileobj)
+                del watched[key.fileobj]
+                pipe.close()
+                watch.open_pipes -= 1
+                if not watch.open_pipes:
+                    timed.discard(watch)
+                    watch.process.wait()
+                    try:
+                        watch.callback(
+                            watch.process.returncode, b''.join(watch.chunks[0]), b''.join(watch.chunks[1]),
+                            watch.timed_out,
+                        )
+                    except Exception:
+                        # One failing callback must not stop the thread
+                        # that every other open dialog waits on.
+                        import traceback
+                        traceback.print_exc()
+
+            now = time.monotonic()
+            for watch in [w for w in timed if w.deadline <= now]:
+                if watch.timed_out:
+                    # Still open kill_grace seconds after SIGTERM.
+                    timed.discard(watch)
+                    kill(watch.process)
+                    continue
+                # Close the dialog; once its pipes reach EOF the callback
+                # runs with timed_out set.
+                watch.timed_out = True
+                watch.deadline = now + kill_grace
+                terminate(watch.process)
+
+            with self._lock:
+                for watch in self._pending:
+                    if watch.deadline is not None:
+                        timed.add(watch)
+                    for index, pipe in enumerate((watch.process.stdout, watch.process.stderr)):
+                        # stderr is None with the 'devnull' policy.
+                        if pipe is not None:
+                            self._selector.register(pipe.fileno(), selectors.EVENT_READ)
+                            watched[pipe.fileno()] = (watch, index, pipe)
+                            watch.open_pipes += 1
+                del self._pending[:]
+
+                if not watched:
+                    self._selector.close()
+                    os.close(self._wakeup_r)
+                    os.close(self._wakeup_w)
+                    self._thread = None
+                    return
+
+
+_watcher = _Watcher()
+
+
+def _start(function, command_name, args, finish, timeout, stderr):
+    backend = load_backend()
+    if not hasattr(backend, command_name):
+        return _start_thread(getattr(backend, function), args, timeout)
+
+    kind = history.kinds[function]
+    # Created here, so the policy is that of the calling thread.
+    capture = Capture(backend.__name__.rsplit('.', 1)[-1], stderr)
+    process = spawn(getattr(backend, command_name)(*args), stderr=capture.target, **backend.popen_kwargs(kind))
+    handle = DialogHandle(process)
+
+    def complete(returncode, stdout, stderr, timed_out):
+        if handle.cancelled():
+            return
+        try:
+            with capture:
+                if timed_out:
+                    raise DialogTimeout("No answer from the dialog within {0} seconds".format(timeout))
+                output = backend.process_output(returncode, stdout, capture.collect(stderr), forward=capture.forward)
+                settle = functools.partial(handle.set_result, finish(backend, output, kind))
+        except Exception as e:
+            settle = functools.partial(handle.set_exception, e)
+        try:
+            settle()
+        except InvalidStateError:
+            # cancel() was called from another thread since the check above.
+            pass
+
+    _watcher.watch(process, complete, capture, timeout)
+    return handle
+
+
+def _start_thread(function, args, timeout):
+    # Backends without a command line (win32) show the dialog on a thread of
+    # their own; the handle still completes like any other.
+    handle = DialogHandle()
+    handle.set_running_or_notify_cancel()
+
+    def run():
+        try:
+            handle.set_result(function(*args, timeout=timeout))
+        except Exception as e:
+            handle.set_exception(e)
+
+    threading.Thread(target=run, name='crossfiledialog-dialog', daemon=True).start()
+    return handle
+
+
+def _finish_single(backend, result, kind):
+    if result:
+        backend.set_last_cwd(result, kind)
+    return result
+
+
+def _finish_multiple(backend, result, kind):
+    result_list = backend.parse_multiple(result)
+    if result_list:
+        backend.set_last_cwd(result_list[0], kind)
+        return result_list
+    return []
+
+
+def open_file_nowait(title=strings.open_file, start_dir=None, filter=None, timeout=None, stderr=None):
+    """
+    Open a file selection dialog for selecting a file, without waiting for it.
+
+    Args:
+        title (str, optional): The title of the file selection dialog.
+            Default is 'Choose a file'
+        start_dir (str, optional): The starting directory for the dialog.
+        filter (str, list, dict, optional): The filter for file types to display.
+        timeout (float, optional): Seconds after which the dialog is closed and
+            the handle fails with DialogTimeout. Default is to wait indefinitely.
+        stderr (str, optional): What happens to the dialog program's stderr:
+            'forward' (default), 'devnull', 'ring', 'log' or a logger. See
+            crossfiledialog.stderr.
+
+    Returns:
+        DialogHandle: A future that resolves to the selected file's path.
+
+    Example:
+        handle = open_file_nowait(filter="*.txt")
+        handle.add_done_callback(on_file_chosen, adapter=tk_adapter(root))
+    """
+    return _start('open_file', 'open_file_command', (title, start_dir, filter), _finish_single, timeout, stderr)
+
+
+def open_multiple_nowait(title=strings.open_multiple, start_dir=None, filter=None, timeout=None, stderr=None):
+    """
+    Open a file selection dialog for selecting multiple files, without waiting for it.
+
+    Args:
+        title (str, optional): The title of the file selection dialog.
+            Default is 'Choose one or more files'
+        start_dir (str, optional): The starting directory for the dialog.
+        filter (str, list, dict, optional): The filter for file types to display.
+        timeout (float, optional): Seconds after which the dialog is closed and
+            the handle fails with DialogTimeout. Default is to wait indefinitely.
+        stderr (str, optional): What happens to the dialog program's stderr:
+            'forward' (default), 'devnull', 'ring', 'log' or a logger. See
+            crossfiledialog.stderr.
+
+    Returns:
+        DialogHandle: A future that resolves to a list of selected file paths.
+    """
+    return _start(
+        'open_multiple', 'open_multiple_command', (title, start_dir, filter), _finish_multiple, timeout, stderr,
+    )
+
+
+def save_file_nowait(title=strings.save_file, start_dir=None, timeout=None, stderr=None):
+    """
+    Open a save file dialog, without waiting for it.
+
+    Args:
+        title (str, optional): The title of the save file dialog.
+            Default is 'Enter the name of the file to save to'
+        start_dir (str, optional): The starting directory for the dialog.
+        timeout (float, optional): Seconds after which the dialog is closed and
+            the handle fails with DialogTimeout. Default is to wait indefinitely.
+        stderr (str, optional): What happens to the dialog program's stderr:
+            'forward' (default), 'devnull', 'ring', 'log' or a logger. See
+            crossfiledialog.stderr.
+
+    Returns:
+        DialogHandle: A future that resolves to the selected file's path for saving.
+    """
+    return _start('save_file', 'save_file_command', (title, start_dir), _finish_single, timeout, stderr)
+
+
+def choose_folder_nowait(title=strings.choose_folder, start_dir=None, timeout=None, stderr=None):
+    """
+    Open a folder selection dialog, without waiting for it.
+
+    Args:
+        title (str, optional): The title of the folder selection dialog.
+            Default is 'Choose a folder'
+        start_dir (str, optional): The starting directory for the dialog.
+        timeout (float, optional): Seconds after which the dialog is closed and
+            the handle fails with DialogTimeout. Default is to wait indefinitely.
+        stderr (str, optional): What happens to the dialog program's stderr:
+            'forward' (default), 'devnull', 'ring', 'log' or a logger. See
+            crossfiledialog.stderr.
+
+    Returns:
+        DialogHandle: A future that resolves to the selected folder's path.
+    """
+    return _start('choose_folder', 'choose_folder_command', (title, start_dir), _finish_single, timeout, stderr)
+
+
+def tk_adapter(widget):
+    """
+    Deliver callbacks on the Tk event loop that owns `widget`.
+    """
+    return lambda callback: widget.after(0, callback)
+
+
+def qt_adapter(parent=None):
+    """
+    Deliver callbacks on the Qt event loop through a queued signal.
+
+    The adapter must be created on the thread that runs the Qt event loop,
+    usually the GUI thread. It uses the host's binding, detected like
+    crossfiledialog.qt does.
+
+    Raises:
+        QtUnavailable: If the host has not imported a Qt binding.
+    """
+    from crossfiledialog.qt import QtUnavailable, _enum, find_qtcore
+
+    QtCore = find_qtcore()
+    if QtCore is None:
+        raise QtUnavailable("No Qt binding is imported")
+    Signal = getattr(QtCore, 'Signal', None) or QtCore.pyqtSignal
+
+    class _Dispatcher(QtCore.QObject):
+        dispatch = Signal(object)
+
+    dispatcher = _Dispatcher(parent)
+    dispatcher.dispatch.connect(lambda callback: callback(), _enum(QtCore.Qt, 'ConnectionType', 'QueuedConnection'))
+    return dispatcher.dispatch.emit
+
+
+def glib_adapter():
+    """
+    Deliver callbacks on the default GLib main context through idle_add.
+    """
+    from gi.repository import GLib
+
+    def schedule(callback):
+        def idle():
+            callback()
+            return GLib.SOURCE_REMOVE
+        GLib.idle_add(idle)
+
+    return schedule
+
+
+__all__ = [
+    'DialogHandle', 'open_file_nowait', 'open_multiple_nowait', 'save_file_nowait',
+    'choose_folder_nowait', 'tk_adapter', 'qt_adapter', 'glib_adapter',
+]
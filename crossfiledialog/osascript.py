@@ -1,55 +1,439 @@
+"""
+Dialogs through AppleScript's Standard Additions, run by osascript.
+
+Each dialog kind is a fixed script taking its title, start directory and
+file types as arguments (argv), so no source is built per call. The
+scripts are compiled once with osacompile into the cache directory (see
+crossfiledialog.registry.cache_dir()); without osacompile they are passed
+as source.
+
+With FILEDIALOG_OSASCRIPT_RUNNER=1 (or `use_runner = True`), one osascript
+process is kept running and runs the same scripts for every dialog, so
+the interpreter starts only once. It reads one JSON request per line on
+stdin and answers with one JSON line on stdout.
+"""
+import hashlib
+import json
 import os
+import select
 import sys
+import tempfile
+import threading
+import time
 
 from subprocess import PIPE, Popen
 
-from crossfiledialog import strings
-from crossfiledialog.exceptions import FileDialogException
+from crossfiledialog import history, metrics, registry, strings
+from crossfiledialog.exceptions import DialogTimeout, FileDialogException
+from crossfiledialog.filters import compile_filter
+from crossfiledialog.paths import check_mode, decode_output, split_lines, strip_newline
+from crossfiledialog.process import communicate, spawn, spawn_kwargs, terminate
+from crossfiledialog.resolver import which
+from crossfiledialog.stderr import Capture
 
 
 class OsascriptException(FileDialogException):
     pass
 
 
-last_cwd = None
-
-
-def get_preferred_cwd():
+osascript_binary = 'osascript'
+osacompile_binary = 'osacompile'
+
+use_runner = os.environ.get('FILEDIALOG_OSASCRIPT_RUNNER', '0') == '1'
+
+runner = None
+_lock = threading.Lock()
+# script name -> command line prefix that runs it
+_commands = dict()
+
+# The open dialogs; {multiple} is filled in below. Cancelling returns an
+# empty string rather than failing with error -128.
+_OPEN_SCRIPT = """on run argv
+    set {{thePrompt, theLocation, theTypes}} to {{item 1 of argv, item 2 of argv, paragraphs of item 3 of argv}}
+    try
+        if theLocation is "" and theTypes is {{}} then
+            set chosen to choose file with prompt thePrompt{multiple}
+        else if theLocation is "" then
+            set chosen to choose file with prompt thePrompt of type theTypes{multiple}
+        else if theTypes is {{}} then
+            set chosen to choose file with prompt thePrompt default location (POSIX file theLocation){multiple}
+        else
+            set chosen to choose file with prompt thePrompt default location (POSIX file theLocation) ¬
+                of type theTypes{multiple}
+        end if
+    on error number -128
+        return ""
+    end try
+    {result}
+end run
+"""
+
+_SINGLE_RESULT = "return POSIX path of chosen"
+
+# One path per line; commas are common in file names.
+_MULTIPLE_RESULT = """set posixList to {}
+    repeat with f in chosen
+        set end of posixList to POSIX path of f
+    end repeat
+    set AppleScript's text item delimiters to linefeed
+    return posixList as string"""
+
+_CHOOSE_SCRIPT = """on run argv
+    set {{thePrompt, theLocation}} to {{item 1 of argv, item 2 of argv}}
+    try
+        if theLocation is "" then
+            set chosen to {command} with prompt thePrompt
+        else
+            set chosen to {command} with prompt thePrompt default location (POSIX file theLocation)
+        end if
+    on error number -128
+        return ""
+    end try
+    return POSIX path of chosen
+end run
+"""
+
+# The stay-open runner, in JavaScript for its JSON support. Requests are
+# {"script": compiled script} or {"source": ..., "language": ...}, with
+# "argv"; answers are {"result": ...} or {"error": ...}. Requests are
+# ASCII-only JSON, so a line never ends inside a character.
+_RUNNER_SCRIPT = """ObjC.import('Foundation');
+var app = Application.currentApplication();
+app.includeStandardAdditions = true;
+var input = $.NSFileHandle.fileHandleWithStandardInput;
+var output = $.NSFileHandle.fileHandleWithStandardOutput;
+var buffered = '';
+
+function send(message) {
+    output.writeData($(JSON.stringify(message) + '\\n').dataUsingEncoding($.NSUTF8StringEncoding));
+}
+
+function readLine() {
+    var end;
+    while ((end = buffered.indexOf('\\n')) < 0) {
+        var data = input.availableData;
+        if (data.length === 0) {
+            return null;
+        }
+        buffered += $.NSString.alloc.initWithDataEncoding(data, $.NSUTF8StringEncoding).js;
+    }
+    var line = buffered.slice(0, end);
+    buffered = buffered.slice(end + 1);
+    return line;
+}
+
+function run() {
+    send({ready: true});
+    var line;
+    while ((line = readLine()) !== null) {
+        var request = JSON.parse(line);
+        try {
+            var result = request.script !== undefined
+                ? app.runScript(Path(request.script), {withParameters: request.argv})
+                : app.runScript(request.source, {withParameters: request.argv, in: request.language});
+            send({result: result === undefined ? '' : String(result)});
+        } catch (e) {
+            send({error: String(e.message || e)});
+        }
+    }
+}
+"""
+
+SCRIPTS = dict(
+    open_file=('AppleScript', _OPEN_SCRIPT.format(multiple='', result=_SINGLE_RESULT)),
+    open_multiple=('AppleScript', _OPEN_SCRIPT.format(
+        multiple=' with multiple selections allowed', result=_MULTIPLE_RESULT,
+    )),
+    save_file=('AppleScript', _CHOOSE_SCRIPT.format(command='choose file name')),
+    choose_folder=('AppleScript', _CHOOSE_SCRIPT.format(command='choose folder')),
+    runner=('JavaScript', _RUNNER_SCRIPT),
+)
+
+
+def get_preferred_cwd(kind='open'):
     possible_cwd = os.environ.get('FILEDIALOG_CWD', '')
     if possible_cwd:
         return possible_cwd
 
-    global last_cwd
-    if last_cwd:
-        return last_cwd
+    return history.recent(kind)
+
+
+def set_last_cwd(cwd, kind='open'):
+    history.remember(kind, os.path.dirname(os.fsdecode(cwd)))
+
+
+def osascript_command(script):
+    return [osascript_binary, '-e', script]
+
+
+def compiled_path(name):
+    """
+    Where script `name` is compiled to. The file name includes a digest of
+    the source, so a changed script is compiled again.
+    """
+    language, source = SCRIPTS[name]
+    digest = hashlib.sha256((language + source).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(registry.cache_dir(), 'osascript', '{0}-{1}.scpt'.format(name, digest))
+
+
+def compile_script(name):
+    """
+    Compile script `name` into the cache, unless it is there already.
 
+    Returns:
+        str: The compiled script, or None if osacompile is missing or failed.
+    """
+    language, source = SCRIPTS[name]
+    path = compiled_path(name)
+    if os.path.exists(path):
+        return path
+    osacompile = which(osacompile_binary)
+    if osacompile is None:
+        return None
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # A name of its own, so threads compiling at the same time do not
+        # write to one file; osacompile picks the format from the extension.
+        fd, temporary = tempfile.mkstemp(suffix='.tmp.scpt', prefix=name + '-', dir=os.path.dirname(path))
+        os.close(fd)
+    except OSError:
+        # Like the probe cache, a read-only cache directory must not break dialogs.
+        return None
+    try:
+        process = spawn([osacompile, '-l', language, '-o', temporary, '-e', source])
+        communicate(process)
+        if process.returncode != 0:
+            return None
+        os.replace(temporary, path)
+    except OSError:
+        return None
+    finally:
+        try:
+            os.unlink(temporary)
+        except OSError:
+            pass
+    return path
+
+
+def script_command(name):
+    """
+    The command line prefix that runs script `name`; its arguments follow.
+    """
+    command = _commands.get(name)
+    if command is None:
+        path = compile_script(name)
+        if path is not None:
+            command = [osascript_binary, path]
+        else:
+            language, source = SCRIPTS[name]
+            command = [osascript_binary, '-l', language, '-e', source]
+        command = _commands.setdefault(name, command)
+    return command
+
+
+def forget():
+    """Forget the compiled scripts, in memory and in the cache directory."""
+    _commands.clear()
+    for name in SCRIPTS:
+        try:
+            os.unlink(compiled_path(name))
+        except OSError:
+            pass
+
+
+def process_output(returncode, stdout, stderr, paths='str', forward=True):
+    if returncode != 0:
+        error = OsascriptException(f"Unexpected error during osascript call: {stderr.decode(errors='replace').strip()}")
+        error.returncode = returncode
+        raise error
+
+    stdout = decode_output(stdout, paths)
+
+    if forward and stderr.strip():
+        sys.stderr.write(stderr.decode())
+
+    return strip_newline(stdout)
+
+
+def popen_kwargs(kind='open'):
+    return dict()
+
+
+def _runner_request(cmdlist):
+    # [osascript, script, args...] or [osascript, ['-l', language,] '-e', source, args...]
+    args, language = cmdlist[1:], 'AppleScript'
+    if args[:1] == ['-l']:
+        language, args = args[1], args[2:]
+    if args[:1] == ['-e']:
+        return dict(source=args[1], language=language, argv=args[2:])
+    return dict(script=args[0], argv=args[1:])
+
+
+class _Runner(Popen):
+    # What was read from stdout after the last whole response line.
+    # Kept here rather than in a BufferedReader, which select() cannot see.
+    buffered = b''
+
+
+def _read_response(process, timeout=None, capture=None):
+    # The runner's stderr is read only while it runs a dialog, and handed to
+    # that dialog's `capture`; what it printed in between goes there too.
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    pipes = [process.stdout, process.stderr]
+    while b'\n' not in process.buffered:
+        wait = max(0, deadline - time.monotonic()) if deadline is not None else None
+        ready, _, _ = select.select(pipes, [], [], wait)
+        if not ready:
+            raise DialogTimeout("No answer from the dialog within {0} seconds".format(timeout))
+        if process.stderr in ready:
+            data = os.read(process.stderr.fileno(), 65536)
+            if capture is not None:
+                capture.feed(data)
+            if not data:
+                pipes.remove(process.stderr)
+        if process.stdout in ready:
+            data = os.read(process.stdout.fileno(), 65536)
+            if not data:
+                return None
+            process.buffered += data
+    line, process.buffered = process.buffered.split(b'\n', 1)
+    return json.loads(line)
+
+
+def _start_runner(capture=None):
+    process = _Runner(script_command('runner'), stdin=PIPE, stdout=PIPE, stderr=PIPE, **spawn_kwargs())
+    ready = _read_response(process, capture=capture)
+    if not ready or not ready.get('ready'):
+        terminate(process)
+        process.wait()
+        raise OsascriptException("osascript runner failed to start")
+    return process
+
+
+def stop_runner():
+    """
+    Shut the runner process down. The next dialog starts a new one.
+    """
+    global runner
+    with _lock:
+        if runner is not None:
+            runner.stdin.close()
+            runner.wait()
+            runner.stdout.close()
+            runner.stderr.close()
+            runner = None
 
-def set_last_cwd(cwd):
-    global last_cwd
-    last_cwd = os.path.dirname(cwd)
 
+def run_in_runner(cmdlist, timeout=None, capture=None):
+    """
+    Run an osascript command line in the runner process.
 
+    Args:
+        capture (Capture, optional): Receives what the runner writes to
+            stderr while it runs the script.
+
+    Returns:
+        bytes: What the script returned, like osascript's output.
+    """
+    global runner
+    line = json.dumps(_runner_request(cmdlist)).encode('ascii') + b'\n'
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    # The runner shows one dialog at a time; waiting for another thread's
+    # dialog counts against this one's timeout.
+    if not _lock.acquire(timeout=-1 if timeout is None else timeout):
+        raise DialogTimeout("No dialog slot became free within {0} seconds".format(timeout))
+    try:
+        # A runner that died since the last dialog is replaced once.
+        for _ in range(2):
+            if runner is None or runner.poll() is not None:
+                runner = _start_runner(capture)
+            try:
+                runner.stdin.write(line)
+                runner.stdin.flush()
+                remaining = max(0, deadline - time.monotonic()) if deadline is not None else None
+                response = _read_response(runner, remaining, capture)
+            except BrokenPipeError:
+                response = None
+            except DialogTimeout:
+                # The only way to close the dialog is to end the runner.
+                terminate(runner)
+                runner.wait()
+                runner = None
+                raise
+            if response is not None:
+                break
+            runner.wait()
+            runner = None
+        else:
+            raise OsascriptException("osascript runner exited unexpectedly")
+    finally:
+        _lock.release()
+
+    if 'error' in response:
+        raise OsascriptException(f"Unexpected error during osascript call: {response['error']}")
+    return response['result'].encode('utf-8')
+
+
+def run_command(cmdlist, timeout=None, on_spawn=None, paths='str', kind='open'):
+    check_mode(paths)
+    metrics.mark('command')
+    capture = Capture('osascript')
+    if use_runner:
+        with capture:
+            stdout = run_in_runner(cmdlist, timeout, capture)
+            metrics.mark('exited')
+            stderr = capture.collect(b'')
+            metrics.mark('output')
+            return process_output(0, stdout, stderr, paths, capture.forward)
+    process = spawn(cmdlist, stderr=capture.target, **popen_kwargs(kind))
+    metrics.mark('spawned')
+    capture.start(process)
+    if on_spawn:
+        on_spawn(process)
+    with capture:
+        stdout, stderr = communicate(process, timeout)
+        metrics.process_exited(process)
+        stderr = capture.collect(stderr)
+        # parse_time starts here, so it covers decoding and splitting.
+        metrics.mark('output')
+        return process_output(process.returncode, stdout, stderr, paths, capture.forward)
+
+
+@metrics.instrument('osascript')
 def run_osascript(script):
-    process = Popen(['osascript', '-e', script], stdout=PIPE, stderr=PIPE)
-    stdout, stderr = process.communicate()
+    return run_command(osascript_command(script))
+
+
+def _file_types(filter):
+    # AppleScript does not support file type filtering by wildcard, only by file type/extension
+    # so we attempt to support basic extension filtering if possible
+    spec = compile_filter(filter)
+    return '\n'.join(spec.applescript_types()) if spec is not None else ''
+
+
+def open_file_command(title=strings.open_file, start_dir=None, filter=None):
+    return script_command('open_file') + [title or '', start_dir or '', _file_types(filter)]
 
-    if process.returncode != 0:
-        raise OsascriptException(f"Unexpected error during osascript call: {stderr.decode().strip()}")
 
-    stdout, stderr = stdout.decode(), stderr.decode()
+def open_multiple_command(title=strings.open_multiple, start_dir=None, filter=None):
+    return script_command('open_multiple') + [title or '', start_dir or '', _file_types(filter)]
 
-    if stderr.strip():
-        sys.stderr.write(stderr)
 
-    return stdout.strip()
+def save_file_command(title=strings.save_file, start_dir=None):
+    return script_command('save_file') + [title or '', start_dir or '']
 
 
-def _escape_applescript_string(s):
-    # Escape backslashes and double quotes for AppleScript
-    return s.replace("\\", "\\\\").replace('"', '\\"')
+def choose_folder_command(title=strings.choose_folder, start_dir=None):
+    return script_command('choose_folder') + [title or '', start_dir or '']
 
 
-def open_file(title=strings.open_file, start_dir=None, filter=None):
+def parse_multiple(result):
+    # The script returns one POSIX path per line
+    return split_lines(result)
+
+
+@metrics.instrument('osascript')
+def open_file(title=strings.open_file, start_dir=None, filter=None, timeout=None, on_spawn=None, paths='str'):
     """
     Open a file selection dialog for selecting a file using AppleScript (osascript).
 
@@ -58,6 +442,15 @@ def open_file(title=strings.open_file, start_dir=None, filter=None):
             Default is 'Choose a file'
         start_dir (str, optional): The starting directory for the dialog.
         filter (str, list, dict, optional): The filter for file types to display.
+        timeout (float, optional): Seconds after which the dialog is closed and
+            DialogTimeout is raised. Default is to wait indefinitely.
+        on_spawn (callable, optional): Called with the dialog process as soon as
+            it starts, so another thread can close it with
+            crossfiledialog.process.terminate(). Not called when the runner
+            shows the dialog.
+        paths (str, optional): 'str' (default) decodes the dialog's output as
+            UTF-8, 'surrogateescape' decodes it like os.fsdecode() and 'bytes'
+            returns the raw bytes, for file names that are not valid UTF-8.
 
     Returns:
         str: The selected file's path.
@@ -65,43 +458,14 @@ def open_file(title=strings.open_file, start_dir=None, filter=None):
     Example:
         result = open_file(title="Select a file", start_dir="/path/to/starting/directory", filter="*.txt")
     """
-    script = 'set chosenFile to choose file'
-    if title:
-        script += f' with prompt "{_escape_applescript_string(title)}"'
-    if start_dir:
-        script += f' default location POSIX file "{_escape_applescript_string(start_dir)}"'
-    # AppleScript does not support file type filtering by wildcard, only by file type/extension
-    # so we attempt to support basic extension filtering if possible
-    if filter:
-        file_types = []
-        if isinstance(filter, str):
-            if filter.startswith("*."):
-                ext = filter[2:]
-                file_types.append(ext)
-        elif isinstance(filter, list):
-            for f in filter:
-                if isinstance(f, str) and f.startswith("*."):
-                    file_types.append(f[2:])
-        elif isinstance(filter, dict):
-            for value in filter.values():
-                if isinstance(value, str) and value.startswith("*."):
-                    file_types.append(value[2:])
-                elif isinstance(value, list):
-                    for v in value:
-                        if isinstance(v, str) and v.startswith("*."):
-                            file_types.append(v[2:])
-        if file_types:
-            # AppleScript expects a list of file types as {"txt", "md"}
-            script += ' of type {' + ", ".join([f'"{_escape_applescript_string(ext)}"' for ext in file_types]) + '}'
-    script += '\nPOSIX path of chosenFile'
-
-    result = run_osascript(script)
+    result = run_command(open_file_command(title, start_dir, filter), timeout, on_spawn, paths)
     if result:
         set_last_cwd(result)
     return result
 
 
-def open_multiple(title=strings.open_multiple, start_dir=None, filter=None):
+@metrics.instrument('osascript')
+def open_multiple(title=strings.open_multiple, start_dir=None, filter=None, timeout=None, on_spawn=None, paths='str'):
     """
     Open a file selection dialog for selecting multiple files using AppleScript (osascript).
 
@@ -110,6 +474,15 @@ def open_multiple(title=strings.open_multiple, start_dir=None, filter=None):
             Default is 'Choose one or more files'
         start_dir (str, optional): The starting directory for the dialog.
         filter (str, list, dict, optional): The filter for file types to display.
+        timeout (float, optional): Seconds after which the dialog is closed and
+            DialogTimeout is raised. Default is to wait indefinitely.
+        on_spawn (callable, optional): Called with the dialog process as soon as
+            it starts, so another thread can close it with
+            crossfiledialog.process.terminate(). Not called when the runner
+            shows the dialog.
+        paths (str, optional): 'str' (default) decodes the dialog's output as
+            UTF-8, 'surrogateescape' decodes it like os.fsdecode() and 'bytes'
+            returns the raw bytes, for file names that are not valid UTF-8.
 
     Returns:
         list[str]: A list of selected file paths.
@@ -118,45 +491,16 @@ def open_multiple(title=strings.open_multiple, start_dir=None, filter=None):
         result = open_multiple(title="Select multiple files",
         start_dir="/path/to/starting/directory", filter="*.txt")
     """
-    script = 'set chosenFiles to choose file with multiple selections allowed'
-    if title:
-        script += f' with prompt "{_escape_applescript_string(title)}"'
-    if start_dir:
-        script += f' default location POSIX file "{_escape_applescript_string(start_dir)}"'
-    # File type filtering as above
-    if filter:
-        file_types = []
-        if isinstance(filter, str):
-            if filter.startswith("*."):
-                ext = filter[2:]
-                file_types.append(ext)
-        elif isinstance(filter, list):
-            for f in filter:
-                if isinstance(f, str) and f.startswith("*."):
-                    file_types.append(f[2:])
-        elif isinstance(filter, dict):
-            for value in filter.values():
-                if isinstance(value, str) and value.startswith("*."):
-                    file_types.append(value[2:])
-                elif isinstance(value, list):
-                    for v in value:
-                        if isinstance(v, str) and v.startswith("*."):
-                            file_types.append(v[2:])
-        if file_types:
-            script += ' of type {' + ", ".join([f'"{_escape_applescript_string(ext)}"' for ext in file_types]) + '}'
-    script += '\nset posixList to {}\nrepeat with f in chosenFiles\nset end of posixList to POSIX path of f\nend repeat\nreturn posixList as string'
-
-    result = run_osascript(script)
-    if result:
-        # AppleScript returns a comma-separated list
-        split_result = [s.strip() for s in result.split(",")]
-        if split_result:
-            set_last_cwd(split_result[0])
-            return split_result
+    result = run_command(open_multiple_command(title, start_dir, filter), timeout, on_spawn, paths)
+    split_result = parse_multiple(result)
+    if split_result:
+        set_last_cwd(split_result[0])
+        return split_result
     return []
 
 
-def save_file(title=strings.save_file, start_dir=None):
+@metrics.instrument('osascript')
+def save_file(title=strings.save_file, start_dir=None, timeout=None, on_spawn=None, paths='str'):
     """
     Open a save file dialog using AppleScript (osascript).
 
@@ -164,6 +508,15 @@ def save_file(title=strings.save_file, start_dir=None):
         title (str, optional): The title of the save file dialog.
             Default is 'Enter the name of the file to save to'
         start_dir (str, optional): The starting directory for the dialog.
+        timeout (float, optional): Seconds after which the dialog is closed and
+            DialogTimeout is raised. Default is to wait indefinitely.
+        on_spawn (callable, optional): Called with the dialog process as soon as
+            it starts, so another thread can close it with
+            crossfiledialog.process.terminate(). Not called when the runner
+            shows the dialog.
+        paths (str, optional): 'str' (default) decodes the dialog's output as
+            UTF-8, 'surrogateescape' decodes it like os.fsdecode() and 'bytes'
+            returns the raw bytes, for file names that are not valid UTF-8.
 
     Returns:
         str: The selected file's path for saving.
@@ -171,20 +524,14 @@ def save_file(title=strings.save_file, start_dir=None):
     Example:
         result = save_file(title="Save file", start_dir="/path/to/starting/directory")
     """
-    script = 'set saveFile to choose file name'
-    if title:
-        script += f' with prompt "{_escape_applescript_string(title)}"'
-    if start_dir:
-        script += f' default location POSIX file "{_escape_applescript_string(start_dir)}"'
-    script += '\nPOSIX path of saveFile'
-
-    result = run_osascript(script)
+    result = run_command(save_file_command(title, start_dir), timeout, on_spawn, paths, 'save')
     if result:
-        set_last_cwd(result)
+        set_last_cwd(result, 'save')
     return result
 
 
-def choose_folder(title=strings.choose_folder, start_dir=None):
+@metrics.instrument('osascript')
+def choose_folder(title=strings.choose_folder, start_dir=None, timeout=None, on_spawn=None, paths='str'):
     """
     Open a folder selection dialog using AppleScript (osascript).
 
@@ -192,6 +539,15 @@ def choose_folder(title=strings.choose_folder, start_dir=None):
         title (str, optional): The title of the folder selection dialog.
             Default is 'Choose a folder'
         start_dir (str, optional): The starting directory for the dialog.
+        timeout (float, optional): Seconds after which the dialog is closed and
+            DialogTimeout is raised. Default is to wait indefinitely.
+        on_spawn (callable, optional): Called with the dialog process as soon as
+            it starts, so another thread can close it with
+            crossfiledialog.process.terminate(). Not called when the runner
+            shows the dialog.
+        paths (str, optional): 'str' (default) decodes the dialog's output as
+            UTF-8, 'surrogateescape' decodes it like os.fsdecode() and 'bytes'
+            returns the raw bytes, for file names that are not valid UTF-8.
 
     Returns:
         str: The selected folder's path.
@@ -199,16 +555,9 @@ def choose_folder(title=strings.choose_folder, start_dir=None):
     Example:
         result = choose_folder(title="Select folder", start_dir="/path/to/starting/directory")
     """
-    script = 'set chosenFolder to choose folder'
-    if title:
-        script += f' with prompt "{_escape_applescript_string(title)}"'
-    if start_dir:
-        script += f' default location POSIX file "{_escape_applescript_string(start_dir)}"'
-    script += '\nPOSIX path of chosenFolder'
-
-    result = run_osascript(script)
+    result = run_command(choose_folder_command(title, start_dir), timeout, on_spawn, paths, 'folder')
     if result:
-        set_last_cwd(result)
+        set_last_cwd(result, 'folder')
     return result
 
 
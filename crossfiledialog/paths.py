@@ -0,0 +1,50 @@
+import os
+
+
+# Accepted values for the `paths` argument of the dialog functions:
+#   'str':             decode the dialog's output as UTF-8, failing on invalid bytes
+#   'surrogateescape': decode like os.fsdecode(), so os.fsencode() gives back
+#                      the exact bytes of the file name
+#   'bytes':           return the raw bytes read from the dialog
+modes = ('str', 'surrogateescape', 'bytes')
+
+
+def check_mode(paths):
+    if paths not in modes:
+        raise ValueError("paths must be one of {0}, not {1!r}".format(', '.join(modes), paths))
+
+
+def decode_output(data, paths='str'):
+    """
+    Turn bytes read from a dialog into paths of the requested kind.
+    """
+    if paths == 'str':
+        return data.decode()
+    check_mode(paths)
+    if paths == 'bytes':
+        return data
+    return os.fsdecode(data)
+
+
+def from_str(path, paths='str'):
+    """
+    Convert a path that a backend received as str into the requested kind.
+    """
+    check_mode(paths)
+    if paths == 'bytes' and path:
+        return os.fsencode(path)
+    return path
+
+
+def strip_newline(output):
+    # Only the line terminator goes; spaces at either end can be part of a name.
+    return output.rstrip(b'\n' if isinstance(output, bytes) else '\n')
+
+
+def split_lines(result):
+    # Works on both str and bytes output.
+    separator = b'\n' if isinstance(result, bytes) else '\n'
+    return [path for path in result.split(separator) if path]
+
+
+__all__ = ['modes', 'check_mode', 'decode_output', 'from_str', 'strip_newline', 'split_lines']
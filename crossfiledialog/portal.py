@@ -0,0 +1,273 @@
+"""
+Dialogs through the xdg-desktop-portal FileChooser interface.
+
+The portal shows the desktop's own file chooser, and is the only one
+available inside Flatpak and Snap sandboxes. Requests go over a session bus
+connection that is opened on first use and kept (see crossfiledialog.bus),
+so no process is started per dialog.
+"""
+import itertools
+import os
+import threading
+
+from concurrent.futures import Future, TimeoutError
+from urllib.parse import unquote_to_bytes, urlsplit
+
+from crossfiledialog import history, metrics, strings
+from crossfiledialog.bus import Connection, DBusError, Variant, session_bus_address
+from crossfiledialog.exceptions import BackendUnavailable, DialogTimeout, FileDialogException
+from crossfiledialog.filters import compile_filter
+from crossfiledialog.paths import check_mode, decode_output
+
+
+class PortalException(FileDialogException):
+    pass
+
+
+class PortalUnavailable(PortalException, BackendUnavailable):
+    pass
+
+
+PORTAL_NAME = 'org.freedesktop.portal.Desktop'
+PORTAL_PATH = '/org/freedesktop/portal/desktop'
+FILE_CHOOSER = 'org.freedesktop.portal.FileChooser'
+REQUEST = 'org.freedesktop.portal.Request'
+
+# Seconds to wait for the portal to accept a request (not for the user to
+# answer it), and for the version check in available().
+call_timeout = 30
+probe_timeout = 5
+
+connection = None
+# The FileChooser interface version; 3 added folder selection.
+version = None
+_lock = threading.Lock()
+_tokens = itertools.count(1)
+
+
+def get_preferred_cwd(kind='open'):
+    possible_cwd = os.environ.get('FILEDIALOG_CWD', '')
+    if possible_cwd:
+        return possible_cwd
+
+    return history.recent(kind)
+
+
+def set_last_cwd(cwd, kind='open'):
+    history.remember(kind, os.path.dirname(os.fsdecode(cwd)))
+
+
+def get_connection():
+    """
+    The session bus connection, opened on first use and again after it closed.
+    """
+    global connection, version
+    with _lock:
+        if connection is None or connection.closed:
+            connection = Connection()
+            version = None
+        return connection
+
+
+def get_version(timeout=None):
+    global version
+    if version is None:
+        version = get_connection().call(
+            PORTAL_NAME, PORTAL_PATH, 'org.freedesktop.DBus.Properties', 'Get', 'ss', [FILE_CHOOSER, 'version'],
+            timeout=timeout or call_timeout,
+        )[0]
+    return version
+
+
+def available():
+    """
+    Whether a portal with a FileChooser answers on the session bus.
+    """
+    if session_bus_address() is None:
+        return False
+    try:
+        get_version(probe_timeout)
+    except (OSError, DBusError, DialogTimeout):
+        return False
+    return True
+
+
+def _options(kind, start_dir, filter, token):
+    options = dict(handle_token=Variant('s', token), modal=Variant('b', True))
+    if kind == 'open_multiple':
+        options['multiple'] = Variant('b', True)
+    elif kind == 'choose_folder':
+        if get_version() < 3:
+            raise PortalUnavailable("The portal's FileChooser cannot select folders before version 3")
+        options['directory'] = Variant('b', True)
+
+    spec = compile_filter(filter)
+    if spec is not None:
+        options['filters'] = Variant('a(sa(us))', list(spec.portal_filters()))
+
+    start_dir = start_dir or get_preferred_cwd(history.kinds[kind])
+    if start_dir:
+        # A NUL-terminated byte string, so any file name can be expressed.
+        options['current_folder'] = Variant('ay', os.fsencode(start_dir) + b'\0')
+    return options
+
+
+def _path(uri, paths):
+    parts = urlsplit(uri)
+    if parts.scheme != 'file':
+        raise PortalException("The portal returned a non-local location: {0}".format(uri))
+    return decode_output(unquote_to_bytes(parts.path), paths)
+
+
+def _show(kind, title, start_dir, filter, timeout, paths):
+    check_mode(paths)
+    try:
+        bus = get_connection()
+    except (OSError, DBusError) as e:
+        raise PortalUnavailable("Cannot reach the session bus: {0}".format(e)) from e
+    token = 'crossfiledialog_{0}_{1}'.format(os.getpid(), next(_tokens))
+    # The portal derives the request's object path from our bus name and the
+    # token; subscribing to it before the call means no response is missed.
+    handle = '{0}/request/{1}/{2}'.format(PORTAL_PATH, bus.unique_name[1:].replace('.', '_'), token)
+    options = _options(kind, start_dir, filter, token)
+
+    response = Future()
+
+    def on_response(message):
+        if not response.done():
+            response.set_result(message.body)
+
+    metrics.mark('command')
+    subscription = bus.subscribe(handle, REQUEST, 'Response', on_response)
+    try:
+        method = 'SaveFile' if kind == 'save_file' else 'OpenFile'
+        request = bus.call(PORTAL_NAME, PORTAL_PATH, FILE_CHOOSER, method, 'ssa{sv}', ['', title, options],
+                           timeout=call_timeout)[0]
+        metrics.mark('spawned')
+        if request != handle:
+            # Portals older than 0.9 choose the path themselves.
+            bus.unsubscribe(subscription)
+            subscription = bus.subscribe(request, REQUEST, 'Response', on_response)
+        try:
+            code, results = response.result(timeout)
+        except TimeoutError:
+            bus.call_async(PORTAL_NAME, request, REQUEST, 'Close')
+            raise DialogTimeout("No answer from the dialog within {0} seconds".format(timeout)) from None
+        metrics.mark('exited')
+    finally:
+        bus.unsubscribe(subscription)
+
+    if code == 1:
+        # Cancelled by the user.
+        return []
+    if code != 0:
+        raise PortalException("The portal ended the request with response {0}".format(code))
+    uris = results.get('uris', [])
+    if kind != 'open_multiple':
+        uris = uris[:1]
+    return [_path(uri, paths) for uri in uris]
+
+
+@metrics.instrument('portal')
+def open_file(title=strings.open_file, start_dir=None, filter=None, timeout=None, on_spawn=None, paths='str'):
+    """
+    Open a file selection dialog for selecting a file through the desktop portal.
+
+    Args:
+        title (str, optional): The title of the file selection dialog.
+            Default is 'Choose a file'
+        start_dir (str, optional): The starting directory for the dialog.
+        filter (str, list, dict, optional): The filter for file types to display.
+        timeout (float, optional): Seconds after which the dialog is closed and
+            DialogTimeout is raised. Default is to wait indefinitely.
+        on_spawn (callable, optional): Never called; the dialog runs in the
+            portal's process.
+        paths (str, optional): 'str' (default), 'surrogateescape' or 'bytes'.
+
+    Returns:
+        str: The selected file's path.
+    """
+    selected = _show('open_file', title, start_dir, filter, timeout, paths)
+    result = selected[0] if selected else ''
+    if result:
+        set_last_cwd(result)
+    return result
+
+
+@metrics.instrument('portal')
+def open_multiple(title=strings.open_multiple, start_dir=None, filter=None, timeout=None, on_spawn=None, paths='str'):
+    """
+    Open a file selection dialog for selecting multiple files through the desktop portal.
+
+    Args:
+        title (str, optional): The title of the file selection dialog.
+            Default is 'Choose one or more files'
+        start_dir (str, optional): The starting directory for the dialog.
+        filter (str, list, dict, optional): The filter for file types to display.
+        timeout (float, optional): Seconds after which the dialog is closed and
+            DialogTimeout is raised. Default is to wait indefinitely.
+        on_spawn (callable, optional): Never called; the dialog runs in the
+            portal's process.
+        paths (str, optional): 'str' (default), 'surrogateescape' or 'bytes'.
+
+    Returns:
+        list[str]: A list of selected file paths.
+    """
+    result_list = _show('open_multiple', title, start_dir, filter, timeout, paths)
+    if result_list:
+        set_last_cwd(result_list[0])
+        return result_list
+    return []
+
+
+@metrics.instrument('portal')
+def save_file(title=strings.save_file, start_dir=None, timeout=None, on_spawn=None, paths='str'):
+    """
+    Open a save file dialog through the desktop portal.
+
+    Args:
+        title (str, optional): The title of the save file dialog.
+            Default is 'Enter the name of the file to save to'
+        start_dir (str, optional): The starting directory for the dialog.
+        timeout (float, optional): Seconds after which the dialog is closed and
+            DialogTimeout is raised. Default is to wait indefinitely.
+        on_spawn (callable, optional): Never called; the dialog runs in the
+            portal's process.
+        paths (str, optional): 'str' (default), 'surrogateescape' or 'bytes'.
+
+    Returns:
+        str: The selected file's path for saving.
+    """
+    selected = _show('save_file', title, start_dir, None, timeout, paths)
+    result = selected[0] if selected else ''
+    if result:
+        set_last_cwd(result, 'save')
+    return result
+
+
+@metrics.instrument('portal')
+def choose_folder(title=strings.choose_folder, start_dir=None, timeout=None, on_spawn=None, paths='str'):
+    """
+    Open a folder selection dialog through the desktop portal.
+
+    Args:
+        title (str, optional): The title of the folder selection dialog.
+            Default is 'Choose a folder'
+        start_dir (str, optional): The starting directory for the dialog.
+        timeout (float, optional): Seconds after which the dialog is closed and
+            DialogTimeout is raised. Default is to wait indefinitely.
+        on_spawn (callable, optional): Never called; the dialog runs in the
+            portal's process.
+        paths (str, optional): 'str' (default), 'surrogateescape' or 'bytes'.
+
+    Returns:
+        str: The selected folder's path.
+    """
+    selected = _show('choose_folder', title, start_dir, None, timeout, paths)
+    result = selected[0] if selected else ''
+    if result:
+        set_last_cwd(result, 'folder')
+    return result
+
+
+__all__ = ['open_file', 'open_multiple', 'save_file', 'choose_folder', 'available']
@@ -0,0 +1,85 @@
+from crossfiledialog import history, strings
+from crossfiledialog.filters import compile_filter
+from crossfiledialog.wrapper import load_backend
+
+
+class PreparedDialog:
+    """
+    A dialog whose command line is built once and reused for every show().
+
+    Use this for dialogs that are shown repeatedly with the same title and
+    filter: the filter is compiled and the backend's argv rendered up front,
+    so each show() only spawns the process and parses its output.
+
+    Args:
+        kind (str): One of 'open_file', 'open_multiple', 'save_file' or 'choose_folder'.
+        title (str, optional): The title of the dialog. Defaults to the title
+            the matching module-level function uses.
+        filter (str, list, dict, FilterSpec, optional): The filter for file types
+            to display. Only used by 'open_file' and 'open_multiple'.
+        start_dir (str, optional): The starting directory for the dialog.
+        backend (module, optional): The backend to use. Default is the one
+            load_backend() picks.
+
+    Example:
+        dialog = PreparedDialog('open_file', filter={"Images": ["*.png", "*.jpg"]})
+        for _ in range(3):
+            result = dialog.show()
+    """
+
+    __slots__ = ('kind', 'title', 'filter', 'start_dir', 'backend', 'command')
+
+    def __init__(self, kind, title=None, filter=None, start_dir=None, backend=None):
+        if kind not in history.kinds:
+            raise ValueError("Unknown dialog kind {0!r}".format(kind))
+        if filter and kind not in ('open_file', 'open_multiple'):
+            raise ValueError("A {0} dialog does not take a filter".format(kind))
+
+        self.kind = kind
+        self.title = title if title is not None else getattr(strings, kind)
+        self.filter = compile_filter(filter)
+        self.start_dir = start_dir
+        self.backend = backend if backend is not None else load_backend()
+
+        args = [self.title, start_dir]
+        if self.filter is not None:
+            args.append(self.filter)
+        command = getattr(self.backend, kind + '_command', None)
+        self.command = tuple(command(*args)) if command is not None else None
+
+    def show(self, timeout=None, on_spawn=None):
+        """
+        Show the dialog and wait for it to close.
+
+        Args:
+            timeout (float, optional): Seconds after which the dialog is closed and
+                DialogTimeout is raised. Default is to wait indefinitely.
+            on_spawn (callable, optional): Called with the dialog's process right
+                after it started.
+
+        Returns:
+            str or list[str]: What the matching module-level function returns.
+        """
+        if self.command is None:
+            # Backends without a command line (win32, resident) take the
+            # compiled filter directly.
+            kwargs = dict(timeout=timeout, on_spawn=on_spawn)
+            if self.filter is not None:
+                kwargs['filter'] = self.filter
+            return getattr(self.backend, self.kind)(self.title, self.start_dir, **kwargs)
+
+        kind = history.kinds[self.kind]
+        result = self.backend.run_command(list(self.command), timeout, on_spawn, kind=kind)
+        if self.kind == 'open_multiple':
+            result_list = self.backend.parse_multiple(result)
+            if result_list:
+                self.backend.set_last_cwd(result_list[0], kind)
+                return result_list
+            return []
+
+        if result:
+            self.backend.set_last_cwd(result, kind)
+        return result
+
+
+__all__ = ['PreparedDialog']
@@ -0,0 +1,378 @@
+import errno
+import os
+import selectors
+import signal
+import sys
+import time
+
+from subprocess import DEVNULL, PIPE, Popen, TimeoutExpired
+
+from crossfiledialog.exceptions import DialogTimeout
+from crossfiledialog.resolver import which
+
+
+PR_SET_PDEATHSIG = 1
+
+# How dialog processes are started: 'popen' (subprocess.Popen),
+# 'posix_spawn' (SpawnedProcess, with minimal descriptors and environment) or
+# 'launcher' (LauncherProcess, see crossfiledialog.launcher).
+spawn_method = os.environ.get('FILEDIALOG_SPAWN', 'popen')
+
+# Environment passed to dialogs started with posix_spawn: what a toolkit
+# needs to reach the session and render in the user's locale.
+environment_keys = frozenset((
+    'DISPLAY', 'WAYLAND_DISPLAY', 'XAUTHORITY', 'DBUS_SESSION_BUS_ADDRESS',
+    'HOME', 'USER', 'LOGNAME', 'PATH', 'LANG', 'LANGUAGE', 'DESKTOP_SESSION',
+))
+environment_prefixes = ('XDG_', 'LC_', 'GTK_', 'GDK_', 'GIO_', 'QT_', 'KDE_')
+
+# Whether dialogs started by this process receive SIGTERM when the thread
+# that started them exits. Dialogs run in a session of their own, out of
+# reach of the terminal's Ctrl+C and hang-up, so this is what closes them
+# when the caller dies. The signal is tied to the spawning thread:
+# FILEDIALOG_PDEATHSIG=0 turns it off for programs that open dialogs from
+# short-lived worker threads.
+parent_death_signal = os.environ.get('FILEDIALOG_PDEATHSIG', '1') != '0'
+
+# Exit statuses that mean the dialog program failed rather than that the user
+# cancelled: zenity and kdialog report errors as -1 (255 once truncated to a
+# byte), and 126/127 mean the program could not be executed.
+failure_statuses = frozenset((-1, 255, 126, 127))
+
+# What dialog programs print when they cannot reach the display (GTK 3,
+# GTK 4, Qt), in lower case.
+display_errors = (b'cannot open display', b'failed to open display', b'could not connect to display')
+
+# Signals used to close a dialog on purpose (terminate(), kill(), Ctrl+C);
+# any other fatal signal is a crash.
+closing_signals = frozenset((signal.SIGTERM, signal.SIGINT, getattr(signal, 'SIGKILL', 9)))
+
+# Seconds a dialog closed with SIGTERM has to exit before it is killed.
+kill_grace = 5
+
+_prctl = None
+
+
+def _load_prctl():
+    # Resolve prctl() in the parent; doing this in the forked child would
+    # mean running the import machinery between fork and exec.
+    global _prctl
+    if _prctl is None:
+        import ctypes
+        _prctl = ctypes.CDLL(None, use_errno=True).prctl
+    return _prctl
+
+
+def spawn_kwargs():
+    """
+    Keyword arguments that make a dialog process orphan-proof.
+
+    The child gets its own session, and therefore its own process group, so
+    terminate() can take down anything it started; on Linux,
+    with_death_signal() closes it when the caller dies. No preexec_fn is used,
+    which would make subprocess fork instead of vfork and is not safe in
+    threaded programs; see death_signal_prefix() for parent-death signals.
+    """
+    return dict(start_new_session=True)
+
+
+def minimal_environment():
+    return {
+        k: v for k, v in os.environ.items()
+        if k in environment_keys or k.startswith(environment_prefixes)
+    }
+
+
+_setpriv = None
+
+
+def _setpriv_binary():
+    global _setpriv
+    if _setpriv is None:
+        _setpriv = which('setpriv') or ''
+    return _setpriv
+
+
+def death_signal_prefix():
+    """
+    The command prefix that makes a dialog receive SIGTERM when the thread
+    that started it exits, or [] unless parent_death_signal is set.
+
+    Linux only, through `setpriv --pdeathsig`: setting the signal in the
+    child ourselves would need a preexec_fn.
+    """
+    if parent_death_signal and sys.platform == 'linux' and _setpriv_binary():
+        return [_setpriv_binary(), '--pdeathsig', 'TERM', '--']
+    return []
+
+
+def with_death_signal(cmdlist):
+    """
+    `cmdlist` prefixed with death_signal_prefix(), if any.
+
+    Raises:
+        FileNotFoundError: If the program does not exist; setpriv would
+            only report it through its exit status.
+    """
+    prefix = death_signal_prefix()
+    if not prefix:
+        return list(cmdlist)
+    check_executable(cmdlist[0])
+    return prefix + list(cmdlist)
+
+
+def check_executable(program):
+    # Fail the way Popen does for a missing program; a wrapper such as sh
+    # or setpriv would only report it through its exit status.
+    executable = program if os.path.dirname(program) else which(program)
+    if not executable or not os.access(executable, os.X_OK):
+        raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), program)
+
+
+class DialogPopen(Popen):
+    """
+    Popen that reaps the dialog with wait4(), keeping its resource usage
+    in `rusage` for crossfiledialog.metrics.
+    """
+
+    rusage = None
+
+    if hasattr(os, 'wait4'):
+        def _try_wait(self, wait_flags):
+            try:
+                pid, status, rusage = os.wait4(self.pid, wait_flags)
+            except ChildProcessError:
+                # Same fallback as Popen: the child was reaped elsewhere.
+                return self.pid, 0
+            if pid:
+                self.rusage = rusage
+            return pid, status
+
+
+class PipeProcess:
+    """
+    Popen-like base for dialog processes that were not started by Popen.
+
+    Subclasses set pid, args, stdout, stderr and _chunks and implement
+    poll() and wait(); this provides communicate() and signalling.
+    """
+
+    returncode = None
+    rusage = None
+    stdin = None
+
+    def communicate(self, timeout=None):
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with selectors.DefaultSelector() as selector:
+            for index, pipe in enumerate((self.stdout, self.stderr)):
+                if pipe is not None and not pipe.closed:
+                    selector.register(pipe, selectors.EVENT_READ, index)
+
+            while selector.get_map():
+                wait = None
+                if deadline is not None:
+                    wait = deadline - time.monotonic()
+                    if wait <= 0:
+                        raise TimeoutExpired(self.args, timeout)
+
+                for key, _ in selector.select(wait):
+                    data = os.read(key.fd, 65536)
+                    if data:
+                        self._chunks[key.data].append(data)
+                    else:
+                        selector.unregister(key.fileobj)
+                        key.fileobj.close()
+
+        self.wait(None if deadline is None else max(0, deadline - time.monotonic()))
+        return b''.join(self._chunks[0]), b''.join(self._chunks[1])
+
+    def send_signal(self, sig):
+        if self.poll() is None:
+            os.kill(self.pid, sig)
+
+    def terminate(self):
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self):
+        self.send_signal(signal.SIGKILL)
+
+
+class SpawnedProcess(PipeProcess):
+    """
+    A dialog process started with os.posix_spawn().
+
+    glibc implements posix_spawn with vfork, so starting a dialog does not
+    copy the page tables of the calling process, and the child only gets
+    /dev/null, the two output pipes and a trimmed environment. Descriptors
+    are not closed one by one: Python opens them close-on-exec, so only
+    those the host explicitly made inheritable reach the dialog. It provides
+    the subset of the Popen interface the backends use.
+
+    posix_spawn cannot change directory or set a parent-death signal, so
+    when needed the command is prefixed with `sh -c 'cd ...'` and
+    death_signal_prefix(). Those run in the child and add nothing to the
+    time the caller is blocked.
+    """
+
+    def __init__(self, args, cwd=None, stderr=PIPE):
+        self.args = args
+        self._chunks = ([], [])
+
+        argv = list(args)
+        prefix = death_signal_prefix()
+        if cwd or prefix:
+            check_executable(argv[0])
+        if cwd:
+            argv = ['/bin/sh', '-c', 'cd -- "$0" && exec "$@"', cwd] + argv
+        argv = prefix + argv
+
+        stdout_r, stdout_w = os.pipe()
+        file_actions = [
+            (os.POSIX_SPAWN_OPEN, 0, os.devnull, os.O_RDONLY, 0),
+            (os.POSIX_SPAWN_DUP2, stdout_w, 1),
+        ]
+        stderr_r = stderr_w = None
+        if stderr == DEVNULL:
+            file_actions.append((os.POSIX_SPAWN_OPEN, 2, os.devnull, os.O_WRONLY, 0))
+        else:
+            stderr_r, stderr_w = os.pipe()
+            file_actions.append((os.POSIX_SPAWN_DUP2, stderr_w, 2))
+        spawn_function = os.posix_spawn if os.path.dirname(argv[0]) else os.posix_spawnp
+        try:
+            self.pid = spawn_function(
+                argv[0], argv, minimal_environment(), file_actions=file_actions,
+                setsid=True, setsigdef=(signal.SIGPIPE, signal.SIGXFSZ),
+            )
+        except BaseException:
+            os.close(stdout_r)
+            if stderr_r is not None:
+                os.close(stderr_r)
+            raise
+        finally:
+            os.close(stdout_w)
+            if stderr_w is not None:
+                os.close(stderr_w)
+
+        self.stdout = os.fdopen(stdout_r, 'rb', 0)
+        self.stderr = os.fdopen(stderr_r, 'rb', 0) if stderr_r is not None else None
+
+    def _reap(self, flags):
+        pid, status, rusage = os.wait4(self.pid, flags)
+        if pid:
+            self.returncode = os.waitstatus_to_exitcode(status)
+            self.rusage = rusage
+
+    def poll(self):
+        if self.returncode is None:
+            self._reap(os.WNOHANG)
+        return self.returncode
+
+    def wait(self, timeout=None):
+        if self.returncode is not None:
+            return self.returncode
+        if timeout is None:
+            self._reap(0)
+            return self.returncode
+
+        deadline = time.monotonic() + timeout
+        delay = 0.0005
+        while self.poll() is None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutExpired(self.args, timeout)
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, 0.05)
+        return self.returncode
+
+
+def spawn(cmdlist, stderr=PIPE, **kwargs):
+    """
+    Start a dialog process with stdout and stderr connected to pipes.
+
+    Args:
+        cmdlist (list): The command line.
+        stderr (int, optional): PIPE (default), or DEVNULL to discard the
+            dialog's stderr; `process.stderr` is then None.
+        **kwargs: Extra arguments; only `cwd` is supported by the
+            posix_spawn and launcher methods.
+
+    Returns:
+        A Popen, or a SpawnedProcess or LauncherProcess depending on
+        spawn_method. Without a running launcher, 'launcher' uses Popen.
+    """
+    if spawn_method == 'posix_spawn':
+        return SpawnedProcess(cmdlist, stderr=stderr, **kwargs)
+    if spawn_method == 'launcher':
+        from crossfiledialog import launcher
+        if launcher.running():
+            return launcher.LauncherProcess(cmdlist, stderr=stderr, **kwargs)
+    return DialogPopen(with_death_signal(cmdlist), stdout=PIPE, stderr=stderr, **spawn_kwargs(), **kwargs)
+
+
+def signal_group(pid, sig):
+    try:
+        os.killpg(pid, sig)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def terminate(process):
+    """
+    Close a running dialog by sending SIGTERM to its whole process group.
+
+    Safe to call from any thread, and a no-op once the dialog has exited.
+
+    Args:
+        process: The process handed to an on_spawn callback.
+    """
+    if process.returncode is None:
+        signal_group(process.pid, signal.SIGTERM)
+
+
+def kill(process):
+    if process.returncode is None:
+        signal_group(process.pid, signal.SIGKILL)
+
+
+def failed(returncode):
+    """
+    Whether a dialog that exited with `returncode` failed, as opposed to
+    returning a selection or being cancelled or closed.
+    """
+    if returncode in failure_statuses:
+        return True
+    return returncode < 0 and -returncode not in closing_signals
+
+
+def display_error(stderr):
+    """
+    Whether `stderr` (bytes) says the dialog program could not reach the display.
+    """
+    stderr = stderr.lower()
+    return any(message in stderr for message in display_errors)
+
+
+def communicate(process, timeout=None):
+    """
+    Wait for a dialog process and collect its output.
+
+    Raises:
+        DialogTimeout: If the dialog is still open after `timeout` seconds.
+            The dialog is closed before the exception is raised.
+    """
+    try:
+        return process.communicate(timeout=timeout)
+    except TimeoutExpired:
+        terminate(process)
+        try:
+            process.communicate(timeout=kill_grace)
+        except TimeoutExpired:
+            kill(process)
+            process.communicate()
+        raise DialogTimeout("No answer from the dialog within {0} seconds".format(timeout))
+
+
+__all__ = [
+    'DialogPopen', 'PipeProcess', 'SpawnedProcess', 'spawn', 'spawn_kwargs', 'with_death_signal', 'communicate',
+    'terminate', 'kill', 'failed', 'display_error',
+]
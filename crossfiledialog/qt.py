@@ -0,0 +1,328 @@
+"""
+In-process Qt dialogs for applications that already run a QApplication.
+
+The Qt binding is detected when a dialog is requested: the first of
+PySide6, PyQt6, PyQt5 and PySide2 that the host has imported and whose
+QApplication is running is used, and the dialog is parented to its active
+window. This module never imports a binding itself and never creates a
+QApplication, so it is only available inside Qt applications.
+
+Dialogs are shown on the application's GUI thread. Called from another
+thread, the request is queued to the GUI thread and the caller waits.
+"""
+import os
+import sys
+import threading
+
+from concurrent.futures import Future, TimeoutError
+
+from crossfiledialog import history, metrics, strings
+from crossfiledialog.exceptions import BackendUnavailable, DialogTimeout, FileDialogException
+from crossfiledialog.filters import compile_filter
+from crossfiledialog.paths import check_mode, from_str
+
+
+class QtException(FileDialogException):
+    pass
+
+
+class QtUnavailable(QtException, BackendUnavailable):
+    pass
+
+
+BINDINGS = ('PySide6', 'PyQt6', 'PyQt5', 'PySide2')
+
+_lock = threading.Lock()
+# binding -> (QApplication, Invoker living on its GUI thread)
+_invokers = dict()
+
+
+class _Qt:
+    __slots__ = ('name', 'QtCore', 'QtWidgets', 'app')
+
+    def __init__(self, name, QtCore, QtWidgets, app):
+        self.name = name
+        self.QtCore = QtCore
+        self.QtWidgets = QtWidgets
+        self.app = app
+
+
+def get_preferred_cwd(kind='open'):
+    possible_cwd = os.environ.get('FILEDIALOG_CWD', '')
+    if possible_cwd:
+        return possible_cwd
+
+    return history.recent(kind)
+
+
+def set_last_cwd(cwd, kind='open'):
+    history.remember(kind, os.path.dirname(os.fsdecode(cwd)))
+
+
+def find_application():
+    """
+    The running QApplication of a binding the host imported.
+
+    Returns:
+        The binding's Qt namespace, or None if no QApplication is running.
+    """
+    for name in BINDINGS:
+        QtWidgets = sys.modules.get(name + '.QtWidgets')
+        if QtWidgets is None:
+            continue
+        app = QtWidgets.QApplication.instance()
+        # A QCoreApplication or QGuiApplication cannot show widgets.
+        if isinstance(app, QtWidgets.QApplication):
+            return _Qt(name, sys.modules[name + '.QtCore'], QtWidgets, app)
+    return None
+
+
+def find_qtcore():
+    """
+    QtCore of the binding whose application is running, or else of the
+    first binding the host imported.
+
+    Returns:
+        module: The binding's QtCore, or None if the host imported none.
+    """
+    imported = [sys.modules[name + '.QtCore'] for name in BINDINGS if name + '.QtCore' in sys.modules]
+    for QtCore in imported:
+        if QtCore.QCoreApplication.instance() is not None:
+            return QtCore
+    return imported[0] if imported else None
+
+
+def available():
+    """
+    Whether the host process runs a QApplication.
+    """
+    return find_application() is not None
+
+
+def _enum(owner, scope, name):
+    # PyQt6 only has scoped enum members; PyQt5 and PySide2 may lack the scope.
+    try:
+        return getattr(getattr(owner, scope), name)
+    except AttributeError:
+        return getattr(owner, name)
+
+
+def _invoker(qt):
+    with _lock:
+        app, invoker = _invokers.get(qt.name, (None, None))
+        if app is qt.app:
+            return invoker
+
+        QtCore = qt.QtCore
+        Signal = getattr(QtCore, 'Signal', None) or QtCore.pyqtSignal
+        Slot = getattr(QtCore, 'Slot', None) or QtCore.pyqtSlot
+
+        class Invoker(QtCore.QObject):
+            request = Signal(object)
+
+            def __init__(self):
+                super().__init__()
+                self.request.connect(self.run, _enum(QtCore.Qt, 'ConnectionType', 'QueuedConnection'))
+
+            @Slot(object)
+            def run(self, job):
+                job()
+
+        invoker = Invoker()
+        invoker.moveToThread(qt.app.thread())
+        _invokers[qt.name] = (qt.app, invoker)
+        return invoker
+
+
+def _dialog(qt, request):
+    QFileDialog = qt.QtWidgets.QFileDialog
+    dialog = QFileDialog(qt.app.activeWindow(), request['title'], request['start_dir'] or '')
+    kind = request['kind']
+    if kind == 'save_file':
+        dialog.setAcceptMode(_enum(QFileDialog, 'AcceptMode', 'AcceptSave'))
+        dialog.setFileMode(_enum(QFileDialog, 'FileMode', 'AnyFile'))
+    elif kind == 'choose_folder':
+        dialog.setFileMode(_enum(QFileDialog, 'FileMode', 'Directory'))
+        dialog.setOption(_enum(QFileDialog, 'Option', 'ShowDirsOnly'), True)
+    elif kind == 'open_multiple':
+        dialog.setFileMode(_enum(QFileDialog, 'FileMode', 'ExistingFiles'))
+    else:
+        dialog.setFileMode(_enum(QFileDialog, 'FileMode', 'ExistingFile'))
+    if request['filters']:
+        dialog.setNameFilters(list(request['filters']))
+    return dialog
+
+
+def _exec(qt, request, timeout, opened):
+    # Runs on the GUI thread.
+    dialog = _dialog(qt, request)
+    opened.append(dialog)
+    expired = []
+    if timeout is not None:
+        def expire():
+            expired.append(True)
+            dialog.reject()
+
+        # Owned by the dialog, so it cannot fire after the dialog is gone.
+        timer = qt.QtCore.QTimer(dialog)
+        timer.setSingleShot(True)
+        timer.timeout.connect(expire)
+        timer.start(max(0, int(timeout * 1000)))
+    try:
+        accepted = bool((getattr(dialog, 'exec', None) or dialog.exec_)())
+        selected = dialog.selectedFiles() if accepted else []
+    finally:
+        opened.remove(dialog)
+        dialog.deleteLater()
+    if expired:
+        raise DialogTimeout("No answer from the dialog within {0} seconds".format(timeout))
+    return selected
+
+
+def _queued(qt, request, timeout):
+    invoker = _invoker(qt)
+    future = Future()
+    opened = []
+
+    def open_dialog():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(_exec(qt, request, None, opened))
+        except BaseException as e:
+            future.set_exception(e)
+
+    def close_dialog():
+        for dialog in list(opened):
+            dialog.reject()
+
+    invoker.request.emit(open_dialog)
+    try:
+        return future.result(timeout)
+    except TimeoutError:
+        # Stops a dialog that has not been opened yet; close_dialog() the others.
+        future.cancel()
+        invoker.request.emit(close_dialog)
+        raise DialogTimeout("No answer from the dialog within {0} seconds".format(timeout)) from None
+
+
+def _show(kind, title, start_dir, filter, timeout, paths):
+    check_mode(paths)
+    qt = find_application()
+    if qt is None:
+        raise QtUnavailable("No QApplication is running")
+    spec = compile_filter(filter)
+    request = dict(
+        kind=kind, title=title, start_dir=start_dir or get_preferred_cwd(history.kinds[kind]),
+        filters=spec.qt_name_filters() if spec is not None else (),
+    )
+
+    metrics.mark('command')
+    if qt.QtCore.QThread.currentThread() == qt.app.thread():
+        selected = _exec(qt, request, timeout, [])
+    else:
+        selected = _queued(qt, request, timeout)
+    metrics.mark('exited')
+    # Qt uses '/' on every platform.
+    return [from_str(os.path.normpath(path), paths) for path in selected]
+
+
+@metrics.instrument('qt')
+def open_file(title=strings.open_file, start_dir=None, filter=None, timeout=None, on_spawn=None, paths='str'):
+    """
+    Open a file selection dialog for selecting a file using the host's QApplication.
+
+    Args:
+        title (str, optional): The title of the file selection dialog.
+            Default is 'Choose a file'
+        start_dir (str, optional): The starting directory for the dialog.
+        filter (str, list, dict, optional): The filter for file types to display.
+        timeout (float, optional): Seconds after which the dialog is closed and
+            DialogTimeout is raised. Default is to wait indefinitely.
+        on_spawn (callable, optional): Never called; no process is started.
+        paths (str, optional): 'str' (default), 'surrogateescape' or 'bytes'.
+
+    Returns:
+        str: The selected file's path.
+    """
+    selected = _show('open_file', title, start_dir, filter, timeout, paths)
+    result = selected[0] if selected else ''
+    if result:
+        set_last_cwd(result)
+    return result
+
+
+@metrics.instrument('qt')
+def open_multiple(title=strings.open_multiple, start_dir=None, filter=None, timeout=None, on_spawn=None, paths='str'):
+    """
+    Open a file selection dialog for selecting multiple files using the host's QApplication.
+
+    Args:
+        title (str, optional): The title of the file selection dialog.
+            Default is 'Choose one or more files'
+        start_dir (str, optional): The starting directory for the dialog.
+        filter (str, list, dict, optional): The filter for file types to display.
+        timeout (float, optional): Seconds after which the dialog is closed and
+            DialogTimeout is raised. Default is to wait indefinitely.
+        on_spawn (callable, optional): Never called; no process is started.
+        paths (str, optional): 'str' (default), 'surrogateescape' or 'bytes'.
+
+    Returns:
+        list[str]: A list of selected file paths.
+    """
+    result_list = _show('open_multiple', title, start_dir, filter, timeout, paths)
+    if result_list:
+        set_last_cwd(result_list[0])
+        return result_list
+    return []
+
+
+@metrics.instrument('qt')
+def save_file(title=strings.save_file, start_dir=None, timeout=None, on_spawn=None, paths='str'):
+    """
+    Open a save file dialog using the host's QApplication.
+
+    Args:
+        title (str, optional): The title of the save file dialog.
+            Default is 'Enter the name of the file to save to'
+        start_dir (str, optional): The starting directory for the dialog.
+        timeout (float, optional): Seconds after which the dialog is closed and
+            DialogTimeout is raised. Default is to wait indefinitely.
+        on_spawn (callable, optional): Never called; no process is started.
+        paths (str, optional): 'str' (default), 'surrogateescape' or 'bytes'.
+
+    Returns:
+        str: The selected file's path for saving.
+    """
+    selected = _show('save_file', title, start_dir, None, timeout, paths)
+    result = selected[0] if selected else ''
+    if result:
+        set_last_cwd(result, 'save')
+    return result
+
+
+@metrics.instrument('qt')
+def choose_folder(title=strings.choose_folder, start_dir=None, timeout=None, on_spawn=None, paths='str'):
+    """
+    Open a folder selection dialog using the host's QApplication.
+
+    Args:
+        title (str, optional): The title of the folder selection dialog.
+            Default is 'Choose a folder'
+        start_dir (str, optional): The starting directory for the dialog.
+        timeout (float, optional): Seconds after which the dialog is closed and
+            DialogTimeout is raised. Default is to wait indefinitely.
+        on_spawn (callable, optional): Never called; no process is started.
+        paths (str, optional): 'str' (default), 'surrogateescape' or 'bytes'.
+
+    Returns:
+        str: The selected folder's path.
+    """
+    selected = _show('choose_folder', title, start_dir, None, timeout, paths)
+    result = selected[0] if selected else ''
+    if result:
+        set_last_cwd(result, 'folder')
+    return result
+
+
+__all__ = ['open_file', 'open_multiple', 'save_file', 'choose_folder', 'available', 'find_application']
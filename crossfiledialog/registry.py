@@ -0,0 +1,411 @@
+"""
+The table of dialog backends and how one is picked.
+
+Each backend is registered with a priority, the platforms it runs on and,
+for backends that drive an external program, the executable it needs.
+The highest-priority backend whose platform matches and whose executable
+is on PATH is used; a backend listed for the current desktop
+(XDG_CURRENT_DESKTOP or DESKTOP_SESSION) ranks above all others, except
+hosted backends. A hosted backend shows dialogs through a toolkit the host
+application already runs (qt inside a QApplication), so it ranks first
+whenever it is available, and hosted() checks for it again on every
+dialog. Backends registered without a priority are only used when asked
+for by name.
+
+When a backend cannot start (its program is missing or not executable,
+or it cannot reach the display or the bus), the dialog is shown by the
+next one and the backend is skipped for `retry_after` seconds; see
+fallback(). Other errors, such as a dialog program that crashed, are raised.
+
+Backends that drive a program ask capabilities() what the installed
+version supports. It runs the backend's probe once per program version and
+caches the result in memory and in
+$XDG_CACHE_HOME/crossfiledialog/capabilities.json.
+
+Other packages can add backends through the 'crossfiledialog.backends'
+entry point group; the entry point's name is the backend's name and its
+value the module. Entry points are only read when a backend is picked and
+the module is only imported when it is tried, so installing such a package
+costs nothing until then. The module may define available() to decline.
+"""
+import errno
+import importlib
+import json
+import os
+import sys
+import threading
+import time
+
+from crossfiledialog.exceptions import BackendUnavailable, FileDialogException, NoImplementationFoundException
+from crossfiledialog.process import display_error
+from crossfiledialog.resolver import which
+
+
+# Priority given to backends that come from entry points: below the native
+# dialog programs, above the last resort (tk).
+entry_point_priority = 50
+
+# Seconds a backend that could not start is skipped before it is tried again.
+retry_after = 60
+
+# Exit statuses of a program that could not be executed, e.g. by a wrapper
+# such as setpriv or sh.
+startup_statuses = frozenset((126, 127))
+
+# FILEDIALOG_PROBE_CACHE=0 keeps probe results in memory only.
+persistent = os.environ.get('FILEDIALOG_PROBE_CACHE', '1') != '0'
+
+
+class Backend:
+    """
+    A registered backend.
+
+    Attributes:
+        name (str): The name FILEDIALOG_BACKEND selects it by.
+        module (str): The module implementing the public API.
+        priority (int): Higher is tried first; None for backends that are
+            only used when asked for by name.
+        platforms (tuple): sys.platform values it runs on; None for any.
+        binary (str): The executable it needs on PATH, if any. Once found,
+            its path is stored in the module's `<binary>_binary`.
+        desktops (tuple): Desktops (lower case) on which it ranks first.
+        hosted (bool): Uses the host application's own toolkit; ranks
+            above desktop preferences.
+    """
+
+    __slots__ = ('name', 'module', 'priority', 'platforms', 'binary', 'desktops', 'hosted')
+
+    def __init__(self, name, module, priority=None, platforms=None, binary=None, desktops=(), hosted=False):
+        self.name = name
+        self.module = module
+        self.priority = priority
+        self.platforms = platforms
+        self.binary = binary
+        self.desktops = desktops
+        self.hosted = hosted
+
+    def __repr__(self):
+        return 'Backend({0!r}, {1!r}, priority={2!r})'.format(self.name, self.module, self.priority)
+
+
+backends = dict()
+# Names of backends that could not start -> time.monotonic() until which
+# they are skipped.
+failed = dict()
+
+_lock = threading.Lock()
+_entry_points_loaded = False
+# binary path -> capabilities, for this process
+_capabilities = dict()
+
+
+def register(name, module, priority=None, platforms=None, binary=None, desktops=(), hosted=False):
+    """
+    Add a backend, or replace the one registered under `name`.
+
+    Args:
+        name (str): The backend's name.
+        module (str): The module implementing open_file(), open_multiple(),
+            save_file() and choose_folder().
+        priority (int, optional): Higher is tried first. Default is to use
+            the backend only when asked for by name.
+        platforms (tuple, optional): sys.platform values it runs on.
+        binary (str, optional): An executable it needs on PATH.
+        desktops (tuple, optional): Desktops on which it ranks first; '*'
+            for any desktop session.
+        hosted (bool, optional): The backend uses a toolkit the host
+            application runs, and its available() only says whether it runs
+            one right now. Default is False.
+    """
+    backends[name] = Backend(
+        name, module, priority, platforms, binary, tuple(d.lower() for d in desktops), hosted,
+    )
+
+
+def _load_entry_points():
+    global _entry_points_loaded
+    if _entry_points_loaded:
+        return
+    _entry_points_loaded = True
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:
+        return
+    try:
+        found = entry_points(group='crossfiledialog.backends')
+    except TypeError:
+        # Python < 3.10
+        found = entry_points().get('crossfiledialog.backends', ())
+    for entry_point in found:
+        if entry_point.name not in backends:
+            register(entry_point.name, entry_point.value, entry_point_priority)
+
+
+def _current_desktops():
+    desktops = set(os.environ.get('XDG_CURRENT_DESKTOP', '').lower().split(':'))
+    desktops.add(os.environ.get('DESKTOP_SESSION', '').lower())
+    desktops.discard('')
+    return desktops
+
+
+def ranked():
+    """
+    The automatically selectable backends for this platform, best first.
+
+    Returns:
+        list[Backend]: Including ones whose executable is missing.
+    """
+    _load_entry_points()
+    desktops = _current_desktops()
+    candidates = [
+        backend for backend in backends.values()
+        if backend.priority is not None and (backend.platforms is None or sys.platform in backend.platforms)
+    ]
+
+    def key(backend):
+        preferred = bool(desktops.intersection(backend.desktops)) or ('*' in backend.desktops and bool(desktops))
+        return backend.hosted, preferred, backend.priority
+
+    candidates.sort(key=key, reverse=True)
+    return candidates
+
+
+def load(name):
+    """
+    Import the backend registered as `name`, without checking that it works.
+
+    Raises:
+        NoImplementationFoundException: If no backend has that name.
+    """
+    _load_entry_points()
+    if name not in backends:
+        raise NoImplementationFoundException("Unknown backend {0!r}".format(name))
+    return importlib.import_module(backends[name].module)
+
+
+def _try(backend):
+    binary = None
+    if backend.binary:
+        binary = which(backend.binary)
+        if binary is None:
+            return None
+    try:
+        module = importlib.import_module(backend.module)
+    except ImportError:
+        return None
+    available = getattr(module, 'available', None)
+    if available is not None and not available():
+        return None
+    if binary is not None and hasattr(module, backend.binary + '_binary'):
+        setattr(module, backend.binary + '_binary', binary)
+    return module
+
+
+def select():
+    """
+    Find the best backend for this platform that did not just fail to start.
+
+    Returns:
+        module: The backend module.
+
+    Raises:
+        NoImplementationFoundException: If no usable backend is available.
+    """
+    now = time.monotonic()
+    for backend in ranked():
+        if failed.get(backend.name, 0) > now:
+            continue
+        module = _try(backend)
+        if module is not None:
+            return module
+    raise NoImplementationFoundException()
+
+
+def hosted():
+    """
+    The hosted backend to use for the next dialog, if the host application
+    runs its toolkit now. Cheap enough to call on every dialog: it may have
+    started after a backend was picked.
+
+    Returns:
+        module: The backend module, or None.
+    """
+    now = time.monotonic()
+    for backend in backends.values():
+        if backend.hosted and failed.get(backend.name, 0) <= now and \
+                (backend.platforms is None or sys.platform in backend.platforms):
+            module = _try(backend)
+            if module is not None:
+                return module
+    return None
+
+
+def name_of(module):
+    for backend in backends.values():
+        if backend.module == module.__name__:
+            return backend.name
+    return module.__name__.rsplit('.', 1)[-1]
+
+
+def _is_startup_failure(backend, error):
+    if isinstance(error, BackendUnavailable):
+        return True
+    if isinstance(error, FileDialogException):
+        return error.returncode in startup_statuses or bool(error.stderr and display_error(error.stderr))
+    if isinstance(error, OSError) and error.errno in (errno.ENOENT, errno.EACCES):
+        # The executable itself, not e.g. a start directory that does not exist.
+        return bool(backend.binary) and error.filename is not None and \
+            os.path.basename(os.fsdecode(error.filename)) == backend.binary
+    return False
+
+
+def fallback(module, error):
+    """
+    Skip `module` for a while after it raised `error`, and find the next backend.
+
+    Only errors that mean the backend could not start lead to a fallback:
+    BackendUnavailable, OSError for its executable (missing, not
+    executable), exit status 126 or 127, and a program that reports it
+    cannot open the display. Anything else, and any error of a backend
+    chosen by name (FILEDIALOG_BACKEND, or one registered without a
+    priority), re-raises `error`: a dialog that crashed or was killed says
+    nothing about the next one.
+
+    Returns:
+        module: The backend to retry with.
+
+    Raises:
+        The original error, if there is no fallback for it.
+    """
+    name = name_of(module)
+    backend = backends.get(name)
+    if backend is None or backend.priority is None or os.environ.get('FILEDIALOG_BACKEND') or \
+            not _is_startup_failure(backend, error):
+        raise error
+    with _lock:
+        failed[name] = time.monotonic() + retry_after
+    try:
+        return select()
+    except NoImplementationFoundException:
+        raise error from None
+
+
+def cache_dir():
+    """The directory for crossfiledialog's caches."""
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~\\AppData\\Local')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, 'crossfiledialog')
+
+
+def cache_file():
+    return os.path.join(cache_dir(), 'capabilities.json')
+
+
+def _signature(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _read_cache():
+    try:
+        with open(cache_file(), encoding='utf-8') as fp:
+            cache = json.load(fp)
+    except (OSError, ValueError):
+        return dict()
+    if not isinstance(cache, dict):
+        return dict()
+    # Edited by hand or written by another version: skip what is not ours.
+    return {path: entry for path, entry in cache.items() if isinstance(entry, dict)}
+
+
+def _write_cache(binary, signature, capabilities):
+    cache = _read_cache()
+    # Drop programs that were removed or replaced since.
+    cache = {path: entry for path, entry in cache.items() if _signature(path) == entry.get('signature')}
+    cache[binary] = dict(signature=signature, capabilities=capabilities)
+    path = cache_file()
+    temporary = '{0}.{1}.tmp'.format(path, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(temporary, 'w', encoding='utf-8') as fp:
+            json.dump(cache, fp, indent=1, sort_keys=True)
+        os.replace(temporary, path)
+    except OSError:
+        # Like the history, the cache must not break dialogs on a read-only home.
+        pass
+
+
+def capabilities(binary, probe):
+    """
+    What the program at `binary` supports, as reported by `probe`.
+
+    The probe runs once per installed version of the program: results are
+    kept in memory and on disk, keyed by the program's path, size and
+    modification time.
+
+    Args:
+        binary (str): The program's path.
+        probe (callable): Called with `binary`; returns a JSON-serialisable dict.
+
+    Returns:
+        dict: The probe's result; empty if it failed.
+    """
+    found = _capabilities.get(binary)
+    if found is not None:
+        return found
+
+    with _lock:
+        found = _capabilities.get(binary)
+        if found is not None:
+            return found
+        signature = _signature(binary)
+        entry = _read_cache().get(binary) if persistent else None
+        if entry is not None and signature is not None and entry.get('signature') == signature and \
+                isinstance(entry.get('capabilities'), dict):
+            found = entry['capabilities']
+        else:
+            try:
+                found = probe(binary)
+            except (OSError, FileDialogException):
+                found = {}
+            else:
+                if persistent and signature is not None:
+                    _write_cache(binary, signature, found)
+        _capabilities[binary] = found
+    return found
+
+
+def forget():
+    """Forget probe results and failed backends, in memory and on disk."""
+    with _lock:
+        _capabilities.clear()
+        failed.clear()
+        try:
+            os.unlink(cache_file())
+        except OSError:
+            pass
+
+
+# Only available inside a running QApplication, where it is the best choice.
+register('qt', 'crossfiledialog.qt', 110, hosted=True)
+register('win32', 'crossfiledialog.win32', 100, platforms=('win32',))
+register('osascript', 'crossfiledialog.osascript', 100, platforms=('darwin',))
+register('portal', 'crossfiledialog.portal', 90, platforms=('linux',), desktops=('*',))
+register('gtk', 'crossfiledialog.gtk', 80, platforms=('linux',))
+register('zenity', 'crossfiledialog.zenity', 70, platforms=('linux',), binary='zenity')
+register('kdialog', 'crossfiledialog.kdialog', 60, platforms=('linux',), binary='kdialog', desktops=('kde',))
+# The last resort: tkinter ships with Python.
+register('tk', 'crossfiledialog.tk', 10)
+register('resident', 'crossfiledialog.resident')
+register('testing', 'crossfiledialog.testing')
+
+
+__all__ = [
+    'Backend', 'register', 'ranked', 'load', 'select', 'hosted', 'fallback', 'capabilities', 'forget', 'cache_dir', 'cache_file',
+    'backends', 'failed',
+]
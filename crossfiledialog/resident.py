@@ -0,0 +1,259 @@
+import os
+import sys
+import threading
+import time
+
+from subprocess import PIPE, Popen
+
+from crossfiledialog import history, metrics, registry, strings
+from crossfiledialog.exceptions import (
+    BackendUnavailable, DialogTimeout, FileDialogException, NoImplementationFoundException,
+)
+from crossfiledialog.filters import compile_filter
+from crossfiledialog.framing import read_frame, write_frame
+from crossfiledialog.paths import from_str
+from crossfiledialog.process import spawn_kwargs, terminate
+from crossfiledialog.stderr import Capture
+
+
+class ResidentException(FileDialogException):
+    pass
+
+
+class ResidentUnavailable(ResidentException, BackendUnavailable):
+    pass
+
+
+# Seconds without a request after which the helper exits on its own.
+idle_timeout = float(os.environ.get('FILEDIALOG_RESIDENT_IDLE_TIMEOUT', '300'))
+
+# The module run as the helper, as `python -m helper_module IDLE_TIMEOUT`.
+helper_module = 'crossfiledialog.gtkhelper'
+
+helper = None
+# The backend used while the helper cannot start, and the time.monotonic()
+# after which the helper is tried again.
+fallback = None
+retry_at = None
+_lock = threading.Lock()
+
+
+def get_preferred_cwd(kind='open'):
+    possible_cwd = os.environ.get('FILEDIALOG_CWD', '')
+    if possible_cwd:
+        return possible_cwd
+
+    return history.recent(kind)
+
+
+def set_last_cwd(cwd, kind='open'):
+    history.remember(kind, os.path.dirname(os.fsdecode(cwd)))
+
+
+def _start_helper():
+    # The helper outlives the dialog that starts it, so its stderr is not
+    # collected per dialog: 'forward' leaves it on ours, and the background
+    # policies read it for as long as the helper runs.
+    capture = Capture('resident')
+    process = Popen(
+        [sys.executable, '-m', helper_module, str(idle_timeout)],
+        stdin=PIPE, stdout=PIPE, stderr=None if capture.forward else capture.target, bufsize=0, **spawn_kwargs()
+    )
+    capture.start(process)
+    with capture:
+        ready = read_frame(process.stdout)
+        if not ready or 'error' in ready:
+            terminate(process)
+            process.wait()
+            raise ResidentUnavailable("Dialog helper failed to start: {0}".format(
+                ready['error'] if ready else "no response"
+            ))
+    return process
+
+
+def stop_helper():
+    """
+    Shut the helper process down. The next dialog starts a new one.
+    """
+    global helper
+    with _lock:
+        if helper is not None:
+            helper.stdin.close()
+            helper.wait()
+            helper = None
+
+
+def _request(payload):
+    global helper
+    with _lock:
+        # A helper that reached its idle timeout exits between requests;
+        # the second attempt then runs on a freshly started one.
+        for _ in range(2):
+            if helper is None or helper.poll() is not None:
+                helper = _start_helper()
+            try:
+                write_frame(helper.stdin, payload)
+                response = read_frame(helper.stdout)
+            except BrokenPipeError:
+                response = None
+            if response is not None:
+                break
+            helper.wait()
+            helper = None
+        else:
+            raise ResidentUnavailable("Dialog helper exited unexpectedly")
+
+    if 'error' in response:
+        raise ResidentException(response['error'])
+    if response['timeout']:
+        raise DialogTimeout("No answer from the dialog within {0} seconds".format(payload['timeout']))
+    return response['paths']
+
+
+def _filter_groups(filter):
+    spec = compile_filter(filter)
+    if spec is None:
+        return []
+    return [[label, list(patterns)] for label, patterns in spec.labelled_groups()]
+
+
+def _show(kind, title, start_dir, filter, timeout, on_spawn, paths):
+    global fallback, retry_at
+    if fallback is not None and time.monotonic() >= retry_at:
+        fallback = retry_at = None
+    if fallback is None:
+        payload = dict(
+            kind=kind, title=title, start_dir=start_dir or get_preferred_cwd(history.kinds[kind]),
+            filters=_filter_groups(filter), timeout=timeout,
+        )
+        try:
+            metrics.mark('command')
+            selected = _request(payload)
+            metrics.mark('exited')
+            return [from_str(path, paths) for path in selected]
+        except ResidentUnavailable as e:
+            # The helper could not start (no PyGObject, no display) or died
+            # and could not be restarted: use the best other backend until
+            # registry.retry_after seconds have passed.
+            try:
+                fallback = registry.select()
+            except NoImplementationFoundException:
+                raise e from None
+            retry_at = time.monotonic() + registry.retry_after
+
+    kwargs = dict(timeout=timeout, on_spawn=on_spawn, paths=paths)
+    if filter is not None:
+        kwargs['filter'] = filter
+    result = getattr(fallback, kind)(title, start_dir, **kwargs)
+    if kind == 'open_multiple':
+        return result
+    return [result] if result else []
+
+
+@metrics.instrument('resident')
+def open_file(title=strings.open_file, start_dir=None, filter=None, timeout=None, on_spawn=None, paths='str'):
+    """
+    Open a file selection dialog for selecting a file using the resident GTK helper.
+
+    Args:
+        title (str, optional): The title of the file selection dialog.
+            Default is 'Choose a file'
+        start_dir (str, optional): The starting directory for the dialog.
+        filter (str, list, dict, optional): The filter for file types to display.
+        timeout (float, optional): Seconds after which the dialog is closed and
+            DialogTimeout is raised. Default is to wait indefinitely.
+        on_spawn (callable, optional): Only called when falling back to another
+            backend; the helper process is shared between dialogs.
+        paths (str, optional): 'bytes' returns paths encoded with
+            os.fsencode(); 'str' and 'surrogateescape' return them unchanged.
+
+    Returns:
+        str: The selected file's path.
+    """
+    selected = _show('open_file', title, start_dir, filter, timeout, on_spawn, paths)
+    result = selected[0] if selected else ''
+    if result:
+        set_last_cwd(result)
+    return result
+
+
+@metrics.instrument('resident')
+def open_multiple(title=strings.open_multiple, start_dir=None, filter=None, timeout=None, on_spawn=None, paths='str'):
+    """
+    Open a file selection dialog for selecting multiple files using the resident GTK helper.
+
+    Args:
+        title (str, optional): The title of the file selection dialog.
+            Default is 'Choose one or more files'
+        start_dir (str, optional): The starting directory for the dialog.
+        filter (str, list, dict, optional): The filter for file types to display.
+        timeout (float, optional): Seconds after which the dialog is closed and
+            DialogTimeout is raised. Default is to wait indefinitely.
+        on_spawn (callable, optional): Only called when falling back to another
+            backend; the helper process is shared between dialogs.
+        paths (str, optional): 'bytes' returns paths encoded with
+            os.fsencode(); 'str' and 'surrogateescape' return them unchanged.
+
+    Returns:
+        list[str]: A list of selected file paths.
+    """
+    result_list = _show('open_multiple', title, start_dir, filter, timeout, on_spawn, paths)
+    if result_list:
+        set_last_cwd(result_list[0])
+        return result_list
+    return []
+
+
+@metrics.instrument('resident')
+def save_file(title=strings.save_file, start_dir=None, timeout=None, on_spawn=None, paths='str'):
+    """
+    Open a save file dialog using the resident GTK helper.
+
+    Args:
+        title (str, optional): The title of the save file dialog.
+            Default is 'Enter the name of the file to save to'
+        start_dir (str, optional): The starting directory for the dialog.
+        timeout (float, optional): Seconds after which the dialog is closed and
+            DialogTimeout is raised. Default is to wait indefinitely.
+        on_spawn (callable, optional): Only called when falling back to another
+            backend; the helper process is shared between dialogs.
+        paths (str, optional): 'bytes' returns paths encoded with
+            os.fsencode(); 'str' and 'surrogateescape' return them unchanged.
+
+    Returns:
+        str: The selected file's path for saving.
+    """
+    selected = _show('save_file', title, start_dir, None, timeout, on_spawn, paths)
+    result = selected[0] if selected else ''
+    if result:
+        set_last_cwd(result, 'save')
+    return result
+
+
+@metrics.instrument('resident')
+def choose_folder(title=strings.choose_folder, start_dir=None, timeout=None, on_spawn=None, paths='str'):
+    """
+    Open a folder selection dialog using the resident GTK helper.
+
+    Args:
+        title (str, optional): The title of the folder selection dialog.
+            Default is 'Choose a folder'
+        start_dir (str, optional): The starting directory for the dialog.
+        timeout (float, optional): Seconds after which the dialog is closed and
+            DialogTimeout is raised. Default is to wait indefinitely.
+        on_spawn (callable, optional): Only called when falling back to another
+            backend; the helper process is shared between dialogs.
+        paths (str, optional): 'bytes' returns paths encoded with
+            os.fsencode(); 'str' and 'surrogateescape' return them unchanged.
+
+    Returns:
+        str: The selected folder's path.
+    """
+    selected = _show('choose_folder', title, start_dir, None, timeout, on_spawn, paths)
+    result = selected[0] if selected else ''
+    if result:
+        set_last_cwd(result, 'folder')
+    return result
+
+
+__all__ = ['open_file', 'open_multiple', 'save_file', 'choose_folder']
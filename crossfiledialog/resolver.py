@@ -0,0 +1,26 @@
+import os
+
+
+def which(command):
+    """
+    Locate an executable on PATH without listing any directories.
+
+    Every PATH entry is probed with a single stat/access call for the
+    candidate path, so the cost depends on the length of PATH and not on
+    the number of files in each directory.
+
+    Args:
+        command (str): The name of the executable to look for.
+
+    Returns:
+        str: The absolute path of the executable, or None if it was not found.
+    """
+    for d in os.environ.get('PATH', os.defpath).split(os.pathsep):
+        if not d:
+            continue
+        candidate = os.path.join(os.path.abspath(d), command)
+        if os.path.isfile(candidate) and os.access(candidate, os.X_OK):
+            return candidate
+
+
+__all__ = ['which']
@@ -0,0 +1,134 @@
+import os
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from stat import S_ISDIR, S_ISREG
+
+
+# Upper bound on concurrent stat() calls; enough to hide network file system
+# latency without flooding the server.
+stat_workers = 8
+
+# Paths stat()ed by one pool task. Large selections become a few hundred
+# tasks rather than one per file.
+batch_size = 64
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=stat_workers, thread_name_prefix='crossfiledialog-stat')
+        return _pool
+
+
+def _stat_batch(paths):
+    results = []
+    for path in paths:
+        try:
+            results.append(os.stat(path))
+        except OSError as e:
+            results.append(e)
+    return results
+
+
+class SelectedFile:
+    """
+    A path returned by a dialog, with its metadata fetched in the background.
+
+    The stat() calls for a whole selection are issued on a bounded thread
+    pool as soon as the dialog returns, so by the time the caller looks at
+    `size` or `mtime` they have usually completed. Accessing them waits
+    only for the batch the path belongs to.
+
+    SelectedFile implements os.PathLike and compares equal to other
+    SelectedFile objects with the same path; use `path` or str() where a
+    plain string is needed.
+    """
+
+    __slots__ = ('path', '_batch', '_index', '_realpath')
+
+    def __init__(self, path, batch=None, index=0):
+        self.path = path
+        self._batch = batch
+        self._index = index
+        self._realpath = None
+
+    def __fspath__(self):
+        return self.path
+
+    def __str__(self):
+        return os.fsdecode(self.path)
+
+    def __repr__(self):
+        return 'SelectedFile({0!r})'.format(self.path)
+
+    def __eq__(self, other):
+        if isinstance(other, SelectedFile):
+            return self.path == other.path
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.path)
+
+    def stat(self):
+        """
+        The os.stat_result for this path.
+
+        Raises:
+            OSError: If the path could not be stat()ed, e.g. because it was
+                removed after it was selected.
+        """
+        if self._batch is None:
+            self._batch = _get_pool().submit(_stat_batch, [self.path])
+            self._index = 0
+        result = self._batch.result()[self._index]
+        if isinstance(result, OSError):
+            raise result
+        return result
+
+    @property
+    def size(self):
+        return self.stat().st_size
+
+    @property
+    def mtime(self):
+        return self.stat().st_mtime
+
+    def is_dir(self):
+        return S_ISDIR(self.stat().st_mode)
+
+    def is_file(self):
+        return S_ISREG(self.stat().st_mode)
+
+    @property
+    def realpath(self):
+        """The canonical path, with symbolic links resolved. Resolved once."""
+        if self._realpath is None:
+            self._realpath = os.path.realpath(self.path)
+        return self._realpath
+
+
+def select_files(paths):
+    """
+    Wrap paths in SelectedFile objects and start fetching their metadata.
+
+    Args:
+        paths (list[str]): Paths as returned by a dialog.
+
+    Returns:
+        list[SelectedFile]: One object per path, in the same order.
+    """
+    pool = _get_pool()
+    selected = []
+    for start in range(0, len(paths), batch_size):
+        chunk = paths[start:start + batch_size]
+        batch = pool.submit(_stat_batch, chunk)
+        selected.extend(SelectedFile(path, batch, index) for index, path in enumerate(chunk))
+    return selected
+
+
+__all__ = ['SelectedFile', 'select_files']
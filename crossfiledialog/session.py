@@ -0,0 +1,243 @@
+import os
+import threading
+import time
+
+from crossfiledialog import history, registry, strings, wrapper
+from crossfiledialog.exceptions import DialogTimeout
+from crossfiledialog.stderr import set_policy as set_stderr_policy
+
+
+_counter_names = ('calls', 'selected', 'cancelled', 'errors', 'timeouts')
+
+
+class DialogSession:
+    """
+    Dialogs that share a backend, default arguments and directory memory.
+
+    Each session remembers the directory of the last selection per dialog
+    kind ('open', 'save', 'folder') for itself, so threads or windows that
+    use separate sessions do not change each other's starting directories.
+    The module-level functions use a default session that shares the
+    process-wide, persistent history instead (see crossfiledialog.history).
+
+    A session can be used from any number of threads. Calls do not take a
+    lock: the remembered directories are replaced with single dict stores
+    and the statistics are counted per thread and summed by stats().
+
+    Args:
+        backend (module or str, optional): The backend, or its name in
+            crossfiledialog.registry. Default is the one load_backend()
+            picks, falling back to the next one if it fails.
+        start_dir (str, optional): Where dialogs start until the session has
+            remembered a directory for their kind.
+        shared_history (bool, optional): Use and update the process-wide
+            history instead of keeping directories per session. Default is False.
+        coordinator (Coordinator, optional): Coalesces identical dialogs and
+            limits how many are open at once; may be shared between
+            sessions. See crossfiledialog.coordinator.
+        **defaults: Default keyword arguments for every dialog, such as
+            `filter`, `timeout`, `paths` or `stderr`. Arguments passed to a
+            call win.
+
+    Example:
+        images = DialogSession(filter={"Images": ["*.png", "*.jpg"]}, timeout=300)
+        picture = images.open_file("Choose a picture")
+    """
+
+    def __init__(self, backend=None, start_dir=None, shared_history=False, coordinator=None, **defaults):
+        if isinstance(backend, str):
+            backend = registry.load(backend)
+        self.backend = backend
+        self.start_dir = start_dir
+        self.shared_history = shared_history
+        self.coordinator = coordinator
+        self.defaults = defaults
+        self._recent = dict()
+        self._local = threading.local()
+        self._all_counters = []
+        self._counters_lock = threading.Lock()
+
+    def __repr__(self):
+        backend = self.backend.__name__.rsplit('.', 1)[-1] if self.backend is not None else None
+        return 'DialogSession(backend={0!r}, shared_history={1!r})'.format(backend, self.shared_history)
+
+    def remember(self, kind, directory):
+        """
+        Record `directory` as this session's most recent one for dialogs of `kind`.
+        """
+        self._recent[kind] = directory
+
+    def recent(self, kind):
+        """
+        This session's most recently used directory for dialogs of `kind`.
+
+        Returns:
+            str: The directory, the session's `start_dir` if none was
+                remembered or it no longer exists, or None.
+        """
+        directory = self._recent.get(kind)
+        if directory is not None and os.path.isdir(directory):
+            return directory
+        return self.start_dir
+
+    def forget(self):
+        """Forget the directories this session remembered."""
+        self._recent.clear()
+
+    def stats(self):
+        """
+        Counts of this session's dialogs.
+
+        Returns:
+            dict: 'calls', 'selected', 'cancelled', 'errors' and 'timeouts'
+                counts, and 'time', the seconds spent in dialogs.
+        """
+        with self._counters_lock:
+            all_counters = list(self._all_counters)
+        totals = dict.fromkeys(_counter_names, 0)
+        totals['time'] = 0.0
+        for counters in all_counters:
+            for name, value in counters.items():
+                totals[name] += value
+        return totals
+
+    def _counters(self):
+        counters = getattr(self._local, 'counters', None)
+        if counters is None:
+            # Each thread counts into its own dict, so the only lock taken
+            # is this one, once per thread.
+            counters = self._local.counters = dict.fromkeys(_counter_names, 0)
+            counters['time'] = 0.0
+            with self._counters_lock:
+                self._all_counters.append(counters)
+        return counters
+
+    def _call(self, function, title, start_dir, kwargs):
+        for name, value in self.defaults.items():
+            # Only for arguments this kind of dialog takes: a default filter
+            # does not apply to choose_folder().
+            if name in kwargs and kwargs[name] is None:
+                kwargs[name] = value
+        if kwargs.get('paths') is None:
+            kwargs['paths'] = 'str'
+        if title is None:
+            title = getattr(strings, function)
+        # Backends that start a program look the policy up themselves.
+        previous_policy = set_stderr_policy(kwargs.pop('stderr'))
+
+        counters = self._counters()
+        counters['calls'] += 1
+        previous = None if self.shared_history else history.set_owner(self)
+        start = time.monotonic()
+        try:
+            result = self._show(function, title, start_dir, kwargs)
+        except DialogTimeout:
+            counters['timeouts'] += 1
+            raise
+        except BaseException:
+            counters['errors'] += 1
+            raise
+        finally:
+            counters['time'] += time.monotonic() - start
+            set_stderr_policy(previous_policy)
+            if not self.shared_history:
+                history.set_owner(previous)
+        counters['selected' if result else 'cancelled'] += 1
+        return result
+
+    def _show(self, function, title, start_dir, kwargs):
+        if self.backend is not None:
+            return self._run(self.backend, function, title, start_dir, kwargs)
+
+        backend = wrapper.load_backend()
+        first_error = None
+        while True:
+            try:
+                return self._run(backend, function, title, start_dir, kwargs)
+            except Exception as e:
+                if first_error is None:
+                    first_error = e
+                try:
+                    # Raises e again unless another backend can take over.
+                    backend = wrapper.fall_back(backend, e)
+                except Exception:
+                    if e is first_error:
+                        raise
+                    # Keep the reason the preferred backend was given up on.
+                    raise e from first_error
+
+    def _run(self, backend, function, title, start_dir, kwargs):
+        if self.coordinator is None:
+            return getattr(backend, function)(title, start_dir, **kwargs)
+        return self._coordinated(backend, function, title, start_dir, kwargs)
+
+    def _coordinated(self, backend, function, title, start_dir, kwargs):
+        def show(timeout):
+            return getattr(backend, function)(title, start_dir, **dict(kwargs, timeout=timeout))
+
+        key = self.coordinator.request_key(function, title, start_dir, kwargs.get('filter'), kwargs['paths'])
+        return self.coordinator.call(key, show, kwargs.get('timeout'))
+
+    def open_file(self, title=None, start_dir=None, filter=None, timeout=None, on_spawn=None, paths=None,
+                  rich=False, stderr=None):
+        """
+        Open a file selection dialog for selecting a file.
+
+        Takes the same arguments as crossfiledialog.open_file(); those left
+        out are taken from the session's defaults.
+        """
+        result = self._call(
+            'open_file', title, start_dir,
+            dict(filter=filter, timeout=timeout, on_spawn=on_spawn, paths=paths, stderr=stderr),
+        )
+        if rich:
+            from crossfiledialog.selection import select_files
+            return select_files([result])[0] if result else None
+        return result
+
+    def open_multiple(self, title=None, start_dir=None, filter=None, timeout=None, on_spawn=None, paths=None,
+                      rich=False, stderr=None):
+        """
+        Open a file selection dialog for selecting multiple files.
+
+        Takes the same arguments as crossfiledialog.open_multiple(); those
+        left out are taken from the session's defaults.
+        """
+        result = self._call(
+            'open_multiple', title, start_dir,
+            dict(filter=filter, timeout=timeout, on_spawn=on_spawn, paths=paths, stderr=stderr),
+        )
+        if rich:
+            from crossfiledialog.selection import select_files
+            return select_files(result)
+        return result
+
+    def save_file(self, title=None, start_dir=None, timeout=None, on_spawn=None, paths=None, stderr=None,
+                  **kwargs):
+        """
+        Open a save file dialog.
+
+        Takes the same arguments as crossfiledialog.save_file(); those left
+        out are taken from the session's defaults.
+        """
+        kwargs.update(timeout=timeout, on_spawn=on_spawn, paths=paths, stderr=stderr)
+        return self._call('save_file', title, start_dir, kwargs)
+
+    def choose_folder(self, title=None, start_dir=None, timeout=None, on_spawn=None, paths=None, rich=False,
+                      stderr=None):
+        """
+        Open a folder selection dialog.
+
+        Takes the same arguments as crossfiledialog.choose_folder(); those
+        left out are taken from the session's defaults.
+        """
+        result = self._call(
+            'choose_folder', title, start_dir, dict(timeout=timeout, on_spawn=on_spawn, paths=paths, stderr=stderr),
+        )
+        if rich:
+            from crossfiledialog.selection import select_files
+            return select_files([result])[0] if result else None
+        return result
+
+
+__all__ = ['DialogSession']
@@ -0,0 +1,185 @@
+"""
+What happens to the stderr of dialog programs (zenity, kdialog, osascript).
+
+GTK and KDE print theme and portal warnings to stderr. The policy decides
+where they go:
+
+  'forward': collected and written to sys.stderr once the dialog closed.
+             The default, as in earlier versions.
+  'devnull': discarded by the operating system; the program's stderr is
+             /dev/null, so nothing is read at all.
+  'ring':    read by a background thread that keeps only the last
+             `ring_size` bytes.
+  'log':     read by a background thread that passes every line to the
+             'crossfiledialog.stderr' logger at `log_level`. A logger (any
+             object with a log() method) can be given instead of 'log'.
+
+With 'forward', 'ring' and 'log', an exception raised for a failed or timed
+out dialog carries what was kept in its `stderr` attribute (bytes), and its
+message includes it.
+
+The policy is chosen per call with `stderr=`, per DialogSession with
+DialogSession(stderr=...), or for the process with FILEDIALOG_STDERR.
+"""
+import os
+import threading
+
+from subprocess import DEVNULL, PIPE
+
+from crossfiledialog.exceptions import FileDialogException
+
+
+policies = ('forward', 'devnull', 'ring', 'log')
+
+default = os.environ.get('FILEDIALOG_STDERR', 'forward')
+
+# Bytes kept by 'ring' and 'log' for exceptions.
+ring_size = 16384
+
+logger_name = 'crossfiledialog.stderr'
+# logging.WARNING, without importing logging until it is needed.
+log_level = 30
+
+# Seconds to wait for the rest of the output after the program exited; a
+# child it left running may hold the pipe open.
+join_timeout = 1
+
+# `policy`: the policy of the dialog shown on the current thread, if any.
+_local = threading.local()
+
+
+def check_policy(policy):
+    if policy in policies or callable(getattr(policy, 'log', None)):
+        return
+    raise ValueError("stderr must be one of {0} or a logger, not {1!r}".format(', '.join(policies), policy))
+
+
+def set_policy(policy):
+    """
+    Use `policy` for dialogs shown on this thread (None for the default).
+
+    Returns:
+        The previous policy, to be restored afterwards.
+    """
+    if policy is not None:
+        check_policy(policy)
+    previous = getattr(_local, 'policy', None)
+    _local.policy = policy
+    return previous
+
+
+def current():
+    policy = getattr(_local, 'policy', None)
+    return policy if policy is not None else default
+
+
+class Capture:
+    """
+    The stderr of one dialog process, handled by the current policy.
+
+    Args:
+        program (str): Prefixed to logged lines.
+        policy (optional): The policy to use instead of the current one.
+
+    Example:
+        capture = Capture('zenity')
+        process = spawn(cmdlist, stderr=capture.target)
+        capture.start(process)
+        with capture:
+            stdout, stderr = communicate(process, timeout)
+            result = process_output(process.returncode, stdout, capture.collect(stderr),
+                                    forward=capture.forward)
+
+    Callers that read stderr themselves (an event loop, a shared process)
+    pass what they read to feed() instead of calling start().
+    """
+
+    def __init__(self, program, policy=None):
+        self.program = program
+        self.policy = policy if policy is not None else current()
+        check_policy(self.policy)
+        self.forward = self.policy == 'forward'
+        self.target = DEVNULL if self.policy == 'devnull' else PIPE
+        self._tail = bytearray()
+        self._pending = b''
+        self._fed = False
+        self._thread = None
+        self._logger = None
+        self._collected = None
+        if self.policy == 'log':
+            import logging
+            self._logger = logging.getLogger(logger_name)
+        elif not isinstance(self.policy, str):
+            self._logger = self.policy
+
+    def start(self, process):
+        """Hand the process's stderr to a background reader, if the policy has one."""
+        if self.forward or process.stderr is None:
+            return
+        pipe = process.stderr
+        # communicate() then reads stdout only.
+        process.stderr = None
+        self._thread = threading.Thread(target=self._read, args=(pipe,), name='crossfiledialog-stderr', daemon=True)
+        self._thread.start()
+
+    def _read(self, pipe):
+        with pipe:
+            fd = pipe.fileno()
+            while True:
+                data = os.read(fd, 65536)
+                self.feed(data)
+                if not data:
+                    break
+
+    def feed(self, data):
+        """
+        Handle `data` read from the program's stderr; b'' at the end of it.
+        """
+        if self.policy == 'devnull':
+            return
+        self._fed = True
+        self._tail += data
+        if len(self._tail) > ring_size:
+            del self._tail[:-ring_size]
+        if self._logger is None:
+            return
+        if not data:
+            if self._pending:
+                self._log(self._pending)
+            self._pending = b''
+            return
+        lines = (self._pending + data).split(b'\n')
+        self._pending = lines.pop()
+        for line in lines:
+            self._log(line)
+
+    def _log(self, line):
+        line = line.rstrip(b'\r').decode(errors='replace')
+        if line.strip():
+            self._logger.log(log_level, '%s: %s', self.program, line)
+
+    def collect(self, captured):
+        """
+        What to hand to process_output(): everything communicate() read for
+        'forward', the kept tail for the background policies and for what
+        was passed to feed().
+        """
+        if self._collected is None:
+            if self._thread is not None:
+                self._thread.join(join_timeout)
+            if self._fed:
+                self._collected = bytes(self._tail)
+            else:
+                self._collected = captured or b''
+        return self._collected
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if isinstance(exc, FileDialogException) and exc.stderr is None and self.policy != 'devnull':
+            exc.stderr = self.collect(b'')
+        return False
+
+
+__all__ = ['Capture', 'set_policy', 'current', 'check_policy', 'policies']
@@ -0,0 +1,146 @@
+import os
+import selectors
+import time
+
+from subprocess import TimeoutExpired
+
+from crossfiledialog import strings
+from crossfiledialog.exceptions import DialogTimeout
+from crossfiledialog.paths import check_mode, decode_output
+from crossfiledialog.process import kill, kill_grace, spawn, terminate
+from crossfiledialog.stderr import Capture
+from crossfiledialog.wrapper import load_backend
+
+
+def _close(process):
+    # Runs when the caller stops iterating early, on errors and on timeout.
+    if process.returncode is None and process.poll() is None:
+        terminate(process)
+    for pipe in (process.stdout, process.stderr):
+        if pipe is not None and not pipe.closed:
+            pipe.close()
+    try:
+        process.wait(kill_grace)
+    except TimeoutExpired:
+        kill(process)
+        process.wait()
+
+
+def _read_lines(process, timeout, capture):
+    # Yields stdout line by line while reading stderr on the side, so a
+    # chatty toolkit cannot fill its pipe and stall the dialog. Only the
+    # unfinished last line is buffered; stderr is collected for 'forward'
+    # and fed to `capture` as it arrives otherwise.
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    stderr = []
+    partial = b''
+    with selectors.DefaultSelector() as selector:
+        selector.register(process.stdout, selectors.EVENT_READ, True)
+        if process.stderr is not None:
+            selector.register(process.stderr, selectors.EVENT_READ, False)
+
+        while selector.get_map():
+            wait = None
+            if deadline is not None:
+                wait = deadline - time.monotonic()
+                if wait <= 0:
+                    raise DialogTimeout("No answer from the dialog within {0} seconds".format(timeout))
+
+            for key, _ in selector.select(wait):
+                data = os.read(key.fd, 65536)
+                if not key.data:
+                    if capture.forward:
+                        stderr.append(data)
+                    else:
+                        capture.feed(data)
+                if not data:
+                    selector.unregister(key.fileobj)
+                    key.fileobj.close()
+                    if key.data and partial:
+                        yield partial
+                    continue
+                if not key.data:
+                    continue
+
+                lines = (partial + data).split(b'\n')
+                partial = lines.pop()
+                yield from lines
+
+    process.wait()
+    return b''.join(stderr)
+
+
+def iter_multiple(title=strings.open_multiple, start_dir=None, filter=None, timeout=None, on_spawn=None,
+                  paths='str', stderr=None):
+    """
+    Open a file selection dialog for selecting multiple files, and yield the
+    selected paths as they are read from the dialog.
+
+    Processing can start on the first path while the rest are still being
+    read, and memory use does not grow with the size of the selection.
+    Paths are yielded before the dialog's exit status is known, so a
+    backend error can still be raised after some paths were produced.
+
+    Backends without a command line (win32, resident) return their whole
+    result at once; it is yielded from a list.
+
+    Args:
+        title (str, optional): The title of the file selection dialog.
+            Default is 'Choose one or more files'
+        start_dir (str, optional): The starting directory for the dialog.
+        filter (str, list, dict, optional): The filter for file types to display.
+        timeout (float, optional): Seconds after which the dialog is closed and
+            DialogTimeout is raised. Default is to wait indefinitely.
+        on_spawn (callable, optional): Called with the dialog process as soon as
+            it starts, so another thread can close it with
+            crossfiledialog.process.terminate().
+        paths (str, optional): 'str' (default), 'surrogateescape' or 'bytes'.
+            See crossfiledialog.paths.
+        stderr (str, optional): What happens to the dialog program's stderr:
+            'forward' (default), 'devnull', 'ring', 'log' or a logger. See
+            crossfiledialog.stderr.
+
+    Yields:
+        str: The selected file paths, in the order the dialog reports them.
+
+    Example:
+        for path in iter_multiple(title="Select scans", filter="*.tif"):
+            queue.put(path)
+    """
+    check_mode(paths)
+    backend = load_backend()
+    if not hasattr(backend, 'open_multiple_command'):
+        yield from backend.open_multiple(title, start_dir, filter, timeout=timeout, on_spawn=on_spawn, paths=paths)
+        return
+
+    capture = Capture(backend.__name__.rsplit('.', 1)[-1], stderr)
+    process = spawn(backend.open_multiple_command(title, start_dir, filter), stderr=capture.target,
+                    **backend.popen_kwargs())
+    with capture:
+        try:
+            if on_spawn:
+                on_spawn(process)
+
+            first = True
+            lines = _read_lines(process, timeout, capture)
+            while True:
+                try:
+                    line = next(lines)
+                except StopIteration as stop:
+                    captured = stop.value
+                    break
+                if not line:
+                    continue
+                path = decode_output(line, paths)
+                if first:
+                    backend.set_last_cwd(path)
+                    first = False
+                yield path
+        finally:
+            _close(process)
+
+        # Surfaces backend errors and forwards stderr, like the blocking call.
+        backend.process_output(process.returncode, b'', capture.collect(captured), paths, capture.forward)
+
+
+__all__ = ['iter_multiple']
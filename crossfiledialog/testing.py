@@ -0,0 +1,341 @@
+"""
+Scripted dialogs for tests and headless load testing.
+
+This backend answers dialogs from a script instead of showing them, without
+starting any process, so code that depends on a dialog can run in CI and at
+thousands of dialogs per second. It can also record the dialogs a real
+backend shows, producing a session file that can be replayed later.
+
+Select it with FILEDIALOG_BACKEND=testing, or from code with install() or
+record(). Configuration through the environment:
+
+  FILEDIALOG_TESTING_SESSION  session file to replay (see below)
+  FILEDIALOG_TESTING_LATENCY  seconds to wait before answers that do not
+                              specify a latency (default 0)
+  FILEDIALOG_TESTING_SPEED    multiplier for all latencies; 0 answers at once
+  FILEDIALOG_TESTING_LOOP     1 to start over when the script is exhausted
+  FILEDIALOG_TESTING_RECORD   record real dialogs to this file instead
+
+A session file holds one JSON object per line:
+
+  {"kind": "open_file", "title": "...", "start_dir": null, "filter": "*.txt",
+   "result": "/home/user/notes.txt", "latency": 2.5}
+
+Only "result" is required. A result of null (or "" / []) means the user
+cancelled, "kind", when present, must match the dialog being answered, and
+"latency" is how long the user took. Scripts passed to install() may also
+contain bare results, or callables that are called with the dialog kind
+and its arguments and return the result.
+"""
+import json
+import os
+import threading
+import time
+
+from collections import deque
+
+from crossfiledialog import metrics, strings
+from crossfiledialog.exceptions import DialogTimeout, FileDialogException
+from crossfiledialog.paths import from_str
+
+
+class ScriptException(FileDialogException):
+    pass
+
+
+# The script being replayed and the position of the next answer.
+script = None
+position = 0
+loop = os.environ.get('FILEDIALOG_TESTING_LOOP', '') == '1'
+latency = float(os.environ.get('FILEDIALOG_TESTING_LATENCY', '0'))
+speed = float(os.environ.get('FILEDIALOG_TESTING_SPEED', '1'))
+
+# The most recent dialogs this backend answered, for assertions in tests.
+requests = deque(maxlen=1000)
+
+# While recording: the backend showing the real dialogs, and the session file.
+recorded_backend = None
+_record_file = None
+
+_lock = threading.Lock()
+
+
+def load_session(path):
+    """
+    Read a session file.
+
+    Returns:
+        list[dict]: The answers, in order.
+    """
+    with open(path, encoding='utf-8') as fp:
+        return [json.loads(line) for line in fp if line.strip()]
+
+
+def install(answers=None, session=None, loop=None, latency=None, speed=None):
+    """
+    Answer every following dialog from a script.
+
+    Args:
+        answers (list, optional): Results, answer dicts or callables, in the
+            order the dialogs will be shown.
+        session (str, optional): A session file to replay instead.
+        loop (bool, optional): Start over when the script is exhausted
+            instead of raising ScriptException.
+        latency (float, optional): Seconds to wait before answers that do
+            not specify a latency.
+        speed (float, optional): Multiplier for all latencies; 0 answers at once.
+
+    Example:
+        testing.install(["/tmp/a.txt", None, ["/tmp/b.txt", "/tmp/c.txt"]])
+        crossfiledialog.open_file()      # "/tmp/a.txt"
+        crossfiledialog.save_file()      # "" (cancelled)
+        crossfiledialog.open_multiple()  # ["/tmp/b.txt", "/tmp/c.txt"]
+    """
+    global script, position, recorded_backend
+    module = globals()
+    with _lock:
+        script = list(answers) if answers is not None else load_session(session) if session else []
+        position = 0
+        recorded_backend = None
+        for name, value in (('loop', loop), ('latency', latency), ('speed', speed)):
+            if value is not None:
+                module[name] = value
+        requests.clear()
+    _select()
+
+
+def record(path, backend=None):
+    """
+    Show real dialogs and append each one, with its answer and how long the
+    user took, to the session file at `path`.
+
+    Args:
+        path (str): The session file; created if needed, appended to otherwise.
+        backend (module, optional): The backend to record. Default is the one
+            detected for this platform.
+    """
+    global recorded_backend, _record_file
+    if backend is None:
+        from crossfiledialog.wrapper import detect_backend
+        backend = detect_backend()
+    with _lock:
+        if _record_file is not None:
+            _record_file.close()
+        _record_file = open(path, 'a', encoding='utf-8')
+        recorded_backend = backend
+    _select()
+
+
+def uninstall():
+    """
+    Stop scripting or recording; the next dialog uses the detected backend again.
+    """
+    global script, position, recorded_backend, _record_file
+    from crossfiledialog import wrapper
+    with _lock:
+        script = None
+        position = 0
+        recorded_backend = None
+        if _record_file is not None:
+            _record_file.close()
+            _record_file = None
+    if wrapper.backend is _this():
+        wrapper.backend = None
+
+
+def _this():
+    import sys
+    return sys.modules[__name__]
+
+
+def _select():
+    from crossfiledialog import wrapper
+    wrapper.backend = _this()
+
+
+def _configure_from_environment():
+    # Called with _lock held, on the first dialog after
+    # FILEDIALOG_BACKEND=testing selected this module.
+    global script, recorded_backend, _record_file
+    record_path = os.environ.get('FILEDIALOG_TESTING_RECORD', '')
+    if record_path:
+        from crossfiledialog.wrapper import detect_backend
+        recorded_backend = detect_backend()
+        _record_file = open(record_path, 'a', encoding='utf-8')
+        return
+    session = os.environ.get('FILEDIALOG_TESTING_SESSION', '')
+    script = load_session(session) if session else []
+
+
+def _serializable(value):
+    if isinstance(value, bytes):
+        return os.fsdecode(value)
+    if isinstance(value, (list, tuple)):
+        return [_serializable(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _serializable(v) for k, v in value.items()}
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return repr(value)
+
+
+def _record(kind, arguments, call):
+    start = time.monotonic()
+    result = call()
+    entry = dict(kind=kind, result=_serializable(result), latency=round(time.monotonic() - start, 3))
+    entry.update((k, _serializable(v)) for k, v in arguments.items())
+    with _lock:
+        if _record_file is not None:
+            _record_file.write(json.dumps(entry) + '\n')
+            _record_file.flush()
+    return result
+
+
+def _next_answer(kind, arguments):
+    global position
+    with _lock:
+        if script is None and recorded_backend is None:
+            _configure_from_environment()
+        requests.append(dict(arguments, kind=kind))
+        if recorded_backend is not None:
+            return None, True
+        if position >= len(script):
+            if not loop or not script:
+                raise ScriptException("No scripted answer left for {0} (after {1} dialogs)".format(kind, position))
+            position = 0
+        answer = script[position]
+        position += 1
+    return answer, False
+
+
+def _answer(kind, arguments, timeout, paths, backend_call):
+    answer, recording = _next_answer(kind, arguments)
+    if recording:
+        return _record(kind, arguments, backend_call)
+
+    if callable(answer):
+        answer = dict(result=answer(kind, **arguments))
+    elif not isinstance(answer, dict):
+        answer = dict(result=answer)
+
+    expected = answer.get('kind')
+    if expected is not None and expected != kind:
+        raise ScriptException("Script expected a {0} dialog, got {1}".format(expected, kind))
+
+    delay = answer.get('latency', latency) * speed
+    if delay > 0:
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            raise DialogTimeout("No answer from the dialog within {0} seconds".format(timeout))
+        time.sleep(delay)
+
+    result = answer.get('result')
+    if kind == 'open_multiple':
+        if isinstance(result, (str, bytes)):
+            result = [result]
+        return [from_str(p, paths) if isinstance(p, str) else p for p in result or []]
+    if not result:
+        return ''
+    return from_str(result, paths) if isinstance(result, str) else result
+
+
+@metrics.instrument('testing')
+def open_file(title=strings.open_file, start_dir=None, filter=None, timeout=None, on_spawn=None, paths='str'):
+    """
+    Answer a file selection dialog for selecting a file from the script.
+
+    Args:
+        title (str, optional): The title of the file selection dialog.
+            Default is 'Choose a file'
+        start_dir (str, optional): The starting directory for the dialog.
+        filter (str, list, dict, optional): The filter for file types to display.
+        timeout (float, optional): DialogTimeout is raised if the answer's
+            latency is longer than this.
+        on_spawn (callable, optional): Never called; no process is started.
+        paths (str, optional): 'bytes' returns the path encoded with os.fsencode().
+
+    Returns:
+        str: The scripted path, or '' if the script cancels.
+    """
+    return _answer(
+        'open_file', dict(title=title, start_dir=start_dir, filter=filter), timeout, paths,
+        lambda: recorded_backend.open_file(title, start_dir, filter, timeout=timeout, on_spawn=on_spawn, paths=paths),
+    )
+
+
+@metrics.instrument('testing')
+def open_multiple(title=strings.open_multiple, start_dir=None, filter=None, timeout=None, on_spawn=None, paths='str'):
+    """
+    Answer a file selection dialog for selecting multiple files from the script.
+
+    Args:
+        title (str, optional): The title of the file selection dialog.
+            Default is 'Choose one or more files'
+        start_dir (str, optional): The starting directory for the dialog.
+        filter (str, list, dict, optional): The filter for file types to display.
+        timeout (float, optional): DialogTimeout is raised if the answer's
+            latency is longer than this.
+        on_spawn (callable, optional): Never called; no process is started.
+        paths (str, optional): 'bytes' returns paths encoded with os.fsencode().
+
+    Returns:
+        list[str]: The scripted paths, or [] if the script cancels.
+    """
+    return _answer(
+        'open_multiple', dict(title=title, start_dir=start_dir, filter=filter), timeout, paths,
+        lambda: recorded_backend.open_multiple(
+            title, start_dir, filter, timeout=timeout, on_spawn=on_spawn, paths=paths
+        ),
+    )
+
+
+@metrics.instrument('testing')
+def save_file(title=strings.save_file, start_dir=None, timeout=None, on_spawn=None, paths='str'):
+    """
+    Answer a save file dialog from the script.
+
+    Args:
+        title (str, optional): The title of the save file dialog.
+            Default is 'Enter the name of the file to save to'
+        start_dir (str, optional): The starting directory for the dialog.
+        timeout (float, optional): DialogTimeout is raised if the answer's
+            latency is longer than this.
+        on_spawn (callable, optional): Never called; no process is started.
+        paths (str, optional): 'bytes' returns the path encoded with os.fsencode().
+
+    Returns:
+        str: The scripted path, or '' if the script cancels.
+    """
+    return _answer(
+        'save_file', dict(title=title, start_dir=start_dir), timeout, paths,
+        lambda: recorded_backend.save_file(title, start_dir, timeout=timeout, on_spawn=on_spawn, paths=paths),
+    )
+
+
+@metrics.instrument('testing')
+def choose_folder(title=strings.choose_folder, start_dir=None, timeout=None, on_spawn=None, paths='str'):
+    """
+    Answer a folder selection dialog from the script.
+
+    Args:
+        title (str, optional): The title of the folder selection dialog.
+            Default is 'Choose a folder'
+        start_dir (str, optional): The starting directory for the dialog.
+        timeout (float, optional): DialogTimeout is raised if the answer's
+            latency is longer than this.
+        on_spawn (callable, optional): Never called; no process is started.
+        paths (str, optional): 'bytes' returns the path encoded with os.fsencode().
+
+    Returns:
+        str: The scripted folder, or '' if the script cancels.
+    """
+    return _answer(
+        'choose_folder', dict(title=title, start_dir=start_dir), timeout, paths,
+        lambda: recorded_backend.choose_folder(title, start_dir, timeout=timeout, on_spawn=on_spawn, paths=paths),
+    )
+
+
+__all__ = [
+    'ScriptException', 'install', 'record', 'uninstall', 'load_session', 'requests',
+    'open_file', 'open_multiple', 'save_file', 'choose_folder',
+]
@@ -0,0 +1,297 @@
+"""
+Dialogs through tkinter, which ships with Python.
+
+The last resort where no dialog program is installed. One hidden Tk root
+window is created on first use, on a daemon thread that then runs its main
+loop; every dialog is shown from that thread, one at a time, so no process
+is started per dialog.
+
+Tk must run on the main thread on macOS, so this backend is not offered
+there (osascript always is).
+"""
+import importlib.util
+import os
+import queue
+import sys
+import threading
+
+from concurrent.futures import Future
+
+from crossfiledialog import history, metrics, strings
+from crossfiledialog.exceptions import BackendUnavailable, DialogTimeout, FileDialogException
+from crossfiledialog.filters import compile_filter
+from crossfiledialog.paths import check_mode, from_str
+
+
+class TkException(FileDialogException):
+    pass
+
+
+class TkUnavailable(TkException, BackendUnavailable):
+    pass
+
+
+# Milliseconds between checks for new requests when Tcl is not threaded.
+POLL_INTERVAL = 50
+
+root = None
+
+_thread = None
+_ready = threading.Event()
+_error = None
+_lock = threading.Lock()
+# Tk's file dialog is a single window, so dialogs are shown one at a time.
+_dialog_lock = threading.Lock()
+_requests = queue.SimpleQueue()
+_threaded = False
+
+
+def get_preferred_cwd(kind='open'):
+    possible_cwd = os.environ.get('FILEDIALOG_CWD', '')
+    if possible_cwd:
+        return possible_cwd
+
+    return history.recent(kind)
+
+
+def set_last_cwd(cwd, kind='open'):
+    history.remember(kind, os.path.dirname(os.fsdecode(cwd)))
+
+
+def _drain():
+    while True:
+        try:
+            job = _requests.get_nowait()
+        except queue.Empty:
+            break
+        job()
+
+
+def _poll():
+    _drain()
+    root.after(POLL_INTERVAL, _poll)
+
+
+def _main():
+    global root, _error, _threaded
+    try:
+        import tkinter
+        root = tkinter.Tk()
+        root.withdraw()
+    except Exception as e:
+        _error = e
+        _ready.set()
+        return
+    # A threaded Tcl accepts calls from other threads, which then wake the
+    # loop directly; otherwise the loop has to look for requests itself.
+    _threaded = root.tk.eval('info exists tcl_platform(threaded)') == '1'
+    if not _threaded:
+        _poll()
+    _ready.set()
+    root.mainloop()
+
+
+def start():
+    """
+    Create the hidden root window, if there is none yet, and wait until it is ready.
+
+    Raises:
+        TkUnavailable: If tkinter is missing or Tk cannot open the display.
+    """
+    global _thread
+    with _lock:
+        if _thread is None:
+            _thread = threading.Thread(target=_main, name='crossfiledialog-tk', daemon=True)
+            _thread.start()
+    _ready.wait()
+    if _error is not None:
+        raise TkUnavailable("Tk is not available: {0}".format(_error))
+
+
+def available():
+    """
+    Whether tkinter is installed and, outside Windows, there is an X
+    display to connect to.
+
+    Tk is not started here, so picking a backend costs no thread and no
+    display connection; if Tk then fails to start, the first dialog raises
+    TkUnavailable and the next backend is used.
+    """
+    if sys.platform == 'darwin':
+        return False
+    if _thread is not None:
+        return _error is None
+    if sys.platform != 'win32' and not os.environ.get('DISPLAY'):
+        return False
+    return importlib.util.find_spec('tkinter') is not None
+
+
+def _ask(request, timeout):
+    # Runs on the Tk thread.
+    from tkinter import filedialog
+
+    options = dict(parent=root, title=request['title'])
+    if request['start_dir']:
+        options['initialdir'] = request['start_dir']
+    if request['filetypes']:
+        options['filetypes'] = request['filetypes']
+
+    expired = []
+    timer = None
+    if timeout is not None:
+        def expire():
+            expired.append(True)
+            # Ends the vwait of Tk's own (non-native) file dialogs.
+            root.tk.eval('set ::tk::Priv(selectFilePath) {}')
+
+        timer = root.after(max(1, int(timeout * 1000)), expire)
+
+    kind = request['kind']
+    try:
+        if kind == 'open_multiple':
+            result = root.tk.splitlist(filedialog.askopenfilenames(**options))
+        elif kind == 'save_file':
+            result = [filedialog.asksaveasfilename(**options)]
+        elif kind == 'choose_folder':
+            options.pop('filetypes', None)
+            result = [filedialog.askdirectory(mustexist=True, **options)]
+        else:
+            result = [filedialog.askopenfilename(**options)]
+    finally:
+        if timer is not None:
+            root.after_cancel(timer)
+    if expired:
+        raise DialogTimeout("No answer from the dialog within {0} seconds".format(timeout))
+    return [path for path in result if path]
+
+
+def _show(kind, title, start_dir, filter, timeout, paths):
+    check_mode(paths)
+    start()
+    spec = compile_filter(filter)
+    request = dict(
+        kind=kind, title=title, start_dir=start_dir or get_preferred_cwd(history.kinds[kind]),
+        filetypes=list(spec.labelled_groups()) if spec is not None else None,
+    )
+
+    if not _dialog_lock.acquire(timeout=-1 if timeout is None else timeout):
+        raise DialogTimeout("No dialog slot became free within {0} seconds".format(timeout))
+    try:
+        future = Future()
+
+        def job():
+            try:
+                future.set_result(_ask(request, timeout))
+            except BaseException as e:
+                future.set_exception(e)
+
+        metrics.mark('command')
+        _requests.put(job)
+        if _threaded:
+            root.after_idle(_drain)
+        selected = future.result()
+        metrics.mark('exited')
+    finally:
+        _dialog_lock.release()
+    return [from_str(os.path.normpath(path), paths) for path in selected]
+
+
+@metrics.instrument('tk')
+def open_file(title=strings.open_file, start_dir=None, filter=None, timeout=None, on_spawn=None, paths='str'):
+    """
+    Open a file selection dialog for selecting a file using tkinter.
+
+    Args:
+        title (str, optional): The title of the file selection dialog.
+            Default is 'Choose a file'
+        start_dir (str, optional): The starting directory for the dialog.
+        filter (str, list, dict, optional): The filter for file types to display.
+        timeout (float, optional): Seconds after which the dialog is closed and
+            DialogTimeout is raised. Default is to wait indefinitely.
+        on_spawn (callable, optional): Never called; no process is started.
+        paths (str, optional): 'str' (default), 'surrogateescape' or 'bytes'.
+
+    Returns:
+        str: The selected file's path.
+    """
+    selected = _show('open_file', title, start_dir, filter, timeout, paths)
+    result = selected[0] if selected else ''
+    if result:
+        set_last_cwd(result)
+    return result
+
+
+@metrics.instrument('tk')
+def open_multiple(title=strings.open_multiple, start_dir=None, filter=None, timeout=None, on_spawn=None, paths='str'):
+    """
+    Open a file selection dialog for selecting multiple files using tkinter.
+
+    Args:
+        title (str, optional): The title of the file selection dialog.
+            Default is 'Choose one or more files'
+        start_dir (str, optional): The starting directory for the dialog.
+        filter (str, list, dict, optional): The filter for file types to display.
+        timeout (float, optional): Seconds after which the dialog is closed and
+            DialogTimeout is raised. Default is to wait indefinitely.
+        on_spawn (callable, optional): Never called; no process is started.
+        paths (str, optional): 'str' (default), 'surrogateescape' or 'bytes'.
+
+    Returns:
+        list[str]: A list of selected file paths.
+    """
+    result_list = _show('open_multiple', title, start_dir, filter, timeout, paths)
+    if result_list:
+        set_last_cwd(result_list[0])
+        return result_list
+    return []
+
+
+@metrics.instrument('tk')
+def save_file(title=strings.save_file, start_dir=None, timeout=None, on_spawn=None, paths='str'):
+    """
+    Open a save file dialog using tkinter.
+
+    Args:
+        title (str, optional): The title of the save file dialog.
+            Default is 'Enter the name of the file to save to'
+        start_dir (str, optional): The starting directory for the dialog.
+        timeout (float, optional): Seconds after which the dialog is closed and
+            DialogTimeout is raised. Default is to wait indefinitely.
+        on_spawn (callable, optional): Never called; no process is started.
+        paths (str, optional): 'str' (default), 'surrogateescape' or 'bytes'.
+
+    Returns:
+        str: The selected file's path for saving.
+    """
+    selected = _show('save_file', title, start_dir, None, timeout, paths)
+    result = selected[0] if selected else ''
+    if result:
+        set_last_cwd(result, 'save')
+    return result
+
+
+@metrics.instrument('tk')
+def choose_folder(title=strings.choose_folder, start_dir=None, timeout=None, on_spawn=None, paths='str'):
+    """
+    Open a folder selection dialog using tkinter.
+
+    Args:
+        title (str, optional): The title of the folder selection dialog.
+            Default is 'Choose a folder'
+        start_dir (str, optional): The starting directory for the dialog.
+        timeout (float, optional): Seconds after which the dialog is closed and
+            DialogTimeout is raised. Default is to wait indefinitely.
+        on_spawn (callable, optional): Never called; no process is started.
+        paths (str, optional): 'str' (default), 'surrogateescape' or 'bytes'.
+
+    Returns:
+        str: The selected folder's path.
+    """
+    selected = _show('choose_folder', title, start_dir, None, timeout, paths)
+    result = selected[0] if selected else ''
+    if result:
+        set_last_cwd(result, 'folder')
+    return result
+
+
+__all__ = ['open_file', 'open_multiple', 'save_file', 'choose_folder', 'available', 'start']
@@ -2,8 +2,10 @@ import os
 import uuid
 import ctypes
 
-from crossfiledialog import strings
-from crossfiledialog.exceptions import FileDialogException
+from crossfiledialog import history, metrics, strings
+from crossfiledialog.exceptions import DialogTimeout, FileDialogException
+from crossfiledialog.filters import compile_filter
+from crossfiledialog.paths import from_str
 
 
 class Win32Exception(FileDialogException):
@@ -52,6 +54,7 @@ _VT_SETFOLDER = 12
 _VT_SETFILENAME = 15
 _VT_SETTITLE = 17
 _VT_GETRESULT = 20
+_VT_CLOSE = 23
 _VT_GETRESULTS = 27  # IFileOpenDialog only
 
 # IShellItem vtable indices.
@@ -141,65 +144,28 @@ class _FilterSpec(ctypes.Structure):
     _fields_ = [("pszName", ctypes.c_wchar_p), ("pszSpec", ctypes.c_wchar_p)]
 
 
-last_cwd = None
-
-
-def get_preferred_cwd():
+def get_preferred_cwd(kind="open"):
     possible_cwd = os.environ.get("FILEDIALOG_CWD", "")
     if possible_cwd:
         return possible_cwd
-    return last_cwd
+    return history.recent(kind)
 
 
-def set_last_cwd(cwd):
+def set_last_cwd(cwd, kind="open"):
     # cwd is a file path; remember its containing directory.
-    global last_cwd
-    last_cwd = os.path.dirname(cwd)
+    history.remember(kind, os.path.dirname(cwd))
 
 
 def _remember_dir(path: str):
     # path is already a directory; store it as-is.
-    global last_cwd
-    last_cwd = path
-
-
-def _normalize_filter(filter) -> list:
-    if isinstance(filter, str):
-        # Single wildcard: label and pattern are identical.
-        return [(filter, filter)]
-
-    if isinstance(filter, list):
-        if not filter:
-            return []
-        if isinstance(filter[0], str):
-            # Flat list of wildcards -> one entry, patterns joined by ';'.
-            joined = ";".join(filter)
-            return [(joined, joined)]
-        if isinstance(filter[0], list):
-            # List of lists -> one entry per inner list.
-            return [(";".join(g), ";".join(g)) for g in filter]
-        raise ValueError("Invalid filter")
-
-    if isinstance(filter, dict):
-        out = []
-        for label, value in filter.items():
-            if isinstance(value, str):
-                out.append((label, value))
-            elif isinstance(value, list):
-                out.append((label, ";".join(value)))
-            else:
-                raise ValueError("Invalid filter")
-        return out
-
-    raise ValueError("Invalid filter")
+    history.remember("folder", path)
 
 
 def _apply_filter(dialog: _ComObj, filter):
-    if not filter:
-        return
-    specs = _normalize_filter(filter)
-    if not specs:
+    spec = compile_filter(filter)
+    if spec is None:
         return
+    specs = spec.comdlg_specs()
     arr = (_FilterSpec * len(specs))(*[_FilterSpec(lbl, pat) for lbl, pat in specs])
     dialog.call(
         _VT_SETFILETYPES,
@@ -216,7 +182,7 @@ def _apply_filter(dialog: _ComObj, filter):
 # ---------------------------------------------------------------------------
 
 
-def _configure_dialog(dialog: _ComObj, title, start_dir, filter, extra_options: int):
+def _configure_dialog(dialog: _ComObj, title, start_dir, filter, extra_options: int, kind="open"):
     # Always force filesystem paths and require existing paths; callers add the rest.
     dialog.call(
         _VT_SETOPTIONS,
@@ -228,7 +194,7 @@ def _configure_dialog(dialog: _ComObj, title, start_dir, filter, extra_options:
     if title:
         dialog.call(_VT_SETTITLE, ctypes.c_int, ctypes.c_wchar_p, title)
 
-    initial = start_dir or get_preferred_cwd()
+    initial = start_dir or get_preferred_cwd(kind)
     if initial and os.path.isdir(initial):
         folder = _shell_item_from_path(initial)
         if folder is not None:
@@ -238,9 +204,9 @@ def _configure_dialog(dialog: _ComObj, title, start_dir, filter, extra_options:
     _apply_filter(dialog, filter)
 
 
-def _show_and_get_single(dialog: _ComObj) -> str:
+def _show_and_get_single(dialog: _ComObj, timeout=None) -> str:
     # Show the dialog and return the single selected path, or None on cancel.
-    hr = dialog.call(_VT_SHOW, ctypes.c_int, ctypes.c_void_p, _dialog_owner())
+    hr = _show(dialog, timeout)
     if hr != S_OK:
         return None
 
@@ -379,12 +345,60 @@ def _dialog_owner() -> ctypes.c_void_p:
     return _u32.GetForegroundWindow()
 
 
+# ---------------------------------------------------------------------------
+# Timeouts
+# ---------------------------------------------------------------------------
+# Show() runs a modal message loop on the calling thread, so a thread timer
+# set before Show() fires inside that loop. Its callback closes the dialog
+# through IFileDialog::Close with a distinct HRESULT, which Show() returns.
+
+# HRESULT_FROM_WIN32(ERROR_TIMEOUT), as the signed int Show() returns.
+_HRESULT_TIMEOUT = ctypes.c_int(0x800705B4).value
+
+_TIMERPROC = ctypes.WINFUNCTYPE(None, ctypes.c_void_p, ctypes.c_uint, ctypes.c_size_t, ctypes.c_ulong)
+
+_u32.SetTimer.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_uint, _TIMERPROC]
+_u32.SetTimer.restype = ctypes.c_size_t
+_u32.KillTimer.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+_u32.KillTimer.restype = ctypes.c_int
+
+
+def _show(dialog: _ComObj, timeout=None) -> int:
+    """IModalWindow::Show, closing the dialog after `timeout` seconds.
+
+    Raises DialogTimeout if the timer closed the dialog.
+    """
+    metrics.mark('command')
+    if timeout is None:
+        hr = dialog.call(_VT_SHOW, ctypes.c_int, ctypes.c_void_p, _dialog_owner())
+        metrics.mark('exited')
+        return hr
+
+    def on_timer(hwnd, msg, timer_id, tick):
+        _u32.KillTimer(None, timer_id)
+        dialog.call(_VT_CLOSE, ctypes.c_int, ctypes.c_int, _HRESULT_TIMEOUT)
+
+    # Keep the ctypes callback alive for as long as the timer can fire.
+    callback = _TIMERPROC(on_timer)
+    timer_id = _u32.SetTimer(None, 0, max(1, int(timeout * 1000)), callback)
+    try:
+        hr = dialog.call(_VT_SHOW, ctypes.c_int, ctypes.c_void_p, _dialog_owner())
+    finally:
+        _u32.KillTimer(None, timer_id)
+        metrics.mark('exited')
+
+    if hr == _HRESULT_TIMEOUT:
+        raise DialogTimeout("No answer from the dialog within {0} seconds".format(timeout))
+    return hr
+
+
 # ---------------------------------------------------------------------------
 # Public API
 # ---------------------------------------------------------------------------
 
 
-def open_file(title=strings.open_file, start_dir=None, filter=None):
+@metrics.instrument('win32')
+def open_file(title=strings.open_file, start_dir=None, filter=None, timeout=None, on_spawn=None, paths='str'):
     """
     Open a file selection dialog using the Common Item Dialog API.
 
@@ -392,6 +406,12 @@ def open_file(title=strings.open_file, start_dir=None, filter=None):
         title (str, optional): Dialog title. Default is 'Choose a file'.
         start_dir (str, optional): Starting directory.
         filter (str, list, dict, optional): File-type filter.
+        timeout (float, optional): Seconds after which the dialog is closed and
+            DialogTimeout is raised.
+        on_spawn (callable, optional): Accepted for compatibility with the other
+            backends; never called, as the dialog runs in-process.
+        paths (str, optional): 'bytes' returns the path encoded with
+            os.fsencode(); 'str' and 'surrogateescape' return it unchanged.
 
     Returns:
         str: Selected file path, or None if cancelled.
@@ -403,7 +423,7 @@ def open_file(title=strings.open_file, start_dir=None, filter=None):
             dialog = _co_create(CLSID_FileOpenDialog, IID_IFileOpenDialog)
             try:
                 _configure_dialog(dialog, title, start_dir, filter, FOS_FILEMUSTEXIST)
-                path = _show_and_get_single(dialog)
+                path = _show_and_get_single(dialog, timeout)
             finally:
                 dialog.release()
     finally:
@@ -411,10 +431,12 @@ def open_file(title=strings.open_file, start_dir=None, filter=None):
 
     if path:
         set_last_cwd(path)
-    return path
+    return from_str(path, paths)
 
 
-def open_multiple(title=strings.open_multiple, start_dir=None, filter=None) -> list:
+@metrics.instrument('win32')
+def open_multiple(title=strings.open_multiple, start_dir=None, filter=None, timeout=None, on_spawn=None,
+                  paths='str') -> list:
     """
     Open a multi-select file dialog using the Common Item Dialog API.
 
@@ -422,12 +444,18 @@ def open_multiple(title=strings.open_multiple, start_dir=None, filter=None) -> l
         title (str, optional): Dialog title. Default is 'Choose one or more files'.
         start_dir (str, optional): Starting directory.
         filter (str, list, dict, optional): File-type filter.
+        timeout (float, optional): Seconds after which the dialog is closed and
+            DialogTimeout is raised.
+        on_spawn (callable, optional): Accepted for compatibility with the other
+            backends; never called, as the dialog runs in-process.
+        paths (str, optional): 'bytes' returns the path encoded with
+            os.fsencode(); 'str' and 'surrogateescape' return it unchanged.
 
     Returns:
         list[str]: Selected file paths (empty list if cancelled).
     """
     ole32.CoInitializeEx(None, COINIT_APARTMENTTHREADED)
-    paths = []
+    selected = []
     try:
         with _DpiAware():
             dialog = _co_create(CLSID_FileOpenDialog, IID_IFileOpenDialog)
@@ -440,7 +468,7 @@ def open_multiple(title=strings.open_multiple, start_dir=None, filter=None) -> l
                     FOS_FILEMUSTEXIST | FOS_ALLOWMULTISELECT,
                 )
 
-                hr = dialog.call(_VT_SHOW, ctypes.c_int, ctypes.c_void_p, _dialog_owner())
+                hr = _show(dialog, timeout)
                 if hr != S_OK:
                     return []
 
@@ -480,7 +508,7 @@ def open_multiple(title=strings.open_multiple, start_dir=None, filter=None) -> l
                         try:
                             p = _shell_item_path(item)
                             if p:
-                                paths.append(p)
+                                selected.append(p)
                         finally:
                             item.release()
                 finally:
@@ -490,12 +518,14 @@ def open_multiple(title=strings.open_multiple, start_dir=None, filter=None) -> l
     finally:
         ole32.CoUninitialize()
 
-    if paths:
-        set_last_cwd(paths[0])
-    return paths
+    if selected:
+        set_last_cwd(selected[0])
+    return [from_str(path, paths) for path in selected]
 
 
-def save_file(title=strings.save_file, start_dir=None, filter=None, default_name=None):
+@metrics.instrument('win32')
+def save_file(title=strings.save_file, start_dir=None, filter=None, default_name=None, timeout=None,
+              on_spawn=None, paths='str'):
     """
     Open a save-as dialog using the Common Item Dialog API.
  
@@ -507,6 +537,12 @@ def save_file(title=strings.save_file, start_dir=None, filter=None, default_name
         default_name (str, optional): Pre-filled filename. May be either a
             bare filename ('report.pdf') or a full path; if a full path is
             given and start_dir is not set, its directory becomes start_dir.
+        timeout (float, optional): Seconds after which the dialog is closed and
+            DialogTimeout is raised.
+        on_spawn (callable, optional): Accepted for compatibility with the other
+            backends; never called, as the dialog runs in-process.
+        paths (str, optional): 'bytes' returns the path encoded with
+            os.fsencode(); 'str' and 'surrogateescape' return it unchanged.
  
     Returns:
         str: Path to save to, or None if cancelled.
@@ -525,27 +561,35 @@ def save_file(title=strings.save_file, start_dir=None, filter=None, default_name
         with _DpiAware():
             dialog = _co_create(CLSID_FileSaveDialog, IID_IFileSaveDialog)
             try:
-                _configure_dialog(dialog, title, start_dir, filter, FOS_OVERWRITEPROMPT)
+                _configure_dialog(dialog, title, start_dir, filter, FOS_OVERWRITEPROMPT, "save")
                 if prefill_name:
                     dialog.call(_VT_SETFILENAME, ctypes.c_int, ctypes.c_wchar_p, prefill_name)
-                path = _show_and_get_single(dialog)
+                path = _show_and_get_single(dialog, timeout)
             finally:
                 dialog.release()
     finally:
         ole32.CoUninitialize()
  
     if path:
-        set_last_cwd(path)
-    return path
+        set_last_cwd(path, "save")
+    return from_str(path, paths)
 
 
-def choose_folder(title: str = "Select folder", start_dir: str = None) -> str:
+@metrics.instrument('win32')
+def choose_folder(title: str = "Select folder", start_dir: str = None, timeout=None, on_spawn=None,
+                  paths='str') -> str:
     """
     Open a folder selection dialog using Common Item Dialog API.
 
     Args:
         title (str, optional): Dialog title. Default is 'Choose a folder'.
         start_dir (str, optional): Starting directory.
+        timeout (float, optional): Seconds after which the dialog is closed and
+            DialogTimeout is raised.
+        on_spawn (callable, optional): Accepted for compatibility with the other
+            backends; never called, as the dialog runs in-process.
+        paths (str, optional): 'bytes' returns the path encoded with
+            os.fsencode(); 'str' and 'surrogateescape' return it unchanged.
 
     Returns:
         str: Selected folder path, or None if cancelled.
@@ -557,9 +601,9 @@ def choose_folder(title: str = "Select folder", start_dir: str = None) -> str:
             dialog = _co_create(CLSID_FileOpenDialog, IID_IFileOpenDialog)
             try:
                 _configure_dialog(
-                    dialog, title, start_dir, None, FOS_PICKFOLDERS | FOS_FILEMUSTEXIST
+                    dialog, title, start_dir, None, FOS_PICKFOLDERS | FOS_FILEMUSTEXIST, "folder"
                 )
-                path = _show_and_get_single(dialog)
+                path = _show_and_get_single(dialog, timeout)
             finally:
                 dialog.release()
     finally:
@@ -567,7 +611,7 @@ def choose_folder(title: str = "Select folder", start_dir: str = None) -> str:
 
     if path:
         _remember_dir(path)
-    return path
+    return from_str(path, paths)
 
 
 __all__ = ["open_file", "open_multiple", "save_file", "choose_folder"]
@@ -1,39 +1,245 @@
+import importlib
 import os
-import sys
+import time
 
-from crossfiledialog.exceptions import NoImplementationFoundException
+from crossfiledialog import strings
 
 
-def which(command):
-    for d in os.environ['PATH'].split(':'):
-        if os.path.exists(d):
-            for binary in os.listdir(d):
-                if binary == command:
-                    return os.path.join(d, command)
+backend = None
+# Set while `backend` stands in for one that could not start: the
+# time.monotonic() after which detection runs again.
+retry_at = None
+# Whether `backend` was detected, rather than named by FILEDIALOG_BACKEND.
+_detected = False
 
+# The DialogSession behind the module-level functions, created on first use.
+default_session = None
 
-if sys.platform == 'linux':
-    probably_kde = os.environ.get('DESKTOP_SESSION', '').lower() == 'kde' or \
-            os.environ.get('XDG_CURRENT_DESKTOP', '').lower() == 'kde'
 
-    kdialog_binary = which('kdialog')
-    zenity_binary = which('zenity')
+def load_backend():
+    """
+    Pick the dialog implementation for this platform.
 
-    if kdialog_binary and (probably_kde or not zenity_binary):
-        from crossfiledialog.kdialog import *
-    elif zenity_binary:
-        from crossfiledialog.zenity import *
-    else:
-        raise NoImplementationFoundException()
+    Resolution is deferred until the first dialog call and the result is
+    cached, so importing crossfiledialog stays cheap and never raises in
+    processes that do not open a dialog. Only hosted backends (qt) are
+    checked again on every call, since the application may start its
+    QApplication after the first dialog. Setting FILEDIALOG_BACKEND to the
+    name of a backend in crossfiledialog.registry skips detection.
 
-elif sys.platform == 'win32':
-    from crossfiledialog.win32 import *
+    Returns:
+        module: The backend module implementing the public API.
 
-elif sys.platform == "darwin":
-    from crossfiledialog.osascript import *
+    Raises:
+        NoImplementationFoundException: If no usable backend is available.
+    """
+    global backend, retry_at, _detected
+    from crossfiledialog import registry
+    if backend is not None and (retry_at is None or time.monotonic() < retry_at):
+        if _detected:
+            return registry.hosted() or backend
+        return backend
+    retry_at = None
 
-else:
-    raise NoImplementationFoundException()
+    requested = os.environ.get('FILEDIALOG_BACKEND', '')
+    if requested:
+        backend = registry.load(requested)
+        _detected = False
+        return backend
 
+    backend = registry.select()
+    _detected = True
+    return backend
 
-__all__ = ['open_file', 'open_multiple', 'save_file', 'choose_folder']
+
+def fall_back(module, error):
+    """
+    Replace `module`, which raised `error`, with the next backend until
+    registry.retry_after seconds have passed.
+
+    Returns:
+        module: The backend to retry with.
+
+    Raises:
+        `error`, unless it means that `module` could not start and another
+        backend is available. See crossfiledialog.registry.fallback().
+    """
+    global backend, retry_at
+    from crossfiledialog import registry
+    backend = registry.fallback(module, error)
+    retry_at = time.monotonic() + registry.retry_after
+    return backend
+
+
+def detect_backend():
+    """
+    Find the best working backend for this platform, ignoring
+    FILEDIALOG_BACKEND and the cached choice.
+
+    Raises:
+        NoImplementationFoundException: If no usable backend is available.
+    """
+    from crossfiledialog import registry
+    return registry.select()
+
+
+def get_default_session():
+    """
+    The session the module-level dialog functions use. It picks its backend
+    with load_backend() and shares the process-wide directory history.
+
+    Returns:
+        DialogSession: The default session.
+    """
+    global default_session
+    if default_session is None:
+        from crossfiledialog.session import DialogSession
+        default_session = DialogSession(shared_history=True)
+    return default_session
+
+
+def open_file(title=strings.open_file, start_dir=None, filter=None, timeout=None, on_spawn=None, paths='str',
+              rich=False, stderr=None):
+    """
+    Open a file selection dialog for selecting a file.
+
+    Args:
+        title (str, optional): The title of the file selection dialog.
+            Default is 'Choose a file'
+        start_dir (str, optional): The starting directory for the dialog.
+        filter (str, list, dict, optional): The filter for file types to display.
+        timeout (float, optional): Seconds after which the dialog is closed and
+            DialogTimeout is raised. Default is to wait indefinitely.
+        on_spawn (callable, optional): Called with the dialog process as soon as
+            it starts, so another thread can close it with
+            crossfiledialog.process.terminate().
+        paths (str, optional): 'str' (default), 'surrogateescape' or 'bytes'.
+            See crossfiledialog.paths.
+        stderr (str, optional): What happens to the dialog program's stderr:
+            'forward' (default), 'devnull', 'ring', 'log' or a logger. See
+            crossfiledialog.stderr.
+        rich (bool, optional): Return a SelectedFile instead of a str, with its
+            metadata fetched in the background. Default is False.
+
+    Returns:
+        str: The selected file's path. With `rich`, a SelectedFile, or None
+            if the dialog was cancelled.
+    """
+    return get_default_session().open_file(
+        title, start_dir, filter, timeout=timeout, on_spawn=on_spawn, paths=paths, rich=rich, stderr=stderr,
+    )
+
+
+def open_multiple(title=strings.open_multiple, start_dir=None, filter=None, timeout=None, on_spawn=None,
+                  paths='str', rich=False, stderr=None):
+    """
+    Open a file selection dialog for selecting multiple files.
+
+    Args:
+        title (str, optional): The title of the file selection dialog.
+            Default is 'Choose one or more files'
+        start_dir (str, optional): The starting directory for the dialog.
+        filter (str, list, dict, optional): The filter for file types to display.
+        timeout (float, optional): Seconds after which the dialog is closed and
+            DialogTimeout is raised. Default is to wait indefinitely.
+        on_spawn (callable, optional): Called with the dialog process as soon as
+            it starts, so another thread can close it with
+            crossfiledialog.process.terminate().
+        paths (str, optional): 'str' (default), 'surrogateescape' or 'bytes'.
+            See crossfiledialog.paths.
+        stderr (str, optional): What happens to the dialog program's stderr:
+            'forward' (default), 'devnull', 'ring', 'log' or a logger. See
+            crossfiledialog.stderr.
+        rich (bool, optional): Return SelectedFile objects instead of str; the
+            whole selection is stat()ed in parallel. Default is False.
+
+    Returns:
+        list[str]: A list of selected file paths, or a list of SelectedFile with `rich`.
+    """
+    return get_default_session().open_multiple(
+        title, start_dir, filter, timeout=timeout, on_spawn=on_spawn, paths=paths, rich=rich, stderr=stderr,
+    )
+
+
+def save_file(title=strings.save_file, start_dir=None, timeout=None, on_spawn=None, paths='str', stderr=None,
+              **kwargs):
+    """
+    Open a save file dialog.
+
+    Args:
+        title (str, optional): The title of the save file dialog.
+            Default is 'Enter the name of the file to save to'
+        start_dir (str, optional): The starting directory for the dialog.
+        timeout (float, optional): Seconds after which the dialog is closed and
+            DialogTimeout is raised. Default is to wait indefinitely.
+        on_spawn (callable, optional): Called with the dialog process as soon as
+            it starts, so another thread can close it with
+            crossfiledialog.process.terminate().
+        paths (str, optional): 'str' (default), 'surrogateescape' or 'bytes'.
+            See crossfiledialog.paths.
+        stderr (str, optional): What happens to the dialog program's stderr:
+            'forward' (default), 'devnull', 'ring', 'log' or a logger. See
+            crossfiledialog.stderr.
+        **kwargs: Passed on to backends that take more options, such as
+            `filter` and `default_name` on Windows.
+
+    Returns:
+        str: The selected file's path for saving.
+    """
+    return get_default_session().save_file(
+        title, start_dir, timeout=timeout, on_spawn=on_spawn, paths=paths, stderr=stderr, **kwargs,
+    )
+
+
+def choose_folder(title=strings.choose_folder, start_dir=None, timeout=None, on_spawn=None, paths='str',
+                  rich=False, stderr=None):
+    """
+    Open a folder selection dialog.
+
+    Args:
+        title (str, optional): The title of the folder selection dialog.
+            Default is 'Choose a folder'
+        start_dir (str, optional): The starting directory for the dialog.
+        timeout (float, optional): Seconds after which the dialog is closed and
+            DialogTimeout is raised. Default is to wait indefinitely.
+        on_spawn (callable, optional): Called with the dialog process as soon as
+            it starts, so another thread can close it with
+            crossfiledialog.process.terminate().
+        paths (str, optional): 'str' (default), 'surrogateescape' or 'bytes'.
+            See crossfiledialog.paths.
+        stderr (str, optional): What happens to the dialog program's stderr:
+            'forward' (default), 'devnull', 'ring', 'log' or a logger. See
+            crossfiledialog.stderr.
+        rich (bool, optional): Return a SelectedFile instead of a str. Default is False.
+
+    Returns:
+        str: The selected folder's path. With `rich`, a SelectedFile, or None
+            if the dialog was cancelled.
+    """
+    return get_default_session().choose_folder(
+        title, start_dir, timeout=timeout, on_spawn=on_spawn, paths=paths, rich=rich, stderr=stderr,
+    )
+
+
+# Public names provided by optional modules, imported on first access.
+extensions = {
+    'open_file_nowait': 'crossfiledialog.nowait',
+    'open_multiple_nowait': 'crossfiledialog.nowait',
+    'save_file_nowait': 'crossfiledialog.nowait',
+    'choose_folder_nowait': 'crossfiledialog.nowait',
+    'iter_multiple': 'crossfiledialog.streaming',
+    'SelectedFile': 'crossfiledialog.selection',
+    'PreparedDialog': 'crossfiledialog.prepared',
+    'FilterSpec': 'crossfiledialog.filters',
+    'compile_filter': 'crossfiledialog.filters',
+    'DialogSession': 'crossfiledialog.session',
+}
+
+
+def __getattr__(name):
+    if name in extensions:
+        return getattr(importlib.import_module(extensions[name]), name)
+    raise AttributeError("module {0!r} has no attribute {1!r}".format(__name__, name))
+
+
+__all__ = ['open_file', 'open_multiple', 'save_file', 'choose_folder'] + list(extensions)
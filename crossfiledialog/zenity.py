@@ -1,59 +1,179 @@
 import os
+import re
 import sys
 
-from subprocess import PIPE, Popen
-
-from crossfiledialog import strings
+from crossfiledialog import history, metrics, registry, strings
 from crossfiledialog.exceptions import FileDialogException
+from crossfiledialog.filters import compile_filter
+from crossfiledialog.paths import check_mode, decode_output, split_lines, strip_newline
+from crossfiledialog.process import communicate, display_error, failed, spawn
+from crossfiledialog.resolver import which
+from crossfiledialog.stderr import Capture
 
 
 class ZenityException(FileDialogException):
     pass
 
 
-last_cwd = None
+zenity_binary = None
 
 
-def get_preferred_cwd():
+def get_preferred_cwd(kind='open'):
     possible_cwd = os.environ.get('FILEDIALOG_CWD', '')
     if possible_cwd:
         return possible_cwd
 
-    global last_cwd
-    if last_cwd:
-        return last_cwd
+    return history.recent(kind)
 
 
-def set_last_cwd(cwd):
-    global last_cwd
-    last_cwd = os.path.dirname(cwd)
+def set_last_cwd(cwd, kind='open'):
+    history.remember(kind, os.path.dirname(os.fsdecode(cwd)))
 
 
-def run_zenity(*args, **kwargs):
-    cmdlist = ['zenity']
+def get_binary():
+    # Resolve the absolute path once; every later call reuses it instead of
+    # letting Popen search PATH again.
+    global zenity_binary
+    if not zenity_binary:
+        zenity_binary = which('zenity') or 'zenity'
+    return zenity_binary
+
+
+def probe(binary):
+    """
+    Find out what the zenity at `binary` supports from its version.
+
+    zenity 3.90 and later are built on GTK 4, where --confirm-overwrite is
+    a deprecated no-op that prints a warning. --file-filter appeared in 2.24.
+    """
+    process = spawn([binary, '--version'])
+    stdout, _ = communicate(process, 10)
+    match = re.search(rb'(\d+)\.(\d+)', stdout)
+    if match is None:
+        return {}
+    version = (int(match.group(1)), int(match.group(2)))
+    gtk4 = version >= (3, 90)
+    return dict(
+        version=match.group(0).decode(),
+        gtk4=gtk4,
+        confirm_overwrite=not gtk4,
+        multiple_filters=version >= (2, 24),
+    )
+
+
+def capabilities():
+    return registry.capabilities(get_binary(), probe)
+
+
+def zenity_command(*args, **kwargs):
+    cmdlist = [get_binary()]
     cmdlist.extend('--{0}'.format(arg) for arg in args)
     cmdlist.extend('--{0}={1}'.format(k, v) for k, v in kwargs.items())
+    return cmdlist
+
+
+def process_output(returncode, stdout, stderr, paths='str', forward=True):
+    # GTK 3 exits with 1, like a cancelled dialog, when there is no display.
+    if failed(returncode) or (returncode == 1 and display_error(stderr)):
+        error = ZenityException("zenity failed with exit status {0}: {1}".format(
+            returncode, stderr.decode(errors='replace').strip() or 'no error message'
+        ))
+        error.returncode = returncode
+        raise error
 
+    stdout = decode_output(stdout, paths)
+
+    if forward and stderr.strip():
+        sys.stderr.write(stderr.decode())
+
+    return strip_newline(stdout)
+
+
+def popen_kwargs(kind='open'):
     extra_kwargs = dict()
-    preferred_cwd = get_preferred_cwd()
+    preferred_cwd = get_preferred_cwd(kind)
     if preferred_cwd:
         extra_kwargs['cwd'] = preferred_cwd
+    return extra_kwargs
+
+
+def run_command(cmdlist, timeout=None, on_spawn=None, paths='str', kind='open'):
+    check_mode(paths)
+    capture = Capture('zenity')
+    metrics.mark('command')
+    process = spawn(cmdlist, stderr=capture.target, **popen_kwargs(kind))
+    metrics.mark('spawned')
+    capture.start(process)
+    if on_spawn:
+        on_spawn(process)
+    with capture:
+        stdout, stderr = communicate(process, timeout)
+        metrics.process_exited(process)
+        stderr = capture.collect(stderr)
+        # parse_time starts here, so it covers decoding and splitting.
+        metrics.mark('output')
+        return process_output(process.returncode, stdout, stderr, paths, capture.forward)
+
+
+@metrics.instrument('zenity')
+def run_zenity(*args, **kwargs):
+    return run_command(zenity_command(*args, **kwargs))
 
-    process = Popen(cmdlist, stdout=PIPE, stderr=PIPE, **extra_kwargs)
-    stdout, stderr = process.communicate()
 
-    if process.returncode == -1:
-        raise ZenityException("Unexpected error during zenity call")
+def _filename_kwargs(zenity_kwargs, start_dir):
+    if start_dir:
+        # If the path doesn't end with a backslash, Zenity only
+        # starts in the parent directory and selects the directory.
+        if start_dir[-1] != "/":
+            start_dir += "/"
+        zenity_kwargs["filename"] = start_dir
+
+
+def _filter_args(filter):
+    spec = compile_filter(filter)
+    if spec is None:
+        return []
+    args = list(spec.zenity_args())
+    if not capabilities().get('multiple_filters', True):
+        del args[1:]
+    return args
+
+
+def open_file_command(title=strings.open_file, start_dir=None, filter=None):
+    zenity_kwargs = dict(title=title)
+    _filename_kwargs(zenity_kwargs, start_dir)
+    return zenity_command('file-selection', **zenity_kwargs) + _filter_args(filter)
 
-    stdout, stderr = stdout.decode(), stderr.decode()
 
-    if stderr.strip():
-        sys.stderr.write(stderr)
+def open_multiple_command(title=strings.open_multiple, start_dir=None, filter=None):
+    zenity_kwargs = dict(title=title)
+    _filename_kwargs(zenity_kwargs, start_dir)
+    # Newlines cannot be typed into a GTK file name, unlike '|', so they
+    # keep the paths apart unambiguously.
+    zenity_kwargs['separator'] = '\n'
+    return zenity_command('file-selection', 'multiple', **zenity_kwargs) + _filter_args(filter)
+
+
+def save_file_command(title=strings.save_file, start_dir=None):
+    zenity_kwargs = dict(title=title)
+    _filename_kwargs(zenity_kwargs, start_dir)
+    if capabilities().get('confirm_overwrite', True):
+        return zenity_command('file-selection', 'save', 'confirm-overwrite', **zenity_kwargs)
+    return zenity_command('file-selection', 'save', **zenity_kwargs)
+
+
+def choose_folder_command(title=strings.choose_folder, start_dir=None):
+    zenity_kwargs = dict(title=title)
+    _filename_kwargs(zenity_kwargs, start_dir)
+    return zenity_command('file-selection', 'directory', **zenity_kwargs)
+
 
-    return stdout.strip()
+def parse_multiple(result):
+    return split_lines(result)
 
 
-def open_file(title=strings.open_file, start_dir=None, filter=None):
+@metrics.instrument('zenity')
+def open_file(title=strings.open_file, start_dir=None, filter=None, timeout=None, on_spawn=None, paths='str'):
     """
     Open a file selection dialog for selecting a file using Zenity.
 
@@ -62,6 +182,14 @@ def open_file(title=strings.open_file, start_dir=None, filter=None):
             Default is 'Choose a file'
         start_dir (str, optional): The starting directory for the dialog.
         filter (str, list, dict, optional): The filter for file types to display.
+        timeout (float, optional): Seconds after which the dialog is closed and
+            DialogTimeout is raised. Default is to wait indefinitely.
+        on_spawn (callable, optional): Called with the dialog process as soon as
+            it starts, so another thread can close it with
+            crossfiledialog.process.terminate().
+        paths (str, optional): 'str' (default) decodes the dialog's output as
+            UTF-8, 'surrogateescape' decodes it like os.fsdecode() and 'bytes'
+            returns the raw bytes, for file names that are not valid UTF-8.
 
     Returns:
         str: The selected file's path.
@@ -69,45 +197,14 @@ def open_file(title=strings.open_file, start_dir=None, filter=None):
     Example:
         result = open_file(title="Select a file", start_dir="/path/to/starting/directory", filter="*.txt")
     """
-    zenity_args = []
-    zenity_kwargs = dict(title=title)
-
-    if start_dir:
-        # If the path doesn't end with a backslash, Zenity only
-        # starts in the parent directory and selects the directory.
-        if start_dir[-1] != "/":
-            start_dir += "/"
-        zenity_kwargs["filename"] = start_dir
-
-    if filter:
-        if isinstance(filter, str):
-            # Filter is a single wildcard.
-            zenity_kwargs["file-filter"] = filter
-        elif isinstance(filter, list):
-            # Filter is a list of wildcards.
-            if isinstance(filter[0], str):
-                zenity_kwargs["file-filter"] = " ".join(filter)
-            elif isinstance(filter[0], list):
-                zenity_args.extend("file-filter={0}".format(' '.join(f)) for f in filter)
-        elif isinstance(filter, dict):
-            # Filter is a dictionary mapping descriptions to wildcards.
-            for key, value in filter.items():
-                if isinstance(value, str):
-                    zenity_args.append("file-filter={0} | {1}".format(key, value))
-                elif isinstance(value, list):
-                    zenity_args.append("file-filter={0} | {1}".format(key, ' | '.join(value)))
-                else:
-                    raise ValueError("Invalid filter")
-        else:
-            raise ValueError("Invalid filter")
-
-    result = run_zenity('file-selection', *zenity_args, **zenity_kwargs)
+    result = run_command(open_file_command(title, start_dir, filter), timeout, on_spawn, paths)
     if result:
         set_last_cwd(result)
     return result
 
 
-def open_multiple(title=strings.open_multiple, start_dir=None, filter=None):
+@metrics.instrument('zenity')
+def open_multiple(title=strings.open_multiple, start_dir=None, filter=None, timeout=None, on_spawn=None, paths='str'):
     """
     Open a file selection dialog for selecting multiple files using Zenity.
 
@@ -116,6 +213,14 @@ def open_multiple(title=strings.open_multiple, start_dir=None, filter=None):
             Default is 'Choose one or more files'
         start_dir (str, optional): The starting directory for the dialog.
         filter (str, list, dict, optional): The filter for file types to display.
+        timeout (float, optional): Seconds after which the dialog is closed and
+            DialogTimeout is raised. Default is to wait indefinitely.
+        on_spawn (callable, optional): Called with the dialog process as soon as
+            it starts, so another thread can close it with
+            crossfiledialog.process.terminate().
+        paths (str, optional): 'str' (default) decodes the dialog's output as
+            UTF-8, 'surrogateescape' decodes it like os.fsdecode() and 'bytes'
+            returns the raw bytes, for file names that are not valid UTF-8.
 
     Returns:
         list[str]: A list of selected file paths.
@@ -124,47 +229,16 @@ def open_multiple(title=strings.open_multiple, start_dir=None, filter=None):
         result = open_multiple(title="Select multiple files",
         start_dir="/path/to/starting/directory", filter="*.txt")
     """
-    zenity_args = []
-    zenity_kwargs = dict(title=title)
-
-    if start_dir:
-        # If the path doesn't end with a backslash, Zenity only starts in the parent directory
-        # and selects the directory in the dialog.
-        if start_dir[-1] != "/":
-            start_dir += "/"
-        zenity_kwargs["filename"] = start_dir
-
-    if filter:
-        if isinstance(filter, str):
-            # Filter is a single wildcard.
-            zenity_kwargs["file-filter"] = filter
-        elif isinstance(filter, list):
-            # Filter is a list of wildcards.
-            if isinstance(filter[0], str):
-                zenity_kwargs["file-filter"] = " ".join(filter)
-            elif isinstance(filter[0], list):
-                zenity_args.extend("file-filter={0}".format(' '.join(f)) for f in filter)
-        elif isinstance(filter, dict):
-            # Filter is a dictionary mapping descriptions to wildcards.
-            for key, value in filter.items():
-                if isinstance(value, str):
-                    zenity_args.append("file-filter={0} | {1}".format(key, value))
-                elif isinstance(value, list):
-                    zenity_args.append("file-filter={0} | {1}".format(key, ' | '.join(value)))
-                else:
-                    raise ValueError("Invalid filter")
-        else:
-            raise ValueError("Invalid filter")
-
-    result = run_zenity('file-selection', 'multiple', *zenity_args, **zenity_kwargs)
-    split_result = result.split('|')
+    result = run_command(open_multiple_command(title, start_dir, filter), timeout, on_spawn, paths)
+    split_result = parse_multiple(result)
     if split_result:
         set_last_cwd(split_result[0])
         return split_result
     return []
 
 
-def save_file(title=strings.save_file, start_dir=None):
+@metrics.instrument('zenity')
+def save_file(title=strings.save_file, start_dir=None, timeout=None, on_spawn=None, paths='str'):
     """
     Open a save file dialog using Zenity.
 
@@ -172,6 +246,14 @@ def save_file(title=strings.save_file, start_dir=None):
         title (str, optional): The title of the save file dialog.
             Default is 'Enter the name of the file to save to'
         start_dir (str, optional): The starting directory for the dialog.
+        timeout (float, optional): Seconds after which the dialog is closed and
+            DialogTimeout is raised. Default is to wait indefinitely.
+        on_spawn (callable, optional): Called with the dialog process as soon as
+            it starts, so another thread can close it with
+            crossfiledialog.process.terminate().
+        paths (str, optional): 'str' (default) decodes the dialog's output as
+            UTF-8, 'surrogateescape' decodes it like os.fsdecode() and 'bytes'
+            returns the raw bytes, for file names that are not valid UTF-8.
 
     Returns:
         str: The selected file's path for saving.
@@ -179,23 +261,14 @@ def save_file(title=strings.save_file, start_dir=None):
     Example:
         result = save_file(title="Save file", start_dir="/path/to/starting/directory")
     """
-    zenity_args = ['file-selection', 'save', 'confirm-overwrite']
-    zenity_kwargs = dict(title=title)
-
-    if start_dir:
-        # If the path doesn't end with a backslash, Zenity only starts in the parent directory
-        # and selects the directory in the dialog.
-        if start_dir[-1] != "/":
-            start_dir += "/"
-        zenity_kwargs["filename"] = start_dir
-
-    result = run_zenity(*zenity_args, **zenity_kwargs)
+    result = run_command(save_file_command(title, start_dir), timeout, on_spawn, paths, 'save')
     if result:
-        set_last_cwd(result)
+        set_last_cwd(result, 'save')
     return result
 
 
-def choose_folder(title=strings.choose_folder, start_dir=None):
+@metrics.instrument('zenity')
+def choose_folder(title=strings.choose_folder, start_dir=None, timeout=None, on_spawn=None, paths='str'):
     """
     Open a folder selection dialog using Zenity.
 
@@ -203,6 +276,14 @@ def choose_folder(title=strings.choose_folder, start_dir=None):
         title (str, optional): The title of the folder selection dialog.
             Default is 'Choose a folder'
         start_dir (str, optional): The starting directory for the dialog.
+        timeout (float, optional): Seconds after which the dialog is closed and
+            DialogTimeout is raised. Default is to wait indefinitely.
+        on_spawn (callable, optional): Called with the dialog process as soon as
+            it starts, so another thread can close it with
+            crossfiledialog.process.terminate().
+        paths (str, optional): 'str' (default) decodes the dialog's output as
+            UTF-8, 'surrogateescape' decodes it like os.fsdecode() and 'bytes'
+            returns the raw bytes, for file names that are not valid UTF-8.
 
     Returns:
         str: The selected folder's path.
@@ -210,18 +291,9 @@ def choose_folder(title=strings.choose_folder, start_dir=None):
     Example:
         result = choose_folder(title="Select folder", start_dir="/path/to/starting/directory")
     """
-    zenity_kwargs = dict(title=title)
-
-    if start_dir:
-        # If the path doesn't end with a backslash, Zenity only starts in the parent directory
-        # and selects the directory in the dialog.
-        if start_dir[-1] != "/":
-            start_dir += "/"
-        zenity_kwargs["filename"] = start_dir
-
-    result = run_zenity('file-selection', 'directory', **zenity_kwargs)
+    result = run_command(choose_folder_command(title, start_dir), timeout, on_spawn, paths, 'folder')
     if result:
-        set_last_cwd(result)
+        set_last_cwd(result, 'folder')
     return result
 
 
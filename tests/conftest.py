@@ -0,0 +1,190 @@
+import os
+import sys
+import time
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+sys.path.insert(0, os.path.join(HERE, '..', 'benchmarks'))
+
+import fakes  # noqa: E402
+
+from crossfiledialog import history, kdialog, osascript, registry, stderr, wrapper, zenity  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def isolated(monkeypatch, tmp_path):
+    """Keep every test away from the user's desktop, bus, history and caches."""
+    monkeypatch.setenv('XDG_STATE_HOME', str(tmp_path / 'state'))
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    monkeypatch.setenv('DBUS_SESSION_BUS_ADDRESS', 'disabled:')
+    for name in ('FILEDIALOG_BACKEND', 'FILEDIALOG_CWD', 'XDG_CURRENT_DESKTOP', 'DESKTOP_SESSION', 'DISPLAY',
+                 'WAYLAND_DISPLAY'):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setattr(history, 'persistent', False)
+    monkeypatch.setattr(registry, 'persistent', False)
+    monkeypatch.setattr(stderr, 'default', 'forward')
+    monkeypatch.setattr(wrapper, 'backend', None)
+    monkeypatch.setattr(wrapper, 'retry_at', None)
+    monkeypatch.setattr(wrapper, 'default_session', None)
+    history._cache.clear()
+    registry.failed.clear()
+    registry._capabilities.clear()
+    yield
+    history._cache.clear()
+    registry.failed.clear()
+    registry._capabilities.clear()
+
+
+class FakeDialogs:
+    """
+    The fake zenity, kdialog, osascript and osacompile of benchmarks/fakes.py,
+    first on PATH.
+    """
+
+    def __init__(self, directory, monkeypatch):
+        self.directory = directory
+        self._monkeypatch = monkeypatch
+
+    def answer(self, paths, status=0):
+        """Make every dialog print `paths` (bytes), one per line, and exit with `status`."""
+        self._monkeypatch.setenv('FAKE_DIALOG_ANSWER', fakes.write_answer(self.directory, paths))
+        self._monkeypatch.setenv('FAKE_DIALOG_STATUS', str(status))
+
+    def answer_raw(self, data, status=0):
+        path = os.path.join(self.directory, 'raw-answer')
+        with open(path, 'wb') as fp:
+            fp.write(data)
+        self._monkeypatch.setenv('FAKE_DIALOG_ANSWER', path)
+        self._monkeypatch.setenv('FAKE_DIALOG_STATUS', str(status))
+
+    def replace(self, name, script):
+        """Replace the fake `name` with a shell script."""
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as fp:
+            fp.write('#!/bin/sh\n' + script)
+        os.chmod(path, 0o755)
+        return path
+
+
+@pytest.fixture
+def fake_dialogs(monkeypatch, tmp_path):
+    directory = fakes.create(str(tmp_path))
+    monkeypatch.setenv('PATH', directory + os.pathsep + '/usr/bin' + os.pathsep + '/bin')
+    for module, name in ((zenity, 'zenity_binary'), (kdialog, 'kdialog_binary')):
+        monkeypatch.setattr(module, name, None)
+    osascript._commands.clear()
+    yield FakeDialogs(directory, monkeypatch)
+    osascript.stop_runner()
+    osascript._commands.clear()
+
+
+# A dialog that stays open: records its pid, then waits to be closed.
+# Version probes are answered at once.
+HANGING_DIALOG = """[ "$1" = --version ] && echo 3.44.0 && exit 0
+echo $$ > "$FAKE_DIALOG_PIDFILE"
+exec sleep 20
+"""
+
+
+# A HANGING_DIALOG that ignores SIGTERM, and only goes away when killed.
+STUBBORN_DIALOG = HANGING_DIALOG.replace('echo $$', "trap '' TERM\necho $$")
+
+
+def wait_for_pid(path, timeout=10):
+    """The pid a HANGING_DIALOG wrote to `path`, once it has."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with open(path) as fp:
+                return int(fp.read())
+        except (OSError, ValueError):
+            time.sleep(0.01)
+    raise AssertionError("The dialog did not start")
+
+
+def process_gone(pid, timeout=5):
+    """Whether process `pid` ended (or is a zombie) within `timeout` seconds."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with open('/proc/{0}/stat'.format(pid)) as fp:
+                if fp.read().rsplit(')', 1)[1].split()[0] == 'Z':
+                    return True
+        except FileNotFoundError:
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.fixture
+def hanging_zenity(fake_dialogs, monkeypatch, tmp_path):
+    fake_dialogs.replace('zenity', HANGING_DIALOG)
+    pidfile = str(tmp_path / 'dialog.pid')
+    monkeypatch.setenv('FAKE_DIALOG_PIDFILE', pidfile)
+    monkeypatch.setenv('FILEDIALOG_BACKEND', 'zenity')
+    return pidfile
+
+
+@pytest.fixture
+def scripted(monkeypatch):
+    """crossfiledialog.testing, uninstalled again after the test."""
+    from crossfiledialog import testing
+    # install() keeps these for later scripts that do not set them.
+    for name in ('loop', 'latency', 'speed'):
+        monkeypatch.setattr(testing, name, getattr(testing, name))
+    yield testing
+    testing.uninstall()
+    testing.requests.clear()
+
+
+class FakeSignal:
+    """Just enough of pyqtSignal: queued connections wait in `queued` until run."""
+
+    def __init__(self, *types):
+        self.name = None
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        return instance.__dict__.setdefault('_signal_' + self.name, _BoundSignal())
+
+
+class _BoundSignal:
+    queued = []
+
+    def __init__(self):
+        self.slots = []
+
+    def connect(self, slot, type=None):
+        self.slots.append((slot, type))
+
+    def emit(self, *args):
+        for slot, type in self.slots:
+            if type == 'QueuedConnection':
+                self.queued.append(lambda: slot(*args))
+            else:
+                slot(*args)
+
+
+@pytest.fixture
+def fake_pyqt6(monkeypatch):
+    """
+    A PyQt6.QtCore the host has imported, without a running application.
+    Like PyQt6, its enums are only reachable through their scope.
+    """
+    import types
+
+    QtCore = types.ModuleType('PyQt6.QtCore')
+    QtCore.QObject = type('QObject', (), {'__init__': lambda self, parent=None: None})
+    QtCore.pyqtSignal = FakeSignal
+    QtCore.Qt = types.SimpleNamespace(ConnectionType=types.SimpleNamespace(QueuedConnection='QueuedConnection'))
+    QtCore.QCoreApplication = types.SimpleNamespace(instance=lambda: None)
+    QtCore.queued = _BoundSignal.queued
+    monkeypatch.setitem(sys.modules, 'PyQt6.QtCore', QtCore)
+    yield QtCore
+    del _BoundSignal.queued[:]
@@ -0,0 +1,65 @@
+import asyncio
+import time
+
+import pytest
+
+from conftest import STUBBORN_DIALOG, process_gone, wait_for_pid
+
+from crossfiledialog import aio, history
+from crossfiledialog.exceptions import DialogTimeout
+
+
+def test_result(fake_dialogs, monkeypatch):
+    monkeypatch.setenv('FILEDIALOG_BACKEND', 'zenity')
+    fake_dialogs.answer([b'/tmp/chosen.txt'])
+    assert asyncio.run(aio.open_file('Pick')) == '/tmp/chosen.txt'
+    assert asyncio.run(aio.save_file('Save')) == '/tmp/chosen.txt'
+    assert history.entries('open')[0] == '/tmp'
+    assert history.entries('save')[0] == '/tmp'
+
+
+def test_cancel_kills_the_dialog(hanging_zenity):
+    async def main():
+        task = asyncio.ensure_future(aio.open_file('Pick'))
+        pid = await asyncio.get_running_loop().run_in_executor(None, wait_for_pid, hanging_zenity)
+        task.cancel()
+        # The dialog is closed, not waited for.
+        done, _ = await asyncio.wait([task], timeout=5)
+        assert done and task.cancelled()
+        return pid
+
+    pid = asyncio.run(main())
+    assert process_gone(pid)
+
+
+def test_timeout_kills_the_dialog(hanging_zenity):
+    start = time.monotonic()
+    with pytest.raises(DialogTimeout):
+        asyncio.run(aio.choose_folder('Folder', timeout=0.5))
+    assert time.monotonic() - start < 5
+    assert process_gone(wait_for_pid(hanging_zenity))
+
+
+def test_event_loop_keeps_running(hanging_zenity):
+    async def main():
+        task = asyncio.ensure_future(aio.open_file('Pick'))
+        ticks = 0
+        while ticks < 20:
+            await asyncio.sleep(0.01)
+            ticks += 1
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return ticks
+
+    assert asyncio.run(main()) == 20
+
+
+def test_timeout_kills_a_stubborn_dialog(hanging_zenity, fake_dialogs, monkeypatch):
+    fake_dialogs.replace('zenity', STUBBORN_DIALOG)
+    monkeypatch.setattr(aio, 'kill_grace', 0.2)
+    start = time.monotonic()
+    with pytest.raises(DialogTimeout):
+        asyncio.run(aio.open_file('Pick', timeout=0.2))
+    assert time.monotonic() - start < 5
+    assert process_gone(wait_for_pid(hanging_zenity))
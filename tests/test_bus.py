@@ -0,0 +1,158 @@
+import shutil
+import socket
+import subprocess
+import time
+
+import pytest
+
+from crossfiledialog import bus
+from crossfiledialog.bus import Connection, DBusError, Message, Variant, marshal, split_signature, unmarshal
+
+
+@pytest.mark.parametrize('signature, values', [
+    ('y', [255]),
+    ('b', [True]),
+    ('nqiuxt', [-2, 3, -4, 5, -6, 7]),
+    ('d', [1.5]),
+    ('s', ['café \U0001f4c4']),
+    ('o', ['/org/freedesktop/portal/desktop']),
+    ('g', ['a{sv}']),
+    ('ay', [b'/tmp/caf\xe9\0']),
+    ('as', [['a', '', 'c']]),
+    ('as', [[]]),
+    ('aas', [[['a'], [], ['b', 'c']]]),
+    ('(ysx)', [(1, 'two', 3)]),
+    ('a{sa{ss}}', [{'outer': {'inner': 'value'}, 'empty': {}}]),
+    ('ya(sa(us))', [7, [('Images', [(0, '*.png'), (0, '*.jpg')]), ('All', [(0, '*')])]]),
+])
+@pytest.mark.parametrize('endian', ['<', '>'])
+def test_marshal_round_trip(signature, values, endian):
+    assert unmarshal(signature, marshal(signature, values, endian), endian) == values
+
+
+@pytest.mark.parametrize('endian', ['<', '>'])
+def test_variants_unmarshal_to_their_value(endian):
+    options = {
+        'multiple': Variant('b', True),
+        'current_folder': Variant('ay', b'/tmp\0'),
+        'filters': Variant('a(sa(us))', [('Text', [(0, '*.txt')])]),
+        'nested': Variant('v', Variant('u', 3)),
+    }
+    data = marshal('ua{sv}', [0, options], endian)
+    assert unmarshal('ua{sv}', data, endian) == [0, {
+        'multiple': True, 'current_folder': b'/tmp\0', 'filters': [('Text', [(0, '*.txt')])], 'nested': 3,
+    }]
+
+
+def test_alignment():
+    # The struct after a byte starts on an 8-byte boundary.
+    data = marshal('y(u)', [1, (2,)])
+    assert bytes(data) == b'\x01' + b'\0' * 7 + b'\x02\0\0\0'
+    # An empty array of 8-aligned elements still pads to its first element.
+    assert bytes(marshal('a(u)', [[]])) == b'\0' * 8
+
+
+def test_split_signature():
+    assert split_signature('sa{sv}(ii)aay') == ['s', 'a{sv}', '(ii)', 'aay']
+    with pytest.raises(ValueError):
+        split_signature('z')
+
+
+def test_marshal_checks_value_count():
+    with pytest.raises(ValueError):
+        marshal('ss', ['one'])
+
+
+def test_message_round_trip():
+    message = Message(bus.METHOD_CALL, path='/a/b', interface='x.y', member='Z', destination='x.y',
+                      signature='sa{sv}', body=['title', {'modal': Variant('b', True)}])
+    message.serial = 9
+    data = message.encode()
+    decoded, endian = bus._decode(data[:16], data[16:])
+    assert (decoded.path, decoded.member, decoded.serial, decoded.signature) == ('/a/b', 'Z', 9, 'sa{sv}')
+
+
+@pytest.fixture
+def daemon():
+    if shutil.which('dbus-daemon') is None:
+        pytest.skip('dbus-daemon is not installed')
+    process = subprocess.Popen(['dbus-daemon', '--session', '--nofork', '--print-address=1'],
+                               stdout=subprocess.PIPE, stdin=subprocess.DEVNULL)
+    address = process.stdout.readline().decode().strip()
+    yield address
+    process.terminate()
+    process.wait()
+    process.stdout.close()
+
+
+@pytest.fixture
+def echo(daemon):
+    # Replies to every call with the arguments it was sent.
+    service = Connection(daemon)
+    service.method_handler = lambda call: service.reply(call, call.signature, call.body)
+    client = Connection(daemon)
+    yield client, service
+    client.close()
+    service.close()
+
+
+def test_hello(daemon):
+    connection = Connection(daemon)
+    try:
+        assert connection.unique_name.startswith(':')
+    finally:
+        connection.close()
+
+
+@pytest.mark.parametrize('signature, body', [
+    ('s', ['hello']),
+    ('as', [['a', 'b c', 'd|e,f']]),
+    ('a(sa(us))', [[('Images', [(0, '*.png'), (1, 'image/jpeg')])]]),
+    ('ay', [b'\xff\xfe\0']),
+    ('a{ss}(ub)', [{'k': 'v'}, (7, False)]),
+])
+def test_call_round_trip(echo, signature, body):
+    client, service = echo
+    assert client.call(service.unique_name, '/echo', 'test.Echo', 'Echo', signature, body, timeout=10) == body
+
+
+def test_error_reply(echo):
+    client, service = echo
+    service.method_handler = lambda call: service.reply_error(call, 'test.Error.Failed', 'nope')
+    with pytest.raises(DBusError) as info:
+        client.call(service.unique_name, '/echo', 'test.Echo', 'Echo', timeout=10)
+    assert info.value.name == 'test.Error.Failed'
+    assert 'nope' in str(info.value)
+
+
+def test_signal_subscription(echo):
+    client, service = echo
+    received = []
+    token = client.subscribe('/sig', 'test.Signal', 'Ping', lambda message: received.append(message.body))
+    service.emit('/sig', 'test.Signal', 'Ping', 'u', [1], destination=client.unique_name)
+    client.call(service.unique_name, '/echo', 'test.Echo', 'Echo', timeout=10)
+    deadline = time.monotonic() + 5
+    while not received and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert received == [[1]]
+    client.unsubscribe(token)
+
+
+def test_pending_calls_fail_when_the_bus_drops(echo):
+    client, service = echo
+    service.method_handler = lambda call: None
+    future = client.call_async(service.unique_name, '/echo', 'test.Echo', 'Echo')
+    client._socket.shutdown(socket.SHUT_RDWR)
+    with pytest.raises(DBusError) as info:
+        future.result(5)
+    assert info.value.name == 'org.freedesktop.DBus.Error.Disconnected'
+    assert client.closed
+    with pytest.raises(DBusError):
+        client.call_async(service.unique_name, '/echo', 'test.Echo', 'Echo')
+
+
+def test_unreachable_bus(tmp_path):
+    with pytest.raises(OSError):
+        Connection('unix:path=' + str(tmp_path / 'missing'))
+    with pytest.raises(DBusError):
+        Connection('tcp:host=localhost,port=1')
@@ -0,0 +1,126 @@
+import io
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from crossfiledialog import __main__ as cli
+
+
+def run(capsys, *argv):
+    status = cli.main(list(argv))
+    return status, json.loads(capsys.readouterr().out)
+
+
+def test_result(scripted, capsys):
+    scripted.install(['/tmp/a.txt'])
+    assert run(capsys, 'open_file', '--backend', 'testing', '--title', 'Pick', '--filter', '*.py') == \
+        (0, dict(result='/tmp/a.txt'))
+    assert scripted.requests[0]['title'] == 'Pick'
+    assert scripted.requests[0]['filter'] == '*.py'
+
+
+def test_filters(scripted, capsys):
+    scripted.install(['/tmp/a', '/tmp/b'])
+    run(capsys, 'open_file', '--backend', 'testing', '--filter', '*.py', '--filter', '*.md')
+    run(capsys, 'open_file', '--backend', 'testing', '--filter', '{"Images": ["*.png"]}')
+    assert [request['filter'] for request in scripted.requests] == [['*.py', '*.md'], {'Images': ['*.png']}]
+
+
+def test_cancel(scripted, capsys):
+    scripted.install([None, None])
+    assert run(capsys, 'save_file', '--backend', 'testing') == (1, dict(result=''))
+    assert run(capsys, 'open_multiple', '--backend', 'testing') == (1, dict(result=[]))
+
+
+def test_errors(scripted, capsys):
+    scripted.install([])
+    status, output = run(capsys, 'open_file', '--backend', 'testing')
+    assert status == 2
+    assert output['error']['type'] == 'ScriptException'
+
+    status, output = run(capsys, 'open_file', '--backend', 'no-such-backend')
+    assert status == 2
+    assert 'error' in output
+
+    status, output = run(capsys, 'choose_folder', '--backend', 'testing', '--filter', '*.py')
+    assert status == 2
+    assert output['error']['type'] == 'RequestError'
+
+
+def test_usage_errors(capsys):
+    with pytest.raises(SystemExit) as info:
+        cli.main([])
+    assert info.value.code == 2
+    with pytest.raises(SystemExit):
+        cli.main(['open_file', '--batch'])
+    with pytest.raises(SystemExit):
+        cli.main(['open_file', '--paths', 'bytes'])
+
+
+def batch(monkeypatch, capsys, lines):
+    monkeypatch.setattr(sys, 'stdin', io.StringIO(''.join(line + '\n' for line in lines)))
+    status = cli.main(['--batch', '--backend', 'testing'])
+    return status, [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+
+def test_batch(scripted, monkeypatch, capsys):
+    scripted.install(['/tmp/a.txt', ['/tmp/b', '/tmp/c'], None])
+    status, responses = batch(monkeypatch, capsys, [
+        json.dumps(dict(id=1, function='open_file', title='One')),
+        '',
+        json.dumps(dict(id='two', function='open_multiple', filter=['*.tif'])),
+        json.dumps(dict(function='choose_folder')),
+    ])
+    assert status == 0
+    assert responses == [
+        dict(id=1, result='/tmp/a.txt'), dict(id='two', result=['/tmp/b', '/tmp/c']), dict(id=None, result=''),
+    ]
+
+
+def test_batch_errors_do_not_stop_it(scripted, monkeypatch, capsys):
+    scripted.install(['/tmp/a.txt'])
+    status, responses = batch(monkeypatch, capsys, [
+        'not json',
+        json.dumps([1, 2]),
+        json.dumps(dict(id=2, function='delete_everything')),
+        json.dumps(dict(id=3, function='save_file', filter='*.py')),
+        json.dumps(dict(id=4, function='open_file', colour='red')),
+        json.dumps(dict(id=5, function='open_file', paths='bytes')),
+        json.dumps(dict(id=6, function='open_file')),
+        json.dumps(dict(id=7, function='open_file')),
+    ])
+    assert status == 0
+    assert [response['id'] for response in responses] == [None, None, 2, 3, 4, 5, 6, 7]
+    assert [response['error']['type'] for response in responses[:6]] == [
+        'JSONDecodeError', 'RequestError', 'RequestError', 'RequestError', 'RequestError', 'RequestError',
+    ]
+    assert responses[6] == dict(id=6, result='/tmp/a.txt')
+    assert responses[7]['error']['type'] == 'ScriptException'
+
+
+def test_module_entry_point(fake_dialogs):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=root, FILEDIALOG_BACKEND='zenity')
+
+    def run_module(*args):
+        result = subprocess.run([sys.executable, '-m', 'crossfiledialog'] + list(args), env=env,
+                                capture_output=True, timeout=60)
+        return result.returncode, json.loads(result.stdout)
+
+    fake_dialogs.answer([b'/tmp/latin1-caf\xe9.txt'])
+    env.update(FAKE_DIALOG_ANSWER=os.environ['FAKE_DIALOG_ANSWER'], FAKE_DIALOG_STATUS='0')
+    status, output = run_module('open_file', '--paths', 'surrogateescape')
+    assert status == 0
+    assert os.fsencode(output['result']) == b'/tmp/latin1-caf\xe9.txt'
+
+    env['FAKE_DIALOG_STATUS'] = '1'
+    env['FAKE_DIALOG_ANSWER'] = ''
+    assert run_module('choose_folder') == (1, dict(result=''))
+
+    env['FAKE_DIALOG_STATUS'] = '255'
+    status, output = run_module('open_file')
+    assert status == 2
+    assert output['error']['type'] == 'ZenityException'
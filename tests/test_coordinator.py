@@ -0,0 +1,169 @@
+import threading
+import time
+
+import pytest
+
+import crossfiledialog
+
+from crossfiledialog import coordinator
+from crossfiledialog.coordinator import Coordinator
+from crossfiledialog.exceptions import DialogTimeout
+from crossfiledialog.session import DialogSession
+
+
+class Gate:
+    """A scripted answer that blocks until released, counting the dialogs shown."""
+
+    def __init__(self, result='/tmp/a.txt'):
+        self.result = result
+        self.release = threading.Event()
+        self.shown = []
+        self._lock = threading.Lock()
+
+    def __call__(self, kind, **arguments):
+        with self._lock:
+            self.shown.append(arguments['title'])
+        if not self.release.wait(10):
+            raise AssertionError("The gate was never released")
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+def run_threads(count, target):
+    results = [None] * count
+
+    def work(index):
+        try:
+            results[index] = target(index)
+        except Exception as e:
+            results[index] = e
+
+    threads = [threading.Thread(target=work, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "Timed out"
+        time.sleep(0.005)
+
+
+def test_identical_requests_share_one_dialog(scripted):
+    gate = Gate(['/tmp/a.txt', '/tmp/b.txt'])
+    scripted.install([gate], loop=True)
+    shared = Coordinator(max_concurrent=None)
+    session = DialogSession('testing', coordinator=shared)
+
+    threads, results = run_threads(10, lambda index: session.open_multiple('Pick', filter='*.txt'))
+    wait_until(lambda: shared.stats()['coalesced'] == 9)
+    gate.release.set()
+    for thread in threads:
+        thread.join()
+    assert gate.shown == ['Pick']
+    assert results == [['/tmp/a.txt', '/tmp/b.txt']] * 10
+    # Every caller gets a list of its own.
+    assert len({id(result) for result in results}) == 10
+    assert shared.stats()['dialogs'] == 1
+
+
+def test_different_requests_are_not_coalesced(scripted):
+    gate = Gate()
+    scripted.install([gate], loop=True)
+    shared = Coordinator(max_concurrent=None)
+    session = DialogSession('testing', coordinator=shared)
+
+    threads, results = run_threads(3, lambda index: session.open_file('Pick {0}'.format(index)))
+    wait_until(lambda: len(gate.shown) == 3)
+    gate.release.set()
+    for thread in threads:
+        thread.join()
+    assert shared.stats()['coalesced'] == 0
+    assert results == ['/tmp/a.txt'] * 3
+
+
+def test_equivalent_filters_coalesce():
+    assert Coordinator.request_key('open_file', 'Pick', None, {'Text': ['*.txt']}) == \
+        Coordinator.request_key('open_file', 'Pick', None, crossfiledialog.compile_filter({'Text': ('*.txt',)}))
+    assert Coordinator.request_key('open_file', 'Pick', None, '*.txt') != \
+        Coordinator.request_key('open_file', 'Pick', None, '*.txt', 'bytes')
+
+
+def test_a_later_request_opens_a_new_dialog(scripted):
+    scripted.install(['/tmp/a.txt', '/tmp/b.txt'])
+    session = DialogSession('testing', coordinator=Coordinator())
+    assert session.open_file('Pick') == '/tmp/a.txt'
+    assert session.open_file('Pick') == '/tmp/b.txt'
+
+
+def test_errors_reach_every_caller(scripted):
+    gate = Gate(RuntimeError('dialog crashed'))
+    scripted.install([gate], loop=True)
+    shared = Coordinator(max_concurrent=None)
+    session = DialogSession('testing', coordinator=shared)
+
+    threads, results = run_threads(4, lambda index: session.choose_folder('Folder'))
+    wait_until(lambda: shared.stats()['coalesced'] == 3)
+    gate.release.set()
+    for thread in threads:
+        thread.join()
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_queue_is_first_come_first_served(scripted):
+    gate = Gate()
+    scripted.install([gate], loop=True)
+    shared = Coordinator(max_concurrent=1)
+    session = DialogSession('testing', coordinator=shared)
+
+    first, _ = run_threads(1, lambda index: session.open_file('first'))
+    wait_until(lambda: gate.shown == ['first'])
+    queued = []
+    for index in range(4):
+        threads, _ = run_threads(1, lambda _, index=index: session.open_file('queued {0}'.format(index)))
+        queued.extend(threads)
+        wait_until(lambda: shared.stats()['queue_depth'] == index + 1)
+    assert shared.stats()['running'] == 1
+
+    gate.release.set()
+    for thread in first + queued:
+        thread.join()
+    assert gate.shown == ['first'] + ['queued {0}'.format(index) for index in range(4)]
+    stats = shared.stats()
+    assert (stats['queued'], stats['max_queue_depth'], stats['queue_depth'], stats['running']) == (4, 4, 0, 0)
+    assert stats['max_wait_time'] > 0
+    assert sum(stats['wait_histogram']['counts']) == 4
+
+
+def test_timeout_while_queued(scripted):
+    gate = Gate()
+    scripted.install([gate], loop=True)
+    shared = Coordinator(max_concurrent=1)
+    session = DialogSession('testing', coordinator=shared)
+
+    first, _ = run_threads(1, lambda index: session.open_file('first'))
+    wait_until(lambda: gate.shown == ['first'])
+    with pytest.raises(DialogTimeout):
+        session.save_file('second', timeout=0.1)
+    gate.release.set()
+    first[0].join()
+    stats = shared.stats()
+    assert stats['timeouts'] == 1
+    assert stats['queue_depth'] == 0
+    assert gate.shown == ['first']
+
+
+def test_install(scripted):
+    scripted.install([Gate()], loop=True)
+    scripted.script[0].release.set()
+    installed = coordinator.install(max_concurrent=2)
+    try:
+        assert crossfiledialog.open_file('Pick') == '/tmp/a.txt'
+        assert installed.stats()['dialogs'] == 1
+    finally:
+        coordinator.uninstall()
+    crossfiledialog.open_file('Pick')
+    assert installed.stats()['dialogs'] == 1
@@ -0,0 +1,135 @@
+import pytest
+
+from crossfiledialog import history, kdialog, osascript, zenity
+from crossfiledialog.filters import FilterSpec, compile_filter
+from crossfiledialog.prepared import PreparedDialog
+
+SINGLE = '*.py'
+FLAT = ['*.py', '*.md']
+NESTED = [['*.py', '*.md'], ['*.txt']]
+NAMED = {'Python': ['*.py', '*.pyw'], 'Text': '*.txt'}
+
+
+@pytest.fixture
+def bare_binaries(monkeypatch):
+    """Commands start with the program name, as they did before the binaries were resolved."""
+    monkeypatch.setattr(zenity, 'zenity_binary', 'zenity')
+    monkeypatch.setattr(kdialog, 'kdialog_binary', 'kdialog')
+
+
+# The argv and filter arguments the backends built before filters were compiled.
+
+@pytest.mark.parametrize('filter, argv', [
+    (SINGLE, ['zenity', '--file-selection', '--title=Pick', '--file-filter=*.py']),
+    (FLAT, ['zenity', '--file-selection', '--title=Pick', '--file-filter=*.py *.md']),
+    (NESTED, ['zenity', '--file-selection', '--file-filter=*.py *.md', '--file-filter=*.txt', '--title=Pick']),
+    (NAMED, [
+        'zenity', '--file-selection', '--file-filter=Python | *.py | *.pyw', '--file-filter=Text | *.txt',
+        '--title=Pick',
+    ]),
+])
+def test_zenity(bare_binaries, filter, argv):
+    # zenity's options may come in any order; filters keep theirs.
+    command = zenity.open_file_command('Pick', None, filter)
+    assert sorted(command) == sorted(argv)
+    assert [arg for arg in command if arg.startswith('--file-filter')] == \
+        [arg for arg in argv if arg.startswith('--file-filter')]
+
+
+@pytest.mark.parametrize('filter, argument', [
+    (SINGLE, '*.py'),
+    (FLAT, '*.py *.md'),
+    (NESTED, '*.py *.md | *.txt'),
+    (NAMED, 'Python (*.py *.pyw) | Text (*.txt)'),
+])
+def test_kdialog(bare_binaries, filter, argument):
+    assert kdialog.open_file_command('Pick', '/srv', filter) == \
+        ['kdialog', '--getopenfilename', '/srv', argument, '--title', 'Pick']
+
+
+@pytest.mark.parametrize('filter, types', [
+    (SINGLE, ['py']),
+    (FLAT + ['README'], ['py', 'md']),
+    (NAMED, ['py', 'pyw', 'txt']),
+    # Nested lists used to be ignored.
+    (NESTED, ['py', 'md', 'txt']),
+])
+def test_applescript(filter, types):
+    assert osascript.open_file_command('Pick', None, filter)[-1] == '\n'.join(types)
+
+
+@pytest.mark.parametrize('filter, specs', [
+    (SINGLE, [('*.py', '*.py')]),
+    (FLAT, [('*.py;*.md', '*.py;*.md')]),
+    (NESTED, [('*.py;*.md', '*.py;*.md'), ('*.txt', '*.txt')]),
+    (NAMED, [('Python', '*.py;*.pyw'), ('Text', '*.txt')]),
+])
+def test_comdlg(filter, specs):
+    assert list(compile_filter(filter).comdlg_specs()) == specs
+
+
+def test_labelled_formats():
+    spec = compile_filter([['*.png', '*.jpg'], ['*.txt']])
+    assert spec.qt_name_filters() == ('*.png *.jpg', '*.txt')
+    assert spec.labelled_groups() == (('*.png *.jpg', ('*.png', '*.jpg')), ('*.txt', ('*.txt',)))
+    assert compile_filter(NAMED).qt_name_filters() == ('Python (*.py *.pyw)', 'Text (*.txt)')
+    assert compile_filter(NAMED).portal_filters() == (
+        ('Python', [(0, '*.py'), (0, '*.pyw')]), ('Text', [(0, '*.txt')]),
+    )
+
+
+def test_compiled_once():
+    spec = compile_filter({'Python': ['*.py', '*.pyw'], 'Text': '*.txt'})
+    assert spec is compile_filter(NAMED)
+    assert compile_filter(spec) is spec
+    assert spec.zenity_args() is spec.zenity_args()
+    # The same patterns in another shape render differently.
+    assert compile_filter(['*.py']) is not compile_filter('*.py')
+    assert compile_filter(None) is None and compile_filter([]) is None
+
+
+def test_immutable():
+    spec = compile_filter(FLAT)
+    with pytest.raises(AttributeError):
+        spec.groups = ()
+    assert isinstance(spec, FilterSpec)
+
+
+@pytest.mark.parametrize('filter', [[1], {'Text': 1}, 5, [['*.py', 2]]])
+def test_invalid(filter):
+    with pytest.raises(ValueError):
+        compile_filter(filter)
+
+
+def test_prepared_dialog(fake_dialogs):
+    fake_dialogs.answer([b'/srv/a.py'])
+    dialog = PreparedDialog('open_file', 'Pick', filter=NAMED, backend=zenity)
+    assert list(dialog.command) == zenity.open_file_command('Pick', None, NAMED)
+    assert dialog.filter is compile_filter(NAMED)
+    assert dialog.show() == '/srv/a.py'
+    assert dialog.show() == '/srv/a.py'
+    assert history.recent('open') == '/srv'
+
+
+def test_prepared_open_multiple(fake_dialogs):
+    fake_dialogs.answer([b'/srv/a.py', b'/srv/b.py'])
+    dialog = PreparedDialog('open_multiple', filter=FLAT, backend=kdialog)
+    assert dialog.show() == ['/srv/a.py', '/srv/b.py']
+
+    fake_dialogs.answer([], status=1)
+    assert dialog.show() == []
+
+
+def test_prepared_without_a_command(scripted):
+    # Backends that take the compiled filter directly.
+    scripted.install(['/srv/folder', '/srv/a.py'])
+    assert PreparedDialog('choose_folder').show() == '/srv/folder'
+    assert PreparedDialog('open_file', filter=SINGLE).show() == '/srv/a.py'
+    assert scripted.requests[-1]['filter'] is compile_filter(SINGLE)
+
+
+def test_prepared_arguments():
+    with pytest.raises(ValueError):
+        PreparedDialog('open_folder', backend=zenity)
+    with pytest.raises(ValueError):
+        PreparedDialog('save_file', filter=SINGLE, backend=zenity)
@@ -0,0 +1,68 @@
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+import pytest
+
+from crossfiledialog import gtk
+
+
+def test_available_does_not_start_gtk(monkeypatch):
+    monkeypatch.setenv('DISPLAY', ':0')
+    monkeypatch.setattr(gtk.importlib.util, 'find_spec', lambda name: object())
+    assert gtk.available()
+    assert gtk._thread is None
+    assert 'gi.repository.Gtk' not in sys.modules
+
+
+def test_available_needs_a_display(monkeypatch):
+    monkeypatch.setattr(gtk.importlib.util, 'find_spec', lambda name: object())
+    assert not gtk.available()
+
+
+def test_available_declines_host_gtk(monkeypatch):
+    monkeypatch.setenv('DISPLAY', ':0')
+    monkeypatch.setattr(gtk.importlib.util, 'find_spec', lambda name: object())
+    monkeypatch.setitem(sys.modules, 'gi.repository.Gtk', object())
+    assert not gtk.available()
+
+
+@pytest.fixture
+def xvfb():
+    if shutil.which('Xvfb') is None:
+        pytest.skip('Xvfb is not installed')
+    pytest.importorskip('gi')
+    display = ':{0}'.format(90 + os.getpid() % 100)
+    server = subprocess.Popen(['Xvfb', display, '-nolisten', 'tcp'], stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 10
+    while not os.path.exists('/tmp/.X11-unix/X' + display[1:]):
+        if time.monotonic() > deadline or server.poll() is not None:
+            server.kill()
+            pytest.skip('Xvfb did not start')
+        time.sleep(0.05)
+    yield display
+    server.terminate()
+    server.wait()
+
+
+def test_dialog_under_xvfb(xvfb, tmp_path):
+    # In a child process: the GTK thread cannot be stopped once started.
+    code = '\n'.join([
+        'from crossfiledialog import gtk',
+        'from crossfiledialog.exceptions import DialogTimeout',
+        'assert gtk.available() and gtk._thread is None',
+        'try:',
+        '    gtk.open_file("Pick", {0!r}, timeout=1)'.format(str(tmp_path)),
+        'except DialogTimeout:',
+        '    print("timeout")',
+        'gtk.start()',
+        'print(gtk.available())',
+    ])
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, DISPLAY=xvfb, PYTHONPATH=root)
+    env.pop('WAYLAND_DISPLAY', None)
+    result = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split() == [b'timeout', b'True']
@@ -0,0 +1,97 @@
+import os
+import threading
+
+import pytest
+
+from crossfiledialog import history
+
+
+@pytest.fixture
+def persistent(monkeypatch):
+    monkeypatch.setattr(history, 'persistent', True)
+    monkeypatch.setattr(history, 'application', 'tests')
+
+
+def lines(kind):
+    with open(os.path.join(history.state_directory(), kind), 'rb') as fp:
+        return fp.read().splitlines()
+
+
+def test_round_trip(persistent):
+    for directory in ('/srv/a', '/srv/b', '/srv/a', '/srv/c'):
+        history.remember('open', directory)
+    history.remember('save', '/srv/saved')
+    assert history.entries('open') == ['/srv/c', '/srv/a', '/srv/b']
+
+    # Another run of the application: only the files are left.
+    history._cache.clear()
+    assert history.entries('open') == ['/srv/c', '/srv/a', '/srv/b']
+    assert history.entries('save') == ['/srv/saved']
+    assert history.entries('folder') == []
+
+
+def test_recent_skips_missing_directories(persistent, tmp_path):
+    history.remember('folder', str(tmp_path))
+    history.remember('folder', str(tmp_path / 'gone'))
+    assert history.recent('folder') == str(tmp_path)
+
+
+def test_undecodable_names(persistent):
+    directory = os.fsdecode(b'/srv/caf\xe9')
+    history.remember('open', directory)
+    history._cache.clear()
+    assert history.entries('open') == [directory]
+
+
+def test_compaction(persistent, monkeypatch):
+    monkeypatch.setattr(history, 'max_entries', 4)
+    for index in range(100):
+        history.remember('open', '/srv/{0}'.format(index % 6))
+    # Rewritten to the most recent entries whenever it grew too large.
+    assert len(lines('open')) < 4 * 4
+    assert history.entries('open') == ['/srv/3', '/srv/2', '/srv/1', '/srv/0']
+    history._cache.clear()
+    assert history.entries('open') == ['/srv/3', '/srv/2', '/srv/1', '/srv/0']
+
+
+def test_sees_lines_appended_meanwhile(persistent):
+    history.remember('open', '/srv/a')
+    # Another process appends between our read and our append.
+    with open(os.path.join(history.state_directory(), 'open'), 'ab') as fp:
+        fp.write(b'/srv/other\n')
+    history.remember('open', '/srv/b')
+    assert history.entries('open') == ['/srv/b', '/srv/other', '/srv/a']
+
+
+def test_clear(persistent):
+    history.remember('open', '/srv/a')
+    history.remember('save', '/srv/b')
+    history.clear('open')
+    assert history.entries('open') == []
+    assert history.entries('save') == ['/srv/b']
+    history.clear()
+    history._cache.clear()
+    assert history.entries('save') == []
+
+
+@pytest.mark.skipif(history.fcntl is None, reason="needs flock")
+def test_waits_for_a_compaction(persistent):
+    history.remember('open', '/srv/a')
+    path = os.path.join(history.state_directory(), 'open')
+    # Another process is compacting the file.
+    fd = os.open(path, os.O_RDWR)
+    history.fcntl.flock(fd, history.fcntl.LOCK_EX)
+    try:
+        writer = threading.Thread(target=history.remember, args=('open', '/srv/b'))
+        writer.start()
+        writer.join(0.2)
+        assert writer.is_alive()
+        with open(path + '.compacted', 'wb') as fp:
+            fp.write(b'/srv/a\n/srv/other\n')
+        os.replace(path + '.compacted', path)
+    finally:
+        os.close(fd)
+    writer.join(5)
+    # Appended to the new file, not to the one it replaced.
+    assert lines('open') == [b'/srv/a', b'/srv/other', b'/srv/b']
+    assert history.entries('open') == ['/srv/b', '/srv/other', '/srv/a']
@@ -0,0 +1,79 @@
+import os
+import signal
+import subprocess
+import sys
+
+import pytest
+
+from conftest import process_gone, wait_for_pid
+
+import crossfiledialog
+
+from crossfiledialog import launcher, process, zenity
+
+pytestmark = pytest.mark.skipif(not hasattr(os, 'fork'), reason="needs fork")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def started(fake_dialogs, monkeypatch):
+    monkeypatch.setattr(process, 'spawn_method', 'launcher')
+    monkeypatch.setenv('FILEDIALOG_BACKEND', 'zenity')
+    launcher.start()
+    yield fake_dialogs
+    launcher.stop()
+
+
+def test_dialog_through_the_launcher(started):
+    started.answer([b'/tmp/a.txt'])
+    dialog = process.spawn([zenity.get_binary(), '--file-selection'])
+    assert isinstance(dialog, launcher.LauncherProcess)
+    assert dialog.communicate()[0] == b'/tmp/a.txt\n'
+    assert dialog.returncode == 0
+
+
+def test_sees_later_environment_changes(started):
+    # FAKE_DIALOG_ANSWER is set after the launcher forked.
+    started.answer([b'/tmp/b.txt'])
+    assert crossfiledialog.open_file() == '/tmp/b.txt'
+
+
+def test_missing_program(started):
+    with pytest.raises(FileNotFoundError):
+        process.spawn([os.path.join(started.directory, 'missing')])
+
+
+def test_stop_closes_dialogs(started, hanging_zenity):
+    dialog = process.spawn([zenity.get_binary()])
+    pid = wait_for_pid(hanging_zenity)
+    launcher.stop()
+    assert process_gone(pid)
+    assert dialog.wait(5) is not None
+    assert not launcher.running()
+
+
+@pytest.mark.skipif(sys.platform != 'linux', reason="needs PR_SET_PDEATHSIG")
+def test_exits_with_its_host():
+    # The host dies while another process keeps its end of the socket
+    # open, so only the death signal tells the launcher.
+    host = subprocess.Popen(
+        [sys.executable, '-c', 'import os, subprocess, sys\n'
+         'from crossfiledialog import launcher\n'
+         'launcher.start()\n'
+         'fd = launcher._client.sock.fileno()\n'
+         'holder = subprocess.Popen(["sleep", "20"], pass_fds=[fd])\n'
+         'print(launcher._client.pid, holder.pid, flush=True)\n'
+         'sys.stdin.read()\n'
+         'os._exit(0)\n'],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, cwd=ROOT,
+    )
+    pid, holder = map(int, host.stdout.readline().split())
+    try:
+        assert not process_gone(pid, timeout=0.3)
+        host.stdin.close()
+        host.wait(5)
+        assert process_gone(pid)
+    finally:
+        host.stdout.close()
+        os.kill(holder, signal.SIGKILL)
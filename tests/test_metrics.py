@@ -0,0 +1,100 @@
+import json
+
+import pytest
+
+import crossfiledialog
+
+from crossfiledialog import metrics, zenity
+from crossfiledialog.exceptions import DialogTimeout
+
+
+@pytest.fixture
+def events():
+    """Events of the dialogs the test shows."""
+    received = []
+    metrics.add_hook(received.append)
+    yield received
+    metrics.remove_hook(received.append)
+
+
+@pytest.fixture
+def collecting():
+    metrics.reset()
+    metrics.enable()
+    yield
+    metrics.disable()
+    metrics.reset()
+
+
+def test_inactive_without_hooks(events):
+    assert metrics.active
+    metrics.remove_hook(events.append)
+    assert not metrics.active
+    metrics.add_hook(events.append)
+
+
+def test_process_phases(events, fake_dialogs):
+    fake_dialogs.answer([b'/tmp/a.txt', b'/tmp/b.txt'])
+    zenity.open_multiple('Pick')
+    event, = events
+    assert (event.backend, event.function, event.outcome, event.result_count) == \
+        ('zenity', 'open_multiple', 'selected', 2)
+    for phase in ('argv_time', 'spawn_time', 'wall_time', 'parse_time'):
+        assert 0 <= getattr(event, phase) <= event.total_time
+    assert event.max_rss > 0
+    assert event.cpu_time >= 0
+    assert json.dumps(event.as_dict())
+
+
+def test_outcomes(events, scripted):
+    scripted.install(['/tmp/a.txt', None, dict(result='/tmp/a.txt', latency=5)])
+    crossfiledialog.open_file()
+    crossfiledialog.open_file()
+    with pytest.raises(DialogTimeout):
+        crossfiledialog.open_file(timeout=0.01)
+    with pytest.raises(scripted.ScriptException):
+        crossfiledialog.open_file()
+    assert [event.outcome for event in events] == ['selected', 'cancelled', 'timeout', 'error']
+    assert isinstance(events[-1].error, scripted.ScriptException)
+    # No process: only the call as a whole is timed.
+    assert events[0].spawn_time is None and events[0].total_time >= 0
+
+
+def test_one_event_per_call(events, fake_dialogs, monkeypatch):
+    # The wrapper and the backend are both instrumented.
+    monkeypatch.setenv('FILEDIALOG_BACKEND', 'zenity')
+    fake_dialogs.answer([b'/tmp/a.txt'])
+    crossfiledialog.open_file()
+    assert [event.backend for event in events] == ['zenity']
+
+
+def test_failing_hook_is_ignored(events, scripted, capsys):
+    def hook(event):
+        raise RuntimeError("broken hook")
+    metrics.add_hook(hook)
+    try:
+        scripted.install(['/tmp/a.txt'])
+        assert crossfiledialog.open_file() == '/tmp/a.txt'
+    finally:
+        metrics.remove_hook(hook)
+    assert 'broken hook' in capsys.readouterr().err
+    assert len(events) == 1
+
+
+def test_histograms(collecting, scripted):
+    scripted.install([dict(result='/tmp/a.txt', latency=0.03), None, None])
+    for _ in range(3):
+        crossfiledialog.open_file()
+    snapshot = metrics.snapshot()
+    assert snapshot['counters'] == {'testing.selected': 1, 'testing.cancelled': 2}
+    histogram = snapshot['histograms']['testing.total_time']
+    assert histogram['buckets'] == list(metrics.buckets)
+    assert len(histogram['counts']) == len(metrics.buckets) + 1
+    assert sum(histogram['counts']) == 3
+    # The slow answer is not in the buckets below its latency.
+    assert sum(histogram['counts'][:metrics.buckets.index(0.025) + 1]) == 2
+    assert histogram['sum'] >= 0.03
+    assert json.dumps(snapshot)
+
+    metrics.reset()
+    assert metrics.snapshot() == dict(counters={}, histograms={})
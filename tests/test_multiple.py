@@ -0,0 +1,68 @@
+import asyncio
+import os
+
+import pytest
+
+import fakes
+
+from crossfiledialog import aio, kdialog, nowait, osascript, streaming, zenity
+
+BACKENDS = [zenity, kdialog, osascript]
+
+NAMES = [
+    b'/tmp/with space.txt',
+    b'/tmp/  leading and trailing  ',
+    b'/tmp/comma, separated.txt',
+    b'/tmp/pipe|separated.txt',
+    b'/tmp/a|b, c d.txt',
+]
+
+
+def backend_id(backend):
+    return backend.__name__.rsplit('.', 1)[-1]
+
+
+@pytest.mark.parametrize('backend', BACKENDS, ids=backend_id)
+def test_names_with_separators(fake_dialogs, backend):
+    fake_dialogs.answer(NAMES)
+    assert backend.open_multiple('Pick') == [name.decode() for name in NAMES]
+
+
+@pytest.mark.parametrize('backend', BACKENDS, ids=backend_id)
+def test_adversarial_names(fake_dialogs, backend):
+    expected = fakes.adversarial_paths()
+    fake_dialogs.answer(expected)
+    assert [os.fsencode(path) for path in backend.open_multiple('Pick', paths='surrogateescape')] == expected
+
+
+@pytest.mark.parametrize('backend', BACKENDS, ids=backend_id)
+def test_single_selection_keeps_separators(fake_dialogs, backend):
+    fake_dialogs.answer([b'/tmp/a|b, c d.txt'])
+    assert backend.open_file('Pick') == '/tmp/a|b, c d.txt'
+
+
+@pytest.mark.parametrize('backend', BACKENDS, ids=backend_id)
+def test_nothing_selected(fake_dialogs, backend):
+    fake_dialogs.answer([])
+    assert backend.open_multiple('Pick') == []
+
+
+def test_zenity_separates_with_newlines(fake_dialogs):
+    assert '--separator=\n' in zenity.open_multiple_command('Pick')
+
+
+def test_kdialog_separates_output(fake_dialogs):
+    assert '--separate-output' in kdialog.open_multiple_command('Pick')
+
+
+@pytest.fixture
+def zenity_backend(fake_dialogs, monkeypatch):
+    monkeypatch.setenv('FILEDIALOG_BACKEND', 'zenity')
+    fake_dialogs.answer(NAMES)
+
+
+def test_variants_agree(zenity_backend):
+    expected = [name.decode() for name in NAMES]
+    assert asyncio.run(aio.open_multiple('Pick')) == expected
+    assert nowait.open_multiple_nowait('Pick').result(10) == expected
+    assert list(streaming.iter_multiple('Pick')) == expected
@@ -0,0 +1,117 @@
+import threading
+import time
+
+import pytest
+
+from conftest import STUBBORN_DIALOG, process_gone, wait_for_pid
+
+from crossfiledialog import nowait
+from crossfiledialog.exceptions import DialogTimeout
+
+
+def test_result(fake_dialogs, monkeypatch):
+    monkeypatch.setenv('FILEDIALOG_BACKEND', 'zenity')
+    fake_dialogs.answer([b'/tmp/a.txt', b'/tmp/b c.txt'])
+    assert nowait.open_multiple_nowait('Pick').result(10) == ['/tmp/a.txt', '/tmp/b c.txt']
+    fake_dialogs.answer([b'/tmp/a.txt'])
+    assert nowait.open_file_nowait('Pick').result(10) == '/tmp/a.txt'
+
+
+def test_cancel_kills_the_dialog(hanging_zenity):
+    handle = nowait.open_file_nowait('Pick')
+    pid = wait_for_pid(hanging_zenity)
+    assert not handle.done()
+    assert handle.cancel()
+    assert handle.cancelled()
+    assert process_gone(pid)
+
+
+def test_timeout_kills_the_dialog(hanging_zenity):
+    handle = nowait.save_file_nowait('Save', timeout=0.5)
+    with pytest.raises(DialogTimeout):
+        handle.result(5)
+    assert process_gone(wait_for_pid(hanging_zenity))
+
+
+def test_callbacks_run_once_through_the_adapter(fake_dialogs, monkeypatch):
+    monkeypatch.setenv('FILEDIALOG_BACKEND', 'zenity')
+    fake_dialogs.answer([b'/tmp/a.txt'])
+    scheduled = []
+    done = threading.Event()
+
+    def adapter(callback):
+        scheduled.append(callback)
+        done.set()
+
+    handle = nowait.open_file_nowait('Pick')
+    handle.add_done_callback(lambda h: scheduled.append(h.result()), adapter=adapter)
+    assert done.wait(10)
+    scheduled.pop()()
+    assert scheduled == ['/tmp/a.txt']
+
+
+def test_many_dialogs_share_one_watcher(fake_dialogs, monkeypatch):
+    monkeypatch.setenv('FILEDIALOG_BACKEND', 'zenity')
+    fake_dialogs.answer([b'/tmp/a.txt'])
+    handles = [nowait.choose_folder_nowait('Folder') for _ in range(20)]
+    assert [handle.result(10) for handle in handles] == ['/tmp/a.txt'] * 20
+    watchers = [t for t in threading.enumerate() if t.name == 'crossfiledialog-watcher']
+    assert len(watchers) <= 1
+    # The watcher exits once no dialog is left.
+    deadline = time.monotonic() + 5
+    while nowait._watcher._thread is not None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert nowait._watcher._thread is None
+
+
+def test_cancel_while_completing(fake_dialogs, monkeypatch):
+    from crossfiledialog import zenity
+
+    monkeypatch.setenv('FILEDIALOG_BACKEND', 'zenity')
+    fake_dialogs.answer([b'/tmp/a.txt'])
+    handles = []
+    opened = threading.Event()
+    process_output = zenity.process_output
+
+    def cancel_first(*args, **kwargs):
+        # The dialog answered; its handle is cancelled before it is set.
+        if not handles[1:]:
+            opened.wait(5)
+            handles[0].cancel()
+        return process_output(*args, **kwargs)
+
+    monkeypatch.setattr(zenity, 'process_output', cancel_first)
+    handles.append(nowait.open_file_nowait('Pick'))
+    opened.set()
+    deadline = time.monotonic() + 5
+    while not handles[0].cancelled() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert handles[0].cancelled()
+    # The watcher survived and serves the next dialog.
+    handles.append(nowait.open_file_nowait('Pick'))
+    assert handles[1].result(10) == '/tmp/a.txt'
+
+
+def test_timeout_kills_a_stubborn_dialog(hanging_zenity, fake_dialogs, monkeypatch):
+    fake_dialogs.replace('zenity', STUBBORN_DIALOG)
+    monkeypatch.setattr(nowait, 'kill_grace', 0.2)
+    handle = nowait.open_file_nowait('Pick', timeout=0.2)
+    with pytest.raises(DialogTimeout):
+        handle.result(5)
+    assert process_gone(wait_for_pid(hanging_zenity))
+
+
+def test_qt_adapter_uses_the_hosts_binding(fake_pyqt6):
+    called = []
+    adapter = nowait.qt_adapter()
+    adapter(lambda: called.append(True))
+    # Queued for the Qt event loop, not run on the calling thread.
+    assert not called
+    fake_pyqt6.queued.pop()()
+    assert called == [True]
+
+
+def test_qt_adapter_without_qt():
+    from crossfiledialog.qt import QtUnavailable
+    with pytest.raises(QtUnavailable):
+        nowait.qt_adapter()
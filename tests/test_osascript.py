@@ -0,0 +1,173 @@
+import json
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+from crossfiledialog import osascript
+from crossfiledialog.exceptions import DialogTimeout
+
+# Answers each request with its argv, one item per line; the title decides
+# whether it cancels, fails or never answers.
+RUNNER = """#!{python}
+import json, os, sys, time
+
+sys.stdout.write(json.dumps(dict(ready=True)) + '\\n')
+sys.stdout.flush()
+for line in sys.stdin:
+    request = json.loads(line)
+    with open(os.environ['RUNNER_LOG'], 'a') as log:
+        log.write(line)
+    title = request['argv'][0]
+    if title == 'hang':
+        time.sleep(60)
+    if title == 'fail':
+        answer = dict(error='Script error')
+    elif title == 'cancel':
+        answer = dict(result='')
+    else:
+        answer = dict(result='\\n'.join(request['argv']))
+    sys.stdout.write(json.dumps(answer) + '\\n')
+    sys.stdout.flush()
+"""
+
+
+@pytest.fixture
+def echo_osascript(fake_dialogs):
+    # Prints the title argument, after the compiled script's path.
+    fake_dialogs.replace('osascript', 'printf "%s" "$2"\n')
+    return fake_dialogs
+
+
+@pytest.fixture
+def runner(fake_dialogs, monkeypatch, tmp_path):
+    path = os.path.join(fake_dialogs.directory, 'osascript-runner')
+    with open(path, 'w') as fp:
+        fp.write(RUNNER.format(python=sys.executable))
+    log = tmp_path / 'runner.log'
+    monkeypatch.setenv('RUNNER_LOG', str(log))
+    monkeypatch.setattr(osascript, 'use_runner', True)
+
+    def requests():
+        return [json.loads(line) for line in log.read_text().splitlines()] if log.exists() else []
+    return requests
+
+
+@pytest.mark.parametrize('title', [
+    'say "hello"',
+    "it's",
+    'two\nlines',
+    '" & (do shell script "touch /tmp/pwned") & "',
+    'back\\slash',
+    'café \U0001f4c4',
+])
+def test_title_is_passed_as_argument(echo_osascript, title):
+    assert osascript.open_file(title) == title
+
+
+def test_arguments_follow_compiled_script(fake_dialogs):
+    command = osascript.open_file_command('Pick "one"', '/tmp/a dir', '*.py')
+    assert command[1] == osascript.compiled_path('open_file')
+    assert command[2:] == ['Pick "one"', '/tmp/a dir', 'py']
+
+
+def test_scripts_are_compiled_once(fake_dialogs, monkeypatch, tmp_path):
+    log = tmp_path / 'compiles.log'
+    monkeypatch.setenv('FAKE_OSACOMPILE_LOG', str(log))
+    fake_dialogs.answer([b'/tmp/chosen.txt'])
+    for _ in range(3):
+        assert osascript.open_file('Pick') == '/tmp/chosen.txt'
+    # A new process finds the compiled script in the cache.
+    osascript._commands.clear()
+    assert osascript.open_file('Pick') == '/tmp/chosen.txt'
+    assert len(log.read_text().splitlines()) == 1
+    directory = os.path.dirname(osascript.compiled_path('open_file'))
+    assert os.listdir(directory) == [os.path.basename(osascript.compiled_path('open_file'))]
+
+
+def test_concurrent_compiles_do_not_collide(fake_dialogs):
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(osascript.compile_script('save_file')))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    path = osascript.compiled_path('save_file')
+    assert results == [path] * 8
+    assert os.listdir(os.path.dirname(path)) == [os.path.basename(path)]
+
+
+def test_without_osacompile_source_is_passed(fake_dialogs, monkeypatch):
+    monkeypatch.setattr(osascript, 'osacompile_binary', 'no-such-osacompile')
+    assert osascript.script_command('open_file') == ['osascript', '-l', 'AppleScript', '-e',
+                                                     osascript.SCRIPTS['open_file'][1]]
+
+
+def test_runner_protocol(runner):
+    assert osascript.open_file('Pick "it"\nnow', '/tmp/start') == 'Pick "it"\nnow\n/tmp/start'
+    assert osascript.save_file('Save') == 'Save'
+    requests = runner()
+    assert [request['script'] for request in requests] == [
+        osascript.compiled_path('open_file'), osascript.compiled_path('save_file'),
+    ]
+    assert requests[0]['argv'] == ['Pick "it"\nnow', '/tmp/start', '']
+    # Both dialogs went to the same process.
+    assert osascript.runner is not None and osascript.runner.poll() is None
+
+
+def test_runner_cancel(runner):
+    assert osascript.open_file('cancel') == ''
+    assert osascript.open_multiple('cancel') == []
+    assert osascript.runner.poll() is None
+
+
+def test_runner_error(runner):
+    with pytest.raises(osascript.OsascriptException, match='Script error'):
+        osascript.open_file('fail')
+    # The runner survives a failed script.
+    process = osascript.runner
+    assert osascript.choose_folder('after') == 'after'
+    assert osascript.runner is process
+
+
+def test_runner_timeout_restarts(runner):
+    with pytest.raises(DialogTimeout):
+        osascript.open_file('hang', timeout=0.2)
+    assert osascript.runner is None
+    assert osascript.choose_folder('Folder') == 'Folder'
+
+
+def test_responses_in_one_chunk():
+    stdout_r, stdout_w = os.pipe()
+    stderr_r, stderr_w = os.pipe()
+    process = osascript._Runner.__new__(osascript._Runner)
+    process.stdout, process.stderr = os.fdopen(stdout_r, 'rb'), os.fdopen(stderr_r, 'rb')
+    try:
+        os.write(stdout_w, b'{"ready": true}\n{"result": "a"}\n{"resu')
+        assert osascript._read_response(process, 1) == dict(ready=True)
+        # Already read, though select() sees nothing new on the pipe.
+        assert osascript._read_response(process, 0.1) == dict(result='a')
+        os.write(stdout_w, b'lt": "b"}\n')
+        assert osascript._read_response(process, 1) == dict(result='b')
+    finally:
+        for fd in (stdout_w, stderr_w):
+            os.close(fd)
+        process.stdout.close()
+        process.stderr.close()
+
+
+def test_waiting_for_the_runner_counts_against_the_timeout(runner):
+    first = threading.Thread(target=lambda: pytest.raises(DialogTimeout, osascript.open_file, 'hang', timeout=2))
+    first.start()
+    try:
+        while not runner():
+            time.sleep(0.01)
+        start = time.monotonic()
+        with pytest.raises(DialogTimeout, match='slot'):
+            osascript.open_file('second', timeout=0.2)
+        assert time.monotonic() - start < 1
+    finally:
+        first.join(10)
@@ -0,0 +1,73 @@
+import os
+
+import pytest
+
+import crossfiledialog
+
+from crossfiledialog import history, kdialog, osascript, paths, streaming, zenity
+
+BACKENDS = [zenity, kdialog, osascript]
+
+RAW = b'/tmp/latin1-caf\xe9/r\xe9sum\xe9.txt'
+
+
+def backend_id(backend):
+    return backend.__name__.rsplit('.', 1)[-1]
+
+
+@pytest.mark.parametrize('backend', BACKENDS, ids=backend_id)
+@pytest.mark.parametrize('function', ['open_file', 'save_file', 'choose_folder'])
+def test_bytes(fake_dialogs, backend, function):
+    fake_dialogs.answer([RAW])
+    assert getattr(backend, function)('Pick', paths='bytes') == RAW
+
+
+@pytest.mark.parametrize('backend', BACKENDS, ids=backend_id)
+@pytest.mark.parametrize('function', ['open_file', 'save_file', 'choose_folder'])
+def test_surrogateescape(fake_dialogs, backend, function):
+    fake_dialogs.answer([RAW])
+    result = getattr(backend, function)('Pick', paths='surrogateescape')
+    assert isinstance(result, str)
+    assert os.fsencode(result) == RAW
+
+
+@pytest.mark.parametrize('backend', BACKENDS, ids=backend_id)
+def test_multiple(fake_dialogs, backend):
+    selection = [RAW, b'/tmp/plain.txt', '/tmp/café.txt'.encode()]
+    fake_dialogs.answer(selection)
+    assert backend.open_multiple('Pick', paths='bytes') == selection
+    assert [os.fsencode(path) for path in backend.open_multiple('Pick', paths='surrogateescape')] == selection
+
+
+@pytest.mark.parametrize('backend', BACKENDS, ids=backend_id)
+def test_str_rejects_invalid_utf8(fake_dialogs, backend):
+    fake_dialogs.answer([RAW])
+    with pytest.raises(UnicodeDecodeError):
+        backend.open_file('Pick')
+
+
+@pytest.mark.parametrize('backend', BACKENDS, ids=backend_id)
+def test_unknown_mode(fake_dialogs, backend):
+    with pytest.raises(ValueError):
+        backend.open_file('Pick', paths='latin-1')
+
+
+def test_remembers_directory(fake_dialogs):
+    fake_dialogs.answer([RAW])
+    zenity.open_file('Pick', paths='bytes')
+    assert os.fsencode(history.entries('open')[0]) == os.path.dirname(RAW)
+
+
+def test_public_api(fake_dialogs, monkeypatch):
+    monkeypatch.setenv('FILEDIALOG_BACKEND', 'zenity')
+    fake_dialogs.answer([RAW])
+    assert crossfiledialog.open_file(paths='bytes') == RAW
+    assert os.fsencode(crossfiledialog.open_multiple(paths='surrogateescape')[0]) == RAW
+    assert list(streaming.iter_multiple(paths='bytes')) == [RAW]
+
+
+def test_decode_output():
+    assert paths.decode_output(RAW, 'bytes') is RAW
+    assert paths.decode_output(RAW, 'surrogateescape') == os.fsdecode(RAW)
+    assert paths.from_str(os.fsdecode(RAW), 'bytes') == RAW
+    assert paths.from_str('', 'bytes') == ''
@@ -0,0 +1,163 @@
+import os
+import shutil
+import time
+
+import pytest
+
+from fakes import MockPortal
+
+import crossfiledialog
+
+from crossfiledialog import history, portal, registry, wrapper, zenity
+from crossfiledialog.exceptions import DialogTimeout
+
+pytestmark = pytest.mark.skipif(shutil.which('dbus-daemon') is None, reason='dbus-daemon is not installed')
+
+
+@pytest.fixture(autouse=True)
+def fresh_connection(monkeypatch):
+    monkeypatch.setattr(portal, 'connection', None)
+    monkeypatch.setattr(portal, 'version', None)
+    yield
+    if portal.connection is not None:
+        portal.connection.close()
+
+
+@pytest.fixture
+def mock_portal(monkeypatch):
+    def start(*args, **kwargs):
+        mock = MockPortal(*args, **kwargs)
+        mock.__enter__()
+        started.append(mock)
+        monkeypatch.setenv('DBUS_SESSION_BUS_ADDRESS', mock.address)
+        return mock
+
+    started = []
+    yield start
+    for mock in started:
+        if mock.daemon.poll() is None:
+            mock.__exit__(None, None, None)
+
+
+def test_available(mock_portal):
+    mock_portal(version=4)
+    assert portal.available()
+    assert portal.version == 4
+
+
+def test_unavailable_without_bus(monkeypatch, tmp_path):
+    monkeypatch.setenv('DBUS_SESSION_BUS_ADDRESS', 'unix:path=' + str(tmp_path / 'missing'))
+    assert not portal.available()
+    with pytest.raises(portal.PortalUnavailable):
+        portal.open_file('Pick')
+
+
+def test_open_file(mock_portal, tmp_path):
+    mock = mock_portal(['file:///tmp/chosen%20file.txt'])
+    assert portal.open_file('Pick', str(tmp_path)) == '/tmp/chosen file.txt'
+    request, = mock.requests
+    assert request['method'] == 'OpenFile'
+    assert request['title'] == 'Pick'
+    assert request['modal'] is True
+    assert request['current_folder'] == os.fsencode(str(tmp_path)) + b'\0'
+    assert history.recent('open') == '/tmp'
+
+
+def test_open_multiple(mock_portal):
+    uris = ['file:///tmp/a%2C%20b.txt', 'file:///tmp/pipe%7C.txt']
+    mock = mock_portal(uris)
+    assert portal.open_multiple('Pick') == ['/tmp/a, b.txt', '/tmp/pipe|.txt']
+    assert mock.requests[0]['multiple'] is True
+
+
+def test_save_file_and_folder(mock_portal):
+    mock = mock_portal(['file:///tmp/out'])
+    assert portal.save_file('Save') == '/tmp/out'
+    assert portal.choose_folder('Folder') == '/tmp/out'
+    assert [request['method'] for request in mock.requests] == ['SaveFile', 'OpenFile']
+    assert mock.requests[1]['directory'] is True
+
+
+def test_folder_needs_version_3(mock_portal):
+    mock_portal(['file:///tmp'], version=2)
+    with pytest.raises(portal.PortalUnavailable):
+        portal.choose_folder('Folder')
+
+
+def test_old_portal_falls_back_for_folders(mock_portal, fake_dialogs, monkeypatch):
+    monkeypatch.setattr(registry, 'backends', {name: registry.backends[name] for name in ('portal', 'zenity')})
+    monkeypatch.setattr(registry, '_entry_points_loaded', True)
+    mock_portal(['file:///tmp'], version=2)
+    fake_dialogs.answer([b'/srv/folder'])
+    assert crossfiledialog.choose_folder() == '/srv/folder'
+    assert wrapper.backend is zenity
+
+
+def test_filters(mock_portal):
+    mock = mock_portal(['file:///tmp/a.png'])
+    portal.open_file('Pick', filter={'Images': ['*.png', '*.jpg'], 'Text': '*.txt'})
+    assert mock.requests[0]['filters'] == [
+        ('Images', [(0, '*.png'), (0, '*.jpg')]), ('Text', [(0, '*.txt')]),
+    ]
+
+
+def test_cancel(mock_portal):
+    mock_portal(None)
+    assert portal.open_file('Pick') == ''
+    assert portal.open_multiple('Pick') == []
+
+
+def test_other_response_fails(mock_portal):
+    mock_portal(response=2)
+    with pytest.raises(portal.PortalException, match='response 2'):
+        portal.open_file('Pick')
+
+
+def test_non_utf8_path(mock_portal):
+    mock_portal(['file:///tmp/caf%E9.txt'])
+    assert portal.open_file('Pick', paths='bytes') == b'/tmp/caf\xe9.txt'
+    result = portal.open_file('Pick', paths='surrogateescape')
+    assert os.fsencode(result) == b'/tmp/caf\xe9.txt'
+    with pytest.raises(UnicodeDecodeError):
+        portal.open_file('Pick')
+
+
+def test_non_local_uri(mock_portal):
+    mock_portal(['https://example.org/a.txt'])
+    with pytest.raises(portal.PortalException):
+        portal.open_file('Pick')
+
+
+def test_connection_is_kept(mock_portal):
+    mock_portal(['file:///tmp/a'])
+    portal.open_file('Pick')
+    connection = portal.connection
+    portal.open_file('Pick')
+    assert portal.connection is connection
+
+
+def test_reconnects_after_the_bus_drops(mock_portal):
+    first = mock_portal(['file:///tmp/a'])
+    assert portal.open_file('Pick') == '/tmp/a'
+    connection = portal.connection
+    first.__exit__(None, None, None)
+    deadline = time.monotonic() + 5
+    while not connection.closed and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert connection.closed
+
+    # No bus at all: the backend cannot start, so the session may fall back.
+    with pytest.raises(portal.PortalUnavailable):
+        portal.open_file('Pick')
+
+    mock_portal(['file:///tmp/b'])
+    assert portal.open_file('Pick') == '/tmp/b'
+    assert portal.connection is not connection
+
+
+def test_timeout_closes_the_request(mock_portal, monkeypatch):
+    mock = mock_portal(['file:///tmp/a'])
+    # A portal that never answers: the Response signal is not sent.
+    monkeypatch.setattr(mock.connection, 'emit', lambda *args, **kwargs: None)
+    with pytest.raises(DialogTimeout):
+        portal.open_file('Pick', timeout=0.2)
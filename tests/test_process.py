@@ -0,0 +1,113 @@
+import json
+import os
+import sys
+import threading
+
+from subprocess import DEVNULL, TimeoutExpired
+
+import pytest
+
+from conftest import process_gone, wait_for_pid
+
+from crossfiledialog import process, zenity
+
+
+def spawn_from_thread(pidfile):
+    """Open a dialog from a thread that ends once the dialog is up."""
+    started = []
+
+    def run():
+        started.append(process.spawn([zenity.get_binary()]))
+        started.append(wait_for_pid(pidfile))
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join()
+    return started
+
+
+@pytest.mark.skipif(sys.platform != 'linux' or not process._setpriv_binary(), reason="needs setpriv")
+def test_dialog_closes_with_its_thread(hanging_zenity):
+    dialog, pid = spawn_from_thread(hanging_zenity)
+    assert process_gone(pid)
+    dialog.wait(5)
+
+
+def test_death_signal_opt_out(hanging_zenity, monkeypatch):
+    monkeypatch.setattr(process, 'parent_death_signal', False)
+    dialog, pid = spawn_from_thread(hanging_zenity)
+    try:
+        assert not process_gone(pid, timeout=0.3)
+    finally:
+        process.terminate(dialog)
+        dialog.wait(5)
+
+
+# Reports the descriptors it inherited, its environment and its directory.
+REPORT = (
+    'import json, os\n'
+    'fds = []\n'
+    'for fd in range(256):\n'
+    '    try:\n'
+    '        os.fstat(fd)\n'
+    '        fds.append(fd)\n'
+    '    except OSError:\n'
+    '        pass\n'
+    'print(json.dumps([fds, dict(os.environ), os.getcwd()]))\n'
+)
+
+
+@pytest.fixture
+def posix_spawn(monkeypatch):
+    if not hasattr(os, 'posix_spawn'):
+        pytest.skip("needs os.posix_spawn")
+    monkeypatch.setattr(process, 'spawn_method', 'posix_spawn')
+
+
+def report(**kwargs):
+    dialog = process.spawn([sys.executable, '-c', REPORT], **kwargs)
+    stdout, _ = dialog.communicate()
+    assert dialog.returncode == 0
+    return json.loads(stdout)
+
+
+def test_posix_spawn_passes_only_the_pipes(posix_spawn, monkeypatch, tmp_path):
+    # Opened close-on-exec, like every descriptor Python creates.
+    open_r, open_w = os.pipe()
+    monkeypatch.setenv('DISPLAY', ':0')
+    monkeypatch.setenv('LC_ALL', 'C.UTF-8')
+    monkeypatch.setenv('SECRET_TOKEN', 'x')
+    try:
+        fds, environ, cwd = report(cwd=str(tmp_path))
+    finally:
+        os.close(open_r)
+        os.close(open_w)
+    assert fds == [0, 1, 2]
+    assert environ['DISPLAY'] == ':0'
+    assert environ['LC_ALL'] == 'C.UTF-8'
+    assert 'SECRET_TOKEN' not in environ
+    # The shell that changes directory adds PWD and OLDPWD.
+    assert set(environ) <= set(process.minimal_environment()) | {'LC_CTYPE', 'PWD', 'OLDPWD'}
+    assert os.path.samefile(cwd, str(tmp_path))
+
+
+def test_posix_spawn_discards_stderr(posix_spawn):
+    dialog = process.spawn([sys.executable, '-c', 'import sys; sys.stderr.write("noise")'], stderr=DEVNULL)
+    assert dialog.stderr is None
+    assert dialog.communicate()[0] == b''
+    assert dialog.rusage.ru_utime >= 0
+
+
+def test_posix_spawn_missing_program(posix_spawn, tmp_path):
+    with pytest.raises(FileNotFoundError):
+        process.spawn([str(tmp_path / 'missing')])
+    with pytest.raises(FileNotFoundError):
+        process.spawn([str(tmp_path / 'missing')], cwd=str(tmp_path))
+
+
+def test_posix_spawn_timeout(posix_spawn):
+    dialog = process.spawn(['sleep', '20'])
+    with pytest.raises(TimeoutExpired):
+        dialog.wait(0.05)
+    process.terminate(dialog)
+    assert dialog.wait(5) != 0
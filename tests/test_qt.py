@@ -0,0 +1,198 @@
+import sys
+import threading
+import types
+
+import pytest
+
+import crossfiledialog
+
+from crossfiledialog import history, qt, registry, wrapper
+from crossfiledialog.exceptions import DialogTimeout
+
+
+class FileDialog:
+    """Just enough of QFileDialog; `answer` is what the user picks, None to cancel."""
+
+    AcceptMode = types.SimpleNamespace(AcceptSave='AcceptSave')
+    FileMode = types.SimpleNamespace(
+        AnyFile='AnyFile', Directory='Directory', ExistingFile='ExistingFile', ExistingFiles='ExistingFiles',
+    )
+    Option = types.SimpleNamespace(ShowDirsOnly='ShowDirsOnly')
+
+    answer = None
+    shown = []
+
+    def __init__(self, parent, title, directory):
+        self.parent, self.title, self.directory = parent, title, directory
+        self.accept_mode = self.file_mode = None
+        self.options = set()
+        self.filters = []
+        self.timers = []
+        self.rejected = False
+
+    def setAcceptMode(self, mode):
+        self.accept_mode = mode
+
+    def setFileMode(self, mode):
+        self.file_mode = mode
+
+    def setOption(self, option, on):
+        self.options.add(option)
+
+    def setNameFilters(self, filters):
+        self.filters = filters
+
+    def exec(self):
+        self.shown.append(self)
+        for timer in self.timers:
+            timer.fire()
+        return not self.rejected and self.answer is not None
+
+    def selectedFiles(self):
+        return list(self.answer)
+
+    def reject(self):
+        self.rejected = True
+
+    def deleteLater(self):
+        pass
+
+
+class Timer:
+    def __init__(self, parent):
+        parent.timers.append(self)
+        self.slots = []
+        self.timeout = types.SimpleNamespace(connect=self.slots.append)
+
+    def setSingleShot(self, single):
+        pass
+
+    def start(self, msec):
+        self.msec = msec
+
+    def fire(self):
+        for slot in self.slots:
+            slot()
+
+
+@pytest.fixture
+def qt_app(fake_pyqt6, monkeypatch):
+    """A running PyQt6 QApplication whose GUI thread is the test's thread."""
+    gui_thread = threading.current_thread()
+
+    class QApplication:
+        def thread(self):
+            return gui_thread
+
+        def activeWindow(self):
+            return 'main window'
+
+    app = QApplication()
+    QApplication.instance = staticmethod(lambda: app)
+    QtCore = fake_pyqt6
+    QtCore.QCoreApplication = QApplication
+    QtCore.QThread = types.SimpleNamespace(currentThread=threading.current_thread)
+    QtCore.QTimer = Timer
+    QtCore.pyqtSlot = lambda *types: lambda function: function
+    QtCore.QObject.moveToThread = lambda self, thread: None
+    QtWidgets = types.ModuleType('PyQt6.QtWidgets')
+    QtWidgets.QApplication = QApplication
+    QtWidgets.QFileDialog = FileDialog
+    monkeypatch.setitem(sys.modules, 'PyQt6.QtWidgets', QtWidgets)
+    monkeypatch.setattr(qt, '_invokers', dict())
+    monkeypatch.setattr(FileDialog, 'shown', [])
+    return QtCore
+
+
+def run_queued(QtCore, until):
+    """Be the GUI thread: run queued calls until `until` finishes."""
+    while until.is_alive() or QtCore.queued:
+        if QtCore.queued:
+            QtCore.queued.pop(0)()
+        else:
+            until.join(0.01)
+
+
+def test_available(qt_app, monkeypatch):
+    assert qt.available()
+    assert qt.find_application().name == 'PyQt6'
+    monkeypatch.setattr(qt_app.QCoreApplication, 'instance', staticmethod(lambda: None))
+    assert not qt.available()
+    with pytest.raises(qt.QtUnavailable):
+        qt.open_file()
+
+
+def test_unavailable_without_a_binding():
+    assert not qt.available()
+
+
+def test_open_file(qt_app, monkeypatch):
+    monkeypatch.setattr(FileDialog, 'answer', ['/srv/a.txt'])
+    assert qt.open_file('Pick', '/srv', {'Text': ['*.txt', '*.md']}) == '/srv/a.txt'
+    dialog, = FileDialog.shown
+    assert (dialog.parent, dialog.title, dialog.directory) == ('main window', 'Pick', '/srv')
+    assert dialog.file_mode == 'ExistingFile'
+    assert dialog.filters == ['Text (*.txt *.md)']
+    assert history.recent('open') == '/srv'
+
+
+def test_kinds(qt_app, monkeypatch):
+    monkeypatch.setattr(FileDialog, 'answer', ['/srv/a.txt', '/srv/b.txt'])
+    assert qt.open_multiple() == ['/srv/a.txt', '/srv/b.txt']
+    assert qt.save_file(paths='bytes') == b'/srv/a.txt'
+    assert qt.choose_folder() == '/srv/a.txt'
+    multiple, save, folder = FileDialog.shown
+    assert multiple.file_mode == 'ExistingFiles'
+    assert (save.accept_mode, save.file_mode) == ('AcceptSave', 'AnyFile')
+    assert (folder.file_mode, folder.options) == ('Directory', {'ShowDirsOnly'})
+
+
+def test_cancel(qt_app):
+    assert qt.open_file() == ''
+    assert qt.open_multiple() == []
+
+
+def test_timeout(qt_app, monkeypatch):
+    monkeypatch.setattr(FileDialog, 'answer', ['/srv/a.txt'])
+    with pytest.raises(DialogTimeout):
+        qt.open_file(timeout=0.5)
+    assert FileDialog.shown[0].timers[0].msec == 500
+
+
+def test_from_another_thread(qt_app, monkeypatch):
+    monkeypatch.setattr(FileDialog, 'answer', ['/srv/a.txt'])
+    results = []
+    worker = threading.Thread(target=lambda: results.append(qt.open_file('Pick')))
+    worker.start()
+    run_queued(qt_app, worker)
+    assert results == ['/srv/a.txt']
+    assert len(FileDialog.shown) == 1
+
+
+def test_timeout_before_the_gui_thread_runs(qt_app):
+    # The GUI thread is busy: the request is dropped, not shown later.
+    errors = []
+
+    def show():
+        try:
+            qt.open_file(timeout=0.05)
+        except DialogTimeout as e:
+            errors.append(e)
+
+    worker = threading.Thread(target=show)
+    worker.start()
+    worker.join(5)
+    run_queued(qt_app, worker)
+    assert len(errors) == 1
+    assert FileDialog.shown == []
+
+
+def test_ranked_first_while_running(qt_app, monkeypatch):
+    monkeypatch.setattr(registry, 'backends', dict(
+        testing=registry.Backend('testing', 'crossfiledialog.testing', 1),
+        qt=registry.Backend('qt', 'crossfiledialog.qt', 110, hosted=True),
+    ))
+    monkeypatch.setattr(registry, '_entry_points_loaded', True)
+    monkeypatch.setattr(FileDialog, 'answer', ['/srv/a.txt'])
+    assert crossfiledialog.open_file() == '/srv/a.txt'
+    assert wrapper.backend is qt
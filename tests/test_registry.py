@@ -0,0 +1,177 @@
+import os
+import time
+
+import pytest
+
+import crossfiledialog
+
+from crossfiledialog import kdialog, qt, registry, wrapper, zenity
+from crossfiledialog.exceptions import BackendUnavailable, FileDialogException
+from crossfiledialog.zenity import ZenityException
+
+
+@pytest.fixture
+def dialog_programs(fake_dialogs, monkeypatch):
+    """Only zenity and then kdialog are detected, both fakes."""
+    monkeypatch.setattr(registry, 'backends', {name: registry.backends[name] for name in ('zenity', 'kdialog')})
+    monkeypatch.setattr(registry, '_entry_points_loaded', True)
+    fake_dialogs.answer([b'/tmp/picked.txt'])
+    return fake_dialogs
+
+
+@pytest.mark.parametrize('status', [126, 127])
+def test_fallback_on_startup_status(dialog_programs, status):
+    dialog_programs.replace('zenity', 'exit {0}\n'.format(status))
+    assert crossfiledialog.open_file() == '/tmp/picked.txt'
+    assert wrapper.backend is kdialog
+    assert 'zenity' in registry.failed
+
+
+def test_fallback_on_missing_program(dialog_programs):
+    assert wrapper.load_backend() is zenity
+    os.unlink(os.path.join(dialog_programs.directory, 'zenity'))
+    assert crossfiledialog.open_file() == '/tmp/picked.txt'
+    assert wrapper.backend is kdialog
+
+
+def test_fallback_on_display_error(dialog_programs):
+    dialog_programs.replace('zenity', 'echo "Gtk-WARNING: cannot open display: :0" >&2\nexit 1\n')
+    assert crossfiledialog.open_file() == '/tmp/picked.txt'
+    assert wrapper.backend is kdialog
+
+
+def test_fallback_on_unavailable(dialog_programs):
+    assert registry.fallback(zenity, BackendUnavailable("no display")) is kdialog
+    assert 'zenity' in registry.failed
+
+
+def test_crash_is_raised(dialog_programs):
+    dialog_programs.replace('zenity', 'exit 255\n')
+    with pytest.raises(ZenityException) as info:
+        crossfiledialog.open_file()
+    assert info.value.returncode == 255
+    assert not registry.failed
+    assert wrapper.backend is zenity
+
+
+def test_named_backend_is_raised(dialog_programs, monkeypatch):
+    monkeypatch.setenv('FILEDIALOG_BACKEND', 'zenity')
+    dialog_programs.replace('zenity', 'exit 127\n')
+    with pytest.raises(ZenityException):
+        crossfiledialog.open_file()
+    assert not registry.failed
+
+
+def test_last_error_chains_the_first(dialog_programs):
+    dialog_programs.replace('zenity', 'exit 127\n')
+    dialog_programs.replace('kdialog', 'exit 127\n')
+    with pytest.raises(FileDialogException) as info:
+        crossfiledialog.open_file()
+    assert info.value.returncode == 127
+    assert isinstance(info.value.__cause__, ZenityException)
+    assert set(registry.failed) == {'zenity', 'kdialog'}
+
+
+def test_failed_backend_is_retried(dialog_programs):
+    dialog_programs.replace('zenity', 'exit 127\n')
+    crossfiledialog.open_file()
+    assert wrapper.load_backend() is kdialog
+
+    # retry_after seconds later, with zenity working again.
+    dialog_programs.replace('zenity', 'cat "$FAKE_DIALOG_ANSWER"\n')
+    assert wrapper.load_backend() is kdialog
+    registry.failed['zenity'] = wrapper.retry_at = time.monotonic() - 1
+    assert wrapper.load_backend() is zenity
+    assert crossfiledialog.open_file() == '/tmp/picked.txt'
+    assert wrapper.backend is zenity
+
+
+def test_hosted_backend_ranks_first(dialog_programs, monkeypatch):
+    backends = dict(registry.backends, qt=registry.Backend('qt', 'crossfiledialog.qt', 110, hosted=True))
+    monkeypatch.setattr(registry, 'backends', backends)
+    monkeypatch.setattr(qt, 'available', lambda: False)
+    assert wrapper.load_backend() is zenity
+
+    # The application started its QApplication after the first dialog.
+    monkeypatch.setattr(qt, 'available', lambda: True)
+    assert [backend.name for backend in registry.ranked()][0] == 'qt'
+    assert wrapper.load_backend() is qt
+
+
+class Probe:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, binary):
+        self.calls += 1
+        return dict(version='3.44', calls=self.calls)
+
+
+@pytest.fixture
+def program(fake_dialogs, monkeypatch):
+    monkeypatch.setattr(registry, 'persistent', True)
+    return os.path.join(fake_dialogs.directory, 'zenity')
+
+
+def test_probe_runs_once(program):
+    probe = Probe()
+    assert registry.capabilities(program, probe) == dict(version='3.44', calls=1)
+    assert registry.capabilities(program, probe) == dict(version='3.44', calls=1)
+    assert probe.calls == 1
+
+
+def test_probe_cache_persists(program):
+    probe = Probe()
+    registry.capabilities(program, probe)
+    assert os.path.dirname(registry.cache_file()) == os.path.join(os.environ['XDG_CACHE_HOME'], 'crossfiledialog')
+    assert os.path.exists(registry.cache_file())
+
+    # A new process: only the file is left.
+    registry._capabilities.clear()
+    assert registry.capabilities(program, probe)['calls'] == 1
+    assert probe.calls == 1
+
+
+def test_changed_program_is_probed_again(program):
+    probe = Probe()
+    registry.capabilities(program, probe)
+    registry._capabilities.clear()
+    with open(program, 'a') as fp:
+        fp.write('# upgraded\n')
+    assert registry.capabilities(program, probe)['calls'] == 2
+
+
+def test_forget(program):
+    probe = Probe()
+    registry.capabilities(program, probe)
+    registry.failed['zenity'] = time.monotonic() + registry.retry_after
+    registry.forget()
+    assert not os.path.exists(registry.cache_file())
+    assert not registry.failed
+    assert registry.capabilities(program, probe)['calls'] == 2
+
+
+def test_failed_probe(program):
+    def probe(binary):
+        raise OSError("not executable")
+    assert registry.capabilities(program, probe) == {}
+
+
+def test_zenity_version_decides_options(fake_dialogs):
+    fake_dialogs.replace('zenity', 'echo 4.0.1\n')
+    assert zenity.capabilities()['gtk4']
+    assert '--confirm-overwrite' not in zenity.save_file_command('Save', None)
+
+    registry._capabilities.clear()
+    fake_dialogs.replace('zenity', 'echo 3.44.0\n# a different size\n')
+    assert '--confirm-overwrite' in zenity.save_file_command('Save', None)
+
+
+def test_broken_cache_is_ignored(program):
+    os.makedirs(os.path.dirname(registry.cache_file()))
+    with open(registry.cache_file(), 'w') as fp:
+        fp.write('{"%s": [], "/usr/bin/kdialog": "1.0"}' % program)
+    probe = Probe()
+    assert registry.capabilities(program, probe)['calls'] == 1
+    registry._capabilities.clear()
+    assert registry.capabilities(program, probe)['calls'] == 1
@@ -0,0 +1,144 @@
+import json
+import os
+import time
+
+from io import BytesIO
+
+import pytest
+
+from crossfiledialog import registry, resident, stderr, zenity
+from crossfiledialog.framing import read_frame, write_frame
+from crossfiledialog.process import terminate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def helper(fake_dialogs, monkeypatch, tmp_path):
+    """The fake gtkhelper of benchmarks/fakes.py, with zenity to fall back to."""
+    monkeypatch.setattr(resident, 'helper_module', 'fake_gtkhelper')
+    monkeypatch.setattr(resident, 'fallback', None)
+    monkeypatch.setattr(resident, 'retry_at', None)
+    monkeypatch.setenv('PYTHONPATH', os.pathsep.join([fake_dialogs.directory, ROOT]))
+    monkeypatch.setenv('FAKE_HELPER_LOG', str(tmp_path / 'requests'))
+    monkeypatch.setattr(registry, 'backends', {'zenity': registry.backends['zenity']})
+    monkeypatch.setattr(registry, '_entry_points_loaded', True)
+    fake_dialogs.answer([b'/tmp/a.txt'])
+    yield fake_dialogs
+    resident.stop_helper()
+
+
+def requests(tmp_path):
+    try:
+        with open(str(tmp_path / 'requests'), encoding='utf-8') as fp:
+            return [json.loads(line) for line in fp]
+    except FileNotFoundError:
+        return []
+
+
+def test_helper_that_cannot_start_falls_back(helper, monkeypatch, tmp_path):
+    monkeypatch.setenv('FAKE_HELPER_ERROR', 'Cannot open display')
+    assert resident.open_file('Pick') == '/tmp/a.txt'
+    assert resident.fallback is zenity
+    assert requests(tmp_path) == []
+
+    # Still falling back before registry.retry_after has passed...
+    monkeypatch.delenv('FAKE_HELPER_ERROR')
+    assert resident.open_file('Pick') == '/tmp/a.txt'
+    assert requests(tmp_path) == []
+
+    # ...and trying the helper again after it.
+    resident.retry_at = time.monotonic() - 1
+    assert resident.open_file('Pick') == '/tmp/a.txt'
+    assert resident.fallback is None
+    assert [request['title'] for request in requests(tmp_path)] == ['Pick']
+
+
+def test_dead_helper_falls_back(helper, monkeypatch, tmp_path):
+    assert resident.open_file('Pick') == '/tmp/a.txt'
+    assert len(requests(tmp_path)) == 1
+
+    # The helper dies, and a new one cannot start.
+    monkeypatch.setenv('FAKE_HELPER_ERROR', 'Cannot open display')
+    terminate(resident.helper)
+    resident.helper.wait()
+    assert resident.open_file('Pick') == '/tmp/a.txt'
+    assert resident.fallback is zenity
+    assert len(requests(tmp_path)) == 1
+
+
+def test_no_fallback_raises(helper, monkeypatch):
+    monkeypatch.setenv('FAKE_HELPER_ERROR', 'Cannot open display')
+    monkeypatch.setattr(registry, 'backends', {})
+    with pytest.raises(resident.ResidentUnavailable, match='Cannot open display'):
+        resident.open_file('Pick')
+
+
+def test_helper_stderr_follows_the_policy(helper, monkeypatch):
+    monkeypatch.setenv('FAKE_HELPER_ERROR', 'Cannot open display')
+    monkeypatch.setattr(registry, 'backends', {})
+    monkeypatch.setattr(stderr, 'default', 'ring')
+    with pytest.raises(resident.ResidentUnavailable) as info:
+        resident.open_file('Pick')
+    assert b'fake helper' in info.value.stderr
+
+
+def test_helper_stderr_discarded(helper, monkeypatch, capfd):
+    monkeypatch.setattr(stderr, 'default', 'devnull')
+    assert resident.open_file('Pick') == '/tmp/a.txt'
+    assert 'fake helper' not in capfd.readouterr().err
+
+
+def test_helper_stderr_forwarded(helper, capfd):
+    assert resident.open_file('Pick') == '/tmp/a.txt'
+    assert 'fake helper' in capfd.readouterr().err
+
+
+def test_requests_share_one_helper(helper, tmp_path):
+    helper.answer([b'/tmp/a.txt', b'/tmp/b.txt'])
+    assert resident.open_multiple('Pick', '/srv', {'Text': ['*.txt', '*.md']}) == ['/tmp/a.txt', '/tmp/b.txt']
+    assert resident.choose_folder('Folder', '/srv') == '/tmp/a.txt'
+    first, second = requests(tmp_path)
+    assert first['kind'] == 'open_multiple'
+    assert first['title'] == 'Pick'
+    assert first['start_dir'] == '/srv'
+    assert first['filters'] == [['Text', ['*.txt', '*.md']]]
+    assert second['kind'] == 'choose_folder'
+    assert first['pid'] == second['pid'] == resident.helper.pid
+
+
+def test_undecodable_paths(helper):
+    raw = b'/tmp/caf\xe9.txt'
+    helper.answer([raw])
+    assert resident.open_file('Pick', paths='bytes') == raw
+
+
+def test_cancel(helper):
+    helper.answer([])
+    assert resident.open_file('Pick') == ''
+    assert resident.open_multiple('Pick') == []
+
+
+def test_idle_helper_is_restarted(helper, monkeypatch, tmp_path):
+    monkeypatch.setattr(resident, 'idle_timeout', 0.1)
+    resident.open_file('Pick')
+    first = resident.helper
+    first.wait(5)
+    assert resident.open_file('Pick') == '/tmp/a.txt'
+    assert resident.helper is not first
+    assert [request['pid'] for request in requests(tmp_path)] == [first.pid, resident.helper.pid]
+    assert resident.fallback is None
+
+
+def test_frames_round_trip():
+    stream = BytesIO()
+    write_frame(stream, dict(paths=[os.fsdecode(b'/tmp/caf\xe9')]))
+    write_frame(stream, dict(ready=True))
+    data = stream.getvalue()
+    stream = BytesIO(data)
+    assert read_frame(stream) == dict(paths=[os.fsdecode(b'/tmp/caf\xe9')])
+    assert read_frame(stream) == dict(ready=True)
+    assert read_frame(stream) is None
+    # A frame cut short reads as the end of the stream.
+    assert read_frame(BytesIO(data[:-1])) == dict(paths=[os.fsdecode(b'/tmp/caf\xe9')])
+    assert read_frame(BytesIO(data[:6])) is None
@@ -0,0 +1,74 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import crossfiledialog
+
+from crossfiledialog import zenity
+from crossfiledialog.resolver import which
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def program(directory, name, mode=0o755):
+    os.makedirs(str(directory), exist_ok=True)
+    path = os.path.join(str(directory), name)
+    with open(path, 'w') as fp:
+        fp.write('#!/bin/sh\n')
+    os.chmod(path, mode)
+    return path
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason="POSIX permissions")
+def test_which(tmp_path, monkeypatch):
+    program(tmp_path / 'a', 'dialog', 0o644)
+    os.makedirs(str(tmp_path / 'b' / 'dialog'))
+    found = program(tmp_path / 'c', 'dialog')
+    program(tmp_path / 'd', 'dialog')
+    path = [str(tmp_path / name) for name in ('missing', 'a', 'b', 'c', 'd')]
+    monkeypatch.setenv('PATH', os.pathsep.join(path))
+    # Not executable, a directory, then the first real match.
+    assert which('dialog') == found
+    assert which('other') is None
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason="POSIX permissions")
+def test_which_resolves_relative_entries(tmp_path, monkeypatch):
+    found = program(tmp_path / 'bin', 'dialog')
+    monkeypatch.chdir(str(tmp_path))
+    monkeypatch.setenv('PATH', os.pathsep + 'bin')
+    assert which('dialog') == found
+
+
+def test_binary_is_resolved_once(fake_dialogs, monkeypatch):
+    binary = zenity.get_binary()
+    assert binary == os.path.join(fake_dialogs.directory, 'zenity')
+    monkeypatch.setenv('PATH', '/nonexistent')
+    assert zenity.get_binary() == binary
+
+
+def test_import_is_lazy():
+    # Backends and optional modules are only imported when first used.
+    script = (
+        'import json, sys\n'
+        'import crossfiledialog\n'
+        'before = sorted(m for m in sys.modules if m.startswith("crossfiledialog"))\n'
+        'crossfiledialog.compile_filter\n'
+        'after = sorted(m for m in sys.modules if m.startswith("crossfiledialog"))\n'
+        'print(json.dumps([before, after]))\n'
+    )
+    env = {key: value for key, value in os.environ.items() if not key.startswith('FILEDIALOG_')}
+    output = subprocess.check_output([sys.executable, '-c', script], cwd=ROOT, env=env)
+    before, after = json.loads(output)
+    for module in ('zenity', 'kdialog', 'osascript', 'win32', 'filters', 'nowait', 'launcher'):
+        assert 'crossfiledialog.' + module not in before
+    assert 'crossfiledialog.filters' in after
+
+
+def test_unknown_attribute():
+    with pytest.raises(AttributeError):
+        crossfiledialog.no_such_function
+    assert 'open_file' in dir(crossfiledialog)
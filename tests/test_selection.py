@@ -0,0 +1,67 @@
+import os
+
+import pytest
+
+import crossfiledialog
+
+from crossfiledialog import selection
+from crossfiledialog.selection import SelectedFile, select_files
+
+
+@pytest.fixture
+def files(tmp_path):
+    paths = []
+    for index in range(5):
+        path = tmp_path / 'file{0}.txt'.format(index)
+        path.write_bytes(b'x' * index)
+        paths.append(str(path))
+    return paths
+
+
+def test_metadata(files, tmp_path):
+    selected = select_files(files + [str(tmp_path)])
+    assert [file.path for file in selected] == files + [str(tmp_path)]
+    assert [file.size for file in selected[:-1]] == [0, 1, 2, 3, 4]
+    assert all(file.is_file() for file in selected[:-1])
+    assert selected[-1].is_dir() and not selected[-1].is_file()
+    assert selected[0].mtime == os.stat(files[0]).st_mtime
+
+
+def test_batches(files, monkeypatch):
+    monkeypatch.setattr(selection, 'batch_size', 2)
+    selected = select_files(files)
+    assert len({id(file._batch) for file in selected}) == 3
+    assert [file.size for file in selected] == [0, 1, 2, 3, 4]
+
+
+def test_removed_file(files):
+    os.unlink(files[1])
+    first, second = select_files(files[:2])
+    assert first.size == 0
+    with pytest.raises(FileNotFoundError):
+        second.size
+
+
+def test_path_like(files, tmp_path):
+    file = SelectedFile(files[0])
+    with open(file, 'rb') as fp:
+        assert fp.read() == b''
+    assert str(file) == os.fspath(file) == files[0]
+    assert file == SelectedFile(files[0]) and file != SelectedFile(files[1])
+    assert len({file, SelectedFile(files[0])}) == 1
+    # Fetched on demand when not created by select_files().
+    assert file.is_file()
+
+    link = tmp_path / 'link'
+    link.symlink_to(files[0])
+    assert SelectedFile(str(link)).realpath == os.path.realpath(files[0])
+    assert str(SelectedFile(os.fsencode(files[0]))) == files[0]
+
+
+def test_rich_results(scripted, files):
+    scripted.install([files[0], files[1:3], None, None])
+    assert crossfiledialog.open_file(rich=True) == SelectedFile(files[0])
+    selected = crossfiledialog.open_multiple(rich=True)
+    assert [file.size for file in selected] == [1, 2]
+    assert crossfiledialog.open_file(rich=True) is None
+    assert crossfiledialog.open_multiple(rich=True) == []
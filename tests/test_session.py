@@ -0,0 +1,135 @@
+import threading
+
+import pytest
+
+from crossfiledialog import history, testing, zenity
+from crossfiledialog.exceptions import DialogTimeout
+from crossfiledialog.session import DialogSession
+
+
+def test_backend_by_name(scripted):
+    scripted.install(['/tmp/a.txt'])
+    session = DialogSession('testing')
+    assert session.backend is testing
+    assert session.open_file() == '/tmp/a.txt'
+
+
+def test_defaults_and_overrides(scripted):
+    scripted.install(['/tmp/a.txt', '/tmp/b.txt', '/tmp/c'])
+    session = DialogSession('testing', filter='*.csv')
+    session.open_file('First')
+    session.open_file('Second', filter='*.tsv')
+    session.choose_folder('Folder')
+    requests = list(scripted.requests)
+    assert [request.get('filter') for request in requests] == ['*.csv', '*.tsv', None]
+    assert requests[0]['title'] == 'First'
+
+
+def test_stats(scripted):
+    scripted.install(['/tmp/a.txt', None, dict(result='/tmp/b', latency=1)], speed=1)
+    session = DialogSession('testing')
+    session.open_file()
+    session.save_file()
+    with pytest.raises(DialogTimeout):
+        session.choose_folder(timeout=0.05)
+    with pytest.raises(testing.ScriptException):
+        session.open_file()
+    stats = session.stats()
+    assert {name: stats[name] for name in ('calls', 'selected', 'cancelled', 'errors', 'timeouts')} == dict(
+        calls=4, selected=1, cancelled=1, errors=1, timeouts=1,
+    )
+    assert stats['time'] > 0
+
+
+def test_stats_from_many_threads(scripted):
+    scripted.install(['/tmp/a.txt'], loop=True)
+    session = DialogSession('testing')
+
+    def work():
+        for _ in range(50):
+            session.open_file()
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = session.stats()
+    assert stats['calls'] == stats['selected'] == 400
+
+
+@pytest.fixture
+def folders(tmp_path):
+    paths = []
+    for name in ('one', 'two'):
+        (tmp_path / name).mkdir()
+        paths.append(str(tmp_path / name))
+    return paths
+
+
+def test_sessions_remember_their_own_directories(fake_dialogs, folders):
+    first, second = DialogSession(zenity), DialogSession(zenity)
+    fake_dialogs.answer([(folders[0] + '/a.txt').encode()])
+    first.open_file()
+    fake_dialogs.answer([(folders[1] + '/b.txt').encode()])
+    second.open_file()
+    assert first.recent('open') == folders[0]
+    assert second.recent('open') == folders[1]
+    # Neither touched the process-wide history, or another dialog kind.
+    assert history.entries('open') == []
+    assert first.recent('save') is None
+
+
+def test_start_dir_until_something_is_remembered(fake_dialogs, folders):
+    session = DialogSession(zenity, start_dir=folders[1])
+    assert session.recent('open') == folders[1]
+    fake_dialogs.answer([(folders[0] + '/a.txt').encode()])
+    session.open_file()
+    assert session.recent('open') == folders[0]
+    session.forget()
+    assert session.recent('open') == folders[1]
+
+
+def test_shared_history(fake_dialogs, folders):
+    session = DialogSession(zenity, shared_history=True)
+    fake_dialogs.answer([(folders[0] + '/a.txt').encode()])
+    session.open_file()
+    assert history.recent('open') == folders[0]
+
+
+def test_sessions_on_threads_do_not_mix(scripted, folders):
+    # Each answer is remembered the way a backend does, by the thread that
+    # showed the dialog; it must land in that thread's session.
+    def answer(kind, title, start_dir, filter):
+        history.remember('open', folders[int(title)])
+        return folders[int(title)] + '/a.txt'
+
+    scripted.install([answer], loop=True)
+    sessions = [DialogSession('testing') for _ in folders]
+    barrier = threading.Barrier(len(sessions))
+    errors = []
+
+    def work(index):
+        barrier.wait()
+        for _ in range(200):
+            sessions[index].open_file(str(index))
+            if sessions[index].recent('open') != folders[index]:
+                errors.append(index)
+
+    threads = [threading.Thread(target=work, args=(index,)) for index in range(len(sessions))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert history.entries('open') == []
+
+
+def test_stderr_policy(fake_dialogs, capsys):
+    fake_dialogs.replace('zenity', 'echo "Gtk-WARNING: theme" >&2\necho /tmp/a.txt\n')
+    assert DialogSession(zenity, stderr='devnull').open_file() == '/tmp/a.txt'
+    assert capsys.readouterr().err == ''
+    assert DialogSession(zenity).open_file() == '/tmp/a.txt'
+    assert 'Gtk-WARNING' in capsys.readouterr().err
+    with pytest.raises(ValueError):
+        DialogSession(zenity, stderr='nowhere').open_file()
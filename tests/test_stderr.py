@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import sys
+
+import pytest
+
+from crossfiledialog import aio, nowait, osascript, stderr, streaming, zenity
+from crossfiledialog.exceptions import DialogTimeout
+
+WARNING = b'Gtk-WARNING: cannot load theme'
+
+CHATTY = """echo "Gtk-WARNING: cannot load theme" >&2
+[ -n "$FAKE_DIALOG_ANSWER" ] && cat "$FAKE_DIALOG_ANSWER"
+[ -n "$FAKE_DIALOG_SLEEP" ] && sleep "$FAKE_DIALOG_SLEEP"
+exit "${FAKE_DIALOG_STATUS:-0}"
+"""
+
+# Warns on stderr before every answer, like a runner whose dialogs print
+# toolkit warnings.
+RUNNER = """#!{python}
+import json, sys
+
+sys.stdout.write(json.dumps(dict(ready=True)) + '\\n')
+sys.stdout.flush()
+for line in sys.stdin:
+    request = json.loads(line)
+    sys.stderr.write('Gtk-WARNING: cannot load theme\\n')
+    sys.stderr.flush()
+    if request['argv'][0] == 'fail':
+        sys.stdout.write(json.dumps(dict(error='Script error')) + '\\n')
+    else:
+        sys.stdout.write(json.dumps(dict(result='/tmp/chosen.txt')) + '\\n')
+    sys.stdout.flush()
+"""
+
+
+@pytest.fixture
+def chatty(fake_dialogs, monkeypatch):
+    fake_dialogs.replace('zenity', CHATTY)
+    fake_dialogs.answer([b'/tmp/chosen.txt'])
+    monkeypatch.setenv('FILEDIALOG_BACKEND', 'zenity')
+    return fake_dialogs
+
+
+def open_aio(**kwargs):
+    return asyncio.run(aio.open_file('Pick', **kwargs))
+
+
+def open_nowait(**kwargs):
+    return nowait.open_file_nowait('Pick', **kwargs).result(10)
+
+
+def open_streaming(**kwargs):
+    return list(streaming.iter_multiple('Pick', **kwargs))
+
+
+def open_runner(**kwargs):
+    policy = stderr.set_policy(kwargs.get('stderr'))
+    try:
+        return osascript.open_file('fail' if kwargs.get('fail') else 'Pick')
+    finally:
+        stderr.set_policy(policy)
+
+
+VARIANTS = [open_aio, open_nowait, open_streaming]
+
+
+@pytest.mark.parametrize('show', VARIANTS)
+def test_forward(chatty, capsys, show):
+    assert show()
+    assert capsys.readouterr().err.encode().strip() == WARNING
+
+
+@pytest.mark.parametrize('show', VARIANTS)
+def test_devnull(chatty, capsys, show):
+    assert show(stderr='devnull')
+    assert capsys.readouterr().err == ''
+
+
+@pytest.mark.parametrize('show', VARIANTS)
+def test_log(chatty, caplog, capsys, show):
+    with caplog.at_level(logging.WARNING, logger=stderr.logger_name):
+        assert show(stderr='log')
+    assert [r.getMessage() for r in caplog.records] == ['zenity: ' + WARNING.decode()]
+    assert capsys.readouterr().err == ''
+
+
+@pytest.mark.parametrize('show', VARIANTS)
+def test_environment_default(chatty, caplog, capsys, monkeypatch, show):
+    monkeypatch.setattr(stderr, 'default', 'log')
+    with caplog.at_level(logging.WARNING, logger=stderr.logger_name):
+        assert show()
+    assert len(caplog.records) == 1
+    assert capsys.readouterr().err == ''
+
+
+@pytest.mark.parametrize('show', VARIANTS)
+@pytest.mark.parametrize('policy', ['forward', 'ring', 'log'])
+def test_error_carries_stderr(chatty, show, policy):
+    chatty.answer([], status=255)
+    with pytest.raises(zenity.ZenityException) as info:
+        show(stderr=policy)
+    assert info.value.stderr.strip() == WARNING
+
+
+@pytest.mark.parametrize('show', VARIANTS)
+def test_timeout_carries_stderr(chatty, monkeypatch, show):
+    monkeypatch.setenv('FAKE_DIALOG_SLEEP', '30')
+    with pytest.raises(DialogTimeout) as info:
+        show(stderr='ring', timeout=0.5)
+    assert info.value.stderr.strip() == WARNING
+
+
+def test_invalid_policy(chatty):
+    with pytest.raises(ValueError):
+        open_nowait(stderr='nowhere')
+
+
+@pytest.fixture
+def runner(fake_dialogs, monkeypatch):
+    with open(fake_dialogs.directory + '/osascript-runner', 'w') as fp:
+        fp.write(RUNNER.format(python=sys.executable))
+    monkeypatch.setattr(osascript, 'use_runner', True)
+
+
+def test_runner_forward(runner, capsys):
+    assert open_runner() == '/tmp/chosen.txt'
+    assert capsys.readouterr().err.encode().strip() == WARNING
+
+
+def test_runner_devnull(runner, capsys):
+    assert open_runner(stderr='devnull') == '/tmp/chosen.txt'
+    assert open_runner(stderr='devnull') == '/tmp/chosen.txt'
+    assert capsys.readouterr().err == ''
+
+
+def test_runner_log(runner, caplog):
+    with caplog.at_level(logging.WARNING, logger=stderr.logger_name):
+        open_runner(stderr='log')
+    assert [r.getMessage() for r in caplog.records] == ['osascript: ' + WARNING.decode()]
+
+
+def test_runner_error_carries_stderr(runner):
+    with pytest.raises(osascript.OsascriptException) as info:
+        open_runner(stderr='ring', fail=True)
+    assert info.value.stderr.strip() == WARNING
@@ -0,0 +1,120 @@
+import json
+import time
+
+import pytest
+
+import crossfiledialog
+
+from crossfiledialog import testing, wrapper, zenity
+from crossfiledialog.exceptions import DialogTimeout
+
+
+def write_session(path, entries):
+    with open(str(path), 'w', encoding='utf-8') as fp:
+        for entry in entries:
+            fp.write(json.dumps(entry) + '\n')
+    return str(path)
+
+
+def test_replay_session(scripted, tmp_path):
+    session = write_session(tmp_path / 'session', [
+        dict(kind='open_file', result='/srv/a.txt'),
+        dict(kind='open_multiple', result=['/srv/a.txt', '/srv/b.txt']),
+        dict(result=None),
+        dict(result='/srv/folder'),
+    ])
+    scripted.install(session=session)
+    assert crossfiledialog.open_file('Pick', filter='*.txt') == '/srv/a.txt'
+    assert crossfiledialog.open_multiple() == ['/srv/a.txt', '/srv/b.txt']
+    assert crossfiledialog.save_file() == ''
+    assert crossfiledialog.choose_folder(paths='bytes') == b'/srv/folder'
+    assert [request['kind'] for request in scripted.requests] == [
+        'open_file', 'open_multiple', 'save_file', 'choose_folder',
+    ]
+    assert scripted.requests[0]['title'] == 'Pick'
+    assert scripted.requests[0]['filter'] == '*.txt'
+
+
+def test_session_from_the_environment(scripted, tmp_path, monkeypatch):
+    session = write_session(tmp_path / 'session', [dict(result='/srv/a.txt')])
+    monkeypatch.setenv('FILEDIALOG_BACKEND', 'testing')
+    monkeypatch.setenv('FILEDIALOG_TESTING_SESSION', session)
+    assert crossfiledialog.open_file() == '/srv/a.txt'
+    assert wrapper.backend is testing
+
+
+def test_script_runs_out(scripted):
+    scripted.install(['/srv/a.txt'])
+    crossfiledialog.open_file()
+    with pytest.raises(testing.ScriptException):
+        crossfiledialog.open_file()
+
+
+def test_loop(scripted):
+    scripted.install(['/srv/a.txt', '/srv/b.txt'], loop=True)
+    assert [crossfiledialog.open_file() for _ in range(3)] == ['/srv/a.txt', '/srv/b.txt', '/srv/a.txt']
+
+
+def test_kind_must_match(scripted):
+    scripted.install([dict(kind='save_file', result='/srv/a.txt')])
+    with pytest.raises(testing.ScriptException):
+        crossfiledialog.open_file()
+
+
+def test_callable_answers(scripted):
+    scripted.install([lambda kind, title, start_dir, **arguments: '{0}/{1}'.format(start_dir, title)])
+    assert crossfiledialog.save_file('out.txt', '/srv') == '/srv/out.txt'
+
+
+def test_latency(scripted):
+    scripted.install([dict(result='/srv/a.txt', latency=0.2), '/srv/b.txt'])
+    start = time.monotonic()
+    assert crossfiledialog.open_file() == '/srv/a.txt'
+    assert time.monotonic() - start >= 0.2
+
+    # The default latency, scaled by speed.
+    scripted.install([dict(result='/srv/a.txt', latency=10)] * 2 + ['/srv/b.txt'], latency=10, speed=0)
+    start = time.monotonic()
+    assert crossfiledialog.open_file() == '/srv/a.txt'
+    assert crossfiledialog.open_file() == '/srv/a.txt'
+    assert crossfiledialog.open_file() == '/srv/b.txt'
+    assert time.monotonic() - start < 1
+
+
+def test_latency_beyond_the_timeout(scripted):
+    scripted.install([dict(result='/srv/a.txt', latency=5)])
+    with pytest.raises(DialogTimeout):
+        crossfiledialog.open_file(timeout=0.05)
+
+
+def test_record_and_replay(scripted, fake_dialogs, tmp_path):
+    session = str(tmp_path / 'session')
+    fake_dialogs.answer([b'/srv/a.txt'])
+    scripted.record(session, backend=zenity)
+    assert crossfiledialog.open_file('Pick', '/srv', '*.txt') == '/srv/a.txt'
+    fake_dialogs.answer([b'/srv/a.txt', b'/srv/b.txt'])
+    assert crossfiledialog.open_multiple() == ['/srv/a.txt', '/srv/b.txt']
+    scripted.uninstall()
+
+    entries = testing.load_session(session)
+    assert [entry['kind'] for entry in entries] == ['open_file', 'open_multiple']
+    assert entries[0]['title'] == 'Pick'
+    assert entries[0]['start_dir'] == '/srv'
+    assert entries[0]['filter'] == '*.txt'
+    assert entries[0]['latency'] >= 0
+
+    # Replayed without showing anything.
+    fake_dialogs.replace('zenity', 'exit 1\n')
+    scripted.install(session=session, speed=0)
+    assert crossfiledialog.open_file() == '/srv/a.txt'
+    assert crossfiledialog.open_multiple() == ['/srv/a.txt', '/srv/b.txt']
+
+
+def test_uninstall_restores_detection(scripted, fake_dialogs, monkeypatch):
+    monkeypatch.setenv('FILEDIALOG_BACKEND', 'zenity')
+    scripted.install(['/srv/a.txt'])
+    assert wrapper.backend is testing
+    scripted.uninstall()
+    assert wrapper.backend is None
+    fake_dialogs.answer([b'/srv/b.txt'])
+    assert crossfiledialog.open_file() == '/srv/b.txt'
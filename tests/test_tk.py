@@ -0,0 +1,51 @@
+import sys
+import threading
+
+import pytest
+
+import crossfiledialog
+
+from crossfiledialog import registry, tk, wrapper
+
+
+@pytest.fixture
+def fresh_tk(monkeypatch):
+    """tk as if no dialog had been shown yet."""
+    monkeypatch.setattr(tk, '_thread', None)
+    monkeypatch.setattr(tk, '_error', None)
+    monkeypatch.setattr(tk, '_ready', threading.Event())
+    monkeypatch.setattr(tk, 'root', None)
+
+
+def test_available_does_not_start_tk(fresh_tk, monkeypatch):
+    monkeypatch.setenv('DISPLAY', ':0')
+    monkeypatch.setattr(tk.importlib.util, 'find_spec', lambda name: object())
+    assert tk.available()
+    assert tk._thread is None
+
+
+def test_available_needs_a_display(fresh_tk, monkeypatch):
+    monkeypatch.setattr(tk.importlib.util, 'find_spec', lambda name: object())
+    assert tk.available() == (sys.platform == 'win32')
+
+
+def test_available_needs_tkinter(fresh_tk, monkeypatch):
+    monkeypatch.setenv('DISPLAY', ':0')
+    monkeypatch.setattr(tk.importlib.util, 'find_spec', lambda name: None)
+    assert not tk.available()
+
+
+def test_first_dialog_falls_back(fresh_tk, scripted, monkeypatch):
+    pytest.importorskip('tkinter')
+    # Nothing listens there, so Tk fails to start.
+    monkeypatch.setenv('DISPLAY', ':4242')
+    monkeypatch.setattr(registry, 'backends', dict(
+        tk=registry.backends['tk'], testing=registry.Backend('testing', 'crossfiledialog.testing', 1),
+    ))
+    monkeypatch.setattr(registry, '_entry_points_loaded', True)
+    scripted.install(['/tmp/a.txt'])
+    # Detect a backend instead of using the one install() selected.
+    wrapper.backend = None
+    assert crossfiledialog.open_file() == '/tmp/a.txt'
+    assert 'tk' in registry.failed
+    assert not tk.available()